@@ -15,22 +15,21 @@
 import os
 from typing import Any, Dict
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from clients.anthropic_client import AnthropicClient
 from shared.callbacks.websocket_error_handler import WebsocketErrorHandler
 from shared.callbacks.websocket_handler import WebsocketHandler
 from utils.constants import DEFAULT_ANTHROPIC_RAG_ENABLED_MODE, RAG_ENABLED_ENV_VAR, TRACE_ID_ENV_VAR, USER_ID_EVENT_KEY
-from utils.enum_types import CloudWatchNamespaces
 from utils.handler_response_formatter import format_response
+from utils.request_timer import log_request_timings
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.COLD_STARTS.value)
 
 
 @tracer.capture_lambda_handler
-@metrics.log_metrics(capture_cold_start_metric=True)
+@log_request_timings
 def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
     """Create an AnthropicLLM object based on the configuration in `event` and admin configuration
     :param event (Dict): AWS Lambda Event
@@ -44,6 +43,9 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
         )
         anthropic_client.check_env()
         event_body = anthropic_client.check_event(event)
+        faq_answer = anthropic_client.get_faq_answer(event_body)
+        if faq_answer is not None:
+            return format_response({"response": {"answer": faq_answer}})
 
         anthropic_chat = anthropic_client.get_model(
             event_body, event["requestContext"]["authorizer"][USER_ID_EVENT_KEY]
@@ -59,7 +61,8 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
 
         logger.debug(f"LLM response {ai_response}")
 
-        return format_response({"response": ai_response})
+        # Source documents are sent to the websocket client as soon as retrieval completes, so only the answer is returned
+        return format_response({"response": {"answer": ai_response["answer"]}})
     except Exception as ex:
         tracer_id = os.getenv(TRACE_ID_ENV_VAR)
         logger.error(f"An exception occurred in the processing of Anthropic chat: {ex}", xray_trace_id=tracer_id)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+"""
+Benchmarks the chunking stage of the ingestion pipeline on a synthetic corpus, reporting its throughput and its peak
+memory, which must stay within the memory of a lambda whatever the size of the documents.
+
+The corpus is written to a local directory as large text files of random words and paragraphs, then read back through
+iter_local_documents and OpenSearchIngestionPipeline.iter_batches, which chunks, hashes and batches the documents as
+they are fed to the embedding and _bulk stages. Run from the package root, e.g.
+
+    python -m benchmarks.chunker_benchmark --size-mb 4096 --file-mb 512
+
+With --compare-splitter, the same files are also read whole and split with RecursiveCharacterTextSplitter, as before
+the streaming chunker, for reference. Peak memory is the high-water mark of the Python allocations of each run, and
+the maximum resident set size of the process once it is done.
+"""
+
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from shared.knowledge.opensearch_ingestion import OpenSearchIngestionPipeline, iter_local_documents
+from utils.constants import (
+    DEFAULT_INGESTION_BATCH_SIZE,
+    DEFAULT_INGESTION_CHUNK_OVERLAP,
+    DEFAULT_INGESTION_CHUNK_SIZE,
+    ESTIMATED_CHARACTERS_PER_TOKEN,
+)
+
+VOCABULARY_SIZE = 20000
+WORDS_PER_BLOCK = 200000
+WORDS_PER_PARAGRAPH = 120
+
+
+def write_synthetic_corpus(directory: str, size_mb: int, file_mb: int, seed: int) -> int:
+    """
+    Writes files of random words drawn with a Zipf distribution, as in natural text, block by block so that the corpus
+    is never held in memory.
+
+    Returns:
+        int: the number of bytes written
+    """
+    random_state = np.random.RandomState(seed)
+    vocabulary = np.array(
+        [
+            "".join(chr(97 + letter) for letter in random_state.randint(26, size=random_state.randint(1, 12)))
+            for _ in range(VOCABULARY_SIZE)
+        ]
+    )
+    written = 0
+    file_number = 0
+    while written < size_mb * 2**20:
+        file_written = 0
+        with open(os.path.join(directory, f"document-{file_number:04d}.txt"), "w", encoding="utf-8") as file:
+            while file_written < min(file_mb, size_mb) * 2**20 and written + file_written < size_mb * 2**20:
+                word_ids = np.minimum(random_state.zipf(1.2, size=WORDS_PER_BLOCK) - 1, VOCABULARY_SIZE - 1)
+                words = vocabulary[word_ids]
+                words[WORDS_PER_PARAGRAPH - 1 :: WORDS_PER_PARAGRAPH] = np.char.add(
+                    words[WORDS_PER_PARAGRAPH - 1 :: WORDS_PER_PARAGRAPH], ".\n\n"
+                )
+                block = " ".join(words) + " "
+                file.write(block)
+                file_written += len(block)
+        written += file_written
+        file_number += 1
+    return written
+
+
+def run_streaming_chunker(directory: str, args: argparse.Namespace) -> Dict:
+    pipeline = OpenSearchIngestionPipeline(
+        client=None,
+        embeddings=None,
+        index_name="chunker-benchmark",
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        incremental=False,
+    )
+    chunks = tokens = 0
+    for batch in pipeline.iter_batches(iter_local_documents(directory)):
+        chunks += len(batch)
+        tokens += sum(chunk.metadata["token_count"] for chunk in batch)
+        # completes the documents as write_batch does, without embedding and writing their chunks
+        pipeline.release_chunks([(chunk.metadata["source"], chunk.metadata["version"]) for chunk in batch])
+    return {"chunks": chunks, "tokens": tokens}
+
+
+def run_text_splitter(directory: str, args: argparse.Namespace) -> Dict:
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size * ESTIMATED_CHARACTERS_PER_TOKEN,
+        chunk_overlap=args.chunk_overlap * ESTIMATED_CHARACTERS_PER_TOKEN,
+    )
+    chunks = 0
+    for file_name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, file_name), encoding="utf-8") as file:
+            chunks += len(text_splitter.split_text(file.read()))
+    return {"chunks": chunks, "tokens": ""}
+
+
+def measure(name: str, run: Callable, directory: str, size_bytes: int, args: argparse.Namespace) -> Dict:
+    """
+    Runs a chunker over the corpus, tracing the Python allocations only when requested as tracing halves throughput.
+    """
+    if args.trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    counts = run(directory, args)
+    elapsed = time.perf_counter() - start_time
+    peak_mb = ""
+    if args.trace_memory:
+        peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+        tracemalloc.stop()
+    return {
+        "chunker": name,
+        **counts,
+        "seconds": round(elapsed, 1),
+        "mb_per_s": round(size_bytes / 2**20 / elapsed, 1),
+        "peak_traced_mb": peak_mb,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048, help="size of the synthetic corpus")
+    parser.add_argument("--file-mb", type=int, default=256, help="size of each file of the corpus")
+    parser.add_argument("--directory", help="directory of the corpus [defaults to a temporary directory]")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_INGESTION_CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_INGESTION_CHUNK_OVERLAP)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INGESTION_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="trace the peak of the Python allocations")
+    parser.add_argument("--compare-splitter", action="store_true", help="also run RecursiveCharacterTextSplitter")
+    parser.add_argument("--keep-corpus", action="store_true", help="keep the corpus for another run")
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix="chunker-benchmark-")
+    try:
+        if not os.listdir(directory):
+            write_synthetic_corpus(directory, args.size_mb, args.file_mb, args.seed)
+        size_bytes = sum(os.path.getsize(os.path.join(directory, file_name)) for file_name in os.listdir(directory))
+
+        # the streaming chunker runs first, so the maximum resident set size is its own
+        results = [measure("streaming", run_streaming_chunker, directory, size_bytes, args)]
+        if args.compare_splitter:
+            results.append(measure("text_splitter", run_text_splitter, directory, size_bytes, args))
+    finally:
+        if not args.keep_corpus and not args.directory:
+            shutil.rmtree(directory)
+
+    print(f"corpus\t{round(size_bytes / 2**20, 1)} MB")
+    columns = list(results[0])
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
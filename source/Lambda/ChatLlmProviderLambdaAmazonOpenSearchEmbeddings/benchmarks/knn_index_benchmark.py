@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+"""
+Benchmarks k-NN index configs on a synthetic corpus, reporting recall@k against query latency and graph memory.
+
+Each config is created as a temporary index on the domain, loaded with the same clustered, unit-normalized random
+vectors, force merged to a single segment and warmed up. The queries are then run one at a time, and their results
+compared with the exact nearest neighbours computed with numpy. Run from the package root, e.g.
+
+    python -m benchmarks.knn_index_benchmark --host <domain endpoint> --secret-name <secret> --dimension 768 \
+        --configs configs.json
+
+where configs.json holds a list of declarative KnnIndexConfig, e.g. [{"Engine": "faiss", "Encoding": "fp16"}]. The
+dimension is set by --dimension. Without --configs, float, fp16 and byte encodings of both engines are compared.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from opensearchpy import helpers
+from shared.knowledge.opensearch_connection import get_opensearch_client
+from shared.knowledge.opensearch_index import KnnIndexConfig, create_or_update_index, encode_vector
+from shared.knowledge.opensearch_knowledge_base import get_secret
+from utils.constants import OPENSEARCH_TEXT_FIELD, OPENSEARCH_VECTOR_FIELD
+
+DEFAULT_CONFIGS = [
+    {"Engine": "faiss", "Encoding": "float"},
+    {"Engine": "faiss", "Encoding": "fp16"},
+    {"Engine": "faiss", "Encoding": "byte"},
+    {"Engine": "lucene", "Encoding": "float"},
+    {"Engine": "lucene", "Encoding": "byte"},
+]
+BENCHMARK_INDEX_PREFIX = "knn-benchmark"
+BULK_CHUNK_SIZE = 500
+
+
+def get_synthetic_corpus(number_of_vectors: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """
+    Generates unit-normalized vectors drawn around random centroids, which are closer to real embeddings than
+    uniformly random vectors, whose neighbours are all nearly equidistant.
+    """
+    random_state = np.random.RandomState(seed)
+    centroids = random_state.normal(size=(clusters, dimension))
+    vectors = centroids[random_state.randint(clusters, size=number_of_vectors)]
+    vectors = vectors + random_state.normal(scale=0.5, size=(number_of_vectors, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def get_exact_neighbours(corpus: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns the ids of the exact k nearest neighbours of each query. The vectors are unit-normalized, so the l2,
+    inner product and cosine orders are the same.
+    """
+    similarities = queries @ corpus.T
+    return np.argsort(-similarities, axis=1)[:, :k]
+
+
+def load_index(client: Any, index_name: str, config: KnnIndexConfig, corpus: np.ndarray) -> float:
+    """
+    Loads the corpus in the index, merges it to a single segment and warms up its graphs.
+
+    Returns:
+        float: the loading time, in seconds
+    """
+    start_time = time.perf_counter()
+    actions = (
+        {
+            "_index": index_name,
+            "_id": str(document_id),
+            OPENSEARCH_TEXT_FIELD: f"document {document_id}",
+            OPENSEARCH_VECTOR_FIELD: encode_vector(vector.tolist(), config.encoding),
+        }
+        for document_id, vector in enumerate(corpus)
+    )
+    helpers.bulk(client, actions, chunk_size=BULK_CHUNK_SIZE, request_timeout=300)
+    client.indices.refresh(index=index_name)
+    client.indices.forcemerge(index=index_name, max_num_segments=1, request_timeout=1800)
+    client.transport.perform_request("GET", f"/_plugins/_knn/warmup/{index_name}")
+    return time.perf_counter() - start_time
+
+
+def get_graph_memory_kb(client: Any, index_name: str) -> float:
+    """
+    Returns the native memory the graphs of the index take on the domain, as reported by the k-NN stats. Graphs of
+    the lucene engine live in the page cache and are not reported.
+    """
+    stats = client.transport.perform_request("GET", "/_plugins/_knn/stats")
+    return sum(
+        node.get("indices_in_cache", {}).get(index_name, {}).get("graph_memory_usage", 0)
+        for node in stats.get("nodes", {}).values()
+    )
+
+
+def run_queries(client: Any, index_name: str, config: KnnIndexConfig, queries: np.ndarray, k: int) -> Dict:
+    """
+    Runs the queries one at a time.
+
+    Returns:
+        Dict: the retrieved ids of each query, and the client and server side latencies, in milliseconds
+    """
+    retrieved_ids, latencies, took = [], [], []
+    for query in queries:
+        query_vector = encode_vector(query.tolist(), config.encoding)
+        body = {
+            "size": k,
+            "query": {"knn": {OPENSEARCH_VECTOR_FIELD: {"vector": query_vector, "k": k}}},
+            "_source": False,
+            "track_total_hits": False,
+        }
+        start_time = time.perf_counter()
+        response = client.search(index=index_name, body=body)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        took.append(response["took"])
+        retrieved_ids.append([int(hit["_id"]) for hit in response["hits"]["hits"]])
+    return {"retrieved_ids": retrieved_ids, "latencies": latencies, "took": took}
+
+
+def get_recall(retrieved_ids: List[List[int]], exact_ids: np.ndarray) -> float:
+    """
+    Returns the mean recall@k of the queries, the share of their exact k nearest neighbours that were retrieved.
+    """
+    k = exact_ids.shape[1]
+    return float(np.mean([len(set(retrieved) & set(exact)) / k for retrieved, exact in zip(retrieved_ids, exact_ids)]))
+
+
+def benchmark(args: argparse.Namespace) -> List[Dict]:
+    secret = get_secret(args.secret_name)
+    client = get_opensearch_client(
+        args.host, args.port, (secret["username"], secret["password"]), use_ssl=True, verify_certs=True, timeout=60
+    )
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs) as configs_file:
+            configs = json.load(configs_file)
+
+    corpus = get_synthetic_corpus(args.documents, args.dimension, args.clusters, args.seed)
+    queries = get_synthetic_corpus(args.queries, args.dimension, args.clusters, args.seed + 1)
+    exact_ids = get_exact_neighbours(corpus, queries, args.k)
+
+    results = []
+    for config_number, declarative_config in enumerate(configs):
+        config = KnnIndexConfig.from_dict({**declarative_config, "Dimension": args.dimension})
+        index_name = f"{BENCHMARK_INDEX_PREFIX}-{config_number}"
+        if client.indices.exists(index=index_name):
+            client.indices.delete(index=index_name)
+        try:
+            create_or_update_index(client, index_name, config)
+            load_time = load_index(client, index_name, config, corpus)
+            query_results = run_queries(client, index_name, config, queries, args.k)
+            results.append(
+                {
+                    "engine": config.engine,
+                    "encoding": config.encoding,
+                    "m": config.m,
+                    "ef_construction": config.ef_construction,
+                    "ef_search": config.ef_search,
+                    f"recall@{args.k}": round(get_recall(query_results["retrieved_ids"], exact_ids), 4),
+                    "p50_ms": round(float(np.percentile(query_results["latencies"], 50)), 2),
+                    "p99_ms": round(float(np.percentile(query_results["latencies"], 99)), 2),
+                    "took_p50_ms": float(np.percentile(query_results["took"], 50)),
+                    "estimated_mb": round(config.estimate_memory_bytes(args.documents) / 2**20, 1),
+                    "graph_mb": round(get_graph_memory_kb(client, index_name) / 2**10, 1),
+                    "load_s": round(load_time, 1),
+                }
+            )
+        finally:
+            if not args.keep_indices:
+                client.indices.delete(index=index_name, ignore_unavailable=True)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", required=True, help="endpoint of the OpenSearch domain")
+    parser.add_argument("--port", type=int, default=443)
+    parser.add_argument("--secret-name", required=True, help="Secrets Manager secret with the domain credentials")
+    parser.add_argument("--configs", help="JSON file with the list of declarative configs to compare")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-indices", action="store_true", help="keep the benchmark indices for inspection")
+    args = parser.parse_args()
+
+    results = benchmark(args)
+    columns = list(results[0]) if results else []
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
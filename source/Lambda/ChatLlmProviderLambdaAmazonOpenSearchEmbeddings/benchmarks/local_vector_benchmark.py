@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+"""
+Benchmarks the in-process search of LocalVectorStore on synthetic embeddings, reporting the latency of a single query
+search and its recall against an exact float32 search, for each encoding and inverted list configuration.
+
+The embeddings are drawn around random cluster centers, as the embeddings of a corpus of topics are, and the queries
+are noisy copies of stored embeddings. Each configuration is written with LocalVectorStoreWriter to a temporary
+directory, then loaded and searched as the lambda does. Run from the package root, e.g.
+
+    python -m benchmarks.local_vector_benchmark --count 300000 --dimension 768 --ivf-lists 548
+
+Latencies exclude the embedding of the query, which is a call to the embedding endpoint in every knowledge base.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain.schema import Document
+from shared.knowledge.local_vector_store import LocalVectorStore, LocalVectorStoreWriter
+from utils.constants import DEFAULT_IVF_NPROBE, DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS
+
+WRITE_BATCH_SIZE = 10000
+
+
+def get_embeddings(random_state: np.random.RandomState, centers: np.ndarray, count: int, noise: float) -> np.ndarray:
+    vectors = centers[random_state.randint(len(centers), size=count)]
+    vectors = vectors + noise * random_state.normal(size=vectors.shape).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def write_store(directory: str, embeddings: np.ndarray, encoding: str, ivf_lists: int) -> float:
+    """
+    Writes a store of the embeddings, with a short document per row.
+
+    Returns:
+        float: the seconds taken to write the store
+    """
+    start_time = time.perf_counter()
+    writer = LocalVectorStoreWriter(directory, encoding=encoding, ivf_lists=ivf_lists)
+    for start in range(0, len(embeddings), WRITE_BATCH_SIZE):
+        rows = range(start, min(start + WRITE_BATCH_SIZE, len(embeddings)))
+        documents = [Document(page_content=f"chunk {row}", metadata={"row": row}) for row in rows]
+        writer.add(documents, embeddings[start : rows.stop])
+    writer.close()
+    return time.perf_counter() - start_time
+
+
+def measure(directory: str, queries: np.ndarray, exact_top_k: List[set], args: argparse.Namespace, **kwargs) -> Dict:
+    """
+    Loads a store and searches it query by query, as the retriever does, then reads the documents found.
+    """
+    start_time = time.perf_counter()
+    store = LocalVectorStore(directory)
+    load_ms = (time.perf_counter() - start_time) * 1000
+
+    latencies = []
+    recalls = []
+    for query, exact_rows in zip(queries, exact_top_k):
+        start_time = time.perf_counter()
+        results = store.search([query], args.k, nprobe=args.nprobe)[0]
+        documents = [store.get_document(row) for row, _ in results]
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        recalls.append(len({document.metadata["row"] for document in documents} & exact_rows) / args.k)
+    return {
+        **kwargs,
+        "load_ms": round(load_ms, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        f"recall@{args.k}": round(float(np.mean(recalls)), 3),
+        "vectors_mb": round(os.path.getsize(os.path.join(directory, "vectors.npy")) / 2**20, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100000, help="number of stored embeddings")
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=1000, help="number of topics the embeddings are drawn around")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS)
+    parser.add_argument("--ivf-lists", type=int, default=0, help="inverted lists [defaults to sqrt(count)]")
+    parser.add_argument("--nprobe", type=int, default=DEFAULT_IVF_NPROBE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    ivf_lists = args.ivf_lists or int(np.sqrt(args.count))
+
+    random_state = np.random.RandomState(args.seed)
+    centers = random_state.normal(size=(args.clusters, args.dimension)).astype(np.float32)
+    embeddings = get_embeddings(random_state, centers, args.count, noise=0.8)
+    queries = embeddings[random_state.randint(args.count, size=args.queries)]
+    queries = queries + 0.02 * random_state.normal(size=queries.shape).astype(np.float32)
+    exact_top_k = [set(np.argsort(-(embeddings @ query))[: args.k]) for query in queries]
+
+    results = []
+    directory = tempfile.mkdtemp(prefix="local-vector-benchmark-")
+    try:
+        for encoding, lists in (("float", 0), ("byte", 0), ("float", ivf_lists), ("byte", ivf_lists)):
+            store_directory = os.path.join(directory, f"{encoding}-{lists}")
+            write_seconds = write_store(store_directory, embeddings, encoding, lists)
+            results.append(
+                measure(
+                    store_directory,
+                    queries,
+                    exact_top_k,
+                    args,
+                    encoding=encoding,
+                    ivf_lists=lists,
+                    write_s=round(write_seconds, 1),
+                )
+            )
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"count\t{args.count}\tdimension\t{args.dimension}\tnprobe\t{args.nprobe}")
+    columns = list(results[0])
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
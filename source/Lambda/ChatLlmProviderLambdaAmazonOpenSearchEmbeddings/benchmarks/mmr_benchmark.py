@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+"""
+Benchmarks the selection of documents by maximal marginal relevance on synthetic embeddings, reporting the latency of
+a call for each number of fetch_k candidates. The selection runs in the lambda after the candidates are fetched with
+their vectors, so its latency adds to that of every retrieval of the "mmr" search type. Run from the package root, e.g.
+
+    python -m benchmarks.mmr_benchmark --fetch-k 20 100 --k 10 --dimension 1536
+
+Latencies exclude the search of the candidates and the embedding of the query.
+"""
+
+import argparse
+import timeit
+from typing import Dict
+
+import numpy as np
+from shared.knowledge.maximal_marginal_relevance import maximal_marginal_relevance
+from utils.constants import DEFAULT_MMR_FETCH_K, DEFAULT_MMR_LAMBDA_MULT
+
+
+def measure(fetch_k: int, args: argparse.Namespace) -> Dict:
+    """
+    Times the selection of k of fetch_k random candidates, keeping the fastest of the repeats as the others are slowed
+    down by the rest of the machine.
+    """
+    random_state = np.random.RandomState(args.seed)
+    query_vector = random_state.rand(args.dimension).astype(np.float32)
+    candidate_vectors = random_state.rand(fetch_k, args.dimension).astype(np.float32)
+
+    seconds = min(
+        timeit.repeat(
+            lambda: maximal_marginal_relevance(query_vector, candidate_vectors, k=args.k, lambda_mult=args.lambda_mult),
+            number=args.number,
+            repeat=args.repeat,
+        )
+    )
+    return {
+        "fetch_k": fetch_k,
+        "k": args.k,
+        "dimension": args.dimension,
+        "ms_per_call": round(seconds / args.number * 1000, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[DEFAULT_MMR_FETCH_K, 100])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--lambda-mult", type=float, default=DEFAULT_MMR_LAMBDA_MULT)
+    parser.add_argument("--number", type=int, default=100, help="calls per timed repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = [measure(fetch_k, args) for fetch_k in args.fetch_k]
+
+    columns = list(results[0])
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,8 @@ from clients.builders.bedrock_builder import BedrockBuilder
 from clients.llm_chat_client import LLMChatClient
 from llm_models.bedrock import BedrockLLM
 from utils.constants import CONVERSATION_ID_EVENT_KEY, TRACE_ID_ENV_VAR, USER_ID_EVENT_KEY
-from utils.enum_types import LLMProviderTypes
+from utils.enum_types import LLMProviderTypes, RequestStages
+from utils.request_timer import request_timer
 
 logger = Logger(utc=True)
 tracer = Tracer()
@@ -89,10 +90,12 @@ class BedrockClient(LLMChatClient):
                 )
                 raise ValueError(f"Builder is not set for this LLMChatClient.")
 
-            self.builder.set_knowledge_base()
+            with request_timer.stage(RequestStages.KNOWLEDGE_BASE):
+                self.builder.set_knowledge_base(self.user_context)
             self.builder.set_memory_constants(llm_provider)
             self.builder.set_conversation_memory(user_id, conversation_id)
-            self.builder.set_llm_model()
+            with request_timer.stage(RequestStages.LLM_SETUP):
+                self.builder.set_llm_model()
 
         else:
             error_message = (
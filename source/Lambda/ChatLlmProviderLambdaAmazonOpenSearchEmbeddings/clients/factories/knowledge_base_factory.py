@@ -13,10 +13,11 @@
 ######################################################################################################################
 
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from aws_lambda_powertools import Logger
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
+from shared.knowledge.local_vector_knowledge_base import LocalVectorKnowledgeBase
 from shared.knowledge.opensearch_knowledge_base import OpenSearchKnowledgeBase
 from shared.knowledge.knowledge_base import KnowledgeBase
 from utils.constants import TRACE_ID_ENV_VAR
@@ -31,13 +32,16 @@ class KnowledgeBaseFactory:
     in the llm_config.
     """
 
-    def get_knowledge_base(self, llm_config: Dict, errors: List[str]) -> KnowledgeBase:
+    def get_knowledge_base(
+        self, llm_config: Dict, errors: List[str], user_context: Optional[Dict] = None
+    ) -> KnowledgeBase:
         """
         Returns a KnowledgeBase object based on the knowledge-base object constructed with the provided configuration.
 
         Args:
             llm_config(Dict): Model configuration set by admin
             errors(List): List of errors to append to
+            user_context(Dict): Authorizer context of the request, for the filters on user attributes
 
         Returns:
             KnowledgeBase: the knowledge-base constructed with the provided configuration.
@@ -72,13 +76,22 @@ class KnowledgeBaseFactory:
             if not llm_config.get("KnowledgeBaseParams"):
                 raise ValueError("Missing required parameter (KnowledgeBaseParams) for Kendra knowledge base.")
 
-            return KendraKnowledgeBase(kendra_knowledge_base_params=llm_config.get("KnowledgeBaseParams"))
+            return KendraKnowledgeBase(
+                kendra_knowledge_base_params=llm_config.get("KnowledgeBaseParams"), user_context=user_context
+            )
             
         if knowledge_base_str == KnowledgeBaseTypes.OpenSearch.value:
             if not llm_config.get("KnowledgeBaseParams"):
                 raise ValueError("Missing required parameter (KnowledgeBaseParams) for OpenSearch knowledge base.")
 
-            return OpenSearchKnowledgeBase(opensearch_knowledge_base_params=llm_config.get("KnowledgeBaseParams"))
+            return OpenSearchKnowledgeBase(
+                opensearch_knowledge_base_params=llm_config.get("KnowledgeBaseParams"), user_context=user_context
+            )
+
+        if knowledge_base_str == KnowledgeBaseTypes.LocalVector.value:
+            return LocalVectorKnowledgeBase(
+                local_vector_knowledge_base_params=llm_config.get("KnowledgeBaseParams"), user_context=user_context
+            )
 
 
         else:
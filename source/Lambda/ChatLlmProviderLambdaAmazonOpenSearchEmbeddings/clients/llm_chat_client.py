@@ -22,10 +22,15 @@ from aws_lambda_powertools import Logger, Tracer
 from botocore.exceptions import ClientError
 from clients.builders.llm_builder import LLMBuilder
 from helper import get_service_client
+from langchain.schema import AIMessage, HumanMessage
 from llm_models.base_langchain import BaseLangChainModel
+from shared.callbacks.websocket_handler import WebsocketHandler
+from shared.knowledge.faq_index import get_faq_index
+from shared.memory.ddb_enhanced_message_history import DynamoDBChatMessageHistory
 from utils.constants import (
     CHAT_REQUIRED_ENV_VARS,
     CONVERSATION_ID_EVENT_KEY,
+    CONVERSATION_TABLE_NAME_ENV_VAR,
     LLM_PARAMETERS_SSM_KEY_ENV_VAR,
     PROMPT_EVENT_KEY,
     PROMPT_LENGTH,
@@ -34,7 +39,9 @@ from utils.constants import (
     USER_ID_EVENT_KEY,
     USER_QUERY_LENGTH,
 )
-from utils.enum_types import LLMProviderTypes
+from utils.enum_types import LLMProviderTypes, RequestFlags, RequestStages
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
@@ -52,10 +59,12 @@ class LLMChatClient(ABC):
         llm_config (Dict): Stores the configuration that the admin sets on a use-case, fetched from SSM Parameter store
         rag_enabled (bool): Stores the value of the RAG feature flag that is set on the use-case
         connection_id (str): The connection ID for the websocket client
+        user_context (Dict): The authorizer context of the request, used to restrict the retrieved documents to the user
 
     Methods:
         check_env(List[str]): Checks if the environment variable list provided, along with other required environment variables, are set.
         check_event(event: Dict): Checks if the event it receives is empty.
+        get_faq_answer(event_body: Dict): Answers the question from the FAQ index, when it matches one of its questions
         get_llm_config(): Retrieves the configuration that the admin sets on a use-case from the SSM Parameter store
         construct_chat_model(): Constructs the Chat model based on the event and the LLM configuration as a series of steps on the builder
         get_event_conversation_id(): Sets the conversation_id for the event
@@ -69,12 +78,14 @@ class LLMChatClient(ABC):
         llm_config: Optional[Dict] = None,
         rag_enabled: Optional[Union[str, bool]] = None,
         connection_id: Optional[str] = None,
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._builder = builder
         self._llm_config = llm_config
         # convert string env to bool
         self._rag_enabled = rag_enabled if type(rag_enabled) == bool else rag_enabled.lower() == "true"
         self._connection_id = connection_id
+        self._user_context = user_context
 
     @property
     def builder(self) -> Optional[LLMBuilder]:
@@ -108,6 +119,14 @@ class LLMChatClient(ABC):
     def connection_id(self, connection_id) -> None:
         self._connection_id = connection_id
 
+    @property
+    def user_context(self) -> Optional[Dict]:
+        return self._user_context
+
+    @user_context.setter
+    def user_context(self, user_context) -> None:
+        self._user_context = user_context
+
     @classmethod
     def check_env(cls, additional_keys: Optional[List[str]] = []) -> None:
         """
@@ -135,6 +154,7 @@ class LLMChatClient(ABC):
         """
         Checks if the event it receives is as expected (checking for required fields),
         and adds the user id into the event body (comes from requestContext from custom authorizer).
+        The authorizer context is kept as the user context, for the knowledge base filters on user attributes.
         If the event body does not contain the conversation_id, it also adds it in.
 
         Args:
@@ -188,9 +208,55 @@ class LLMChatClient(ABC):
 
         parsed_event_body[CONVERSATION_ID_EVENT_KEY] = self.get_event_conversation_id(parsed_event_body)
         parsed_event_body[USER_ID_EVENT_KEY] = user_id
+        self.user_context = event["requestContext"]["authorizer"]
         return parsed_event_body
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method
+    def get_faq_answer(self, event_body: Dict) -> Optional[str]:
+        """
+        Answers the question of the event from the FAQ index of FAQ_INDEX_URI, when one is set and the question
+        matches one of its questions, without retrieval or generation. The answer is sent to the websocket client and
+        the turn is written to the conversation memory, so the conversation goes on as if the LLM had answered. When
+        the FAQ index fails, the question is left to the LLM.
+
+        Args:
+            event_body (Dict): Parsed event body, from check_event
+        Returns:
+            Optional[str]: The answer sent to the websocket client, or None when the LLM has to answer
+        """
+        faq_match = None
+        try:
+            faq_index = get_faq_index()
+            if faq_index is None:
+                return None
+            with request_timer.stage(RequestStages.FAQ_MATCH):
+                faq_match = faq_index.match(event_body[QUESTION_EVENT_KEY])
+        except Exception as ex:
+            logger.warning(
+                f"Matching the FAQ index failed, answering with the LLM. Error: {ex}",
+                xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+            )
+
+        request_timer.set_flag(RequestFlags.FAQ_HIT, faq_match is not None)
+        if faq_match is None:
+            return None
+
+        logger.debug(f"Answering from the FAQ question '{faq_match.question}' with score {faq_match.score}")
+        WebsocketHandler(
+            connection_id=self.connection_id, conversation_id=event_body[CONVERSATION_ID_EVENT_KEY]
+        ).post_token_to_connection(faq_match.answer)
+        chat_history = DynamoDBChatMessageHistory(
+            table_name=os.environ[CONVERSATION_TABLE_NAME_ENV_VAR],
+            user_id=event_body[USER_ID_EVENT_KEY],
+            conversation_id=event_body[CONVERSATION_ID_EVENT_KEY],
+        )
+        chat_history.add_messages(
+            [HumanMessage(content=event_body[QUESTION_EVENT_KEY]), AIMessage(content=faq_match.answer)]
+        )
+        return faq_match.answer
+
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def get_llm_config(self) -> Dict:
         """
         Retrieves the configuration that the admin sets on a use-case from the SSM Parameter store
@@ -205,8 +271,9 @@ class LLMChatClient(ABC):
             ssm_param_key = os.getenv(LLM_PARAMETERS_SSM_KEY_ENV_VAR)
             try:
                 if ssm_param_key:
-                    ssm_client = get_service_client(service_name="ssm")
-                    llm_config = ssm_client.get_parameter(Name=ssm_param_key, WithDecryption=True)
+                    with request_timer.stage(RequestStages.LLM_CONFIG):
+                        ssm_client = get_service_client(service_name="ssm")
+                        llm_config = ssm_client.get_parameter(Name=ssm_param_key, WithDecryption=True)
                     self.llm_config = json.loads(llm_config["Parameter"]["Value"])
                     return self.llm_config
                 else:
@@ -253,11 +320,14 @@ class LLMChatClient(ABC):
                 )
                 raise ValueError(f"Builder is not set for this LLMChatClient.")
 
-            self.builder.set_knowledge_base()
+            with request_timer.stage(RequestStages.KNOWLEDGE_BASE):
+                self.builder.set_knowledge_base(self.user_context)
             self.builder.set_memory_constants(llm_provider)
             self.builder.set_conversation_memory(user_id, conversation_id)
-            self.builder.set_api_key()
-            self.builder.set_llm_model()
+            with request_timer.stage(RequestStages.API_KEY):
+                self.builder.set_api_key()
+            with request_timer.stage(RequestStages.LLM_SETUP):
+                self.builder.set_llm_model()
 
         else:
             error_message = (
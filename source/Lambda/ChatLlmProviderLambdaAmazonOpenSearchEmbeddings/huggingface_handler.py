@@ -15,7 +15,7 @@
 import os
 from typing import Any, Dict
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from clients.huggingface_client import HuggingFaceClient
 from shared.callbacks.websocket_error_handler import WebsocketErrorHandler
@@ -26,16 +26,15 @@ from utils.constants import (
     TRACE_ID_ENV_VAR,
     USER_ID_EVENT_KEY,
 )
-from utils.enum_types import CloudWatchNamespaces
 from utils.handler_response_formatter import format_response
+from utils.request_timer import log_request_timings
 
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.COLD_STARTS.value)
 tracer = Tracer()
 
 
 @tracer.capture_lambda_handler
-@metrics.log_metrics(capture_cold_start_metric=True)
+@log_request_timings
 def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
     """Create a HuggingFaceLLM object based on the configuration in `event` and admin configuration
     :param event (Dict): AWS Lambda Event
@@ -50,6 +49,9 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
         )
         huggingface_client.check_env()
         event_body = huggingface_client.check_event(event)
+        faq_answer = huggingface_client.get_faq_answer(event_body)
+        if faq_answer is not None:
+            return format_response({"response": {"answer": faq_answer}})
         huggingface_chat = huggingface_client.get_model(
             event_body, event["requestContext"]["authorizer"][USER_ID_EVENT_KEY]
         )
@@ -62,7 +64,8 @@ def lambda_handler(event: Dict[str, Any], context: LambdaContext) -> Dict:
         socket_handler.post_token_to_connection(ai_response["answer"])
 
         logger.debug(f"LLM response {ai_response}")
-        return format_response({"response": ai_response})
+        # Source documents are sent to the websocket client as soon as retrieval completes, so only the answer is returned
+        return format_response({"response": {"answer": ai_response["answer"]}})
 
     except Exception as ex:
         tracer_id = os.getenv(TRACE_ID_ENV_VAR)
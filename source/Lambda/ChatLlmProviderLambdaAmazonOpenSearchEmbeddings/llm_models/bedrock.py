@@ -16,7 +16,7 @@ import os
 import time
 from typing import Any, Dict, List, Optional
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from helper import get_service_client
 from langchain.callbacks.base import BaseCallbackHandler
@@ -25,6 +25,7 @@ from langchain.llms.base import LLM
 from langchain.schema import BaseMemory
 from llm_models.base_langchain import BaseLangChainModel
 from llm_models.factories.bedrock_adapter_factory import BedrockAdapterFactory
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
 from shared.knowledge.knowledge_base import KnowledgeBase
 from utils.constants import (
     BEDROCK_MODEL_MAP,
@@ -36,15 +37,16 @@ from utils.constants import (
     DEFAULT_BEDROCK_STREAMING_MODE,
     DEFAULT_BEDROCK_TEMPERATURE_MAP,
     DEFAULT_VERBOSE_MODE,
-    METRICS_SERVICE_NAME,
     TRACE_ID_ENV_VAR,
 )
 from utils.custom_exceptions import LLMBuildError
 from utils.enum_types import BedrockModelProviders, CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 tracer = Tracer()
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class BedrockLLM(BaseLangChainModel):
@@ -146,7 +148,8 @@ class BedrockLLM(BaseLangChainModel):
             callbacks=callbacks,
         )
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def generate(self, question: str) -> Dict[str, Any]:
         """
         Fetches the response from the LLM
@@ -164,7 +167,7 @@ class BedrockLLM(BaseLangChainModel):
             metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_QUERY, unit=MetricUnit.Count, value=1)
             try:
                 start_time = time.time()
-                response = self.conversation_chain.predict(input=question)
+                response = self.conversation_chain.predict(input=question, callbacks=[StageTimingCallbackHandler()])
                 end_time = time.time()
                 metrics.add_metric(
                     name=CloudWatchMetrics.LANGCHAIN_QUERY_PROCESSING_TIME,
@@ -189,8 +192,6 @@ class BedrockLLM(BaseLangChainModel):
                 )
                 metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES, unit=MetricUnit.Count, value=1)
                 raise ex
-            finally:
-                metrics.flush_metrics()
 
     def get_clean_model_params(self, model_params) -> Dict[str, Any]:
         """
@@ -16,7 +16,7 @@ import os
 import time
 from typing import Any, Dict, List, Optional
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from huggingface_hub.utils import RepositoryNotFoundError
 from langchain import HuggingFaceHub
@@ -26,6 +26,7 @@ from langchain.llms.base import LLM
 from langchain.llms.utils import enforce_stop_tokens
 from langchain.schema import BaseMemory
 from llm_models.base_langchain import BaseLangChainModel
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
 from shared.knowledge.knowledge_base import KnowledgeBase
 from utils.constants import (
     DEFAULT_HUGGINGFACE_MODEL,
@@ -37,15 +38,16 @@ from utils.constants import (
     DEFAULT_HUGGINGFACE_TASK,
     DEFAULT_HUGGINGFACE_TEMPERATURE,
     DEFAULT_VERBOSE_MODE,
-    METRICS_SERVICE_NAME,
     TRACE_ID_ENV_VAR,
 )
 from utils.custom_exceptions import LLMBuildError
 from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 tracer = Tracer()
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class HuggingFaceLLM(BaseLangChainModel):
@@ -143,8 +145,6 @@ class HuggingFaceLLM(BaseLangChainModel):
                 xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
             )
             raise LLMBuildError(f"HuggingFace model construction failed. Error: {ex}")
-        finally:
-            metrics.flush_metrics()
 
         self._conversation_chain = self.get_conversation_chain()
 
@@ -187,7 +187,8 @@ class HuggingFaceLLM(BaseLangChainModel):
                 verbose=self.verbose,
             )
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def generate(self, question: str) -> Dict[str, Any]:
         """
         Fetches the response from the LLM
@@ -206,7 +207,7 @@ class HuggingFaceLLM(BaseLangChainModel):
 
             try:
                 start_time = time.time()
-                response = self.conversation_chain.predict(input=question)
+                response = self.conversation_chain.predict(input=question, callbacks=[StageTimingCallbackHandler()])
                 end_time = time.time()
                 metrics.add_metric(
                     name=CloudWatchMetrics.LANGCHAIN_QUERY_PROCESSING_TIME.value,
@@ -230,10 +231,9 @@ class HuggingFaceLLM(BaseLangChainModel):
                 )
                 metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES.value, unit=MetricUnit.Count, value=1)
                 raise ex
-            finally:
-                metrics.flush_metrics()
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def get_clean_model_params(self, model_params: Dict[str, Any]) -> Dict[str, Any]:
         """
         Sanitizes and returns the model params for use with HuggingFace models.
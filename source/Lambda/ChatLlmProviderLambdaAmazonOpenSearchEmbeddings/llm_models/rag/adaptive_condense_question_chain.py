@@ -0,0 +1,151 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+from aws_lambda_powertools import Logger
+from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.chains import LLMChain
+from langchain.schema import BaseMessage
+from utils.constants import (
+    CONDENSE_ANAPHORA_WORDS,
+    CONDENSE_FOLLOW_UP_PREFIXES,
+    CONDENSE_REWRITE_CACHE_SIZE,
+    CONDENSE_SELF_CONTAINED_MIN_WORDS,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+# Rewrites are kept for the lifetime of the lambda container, so retried or repeated turns skip the condensing call
+_rewrite_cache: "OrderedDict[str, str]" = OrderedDict()
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Checks, using cheap heuristics, whether a question can be understood without the chat history. A question is
+    considered self-contained when it is long enough, does not start like a follow-up, and has no words that usually
+    refer back to earlier turns (pronouns and other anaphora).
+
+    Args:
+        question (str): the question asked by the user
+
+    Returns:
+        bool: True if the question does not need to be condensed with the chat history
+    """
+    normalized_question = question.strip().lower()
+    words = re.findall(r"[a-z0-9']+", normalized_question)
+    if len(words) < CONDENSE_SELF_CONTAINED_MIN_WORDS:
+        return False
+    if normalized_question.startswith(CONDENSE_FOLLOW_UP_PREFIXES):
+        return False
+    return not any(word in CONDENSE_ANAPHORA_WORDS for word in words)
+
+
+def get_rewrite_cache_key(chat_history: Union[str, List[BaseMessage]], question: str) -> str:
+    """
+    Builds the rewrite cache key from a hash of the chat history and the question.
+
+    Args:
+        chat_history (Union[str, List[BaseMessage]]): chat history passed to the condensing prompt
+        question (str): the question asked by the user
+
+    Returns:
+        str: the cache key
+    """
+    if isinstance(chat_history, str):
+        history = chat_history
+    else:
+        history = "\n".join(f"{message.type}: {message.content}" for message in chat_history)
+    return hashlib.sha256(f"{history}\n{question}".encode("utf-8")).hexdigest()
+
+
+class AdaptiveCondenseQuestionChain(LLMChain):
+    """
+    AdaptiveCondenseQuestionChain is the question generator of a `ConversationalRetrievalChain`. It only calls the
+    condensing LLM when it is needed, which removes a sequential LLM call from most turns:
+        - when there is no chat history, or the question is self-contained, the question is used as is
+        - when the same question was already condensed for the same chat history, the cached rewrite is used
+        - otherwise the condensing LLM is called and its rewrite is cached
+
+    Methods:
+        from_llm_chain(llm_chain): Creates the chain from the question generator built by the retrieval chain
+        will_condense(question, chat_history): Checks whether the condensing LLM will be called for a question
+    """
+
+    @classmethod
+    def from_llm_chain(cls, llm_chain: LLMChain) -> "AdaptiveCondenseQuestionChain":
+        """
+        Creates an AdaptiveCondenseQuestionChain using the LLM, prompt and settings of the provided LLMChain.
+
+        Args:
+            llm_chain (LLMChain): the question generator created by `ConversationalRetrievalChain.from_llm`
+
+        Returns:
+            AdaptiveCondenseQuestionChain: the adaptive question generator
+        """
+        return cls(
+            llm=llm_chain.llm,
+            prompt=llm_chain.prompt,
+            verbose=llm_chain.verbose,
+            callbacks=llm_chain.callbacks,
+        )
+
+    def will_condense(self, question: str, chat_history: Union[str, List[BaseMessage]]) -> bool:
+        """
+        Checks whether the condensing LLM will be called for a question, which is when the question needs the chat
+        history and its rewrite is not cached. Only then does the condensed question take time to be known.
+
+        Args:
+            question (str): the question asked by the user
+            chat_history (Union[str, List[BaseMessage]]): chat history passed to the condensing prompt
+
+        Returns:
+            bool: True if the condensing LLM will be called
+        """
+        if not chat_history or is_self_contained(question):
+            return False
+        return get_rewrite_cache_key(chat_history, question) not in _rewrite_cache
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, str]:
+        question = inputs["question"]
+        chat_history = inputs.get("chat_history")
+
+        if not chat_history or is_self_contained(question):
+            logger.debug("Skipping question condensing, the question is self-contained")
+            request_timer.set_flag(RequestFlags.CONDENSE_SKIPPED, True)
+            return {self.output_key: question}
+
+        request_timer.set_flag(RequestFlags.CONDENSE_SKIPPED, False)
+        cache_key = get_rewrite_cache_key(chat_history, question)
+        cached_question = _rewrite_cache.get(cache_key)
+        request_timer.set_flag(RequestFlags.CONDENSE_CACHE_HIT, cached_question is not None)
+        if cached_question is not None:
+            logger.debug("Using the cached condensed question")
+            _rewrite_cache.move_to_end(cache_key)
+            return {self.output_key: cached_question}
+
+        outputs = super()._call(inputs, run_manager=run_manager)
+        _rewrite_cache[cache_key] = outputs[self.output_key]
+        if len(_rewrite_cache) > CONDENSE_REWRITE_CACHE_SIZE:
+            _rewrite_cache.popitem(last=False)
+        return outputs
@@ -16,31 +16,60 @@ import os
 import time
 from typing import Any, Dict, List, Optional
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
+from helper import get_service_client
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.chains import ConversationalRetrievalChain
 from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.llms import Bedrock
+from langchain.llms.base import LLM
 from langchain.schema import BaseMemory
+from llm_models.base_langchain import BaseLangChainModel
 from llm_models.bedrock import BedrockLLM
+from llm_models.factories.bedrock_adapter_factory import BedrockAdapterFactory
+from llm_models.rag.adaptive_condense_question_chain import AdaptiveCondenseQuestionChain
+from llm_models.rag.context_compressor import ExtractiveContextCompressor
+from llm_models.rag.context_packing_chain import (
+    ContextPacker,
+    ContextPackingConversationalRetrievalChain,
+    get_max_output_tokens,
+)
+from llm_models.rag.document_deduplicator import DocumentDeduplicator
+from llm_models.rag.document_reranker import DocumentReranker, SageMakerDocumentReranker
+from llm_models.rag.multi_query_generator import MultiQueryGenerator
+from llm_models.rag.speculative_retrieval_chain import SpeculativeConversationalRetrievalChain
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
 from shared.knowledge.knowledge_base import KnowledgeBase
 from utils.constants import (
+    BEDROCK_CONTEXT_WINDOW_MAP,
     DEFAULT_BEDROCK_ANTHROPIC_CONDENSING_PROMPT_TEMPLATE,
     DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE,
     DEFAULT_BEDROCK_MODEL_FAMILY,
     DEFAULT_BEDROCK_STREAMING_MODE,
     DEFAULT_BEDROCK_TEMPERATURE_MAP,
+    DEFAULT_COMPRESSION_CONTEXT_SENTENCES,
+    DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT,
+    DEFAULT_COMPRESSION_TOP_SENTENCES,
+    DEFAULT_CONDENSING_TEMPERATURE,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_MULTI_QUERY_MODE,
+    DEFAULT_MULTI_QUERY_NUM_QUERIES,
     DEFAULT_RAG_CHAIN_TYPE,
+    DEFAULT_RERANK_TIMEOUT,
+    DEFAULT_RERANK_TOP_N,
+    DEFAULT_SPECULATIVE_RETRIEVAL,
     DEFAULT_VERBOSE_MODE,
-    METRICS_SERVICE_NAME,
     TRACE_ID_ENV_VAR,
 )
 from utils.custom_exceptions import LLMBuildError
 from utils.enum_types import BedrockModelProviders, CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 tracer = Tracer()
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class BedrockRetrievalLLM(BedrockLLM):
@@ -59,11 +88,29 @@ class BedrockRetrievalLLM(BedrockLLM):
          verbose (bool): A boolean which represents whether the chat is verbose or not [optional, defaults to False]
          temperature (float): A non-negative float that tunes the degree of randomness in model response generation [optional, defaults to DEFAULT_ANTHROPIC_TEMPERATURE]
          callbacks (list): A list of BaseCallbackHandler objects which are used for the LLM model callbacks [optional, defaults to None]
+         condensing_model (str): Bedrock model id used only to condense the chat history and follow-up question into a standalone
+            question. Its model family is derived from the model id [optional, defaults to the answering model]
+         condensing_model_params (dict): A dictionary of model parameters for the condensing model [optional, when neither this nor
+            condensing_model is set, the condensing step reuses the answering model's settings]
+         speculative_retrieval (bool): A boolean which represents whether retrieval starts on the question as asked while the
+            question is condensed [optional, defaults to DEFAULT_SPECULATIVE_RETRIEVAL]
+         context_token_budget (int): Maximum number of tokens of retrieved documents placed in the prompt, further limited by the
+            model's context window [optional, defaults to DEFAULT_CONTEXT_TOKEN_BUDGET]
+         deduplication_threshold (float): Similarity at or above which a retrieved document is dropped as a near-duplicate of a
+            higher scored one, no documents are dropped when it is not set [optional, defaults to None]
+         rerank_params (dict): Configuration of the SageMaker endpoint which reranks the retrieved documents, with the keys
+            EndpointName, TopN and Timeout. Documents are not reranked when it is not set [optional, defaults to None]
+         compression_params (dict): Configuration of the extractive compression of the retrieved documents, with the keys
+            TopSentences, ContextSentences and MaxTokensPerDocument. Documents are kept whole when it is not set
+            [optional, defaults to None]
+         multi_query_params (dict): Configuration of the multi-query retrieval, with the keys Mode ("paraphrase" or "hyde")
+            and NumQueries. Documents are retrieved for the question only when it is not set [optional, defaults to None]
 
     Methods:
         validate_not_null(kwargs): Validates that the supplied values are not null or empty.
         generate(question): Generates a chat response
         get_conversation_chain(): Creates a `ConversationalRetrievalChain` chain that is connected to a conversation memory and the specified prompt
+        get_condensing_llm(): Creates the LLM used to condense the follow-up question into a standalone question
         get_prompt_details(prompt_template, default_prompt_template, default_prompt_template_placeholder): Generates the PromptTemplate using
             the provided prompt template and placeholders
         prompt(): Returns the prompt set on the underlying LLM
@@ -84,14 +131,37 @@ class BedrockRetrievalLLM(BedrockLLM):
         verbose: Optional[bool] = DEFAULT_VERBOSE_MODE,
         temperature: Optional[float] = None,
         callbacks: Optional[List[BaseCallbackHandler]] = None,
+        condensing_model: Optional[str] = None,
+        condensing_model_params: Optional[dict] = None,
+        speculative_retrieval: Optional[bool] = DEFAULT_SPECULATIVE_RETRIEVAL,
+        context_token_budget: Optional[int] = DEFAULT_CONTEXT_TOKEN_BUDGET,
+        deduplication_threshold: Optional[float] = None,
+        rerank_params: Optional[Dict] = None,
+        compression_params: Optional[Dict] = None,
+        multi_query_params: Optional[Dict] = None,
     ):
         temperature = temperature if temperature is not None else DEFAULT_BEDROCK_TEMPERATURE_MAP[model_family]
+
+        # the conversation chain, and with it the condensing model, is built by the parent constructor
+        self._condensing_model = condensing_model
+        self._condensing_model_params = condensing_model_params
+        self._condensing_model_family = (
+            self.get_condensing_model_family(condensing_model) if condensing_model else model_family
+        )
+        self._condensing_llm = None
+        self._speculative_retrieval = speculative_retrieval
+        self._context_token_budget = context_token_budget
+        self._deduplication_threshold = deduplication_threshold
+        self._rerank_params = rerank_params
+        self._compression_params = compression_params
+        self._multi_query_params = multi_query_params
+
         if condensing_prompt_template:
             self.condensing_prompt_template = condensing_prompt_template
         else:
-            if model_family == BedrockModelProviders.ANTHROPIC.value:
+            if self.condensing_model_family == BedrockModelProviders.ANTHROPIC.value:
                 self.condensing_prompt_template = DEFAULT_BEDROCK_ANTHROPIC_CONDENSING_PROMPT_TEMPLATE
-            elif model_family == BedrockModelProviders.META.value:
+            elif self.condensing_model_family == BedrockModelProviders.META.value:
                 self.condensing_prompt_template = DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE
             else:
                 self.condensing_prompt_template = CONDENSE_QUESTION_PROMPT
@@ -110,15 +180,206 @@ class BedrockRetrievalLLM(BedrockLLM):
             rag_enabled=True,
         )
 
+    @property
+    def condensing_model(self) -> Optional[str]:
+        return self._condensing_model
+
+    @property
+    def condensing_model_params(self) -> Optional[dict]:
+        return self._condensing_model_params
+
+    @property
+    def condensing_model_family(self) -> BedrockModelProviders:
+        return self._condensing_model_family
+
+    @property
+    def condensing_llm(self) -> LLM:
+        if self._condensing_llm is None:
+            self._condensing_llm = self.get_condensing_llm()
+        return self._condensing_llm
+
+    @staticmethod
+    def get_condensing_model_family(condensing_model: str) -> BedrockModelProviders:
+        """
+        Derives the Bedrock model family from the condensing model id, for example `amazon.titan-text-lite-v1` belongs
+        to the `amazon` family.
+
+        Args:
+            condensing_model (str): Bedrock model id of the condensing model
+
+        Returns:
+            (BedrockModelProviders): The model family of the condensing model
+
+        Raises:
+            LLMBuildError: If the model id does not belong to a supported model family
+        """
+        try:
+            return BedrockModelProviders[condensing_model.split(".")[0].upper()]
+        except KeyError as error:
+            error_message = f"Unsupported model family for the condensing model {condensing_model}. Error: {error}"
+            logger.error(error_message, xray_trace_id=os.environ[TRACE_ID_ENV_VAR])
+            raise LLMBuildError(error_message)
+
+    def get_condensing_llm(self) -> LLM:
+        """
+        Creates the langchain `LLM` object which condenses the chat history and follow-up question into a standalone
+        question. When a condensing model or condensing model params are configured, a separate model is created from
+        them, with the temperature defaulting to DEFAULT_CONDENSING_TEMPERATURE. Otherwise the answering model's
+        settings are reused. Callbacks and streaming are always disabled for this model.
+
+        Returns:
+            (LLM): The LLM object used for condensing
+
+        Raises:
+            LLMBuildError: If the condensing model params do not match the condensing model family
+        """
+        if not self.condensing_model and not self.condensing_model_params:
+            return self.get_llm(condense_prompt_model=True)
+
+        condensing_model = self.condensing_model or self.model
+        sanitized_model_params = BaseLangChainModel.get_clean_model_params(self, self.condensing_model_params)
+        sanitized_model_params["temperature"] = float(
+            sanitized_model_params.get("temperature", DEFAULT_CONDENSING_TEMPERATURE)
+        )
+        bedrock_adapter = BedrockAdapterFactory().get_bedrock_adapter(self.condensing_model_family)
+
+        try:
+            condensing_model_params = bedrock_adapter(**sanitized_model_params).get_params_as_dict()
+        except TypeError as error:
+            error_message = (
+                f"Error occurred while building Bedrock {self.condensing_model_family} {condensing_model} "
+                "condensing Model. "
+                "Ensure that the condensing model params provided are correct and they match the model specification. "
+                f"Received params: {sanitized_model_params}. Error: {error}"
+            )
+            logger.error(error_message)
+            raise LLMBuildError(error_message)
+
+        return Bedrock(
+            client=get_service_client("bedrock-runtime"),
+            model_id=condensing_model,
+            model_kwargs=condensing_model_params,
+            streaming=False,
+            callbacks=None,
+        )
+
+    @property
+    def speculative_retrieval(self) -> bool:
+        return self._speculative_retrieval
+
+    @property
+    def context_token_budget(self) -> int:
+        return self._context_token_budget
+
+    @property
+    def deduplication_threshold(self) -> Optional[float]:
+        return self._deduplication_threshold
+
+    def get_document_deduplicator(self) -> Optional[DocumentDeduplicator]:
+        """
+        Creates the `DocumentDeduplicator` that removes near-duplicate retrieved documents. The knowledge base's
+        retriever then fetches more candidates than the documents kept, so that removed documents are replaced.
+
+        Returns:
+            DocumentDeduplicator: The deduplicator used by the conversation chain, None if no threshold is set
+        """
+        if self.deduplication_threshold is None:
+            return None
+        document_deduplicator = DocumentDeduplicator(threshold=self.deduplication_threshold)
+        document_deduplicator.over_fetch(self.knowledge_base.retriever)
+        return document_deduplicator
+
+    @property
+    def rerank_params(self) -> Optional[Dict]:
+        return self._rerank_params
+
+    def get_document_reranker(self) -> Optional[DocumentReranker]:
+        """
+        Creates the `DocumentReranker` that keeps the most relevant retrieved documents, scored by a SageMaker endpoint.
+
+        Returns:
+            DocumentReranker: The reranker used by the conversation chain, None if no endpoint is configured
+        """
+        if not (self.rerank_params or {}).get("EndpointName"):
+            return None
+        return SageMakerDocumentReranker(
+            endpoint_name=self.rerank_params["EndpointName"],
+            top_n=self.rerank_params.get("TopN", DEFAULT_RERANK_TOP_N),
+            timeout=self.rerank_params.get("Timeout", DEFAULT_RERANK_TIMEOUT),
+        )
+
+    @property
+    def compression_params(self) -> Optional[Dict]:
+        return self._compression_params
+
+    def get_context_compressor(self) -> Optional[ExtractiveContextCompressor]:
+        """
+        Creates the `ExtractiveContextCompressor` that keeps the sentences of the retrieved documents relevant to the
+        question.
+
+        Returns:
+            ExtractiveContextCompressor: The compressor used by the conversation chain, None if compression is not set
+        """
+        if self.compression_params is None:
+            return None
+        return ExtractiveContextCompressor(
+            top_sentences=self.compression_params.get("TopSentences", DEFAULT_COMPRESSION_TOP_SENTENCES),
+            context_sentences=self.compression_params.get("ContextSentences", DEFAULT_COMPRESSION_CONTEXT_SENTENCES),
+            max_tokens_per_document=self.compression_params.get(
+                "MaxTokensPerDocument", DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT
+            ),
+        )
+
+    @property
+    def multi_query_params(self) -> Optional[Dict]:
+        return self._multi_query_params
+
+    def get_query_generator(self) -> Optional[MultiQueryGenerator]:
+        """
+        Creates the `MultiQueryGenerator` that generates the additional queries of a multi-query retrieval.
+
+        Returns:
+            MultiQueryGenerator: The query generator used by the conversation chain, None if multi-query is not set
+        """
+        if self.multi_query_params is None:
+            return None
+        return MultiQueryGenerator.from_llm(
+            llm=self.condensing_llm,
+            mode=self.multi_query_params.get("Mode", DEFAULT_MULTI_QUERY_MODE),
+            num_queries=self.multi_query_params.get("NumQueries", DEFAULT_MULTI_QUERY_NUM_QUERIES),
+        )
+
+    def get_context_packer(self) -> ContextPacker:
+        """
+        Creates the `ContextPacker` that fits the retrieved documents to the token budget and the context window.
+
+        Returns:
+            ContextPacker: The context packer used by the conversation chain
+        """
+        return ContextPacker(
+            token_budget=self.context_token_budget,
+            context_window=BEDROCK_CONTEXT_WINDOW_MAP.get(self.model_family),
+            max_output_tokens=get_max_output_tokens(self.model_params),
+        )
+
     def get_conversation_chain(self) -> ConversationalRetrievalChain:
         """
         Creates a `ConversationalRetrievalChain` chain that uses a `retriever` connected to a knowledge base.
+        The question is only condensed with the chat history when it needs to be, see `AdaptiveCondenseQuestionChain`.
+        Near-duplicate retrieved documents are removed, the rest are optionally reranked and compressed, and then fit
+        to the token budget, see `ContextPackingConversationalRetrievalChain`. With speculative retrieval, documents are retrieved while the
+        question is condensed, see `SpeculativeConversationalRetrievalChain`.
         Args: None
 
         Returns:
             ConversationalRetrievalChain: An LLM chain uses a `retriever` connected to a knowledge base.
         """
-        return ConversationalRetrievalChain.from_llm(
+        chain_class = (
+            SpeculativeConversationalRetrievalChain
+            if self.speculative_retrieval
+            else ContextPackingConversationalRetrievalChain
+        )
+        conversation_chain = chain_class.from_llm(
             llm=self.llm,
             retriever=self.knowledge_base.retriever,
             chain_type=DEFAULT_RAG_CHAIN_TYPE,
@@ -127,11 +388,21 @@ class BedrockRetrievalLLM(BedrockLLM):
             return_source_documents=True,
             combine_docs_chain_kwargs={"prompt": self.prompt_template},
             get_chat_history=lambda chat_history: chat_history,
-            condense_question_llm=self.get_llm(condense_prompt_model=True),
+            context_packer=self.get_context_packer(),
+            document_deduplicator=self.get_document_deduplicator(),
+            document_reranker=self.get_document_reranker(),
+            context_compressor=self.get_context_compressor(),
+            query_generator=self.get_query_generator(),
+            condense_question_llm=self.condensing_llm,
             condense_question_prompt=self.condensing_prompt_template,
         )
+        conversation_chain.question_generator = AdaptiveCondenseQuestionChain.from_llm_chain(
+            conversation_chain.question_generator
+        )
+        return conversation_chain
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def generate(self, question: str) -> Dict[str, Any]:
         """@overrides BedrockLLM.generate
 
@@ -160,6 +431,10 @@ class BedrockRetrievalLLM(BedrockLLM):
                 start_time = time.time()
                 llm_result = self.conversation_chain(
                     {"question": question, "chat_history": self.conversation_memory.chat_memory.messages},
+                    callbacks=[
+                        StageTimingCallbackHandler(rag_enabled=True),
+                        *(self.knowledge_base.retriever_callbacks or []),
+                    ],
                 )
                 end_time = time.time()
                 metrics.add_metric(
@@ -191,5 +466,3 @@ class BedrockRetrievalLLM(BedrockLLM):
                 )
                 metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES.value, unit=MetricUnit.Count, value=1)
                 raise ex
-            finally:
-                metrics.flush_metrics()
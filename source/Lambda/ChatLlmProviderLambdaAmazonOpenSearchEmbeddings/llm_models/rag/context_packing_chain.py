@@ -0,0 +1,296 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from aws_lambda_powertools import Logger
+from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.chains import ConversationalRetrievalChain
+from langchain.load.dump import dumpd
+from langchain.schema import Document
+from llm_models.rag.context_compressor import ExtractiveContextCompressor
+from llm_models.rag.document_deduplicator import DocumentDeduplicator
+from llm_models.rag.document_reranker import DocumentReranker
+from llm_models.rag.multi_query_generator import MultiQueryGenerator
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+from utils.constants import (
+    DEFAULT_MAX_TOKENS_TO_SAMPLE,
+    DOCUMENT_SCORE_METADATA_KEY,
+    ESTIMATED_CHARACTERS_PER_TOKEN,
+    MAX_OUTPUT_TOKENS_PARAM_NAMES,
+    MULTI_QUERY_MAX_WORKERS,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+SENTENCE_END_PATTERN = re.compile(r"[.!?]+(?=\s|$)")
+
+# Shared across invocations of the lambda container, runs the queries of retrievers without a batched multi-query search
+_multi_query_executor = ThreadPoolExecutor(max_workers=MULTI_QUERY_MAX_WORKERS)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in a text from its length. The estimate is constant time, so it can be used on
+    every retrieved document without loading a model specific tokenizer.
+
+    Args:
+        text (str): the text to estimate
+
+    Returns:
+        int: the estimated number of tokens
+    """
+    return math.ceil(len(text) / ESTIMATED_CHARACTERS_PER_TOKEN) if text else 0
+
+
+def get_document_score(document: Document) -> float:
+    """
+    Returns the retrieval score of a document. Documents without a numeric score, such as OpenSearch hits with a null
+    `_score` when a search template sorts them, get -inf so that they are ranked last.
+
+    Args:
+        document (Document): the retrieved document
+
+    Returns:
+        float: the score of the document, -inf when it has none
+    """
+    try:
+        score = float((document.metadata or {}).get(DOCUMENT_SCORE_METADATA_KEY))
+    except (TypeError, ValueError):
+        return float("-inf")
+    return float("-inf") if math.isnan(score) else score
+
+
+def truncate_to_sentences(text: str, max_tokens: int) -> str:
+    """
+    Truncates a text to the longest run of whole sentences, from its start, that fits the token limit.
+
+    Args:
+        text (str): the text to truncate
+        max_tokens (int): the maximum number of tokens of the truncated text
+
+    Returns:
+        str: the truncated text, empty when not even the first sentence fits
+    """
+    max_characters = max_tokens * ESTIMATED_CHARACTERS_PER_TOKEN
+    if len(text) <= max_characters:
+        return text
+
+    end = 0
+    for match in SENTENCE_END_PATTERN.finditer(text):
+        if match.end() > max_characters:
+            break
+        end = match.end()
+    return text[:end].strip()
+
+
+def get_max_output_tokens(model_params: Dict[str, Any]) -> int:
+    """
+    Returns the maximum number of tokens the model generates, read from the model params of any supported provider.
+
+    Args:
+        model_params (Dict): sanitized model params of the LLM
+
+    Returns:
+        int: the maximum number of generated tokens, DEFAULT_MAX_TOKENS_TO_SAMPLE if it is not set
+    """
+    for param_name in MAX_OUTPUT_TOKENS_PARAM_NAMES:
+        if (model_params or {}).get(param_name):
+            return int(model_params[param_name])
+    return DEFAULT_MAX_TOKENS_TO_SAMPLE
+
+
+class ContextPacker:
+    """
+    ContextPacker selects the retrieved documents placed in a RAG prompt so that they fit a token budget. Documents are
+    added by score (or in retrieval order when they carry no score) until the budget is used up, and the first document
+    that does not fit is truncated at a sentence boundary.
+
+    Attributes:
+        token_budget (int): maximum number of tokens of documents placed in the prompt
+        context_window (int): context size of the model in tokens, which further limits the documents once the prompt,
+            chat history, question and response are accounted for [optional, defaults to None]
+        max_output_tokens (int): tokens kept free in the context window for the model response [optional, defaults to 0]
+
+    Methods:
+        get_available_tokens(reserved_tokens): Returns the number of tokens available for documents
+        pack(documents, reserved_tokens): Selects and truncates the documents to fit the available tokens
+    """
+
+    def __init__(self, token_budget: int, context_window: Optional[int] = None, max_output_tokens: int = 0) -> None:
+        self._token_budget = int(token_budget)
+        self._context_window = context_window
+        self._max_output_tokens = max_output_tokens
+
+    @property
+    def token_budget(self) -> int:
+        return self._token_budget
+
+    @property
+    def context_window(self) -> Optional[int]:
+        return self._context_window
+
+    @property
+    def max_output_tokens(self) -> int:
+        return self._max_output_tokens
+
+    def get_available_tokens(self, reserved_tokens: int = 0) -> int:
+        """
+        Returns the number of tokens available for documents.
+
+        Args:
+            reserved_tokens (int): tokens of the prompt that are not documents, such as the template and chat history
+
+        Returns:
+            int: the number of tokens available for documents
+        """
+        available_tokens = self.token_budget
+        if self.context_window:
+            available_tokens = min(available_tokens, self.context_window - self.max_output_tokens - reserved_tokens)
+        return max(available_tokens, 0)
+
+    def pack(self, documents: List[Document], reserved_tokens: int = 0) -> List[Document]:
+        """
+        Selects and truncates the documents to fit the available tokens.
+
+        Args:
+            documents (List[Document]): the retrieved documents
+            reserved_tokens (int): tokens of the prompt that are not documents, such as the template and chat history
+
+        Returns:
+            List[Document]: the documents to place in the prompt, highest scored first
+        """
+        available_tokens = self.get_available_tokens(reserved_tokens)
+        ranked_documents = sorted(documents, key=lambda document: -get_document_score(document))
+
+        packed_documents = []
+        used_tokens = 0
+        for document in ranked_documents:
+            document_tokens = estimate_tokens(document.page_content)
+            if used_tokens + document_tokens <= available_tokens:
+                packed_documents.append(document)
+                used_tokens += document_tokens
+                continue
+
+            truncated_content = truncate_to_sentences(document.page_content, available_tokens - used_tokens)
+            if truncated_content:
+                packed_documents.append(Document(page_content=truncated_content, metadata=document.metadata))
+                used_tokens += estimate_tokens(truncated_content)
+            break
+
+        if len(packed_documents) < len(documents):
+            logger.debug(f"Packed {len(packed_documents)} of {len(documents)} documents in {used_tokens} tokens")
+        request_timer.set_flag(RequestFlags.CONTEXT_TOKENS, used_tokens)
+        return packed_documents
+
+
+class ContextPackingConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    ContextPackingConversationalRetrievalChain is a `ConversationalRetrievalChain` that fits the retrieved documents
+    to a token budget with a `ContextPacker` before they are stuffed into the prompt, which keeps the prompt size, and
+    the time spent on it, predictable. Near-duplicate documents are removed first with a `DocumentDeduplicator`, so the
+    budget they would have used goes to the next distinct documents. The remaining documents can then be narrowed down
+    to the most relevant few with a `DocumentReranker`, and cut down to their relevant sentences with an
+    `ExtractiveContextCompressor`. With a `MultiQueryGenerator`, documents are retrieved for several queries generated
+    from the question and fused with reciprocal rank fusion.
+
+    Attributes:
+        context_packer (ContextPacker): packs the retrieved documents, when not set the documents are used as retrieved
+        document_deduplicator (DocumentDeduplicator): removes near-duplicate documents, when not set none are removed
+        document_reranker (DocumentReranker): reorders the documents by relevance, when not set they are not reranked
+        context_compressor (ExtractiveContextCompressor): keeps the sentences of the documents relevant to the question,
+            when not set the documents are kept whole
+        query_generator (MultiQueryGenerator): generates the additional queries of a multi-query retrieval, when not
+            set documents are retrieved for the question only
+    """
+
+    context_packer: Optional[ContextPacker] = None
+    document_deduplicator: Optional[DocumentDeduplicator] = None
+    document_reranker: Optional[DocumentReranker] = None
+    context_compressor: Optional[ExtractiveContextCompressor] = None
+    query_generator: Optional[MultiQueryGenerator] = None
+
+    def _get_docs(
+        self,
+        question: str,
+        inputs: Dict[str, Any],
+        *,
+        run_manager: CallbackManagerForChainRun,
+    ) -> List[Document]:
+        docs = self._retrieve_documents(question, run_manager=run_manager)
+        if self.document_deduplicator is not None:
+            docs = self.document_deduplicator.deduplicate(docs)
+        if self.document_reranker is not None:
+            docs = self.document_reranker.rerank(question, docs)
+        if self.context_compressor is not None:
+            docs = self.context_compressor.compress(question, docs)
+        if self.context_packer is None:
+            return self._reduce_tokens_below_limit(docs)
+        return self.context_packer.pack(docs, reserved_tokens=self.get_reserved_tokens(question, inputs))
+
+    def _retrieve_documents(self, question: str, *, run_manager: CallbackManagerForChainRun) -> List[Document]:
+        queries = [question] if self.query_generator is None else self.query_generator.generate_queries(question)
+        if len(queries) == 1:
+            return self.retriever.get_relevant_documents(question, callbacks=run_manager.get_child())
+
+        retriever_run_manager = run_manager.get_child().on_retriever_start(dumpd(self.retriever), question)
+        try:
+            docs = self._retrieve_documents_for_queries(queries)
+        except Exception as ex:
+            retriever_run_manager.on_retriever_error(ex)
+            raise ex
+        retriever_run_manager.on_retriever_end(docs)
+        return docs
+
+    def _retrieve_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        """
+        Retrieves the documents of several queries. Retrievers with a `get_relevant_documents_for_queries` method
+        search for all the queries in a single batched request, the others are queried concurrently and their results
+        fused with reciprocal rank fusion.
+
+        Args:
+            queries (List[str]): the question followed by the generated queries
+
+        Returns:
+            List[Document]: the fused documents, best first
+        """
+        batched_search = getattr(self.retriever, "get_relevant_documents_for_queries", None)
+        if batched_search is not None:
+            return batched_search(queries)
+
+        ranked_lists = list(_multi_query_executor.map(self.retriever.get_relevant_documents, queries))
+        return reciprocal_rank_fusion(ranked_lists, top_k=max(len(ranked_list) for ranked_list in ranked_lists))
+
+    def get_reserved_tokens(self, question: str, inputs: Dict[str, Any]) -> int:
+        """
+        Estimates the tokens of the prompt sent to the answering LLM, other than the documents.
+
+        Args:
+            question (str): the question passed to the answering LLM
+            inputs (Dict): the chain inputs, containing the chat history
+
+        Returns:
+            int: the estimated number of tokens of the prompt template, chat history and question
+        """
+        chat_history = inputs.get("chat_history") or ""
+        if not isinstance(chat_history, str):
+            chat_history = "\n".join(f"{message.type}: {message.content}" for message in chat_history)
+        prompt = getattr(getattr(self.combine_docs_chain, "llm_chain", None), "prompt", None)
+        prompt_template = getattr(prompt, "template", "")
+        return estimate_tokens(prompt_template) + estimate_tokens(chat_history) + estimate_tokens(question)
@@ -0,0 +1,148 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from aws_lambda_powertools import Logger
+from langchain.callbacks.manager import CallbackManagerForChainRun
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain.load.dump import dumpd
+from langchain.pydantic_v1 import PrivateAttr
+from langchain.schema import Document
+from llm_models.rag.adaptive_condense_question_chain import AdaptiveCondenseQuestionChain
+from llm_models.rag.context_packing_chain import ContextPackingConversationalRetrievalChain
+from utils.constants import SPECULATIVE_RETRIEVAL_MAX_WORKERS, SPECULATIVE_RETRIEVAL_MIN_SIMILARITY
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+# Shared across invocations of the lambda container, so no thread is started on the critical path
+_speculative_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_RETRIEVAL_MAX_WORKERS)
+
+
+def get_question_similarity(question: str, other_question: str) -> float:
+    """
+    Computes the word overlap (Jaccard similarity) of two questions, which is used to decide whether the documents
+    retrieved for one of them can stand in for the other.
+
+    Args:
+        question (str): the first question
+        other_question (str): the second question
+
+    Returns:
+        float: the similarity, between 0 (no words in common) and 1 (same words)
+    """
+    words = set(re.findall(r"[a-z0-9']+", question.lower()))
+    other_words = set(re.findall(r"[a-z0-9']+", other_question.lower()))
+    if not words and not other_words:
+        return 1.0
+    return len(words & other_words) / len(words | other_words)
+
+
+class SpeculativeConversationalRetrievalChain(ContextPackingConversationalRetrievalChain):
+    """
+    SpeculativeConversationalRetrievalChain is a `ContextPackingConversationalRetrievalChain` that, when the question
+    has to be condensed with the chat history, starts retrieving documents for the question as asked while the
+    condensing LLM runs. Once the condensed question is known, the speculative documents are used if the two questions
+    are similar enough, otherwise documents are retrieved again for the condensed question. When the rewrite is minor,
+    retrieval is taken off the critical path of the request. Nothing is speculated when an AdaptiveCondenseQuestionChain
+    answers without calling its LLM, as the condensed question is then known at once. With a `MultiQueryGenerator`, the
+    speculative retrieval also generates the queries of the question as asked and fuses their documents.
+
+    Attributes:
+        speculation_min_similarity (float): minimum word overlap between the question as asked and the condensed
+            question for the speculative documents to be used
+            [optional, defaults to SPECULATIVE_RETRIEVAL_MIN_SIMILARITY]
+    """
+
+    speculation_min_similarity: float = SPECULATIVE_RETRIEVAL_MIN_SIMILARITY
+    _speculation: Optional[Tuple[str, Future]] = PrivateAttr(default=None)
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        question = inputs["question"]
+        if not self.will_condense(question, inputs.get("chat_history")):
+            return super()._call(inputs, run_manager=run_manager)
+
+        # the speculative retrieval runs without the chain callbacks, which only hear about it if its documents are used
+        self._speculation = (question, _speculative_executor.submit(self._retrieve_speculative_documents, question))
+        try:
+            return super()._call(inputs, run_manager=run_manager)
+        finally:
+            self._speculation = None
+
+    def will_condense(self, question: str, chat_history: Any) -> bool:
+        """
+        Checks whether the condensed question takes an LLM call to be known, in which case retrieval is speculated.
+
+        Args:
+            question (str): the question asked by the user
+            chat_history (Any): the chat history of the chain inputs
+
+        Returns:
+            bool: True if the question generator will call its LLM
+        """
+        if not chat_history:
+            return False
+        chat_history = (self.get_chat_history or _get_chat_history)(chat_history)
+        if isinstance(self.question_generator, AdaptiveCondenseQuestionChain):
+            return self.question_generator.will_condense(question, chat_history)
+        return bool(chat_history)
+
+    def _retrieve_speculative_documents(self, question: str) -> List[Document]:
+        """
+        Retrieves the documents of the question as asked the way they are retrieved for the condensed question, for the
+        queries generated from it when a query generator is set.
+
+        Args:
+            question (str): the question asked by the user
+
+        Returns:
+            List[Document]: the retrieved documents, best first
+        """
+        if self.query_generator is None:
+            return self.retriever.get_relevant_documents(question)
+        return self._retrieve_documents_for_queries(self.query_generator.generate_queries(question))
+
+    def _retrieve_documents(self, question: str, *, run_manager: CallbackManagerForChainRun) -> List[Document]:
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return super()._retrieve_documents(question, run_manager=run_manager)
+
+        speculative_question, speculative_docs = speculation
+        similarity = get_question_similarity(speculative_question, question)
+        if similarity < self.speculation_min_similarity:
+            logger.debug(f"Discarding speculative retrieval, question similarity {similarity:.2f} is too low")
+            speculative_docs.cancel()
+            request_timer.set_flag(RequestFlags.SPECULATIVE_RETRIEVAL_HIT, False)
+            return super()._retrieve_documents(question, run_manager=run_manager)
+
+        retriever_run_manager = run_manager.get_child().on_retriever_start(dumpd(self.retriever), speculative_question)
+        try:
+            docs = speculative_docs.result()
+        except Exception as ex:
+            logger.warning(f"Speculative retrieval failed, retrieving for the condensed question. Error: {ex}")
+            retriever_run_manager.on_retriever_error(ex)
+            request_timer.set_flag(RequestFlags.SPECULATIVE_RETRIEVAL_HIT, False)
+            return super()._retrieve_documents(question, run_manager=run_manager)
+
+        retriever_run_manager.on_retriever_end(docs)
+        request_timer.set_flag(RequestFlags.SPECULATIVE_RETRIEVAL_HIT, True)
+        return docs
@@ -13,10 +13,12 @@
 
 import json
 import os
+import time
 from typing import Any, Dict, List, Optional
 
 import botocore
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricResolution, MetricUnit
 from helper import get_service_client
 from langchain.callbacks.streaming_aiter import AsyncIteratorCallbackHandler
 from langchain.schema.messages import BaseMessage
@@ -26,6 +28,9 @@ from utils.constants import (
     TRACE_ID_ENV_VAR,
     WEBSOCKET_CALLBACK_URL_ENV_VAR,
 )
+from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces, RequestStages
+from utils.helpers import percentile
+from utils.request_timer import request_timer
 
 logger = Logger(utc=True)
 
@@ -41,6 +46,9 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
         conversation_id (str): The conversation ID for the websocket client, retrieved from the event object
         is_streaming (bool): Flag to indicate if streaming is enabled.
         client (botocore.client): client that establishes the connection to the websocket API
+        start_time (float): Monotonic time at which the handler was created, i.e. when the request entered the handler
+        token_delivery_times (List[float]): Monotonic times at which each token was delivered to the client
+        post_to_connection_time (float): Total time in seconds spent posting to the websocket connection
 
     Methods:
         post_token_to_connection(response): Sends a response to the client that is connected to a websocket.
@@ -48,6 +56,7 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
         on_llm_end(self, response: any, **kwargs: any): Executes once the LLM completes generating a response
         on_llm_error(self, error: Exception, **kwargs: any): Executes when the underlying llm errors out.
         format_response(response): Formats the response in a format that the websocket accepts
+        add_latency_metrics(): Adds the streaming latency metrics to the EMF record of the request
 
     """
 
@@ -58,6 +67,9 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
     _client: botocore.client = None
 
     def __init__(self, connection_id: str, conversation_id: str, is_streaming: bool = False) -> None:
+        self._start_time = time.perf_counter()
+        self._token_delivery_times = []
+        self._post_to_connection_time = 0.0
         self._connection_url = os.environ.get(WEBSOCKET_CALLBACK_URL_ENV_VAR)
         self._connection_id = connection_id
         self._conversation_id = conversation_id
@@ -97,6 +109,18 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
     def client(self, client) -> None:
         self._client = client
 
+    @property
+    def start_time(self) -> float:
+        return self._start_time
+
+    @property
+    def token_delivery_times(self) -> List[float]:
+        return self._token_delivery_times
+
+    @property
+    def post_to_connection_time(self) -> float:
+        return self._post_to_connection_time
+
     def on_chat_model_start(
         self,
         serialized: Dict[str, Any],
@@ -116,6 +140,7 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
         Raises:
             ex: _description_
         """
+        post_start_time = time.perf_counter()
         try:
             self.client.post_to_connection(ConnectionId=self.connection_id, Data=self.format_response(response))
         except Exception as ex:
@@ -124,6 +149,10 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
                 xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
             )
             raise ex
+        finally:
+            post_duration = time.perf_counter() - post_start_time
+            self._post_to_connection_time += post_duration
+            request_timer.record(RequestStages.WEBSOCKET_POST, post_duration)
 
     def on_llm_new_token(self, token: str, **kwargs: any) -> None:
         """
@@ -135,6 +164,7 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
         """
         if self.is_streaming:
             self.post_token_to_connection(token)
+            self._token_delivery_times.append(time.perf_counter())
 
     def on_llm_end(self, response: any, **kwargs: any) -> any:
         """
@@ -149,9 +179,11 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
         """
         if not self.is_streaming:
             self.post_token_to_connection(response.generations[0][0].text)
+            self._token_delivery_times.append(time.perf_counter())
 
         self.post_token_to_connection(END_CONVERSATION_TOKEN)
         logger.info(f"The LLM has finished sending tokens to the connection: {self.connection_id}")
+        self.add_latency_metrics()
 
     def on_llm_error(self, error: Exception, **kwargs: any) -> None:
         """
@@ -176,3 +208,59 @@ class WebsocketStreamingCallbackHandler(AsyncIteratorCallbackHandler):
                 CONVERSATION_ID_EVENT_KEY: self.conversation_id,
             }
         )
+
+    def add_latency_metrics(self) -> None:
+        """
+        Adds the time to first token, the inter-token latency percentiles, the token throughput and the total time
+        spent posting to the connection as high resolution metrics of the request, published by the request timer
+        in the single EMF record of the request.
+        """
+        if not self.token_delivery_times:
+            return
+
+        try:
+            first_token_time = self.token_delivery_times[0]
+            last_token_time = self.token_delivery_times[-1]
+            inter_token_gaps = [
+                (current - previous) * 1000
+                for previous, current in zip(self.token_delivery_times, self.token_delivery_times[1:])
+            ]
+
+            values = [
+                (
+                    CloudWatchMetrics.LLM_TIME_TO_FIRST_TOKEN,
+                    MetricUnit.Milliseconds,
+                    (first_token_time - self.start_time) * 1000,
+                ),
+                (CloudWatchMetrics.LLM_STREAMED_TOKENS, MetricUnit.Count, len(self.token_delivery_times)),
+                (
+                    CloudWatchMetrics.WEBSOCKET_POST_TO_CONNECTION_TIME,
+                    MetricUnit.Milliseconds,
+                    self.post_to_connection_time * 1000,
+                ),
+            ]
+            if inter_token_gaps:
+                for name, pct in [
+                    (CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P50, 50),
+                    (CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P90, 90),
+                    (CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P99, 99),
+                ]:
+                    values.append((name, MetricUnit.Milliseconds, percentile(inter_token_gaps, pct)))
+            if last_token_time > first_token_time:
+                values.append(
+                    (
+                        CloudWatchMetrics.LLM_TOKENS_PER_SECOND,
+                        MetricUnit.CountPerSecond,
+                        (len(self.token_delivery_times) - 1) / (last_token_time - first_token_time),
+                    )
+                )
+
+            for name, unit, value in values:
+                request_timer.add_metric(
+                    CloudWatchNamespaces.LANGCHAIN_LLM, name.value, unit, value, resolution=MetricResolution.High
+                )
+        except Exception as ex:
+            logger.error(
+                f"Error recording streaming latency metrics for connection {self.connection_id}: {ex}",
+                xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+            )
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import codecs
+import itertools
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from langchain.schema import Document
+from utils.constants import (
+    DEFAULT_INGESTION_CHUNK_OVERLAP,
+    DEFAULT_INGESTION_CHUNK_SIZE,
+    INGESTION_MAX_TOKEN_CHARACTERS,
+    INGESTION_READ_BLOCK_SIZE,
+)
+
+# a token is a run of word characters or a single other character, with the whitespace before it. Both are matched
+# atomically, so that a run of tokens matched at once is split the same way as tokens matched one by one
+TOKEN = rf"\s*+(?>\w{{1,{INGESTION_MAX_TOKEN_CHARACTERS}}}|[^\w\s])"
+TOKEN_PATTERN = re.compile(TOKEN)
+WHITESPACE_PATTERN = re.compile(r"\s*")
+
+
+class TextChunk(NamedTuple):
+    """
+    A chunk of a document, with the character offsets of its first and past its last token in the document.
+    """
+
+    text: str
+    start_offset: int
+    end_offset: int
+    token_count: int
+
+
+class StreamingDocument:
+    """
+    StreamingDocument is a document whose text is read in blocks when it is chunked, rather than held in memory, so
+    that documents larger than the memory of the lambda can be indexed. Nothing is read until the blocks are iterated.
+
+    Attributes:
+        metadata (Dict): the metadata of the document, with its source and version
+        read_blocks (Callable[[], Iterator[str]]): opens the document and yields its text in blocks
+    """
+
+    def __init__(self, metadata: Dict[str, Any], read_blocks: Callable[[], Iterator[str]]) -> None:
+        self.metadata = metadata
+        self._read_blocks = read_blocks
+
+    def iter_blocks(self) -> Iterator[str]:
+        return self._read_blocks()
+
+
+def iter_file_blocks(path: str, block_size: Optional[int] = INGESTION_READ_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Reads a UTF-8 text file in blocks of block_size characters, invalid bytes being replaced.
+    """
+    with open(path, encoding="utf-8", errors="replace") as file:
+        yield from iter(lambda: file.read(block_size), "")
+
+
+def iter_byte_stream_blocks(byte_blocks: Iterable[bytes]) -> Iterator[str]:
+    """
+    Decodes a stream of UTF-8 byte blocks, e.g. the iter_chunks of an S3 object body, into text blocks. A character
+    split across two byte blocks is decoded once both are read.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for byte_block in byte_blocks:
+        text = decoder.decode(byte_block)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_text_blocks(document: Any) -> Iterator[str]:
+    """
+    Yields the text of a StreamingDocument in blocks, or the text of an in-memory Document as a single block.
+    """
+    if isinstance(document, Document):
+        return iter([document.page_content])
+    return document.iter_blocks()
+
+
+class StreamingTokenChunker:
+    """
+    StreamingTokenChunker splits a stream of text blocks into chunks of chunk_size tokens, consecutive chunks sharing
+    chunk_overlap tokens. Only the text of the chunk being built and the current block are held, so memory does not
+    grow with the size of the document. Tokens are runs of word characters, capped at INGESTION_MAX_TOKEN_CHARACTERS,
+    and single punctuation characters, which approximates the subword tokens of embedding models without a tokenizer.
+    A document is split the same way whatever its block size.
+
+    Attributes:
+        chunk_size (int): tokens per chunk [optional, defaults to DEFAULT_INGESTION_CHUNK_SIZE]
+        chunk_overlap (int): tokens shared by consecutive chunks [optional, defaults to DEFAULT_INGESTION_CHUNK_OVERLAP]
+
+    Methods:
+        chunk(blocks): Yields the chunks of a stream of text blocks
+    """
+
+    def __init__(
+        self,
+        chunk_size: Optional[int] = DEFAULT_INGESTION_CHUNK_SIZE,
+        chunk_overlap: Optional[int] = DEFAULT_INGESTION_CHUNK_OVERLAP,
+    ) -> None:
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError(f"chunk_overlap must be between 0 and chunk_size, received {chunk_overlap}")
+        self._chunk_size = int(chunk_size)
+        self._chunk_overlap = int(chunk_overlap)
+        # a chunk is matched as the tokens up to the next chunk, then the tokens it shares with the next chunk
+        self._stride_pattern = re.compile(f"(?:{TOKEN}){{{self._chunk_size - self._chunk_overlap}}}")
+        self._overlap_pattern = re.compile(f"(?:{TOKEN}){{{self._chunk_overlap}}}")
+
+    @property
+    def chunk_size(self) -> int:
+        return self._chunk_size
+
+    @property
+    def chunk_overlap(self) -> int:
+        return self._chunk_overlap
+
+    def chunk(self, blocks: Iterable[str]) -> Iterator[TextChunk]:
+        """
+        Yields the chunks of a stream of text blocks. The tokens of a chunk are matched by a single regular expression
+        rather than one by one. A match reaching the end of a block is only used once the next block is read, as its
+        last token may continue in it.
+
+        Args:
+            blocks (Iterable[str]): the text of a document, in order
+
+        Yields:
+            TextChunk: the chunks, in order, the last one possibly shorter
+        """
+        buffer = ""
+        buffer_start = 0  # offset of the buffer in the document
+        chunk_start = 0  # offset of the next chunk, before the whitespace of its first token
+        emitted_end = 0  # offset past the last token of an emitted chunk
+        for block in itertools.chain(blocks, [None]):
+            final = block is None
+            if not final:
+                buffer += block
+            while True:
+                stride_match = self._stride_pattern.match(buffer, chunk_start - buffer_start)
+                if not stride_match or (stride_match.end() == len(buffer) and not final):
+                    break
+                overlap_match = self._overlap_pattern.match(buffer, stride_match.end())
+                if not overlap_match or (overlap_match.end() == len(buffer) and not final):
+                    break
+                yield self._get_chunk(buffer, buffer_start, chunk_start, overlap_match.end(), self.chunk_size)
+                chunk_start = buffer_start + stride_match.end()
+                emitted_end = buffer_start + overlap_match.end()
+
+            if final and TOKEN_PATTERN.match(buffer, max(emitted_end, chunk_start) - buffer_start):
+                # the last chunk is shorter, made of the tokens left after the last full chunk and of its overlap
+                token_ends = [match.end() for match in TOKEN_PATTERN.finditer(buffer, chunk_start - buffer_start)]
+                yield self._get_chunk(buffer, buffer_start, chunk_start, token_ends[-1], len(token_ends))
+            # the text before the next chunk is not needed anymore
+            buffer = buffer[chunk_start - buffer_start :]
+            buffer_start = chunk_start
+
+    @staticmethod
+    def _get_chunk(buffer: str, buffer_start: int, chunk_start: int, end: int, token_count: int) -> TextChunk:
+        start = WHITESPACE_PATTERN.match(buffer, chunk_start - buffer_start).end()
+        return TextChunk(
+            text=buffer[start:end],
+            start_offset=buffer_start + start,
+            end_offset=buffer_start + end,
+            token_count=token_count,
+        )
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import os
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+from aws_lambda_powertools import Logger
+from helper import get_service_client
+from langchain_community.embeddings import SagemakerEndpointEmbeddings
+from shared.knowledge.local_vector_store import LocalVectorStore, get_local_vector_store
+from shared.knowledge.opensearch_knowledge_base import SAGEMAKER_EMBEDDING_ENDPOINT, ContentHandler
+from utils.constants import (
+    DEFAULT_FAQ_MATCH_THRESHOLD,
+    FAQ_ANSWER_METADATA_KEY,
+    FAQ_INDEX_URI_ENV_VAR,
+    FAQ_MATCH_THRESHOLD_ENV_VAR,
+)
+from utils.trace_capture import get_env_number
+
+logger = Logger(utc=True)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# FAQ indices are loaded once per lambda container and matched by all of its invocations
+_faq_indices: Dict[str, "FaqIndex"] = {}
+_faq_indices_lock = threading.Lock()
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question for exact matching: case folded, its words separated by single spaces, and its punctuation
+    dropped, so that "What is the refund policy?" and "what is the  refund policy" are the same question.
+
+    Args:
+        question (str): the question
+
+    Returns:
+        str: the normalized question, empty for a question without words
+    """
+    return " ".join(WORD_PATTERN.findall(question.casefold()))
+
+
+class FaqMatch(NamedTuple):
+    """
+    A question answered from the FAQ index, with the question of the index it matched, the similarity of the two, and
+    whether they were the same question once normalized.
+    """
+
+    question: str
+    answer: str
+    score: float
+    exact: bool
+
+
+class FaqIndex:
+    """
+    FaqIndex answers canonical questions with their precomputed answers, so that they skip retrieval and generation.
+    The index is a LocalVectorStore, written by shared.knowledge.faq_ingestion, whose documents are the questions and
+    their alternate phrasings, each with its answer in the metadata. A question matches when it is one of them once
+    normalized, which costs a dictionary lookup, or otherwise when its embedding is at least threshold similar to one
+    of theirs, which costs one call to the embedding endpoint. Without embeddings, only exact matches are answered.
+
+    Attributes:
+        store (LocalVectorStore): the store of the questions
+        embeddings (Any): embeddings the store was written with [optional, defaults to exact matches only]
+        threshold (float): cosine similarity from which a question matches
+            [optional, defaults to DEFAULT_FAQ_MATCH_THRESHOLD]
+
+    Methods:
+        match(question): Returns the match of a question, or None when it is not in the index
+    """
+
+    def __init__(
+        self,
+        store: LocalVectorStore,
+        embeddings: Optional[Any] = None,
+        threshold: Optional[float] = DEFAULT_FAQ_MATCH_THRESHOLD,
+    ) -> None:
+        self._store = store
+        self._embeddings = embeddings
+        self._threshold = float(threshold)
+        self._exact_rows = {}
+        for row in range(store.count):
+            self._exact_rows.setdefault(normalize_question(store.get_document(row).page_content), row)
+
+    @property
+    def store(self) -> LocalVectorStore:
+        return self._store
+
+    @property
+    def embeddings(self) -> Optional[Any]:
+        return self._embeddings
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    def match(self, question: str) -> Optional[FaqMatch]:
+        """
+        Matches a question against the index, by its normalized text first and by its embedding otherwise.
+
+        Args:
+            question (str): the question of the user
+
+        Returns:
+            Optional[FaqMatch]: the match, or None when no question of the index is close enough
+        """
+        normalized_question = normalize_question(question)
+        if not normalized_question:
+            return None
+        if normalized_question in self._exact_rows:
+            return self._get_match(self._exact_rows[normalized_question], 1.0, True)
+        if self.embeddings is None:
+            return None
+
+        results = self.store.search([self.embeddings.embed_query(question)], 1)[0]
+        if results and results[0][1] >= self.threshold:
+            return self._get_match(*results[0], False)
+        return None
+
+    def _get_match(self, row: int, score: float, exact: bool) -> FaqMatch:
+        document = self.store.get_document(row)
+        return FaqMatch(document.page_content, document.metadata[FAQ_ANSWER_METADATA_KEY], score, exact)
+
+
+def get_faq_index() -> Optional[FaqIndex]:
+    """
+    Returns the FAQ index of FAQ_INDEX_URI, an s3://bucket/prefix or a local directory, loaded once per container.
+    Questions are matched by embedding with the endpoint of SAGEMAKER_EMBEDDING_ENDPOINT when it is set, and only
+    exactly otherwise.
+
+    Returns:
+        Optional[FaqIndex]: the index, or None when FAQ_INDEX_URI is not set
+    """
+    uri = os.getenv(FAQ_INDEX_URI_ENV_VAR)
+    if not uri:
+        return None
+
+    with _faq_indices_lock:
+        if uri not in _faq_indices:
+            embeddings = None
+            if os.getenv(SAGEMAKER_EMBEDDING_ENDPOINT):
+                embeddings = SagemakerEndpointEmbeddings(
+                    endpoint_name=os.environ[SAGEMAKER_EMBEDDING_ENDPOINT],
+                    region_name=os.environ["AWS_REGION"],
+                    content_handler=ContentHandler(),
+                    client=get_service_client("sagemaker-runtime"),
+                )
+            _faq_indices[uri] = FaqIndex(
+                get_local_vector_store(uri),
+                embeddings=embeddings,
+                threshold=get_env_number(FAQ_MATCH_THRESHOLD_ENV_VAR, DEFAULT_FAQ_MATCH_THRESHOLD),
+            )
+            logger.info(f"Loaded the FAQ index {uri} of {_faq_indices[uri].store.count} questions")
+        return _faq_indices[uri]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from aws_lambda_powertools import Logger
+from langchain.schema import Document
+from langchain_community.embeddings import SagemakerEndpointEmbeddings
+from shared.knowledge.faq_index import normalize_question
+from shared.knowledge.local_vector_ingestion import upload_local_vector_store
+from shared.knowledge.local_vector_store import LocalVectorStoreWriter
+from shared.knowledge.opensearch_ingestion import with_retries
+from shared.knowledge.opensearch_knowledge_base import SAGEMAKER_EMBEDDING_ENDPOINT, ContentHandler
+from utils.constants import DEFAULT_INGESTION_BATCH_SIZE, DEFAULT_VECTOR_ENCODING, FAQ_ANSWER_METADATA_KEY
+
+logger = Logger(utc=True)
+
+CANONICAL_QUESTION_METADATA_KEY = "question"
+
+
+def iter_faq_entries(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Reads the entries of a FAQ from a JSON lines file, one {"question": ..., "answer": ..., "alternate_questions":
+    [...]} object per line, the alternate questions being optional.
+
+    Args:
+        path (str): the JSON lines file
+
+    Raises:
+        ValueError: if an entry has no question or no answer
+    """
+    with open(path, encoding="utf-8") as faq_file:
+        for line_number, line in enumerate(faq_file, start=1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not entry.get("question") or not entry.get("answer"):
+                raise ValueError(f"The FAQ entry of line {line_number} of {path} needs a question and an answer")
+            yield entry
+
+
+def get_faq_documents(entries: Iterable[Dict[str, Any]]) -> Iterator[Document]:
+    """
+    Turns FAQ entries into the documents of a FAQ index, one per phrasing of a question, each with the answer and the
+    canonical question in its metadata. A phrasing that normalizes to one already seen is skipped, so the first entry
+    asking a question is the one answering it.
+    """
+    seen_questions = set()
+    for entry in entries:
+        for question in [entry["question"]] + list(entry.get("alternate_questions") or []):
+            normalized_question = normalize_question(question)
+            if not normalized_question or normalized_question in seen_questions:
+                logger.warning(f"Skipping the empty or repeated FAQ question: {question}")
+                continue
+            seen_questions.add(normalized_question)
+            yield Document(
+                page_content=question,
+                metadata={FAQ_ANSWER_METADATA_KEY: entry["answer"], CANONICAL_QUESTION_METADATA_KEY: entry["question"]},
+            )
+
+
+def build_faq_index(
+    embeddings: Any,
+    directory: str,
+    entries: Iterable[Dict[str, Any]],
+    batch_size: Optional[int] = DEFAULT_INGESTION_BATCH_SIZE,
+    encoding: Optional[str] = DEFAULT_VECTOR_ENCODING,
+) -> Dict[str, Any]:
+    """
+    Writes the FAQ index of the entries, a local vector store of their questions embedded with the embeddings the
+    lambda matches questions with. A FAQ holds few enough questions to be searched exactly, so no inverted lists are
+    written.
+
+    Args:
+        embeddings (Any): embeddings of the knowledge base, e.g. SagemakerEndpointEmbeddings with its ContentHandler
+        directory (str): the directory of the index
+        entries (Iterable[Dict[str, Any]]): the FAQ entries, e.g. from iter_faq_entries
+        batch_size (int): questions per embedding call
+        encoding (str): the encoding of the vectors, one of VectorEncodings
+
+    Returns:
+        Dict[str, Any]: the manifest of the index
+    """
+    writer = LocalVectorStoreWriter(directory, encoding=encoding)
+    batch: List[Document] = []
+    for document in get_faq_documents(entries):
+        batch.append(document)
+        if len(batch) == batch_size:
+            writer.add(batch, _embed_questions(embeddings, batch))
+            batch = []
+    if batch:
+        writer.add(batch, _embed_questions(embeddings, batch))
+    return writer.close()
+
+
+def _embed_questions(embeddings: Any, documents: List[Document]) -> List[List[float]]:
+    texts = [document.page_content for document in documents]
+    return with_retries(embeddings.embed_documents, texts, len(texts), description="Embedding request")
+
+
+def main() -> None:
+    """
+    Writes the FAQ index of a JSON lines file, embedded with the endpoint of the knowledge base, and optionally
+    uploads it to the prefix FAQ_INDEX_URI points to, e.g.
+
+        python -m shared.knowledge.faq_ingestion faq.jsonl faq_index --upload s3://bucket/faq/v2
+    """
+    parser = argparse.ArgumentParser(description="Writes the FAQ index of question and answer pairs")
+    parser.add_argument("path", help="JSON lines file of question, answer and alternate_questions objects")
+    parser.add_argument("directory", help="the directory the index is written to")
+    parser.add_argument("--encoding", default=DEFAULT_VECTOR_ENCODING, help="float, fp16 or byte")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INGESTION_BATCH_SIZE)
+    parser.add_argument("--upload", help="s3://bucket/prefix the index is uploaded to")
+    args = parser.parse_args()
+
+    embeddings = SagemakerEndpointEmbeddings(
+        endpoint_name=os.environ[SAGEMAKER_EMBEDDING_ENDPOINT],
+        region_name=os.environ["AWS_REGION"],
+        content_handler=ContentHandler(),
+    )
+    build_faq_index(
+        embeddings, args.directory, iter_faq_entries(args.path), batch_size=args.batch_size, encoding=args.encoding
+    )
+    if args.upload:
+        upload_local_vector_store(args.directory, args.upload)
+
+
+if __name__ == "__main__":
+    main()
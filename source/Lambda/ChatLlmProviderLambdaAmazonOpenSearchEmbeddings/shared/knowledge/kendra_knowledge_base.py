@@ -18,7 +18,15 @@ from typing import Any, Dict, Optional
 from aws_lambda_powertools import Logger
 from shared.knowledge.kendra_retriever import CustomKendraRetriever
 from shared.knowledge.knowledge_base import KnowledgeBase
-from utils.constants import DEFAULT_KENDRA_NUMBER_OF_DOCS, DEFAULT_RETURN_SOURCE_DOCS, KENDRA_INDEX_ID_ENV_VAR
+from shared.knowledge.metadata_filter import build_metadata_filter, to_kendra_attribute_filter
+from utils.constants import (
+    DEFAULT_KENDRA_NUMBER_OF_DOCS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_RETURN_SOURCE_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    KENDRA_INDEX_ID_ENV_VAR,
+)
 from utils.enum_types import KnowledgeBaseTypes
 
 logger = Logger(utc=True)
@@ -31,7 +39,12 @@ class KendraKnowledgeBase(KnowledgeBase):
     Args:
         kendra_index_id (str): An existing Kendra index ID
         number_of_docs (int): Number of documents to query for [Optional]
+        min_score (float): Score below which a retrieved document is dropped [Optional]
+        min_number_of_docs (int): Number of documents kept whatever their scores [Optional]
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap [Optional]
         return_source_documents (bool): if the source of documents should be returned or not [Optional]
+        metadata_filter (Dict): Filter on the document attributes, from MetadataFilter and UserAttributeMapping,
+            applied by Kendra as the AttributeFilter of the query [Optional]
 
     Methods:
         _check_env_variables(): Checks if the kendra index id exists in the environment variables
@@ -43,6 +56,7 @@ class KendraKnowledgeBase(KnowledgeBase):
     def __init__(
         self,
         kendra_knowledge_base_params: Optional[Dict[str, Any]] = {},
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._check_env_variables()
 
@@ -56,11 +70,23 @@ class KendraKnowledgeBase(KnowledgeBase):
             "ReturnSourceDocs",
             DEFAULT_RETURN_SOURCE_DOCS,
         )
+        self.min_score = kendra_knowledge_base_params.get("MinScore", DEFAULT_MIN_SCORE)
+        self.min_number_of_docs = kendra_knowledge_base_params.get("MinNumberOfDocs", DEFAULT_MIN_NUMBER_OF_DOCS)
+        self.score_gap_cutoff = kendra_knowledge_base_params.get("ScoreGapCutoff", DEFAULT_SCORE_GAP_CUTOFF)
+        self.metadata_filter = build_metadata_filter(
+            kendra_knowledge_base_params.get("MetadataFilter"),
+            kendra_knowledge_base_params.get("UserAttributeMapping"),
+            user_context,
+        )
 
         self.retriever = CustomKendraRetriever(
             index_id=self.kendra_index_id,
             top_k=self.number_of_docs,
             return_source_documents=self.return_source_documents,
+            attribute_filter=to_kendra_attribute_filter(self.metadata_filter) if self.metadata_filter else None,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
         )
 
     def _check_env_variables(self) -> None:
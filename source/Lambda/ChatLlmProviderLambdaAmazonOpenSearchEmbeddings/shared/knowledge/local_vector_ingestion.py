@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import boto3
+from aws_lambda_powertools import Logger
+from langchain.schema import Document
+from langchain_community.embeddings import SagemakerEndpointEmbeddings
+from shared.knowledge.document_chunker import StreamingDocument, StreamingTokenChunker, iter_text_blocks
+from shared.knowledge.local_vector_store import MANIFEST_FILE_NAME, S3_URI_PREFIX, LocalVectorStoreWriter
+from shared.knowledge.opensearch_ingestion import (
+    END_OFFSET_METADATA_KEY,
+    SOURCE_METADATA_KEY,
+    START_OFFSET_METADATA_KEY,
+    TOKEN_COUNT_METADATA_KEY,
+    iter_documents,
+    with_retries,
+)
+from shared.knowledge.opensearch_knowledge_base import SAGEMAKER_EMBEDDING_ENDPOINT, ContentHandler
+from utils.constants import (
+    DEFAULT_INGESTION_BATCH_SIZE,
+    DEFAULT_INGESTION_CHUNK_OVERLAP,
+    DEFAULT_INGESTION_CHUNK_SIZE,
+    DEFAULT_INGESTION_WORKERS,
+    DEFAULT_IVF_LISTS,
+    DEFAULT_VECTOR_ENCODING,
+)
+
+logger = Logger(utc=True)
+
+
+def iter_chunk_batches(
+    documents: Iterable[StreamingDocument],
+    chunk_size: Optional[int] = DEFAULT_INGESTION_CHUNK_SIZE,
+    chunk_overlap: Optional[int] = DEFAULT_INGESTION_CHUNK_OVERLAP,
+    batch_size: Optional[int] = DEFAULT_INGESTION_BATCH_SIZE,
+) -> Iterator[List[Document]]:
+    """
+    Splits the documents into chunks of tokens as their text is read, with the same chunker and chunk metadata as the
+    OpenSearch ingestion, and groups the chunks into batches.
+
+    Yields:
+        List[Document]: batches of batch_size chunks, the last one possibly smaller
+    """
+    chunker = StreamingTokenChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    batch = []
+    for document in documents:
+        for chunk in chunker.chunk(iter_text_blocks(document)):
+            batch.append(
+                Document(
+                    page_content=chunk.text,
+                    metadata={
+                        SOURCE_METADATA_KEY: document.metadata[SOURCE_METADATA_KEY],
+                        START_OFFSET_METADATA_KEY: chunk.start_offset,
+                        END_OFFSET_METADATA_KEY: chunk.end_offset,
+                        TOKEN_COUNT_METADATA_KEY: chunk.token_count,
+                    },
+                )
+            )
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def build_local_vector_store(
+    embeddings: Any,
+    directory: str,
+    documents: Iterable[StreamingDocument],
+    chunk_size: Optional[int] = DEFAULT_INGESTION_CHUNK_SIZE,
+    chunk_overlap: Optional[int] = DEFAULT_INGESTION_CHUNK_OVERLAP,
+    batch_size: Optional[int] = DEFAULT_INGESTION_BATCH_SIZE,
+    max_workers: Optional[int] = DEFAULT_INGESTION_WORKERS,
+    encoding: Optional[str] = DEFAULT_VECTOR_ENCODING,
+    ivf_lists: Optional[int] = DEFAULT_IVF_LISTS,
+) -> Dict[str, Any]:
+    """
+    Writes a local vector store of the documents. Batches of chunks are embedded by max_workers concurrent calls,
+    with at most two batches per worker in memory, and appended to the store in the order of the documents.
+
+    Args:
+        embeddings (Any): embeddings of the knowledge base, e.g. SagemakerEndpointEmbeddings with its ContentHandler
+        directory (str): the directory of the store
+        documents (Iterable[StreamingDocument]): the documents, e.g. from iter_documents
+        chunk_size (int): tokens per chunk
+        chunk_overlap (int): tokens shared by consecutive chunks
+        batch_size (int): chunks per embedding call
+        max_workers (int): embedding calls in flight
+        encoding (str): the encoding of the vectors, one of VectorEncodings
+        ivf_lists (int): the number of inverted lists, 0 for an exact search
+
+    Returns:
+        Dict[str, Any]: the manifest of the store
+    """
+    writer = LocalVectorStoreWriter(directory, encoding=encoding, ivf_lists=ivf_lists)
+    embed = lambda texts: with_retries(embeddings.embed_documents, texts, len(texts), description="Embedding request")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for batch in iter_chunk_batches(documents, chunk_size, chunk_overlap, batch_size):
+            in_flight.append((batch, executor.submit(embed, [chunk.page_content for chunk in batch])))
+            if len(in_flight) >= 2 * max_workers:
+                written_batch, future = in_flight.popleft()
+                writer.add(written_batch, future.result())
+        while in_flight:
+            written_batch, future = in_flight.popleft()
+            writer.add(written_batch, future.result())
+    return writer.close()
+
+
+def upload_local_vector_store(directory: str, uri: str, s3_client: Optional[Any] = None) -> None:
+    """
+    Uploads a local vector store to an S3 prefix, its manifest last, so that the lambda never downloads a partial
+    store. A rebuilt store is uploaded to a new prefix, as the lambda containers keep the store they downloaded.
+
+    Args:
+        directory (str): the directory of the store
+        uri (str): s3://bucket/prefix
+        s3_client (Any): S3 client [optional, defaults to a new client]
+    """
+    s3_client = s3_client or boto3.client("s3")
+    bucket, _, prefix = uri[len(S3_URI_PREFIX) :].partition("/")
+    key_prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+    with open(os.path.join(directory, MANIFEST_FILE_NAME)) as manifest_file:
+        manifest = json.load(manifest_file)
+    for file_name in manifest["files"] + [MANIFEST_FILE_NAME]:
+        s3_client.upload_file(os.path.join(directory, file_name), bucket, key_prefix + file_name)
+
+
+def main() -> None:
+    """
+    Writes a local vector store of the documents of a local path or S3 prefix, embedded with the endpoint of the
+    knowledge base, and optionally uploads it, e.g.
+
+        python -m shared.knowledge.local_vector_ingestion s3://bucket/docs store --ivf-lists 256 --upload s3://bucket/v2
+    """
+    parser = argparse.ArgumentParser(description="Writes a local vector store of documents")
+    parser.add_argument("location", help="local file or directory, or s3://bucket/prefix")
+    parser.add_argument("directory", help="the directory the store is written to")
+    parser.add_argument("--encoding", default=DEFAULT_VECTOR_ENCODING, help="float, fp16 or byte")
+    parser.add_argument("--ivf-lists", type=int, default=DEFAULT_IVF_LISTS, help="inverted lists, e.g. sqrt(chunks)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_INGESTION_CHUNK_SIZE, help="tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_INGESTION_CHUNK_OVERLAP, help="tokens of overlap")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INGESTION_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_INGESTION_WORKERS)
+    parser.add_argument("--upload", help="s3://bucket/prefix the store is uploaded to")
+    args = parser.parse_args()
+
+    embeddings = SagemakerEndpointEmbeddings(
+        endpoint_name=os.environ[SAGEMAKER_EMBEDDING_ENDPOINT],
+        region_name=os.environ["AWS_REGION"],
+        content_handler=ContentHandler(),
+    )
+    build_local_vector_store(
+        embeddings,
+        args.directory,
+        iter_documents(args.location),
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        encoding=args.encoding,
+        ivf_lists=args.ivf_lists,
+    )
+    if args.upload:
+        upload_local_vector_store(args.directory, args.upload)
+
+
+if __name__ == "__main__":
+    main()
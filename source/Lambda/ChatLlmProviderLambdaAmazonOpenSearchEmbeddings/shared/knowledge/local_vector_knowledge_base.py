@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import os
+from typing import Any, Dict, Optional
+
+from aws_lambda_powertools import Logger
+from helper import get_service_client
+from langchain_community.embeddings import SagemakerEndpointEmbeddings
+from shared.knowledge.knowledge_base import KnowledgeBase
+from shared.knowledge.local_vector_retriever import LocalVectorRetriever
+from shared.knowledge.local_vector_store import get_local_vector_store
+from shared.knowledge.opensearch_knowledge_base import SAGEMAKER_EMBEDDING_ENDPOINT, ContentHandler
+from utils.constants import (
+    DEFAULT_IVF_NPROBE,
+    DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_RETURN_SOURCE_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    LOCAL_VECTOR_STORE_URI_ENV_VAR,
+)
+from utils.enum_types import KnowledgeBaseTypes
+
+logger = Logger(utc=True)
+
+
+class LocalVectorKnowledgeBase(KnowledgeBase):
+    """
+    LocalVectorKnowledgeBase adds context to the LLM memory from a LocalVectorStore searched inside the lambda, with
+    no call to a search service. The store, written by shared.knowledge.local_vector_ingestion, is read from a local
+    directory such as a lambda layer, or downloaded once per container from S3, and memory-mapped. It suits corpora of
+    up to a few hundred thousand chunks. Filters on the document metadata are not supported.
+
+    Attributes:
+        store_uri (str): s3:// prefix or local directory of the store, from LOCAL_VECTOR_STORE_URI
+        number_of_docs (int): Number of documents to query for [Optional]
+        return_source_documents (bool): Whether the document metadata is returned with the documents [Optional]
+        min_score (float): Score below which a retrieved document is dropped [Optional]
+        min_number_of_docs (int): Number of documents kept whatever their scores [Optional]
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap [Optional]
+        search_type (str): "similarity" or "mmr" to rerank fetch_k candidates by maximal marginal relevance [Optional]
+        fetch_k (int): Number of candidates reranked by maximal marginal relevance [Optional]
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance [Optional]
+        nprobe (int): Number of inverted lists scanned per query, for a store written with inverted lists [Optional]
+        retriever (LocalVectorRetriever): Retriever searching the store
+
+    Methods:
+        get_relevant_documents(query): Searches the store and gets the top k documents.
+    """
+
+    knowledge_base_type: KnowledgeBaseTypes = KnowledgeBaseTypes.LocalVector.value
+
+    def __init__(
+        self,
+        local_vector_knowledge_base_params: Optional[Dict[str, Any]] = {},
+        user_context: Optional[Dict] = None,
+    ) -> None:
+        self._check_env_variables()
+        if local_vector_knowledge_base_params.get("MetadataFilter") or local_vector_knowledge_base_params.get(
+            "UserAttributeMapping"
+        ):
+            # failing is safer than serving the documents a filter was meant to restrict
+            raise ValueError(
+                "MetadataFilter and UserAttributeMapping are not supported by the LocalVector knowledge base."
+            )
+
+        self.store_uri = os.environ[LOCAL_VECTOR_STORE_URI_ENV_VAR]
+        self.number_of_docs = local_vector_knowledge_base_params.get(
+            "NumberOfDocs", DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS
+        )
+        self.return_source_documents = local_vector_knowledge_base_params.get(
+            "ReturnSourceDocs", DEFAULT_RETURN_SOURCE_DOCS
+        )
+        self.min_score = local_vector_knowledge_base_params.get("MinScore", DEFAULT_MIN_SCORE)
+        self.min_number_of_docs = local_vector_knowledge_base_params.get("MinNumberOfDocs", DEFAULT_MIN_NUMBER_OF_DOCS)
+        self.score_gap_cutoff = local_vector_knowledge_base_params.get("ScoreGapCutoff", DEFAULT_SCORE_GAP_CUTOFF)
+        self.search_type = local_vector_knowledge_base_params.get("SearchType", DEFAULT_SEARCH_TYPE)
+        self.fetch_k = local_vector_knowledge_base_params.get("FetchK", DEFAULT_MMR_FETCH_K)
+        self.lambda_mult = local_vector_knowledge_base_params.get("LambdaMult", DEFAULT_MMR_LAMBDA_MULT)
+        self.nprobe = local_vector_knowledge_base_params.get("IvfNprobe", DEFAULT_IVF_NPROBE)
+
+        # the sagemaker-runtime client is kept by the container, so no client is created on the critical path
+        self.embeddings = SagemakerEndpointEmbeddings(
+            endpoint_name=os.environ[SAGEMAKER_EMBEDDING_ENDPOINT],
+            region_name=os.environ["AWS_REGION"],
+            content_handler=ContentHandler(),
+            client=get_service_client("sagemaker-runtime"),
+        )
+        self.retriever = LocalVectorRetriever(
+            store=get_local_vector_store(self.store_uri),
+            embeddings=self.embeddings,
+            top_k=self.number_of_docs,
+            return_source_documents=self.return_source_documents,
+            search_type=self.search_type,
+            fetch_k=self.fetch_k,
+            lambda_mult=self.lambda_mult,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+            nprobe=self.nprobe,
+        )
+
+    def _check_env_variables(self) -> None:
+        """
+        Checks if the local vector store related environment variables exist.
+        """
+        missing_env_vars = [
+            env_var
+            for env_var in (LOCAL_VECTOR_STORE_URI_ENV_VAR, SAGEMAKER_EMBEDDING_ENDPOINT)
+            if not os.environ.get(env_var)
+        ]
+        if missing_env_vars:
+            missing_vars = ", ".join(missing_env_vars)
+            logger.error(f"Missing environment variables: {missing_vars}")
+            raise ValueError(f"Missing environment variables: {missing_vars}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+from aws_lambda_powertools import Logger, Tracer
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from shared.knowledge.maximal_marginal_relevance import maximal_marginal_relevance
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+from shared.knowledge.relevance_filter import select_relevant_documents
+from utils.constants import (
+    DEFAULT_IVF_NPROBE,
+    DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    DOCUMENT_SCORE_METADATA_KEY,
+)
+from utils.enum_types import RetrievalSearchTypes
+from utils.trace_capture import capture_response
+
+logger = Logger(utc=True)
+tracer = Tracer()
+
+
+class LocalVectorRetriever(BaseRetriever):
+    """
+    Retrieves documents from a LocalVectorStore searched in process. Only the query is embedded remotely.
+
+    Attributes:
+        store (LocalVectorStore): the memory-mapped store of the knowledge base
+        embeddings (Any): the embeddings of the queries, of the model the store was written with
+        top_k (int): Number of documents to fetch, the most returned
+        return_source_documents (bool): Whether the document metadata is kept, the score is always kept
+        search_type (str): How documents are selected, by similarity or by maximal marginal relevance ("mmr")
+        fetch_k (int): Number of candidates fetched for maximal marginal relevance
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance
+        min_score (float): Score below which a fetched document is dropped, no threshold when None
+        min_number_of_docs (int): Number of documents returned whatever their scores
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap
+        nprobe (int): Number of inverted lists scanned per query, for a store written with inverted lists
+    """
+
+    store: Any
+    embeddings: Any
+    top_k: int = DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS
+    return_source_documents: bool = False
+    search_type: str = DEFAULT_SEARCH_TYPE
+    fetch_k: int = DEFAULT_MMR_FETCH_K
+    lambda_mult: float = DEFAULT_MMR_LAMBDA_MULT
+    min_score: Optional[float] = DEFAULT_MIN_SCORE
+    min_number_of_docs: int = DEFAULT_MIN_NUMBER_OF_DOCS
+    score_gap_cutoff: bool = DEFAULT_SCORE_GAP_CUTOFF
+    nprobe: int = DEFAULT_IVF_NPROBE
+
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def _get_relevant_documents(self, query: str) -> List[Document]:
+        """
+        Embeds the query and searches the store for its top_k documents, or selects them by maximal marginal relevance
+        among fetch_k candidates. Overrides the abstract method from BaseRetriever.
+
+        Returns:
+            List[Document]: List of Document objects.
+        """
+        query_vector = self.embeddings.embed_query(query)
+        if self.search_type == RetrievalSearchTypes.MMR.value:
+            candidates = self.store.search([query_vector], self.fetch_k, nprobe=self.nprobe)[0]
+            selected = maximal_marginal_relevance(
+                query_vector,
+                self.store.get_vectors([row for row, _ in candidates]),
+                k=self.top_k,
+                lambda_mult=self.lambda_mult,
+            )
+            results = [candidates[index] for index in selected]
+        else:
+            results = self.store.search([query_vector], self.top_k, nprobe=self.nprobe)[0]
+        return self._select_relevant_documents(results)
+
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def get_relevant_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        """
+        Retrieves the documents of several queries, embedded in a single batched call and searched together with one
+        matrix product, and fuses their results with reciprocal rank fusion. The queries are searched by similarity.
+
+        Args:
+            queries (List[str]): the question followed by the generated queries
+
+        Returns:
+            List[Document]: the top_k fused documents, best first
+        """
+        query_vectors = self.embeddings.embed_documents(queries)
+        ranked_lists = [
+            self._select_relevant_documents(results)
+            for results in self.store.search(query_vectors, self.top_k, nprobe=self.nprobe)
+        ]
+        return reciprocal_rank_fusion(ranked_lists, top_k=self.top_k)
+
+    def _select_relevant_documents(self, results: Sequence[Tuple[int, float]]) -> List[Document]:
+        """
+        Reads the documents of the rows found by a search, with their score in the metadata, and drops the ones not
+        relevant enough. The document metadata is only kept when source documents are to be returned.
+
+        Args:
+            results (Sequence[Tuple[int, float]]): the rows and scores found by the search
+
+        Returns:
+            List[Document]: the relevant documents, best first
+        """
+        documents = []
+        for row, score in results:
+            document = self.store.get_document(row)
+            metadata = dict(document.metadata) if self.return_source_documents else {}
+            metadata[DOCUMENT_SCORE_METADATA_KEY] = score
+            documents.append(Document(page_content=document.page_content, metadata=metadata))
+        return select_relevant_documents(
+            documents,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+        )
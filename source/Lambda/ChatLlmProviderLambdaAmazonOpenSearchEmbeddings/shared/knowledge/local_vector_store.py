@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from aws_lambda_powertools import Logger
+from helper import get_service_client
+from langchain.schema import Document
+from numpy.lib.format import open_memmap
+from shared.knowledge.maximal_marginal_relevance import normalize_rows
+from utils.constants import (
+    BYTE_VECTOR_SCALE,
+    DEFAULT_IVF_LISTS,
+    DEFAULT_IVF_NPROBE,
+    DEFAULT_VECTOR_ENCODING,
+    IVF_TRAINING_ITERATIONS,
+    IVF_TRAINING_SAMPLES_PER_LIST,
+    LOCAL_VECTOR_SEARCH_BLOCK_ROWS,
+    LOCAL_VECTOR_STORE_CACHE_DIR,
+    OPENSEARCH_METADATA_FIELD,
+    OPENSEARCH_TEXT_FIELD,
+)
+from utils.enum_types import VectorEncodings
+
+logger = Logger(utc=True)
+
+MANIFEST_FILE_NAME = "manifest.json"
+VECTORS_FILE_NAME = "vectors.npy"
+DOCUMENTS_FILE_NAME = "documents.jsonl"
+OFFSETS_FILE_NAME = "offsets.npy"
+IVF_CENTROIDS_FILE_NAME = "ivf_centroids.npy"
+IVF_OFFSETS_FILE_NAME = "ivf_offsets.npy"
+RAW_VECTORS_FILE_NAME = "vectors.f32.tmp"
+TEMPORARY_FILE_SUFFIX = ".tmp"
+S3_URI_PREFIX = "s3://"
+VECTOR_DTYPES = {
+    VectorEncodings.FLOAT.value: np.float32,
+    VectorEncodings.FP16.value: np.float16,
+    VectorEncodings.BYTE.value: np.int8,
+}
+
+# Stores are loaded once per lambda container and searched by all of its invocations
+_stores: Dict[str, "LocalVectorStore"] = {}
+_stores_lock = threading.Lock()
+
+
+def encode_vectors(vectors: np.ndarray, encoding: Optional[str] = DEFAULT_VECTOR_ENCODING) -> np.ndarray:
+    """
+    Encodes unit-normalized vectors in the encoding of a local vector store. Byte vectors are scaled to [-127, 127]
+    and rounded, like encode_vector does for the byte vector fields of OpenSearch, so their scores are divided by
+    BYTE_VECTOR_SCALE when searched.
+
+    Args:
+        vectors (np.ndarray): a (rows x dimensions) matrix of unit-normalized vectors
+        encoding (str): the encoding of the store, one of VectorEncodings
+
+    Returns:
+        np.ndarray: the encoded matrix
+    """
+    if encoding == VectorEncodings.BYTE.value:
+        return np.clip(np.rint(vectors * BYTE_VECTOR_SCALE), -128, 127).astype(np.int8)
+    return vectors.astype(VECTOR_DTYPES[encoding])
+
+
+def train_ivf_centroids(vectors: np.ndarray, lists: int, seed: Optional[int] = 0) -> np.ndarray:
+    """
+    Trains the centroids of the inverted lists with spherical k-means on a sample of IVF_TRAINING_SAMPLES_PER_LIST
+    vectors per list. Each iteration assigns the whole sample at once with a matrix product, and the centroid of an
+    empty list is kept as it is.
+
+    Args:
+        vectors (np.ndarray): a (rows x dimensions) matrix of unit-normalized float32 vectors, possibly memory-mapped
+        lists (int): the number of inverted lists, at most the number of vectors
+        seed (int): the seed of the sampling and of the initial centroids
+
+    Returns:
+        np.ndarray: a (lists x dimensions) matrix of unit-normalized centroids
+    """
+    random_state = np.random.RandomState(seed)
+    sample_size = min(len(vectors), lists * IVF_TRAINING_SAMPLES_PER_LIST)
+    sample = np.asarray(vectors[np.sort(random_state.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[random_state.choice(sample_size, lists, replace=False)].copy()
+    for _ in range(IVF_TRAINING_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        counts = np.bincount(assignments, minlength=lists)
+        non_empty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[non_empty]
+        sums = np.add.reduceat(sample[np.argsort(assignments, kind="stable")], starts, axis=0)
+        centroids[non_empty] = normalize_rows(sums)
+    return centroids
+
+
+class LocalVectorStore:
+    """
+    LocalVectorStore searches the embeddings of a knowledge base in process, from the files of a local directory that
+    are memory-mapped rather than read, so that loading a store is immediate and its pages are shared with the page
+    cache. The vectors are unit-normalized, so the score of a document is the cosine similarity of its vector with the
+    query, computed with matrix products over LOCAL_VECTOR_SEARCH_BLOCK_ROWS vectors at a time, and the top k are
+    selected with argpartition. A store written with inverted lists has its vectors ordered by list, and a query only
+    scores the contiguous vectors of the nprobe lists whose centroids are nearest to it.
+
+    Attributes:
+        directory (str): the directory written by LocalVectorStoreWriter
+
+    Methods:
+        search(query_vectors, k, nprobe): Returns the rows and scores of the k nearest vectors of each query
+        get_document(row): Returns the document of a row
+        get_vectors(rows): Returns the vectors of rows as float32
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE_NAME)) as manifest_file:
+            self._manifest = json.load(manifest_file)
+        self._vectors = np.load(os.path.join(directory, VECTORS_FILE_NAME), mmap_mode="r")
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE_NAME), mmap_mode="r")
+        with open(os.path.join(directory, DOCUMENTS_FILE_NAME), "rb") as documents_file:
+            self._documents = mmap.mmap(documents_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._ivf_centroids = None
+        self._ivf_offsets = None
+        if self.ivf_lists:
+            self._ivf_centroids = np.load(os.path.join(directory, IVF_CENTROIDS_FILE_NAME))
+            self._ivf_offsets = np.load(os.path.join(directory, IVF_OFFSETS_FILE_NAME))
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def count(self) -> int:
+        return self._manifest["count"]
+
+    @property
+    def dimension(self) -> int:
+        return self._manifest["dimension"]
+
+    @property
+    def encoding(self) -> str:
+        return self._manifest["encoding"]
+
+    @property
+    def ivf_lists(self) -> int:
+        return self._manifest.get("ivf_lists", 0)
+
+    def search(
+        self, query_vectors: Sequence[Sequence[float]], k: int, nprobe: Optional[int] = DEFAULT_IVF_NPROBE
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Searches the k vectors nearest to each query. Without inverted lists, or when nprobe covers all of them, all
+        queries are scored together against every vector.
+
+        Args:
+            query_vectors (Sequence[Sequence[float]]): the embeddings of the queries
+            k (int): the number of vectors returned per query
+            nprobe (int): the number of inverted lists scanned per query
+
+        Returns:
+            List[List[Tuple[int, float]]]: for each query, the rows and scores of its nearest vectors, best first
+        """
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dimension))
+        if not self.ivf_lists or nprobe >= self.ivf_lists:
+            return self._get_top_k(*self._score_ranges([(0, self.count)], queries), k)
+
+        nprobe = max(int(nprobe), 1)
+        results = []
+        for query, centroid_scores in zip(queries, queries @ self._ivf_centroids.T):
+            probed_lists = np.sort(np.argpartition(-centroid_scores, nprobe - 1)[:nprobe])
+            ranges = [(self._ivf_offsets[index], self._ivf_offsets[index + 1]) for index in probed_lists]
+            results.extend(self._get_top_k(*self._score_ranges(ranges, query[None, :]), k))
+        return results
+
+    def _score_ranges(self, ranges: List[Tuple[int, int]], queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores the vectors of ranges of rows against the queries, a block of rows at a time so that the float32 copy
+        of a byte or fp16 block stays small.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: the scored rows, and their (rows x queries) matrix of scores
+        """
+        rows = []
+        scores = []
+        for start, end in ranges:
+            for block_start in range(int(start), int(end), LOCAL_VECTOR_SEARCH_BLOCK_ROWS):
+                block_end = min(block_start + LOCAL_VECTOR_SEARCH_BLOCK_ROWS, int(end))
+                block = np.asarray(self._vectors[block_start:block_end], dtype=np.float32)
+                rows.append(np.arange(block_start, block_end))
+                scores.append(block @ queries.T)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, len(queries)), dtype=np.float32)
+        scores = np.concatenate(scores)
+        if self.encoding == VectorEncodings.BYTE.value:
+            scores /= BYTE_VECTOR_SCALE
+        return np.concatenate(rows), scores
+
+    @staticmethod
+    def _get_top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Selects the k best scored rows of each query, with argpartition and a sort of the k selected only.
+        """
+        k = min(int(k), len(rows))
+        results = []
+        for query_scores in scores.T:
+            if k <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(-query_scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-query_scores[top], kind="stable")]
+            results.append([(int(rows[index]), float(query_scores[index])) for index in top])
+        return results
+
+    def get_document(self, row: int) -> Document:
+        """
+        Reads the document of a row from the memory-mapped documents file.
+        """
+        record = json.loads(self._documents[int(self._offsets[row]) : int(self._offsets[row + 1])])
+        return Document(
+            page_content=record[OPENSEARCH_TEXT_FIELD], metadata=record.get(OPENSEARCH_METADATA_FIELD) or {}
+        )
+
+    def get_vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """
+        Returns the vectors of rows as float32. Byte vectors keep their [-127, 127] scale, which leaves their cosine
+        similarities unchanged.
+        """
+        return np.asarray(self._vectors[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+
+class LocalVectorStoreWriter:
+    """
+    LocalVectorStoreWriter writes a local vector store from a stream of documents and their embeddings, without
+    holding either in memory: the documents are appended to the documents file and the normalized vectors to a raw
+    float32 file as they are added. close() trains the inverted lists, orders the rows by list, and writes the
+    vectors in the encoding of the store. The manifest is written last, so a directory with a manifest holds a
+    complete store.
+
+    Attributes:
+        directory (str): the directory of the store, created if missing
+        encoding (str): the encoding of the vectors, one of VectorEncodings
+            [optional, defaults to DEFAULT_VECTOR_ENCODING]
+        ivf_lists (int): the number of inverted lists, 0 for an exact search [optional, defaults to DEFAULT_IVF_LISTS]
+        seed (int): the seed of the training of the inverted lists [optional, defaults to 0]
+
+    Methods:
+        add(documents, vectors): Appends documents and their embeddings to the store
+        close(): Finalizes the store and returns its manifest
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        encoding: Optional[str] = DEFAULT_VECTOR_ENCODING,
+        ivf_lists: Optional[int] = DEFAULT_IVF_LISTS,
+        seed: Optional[int] = 0,
+    ) -> None:
+        if encoding not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector encoding: {encoding}. Supported encodings are: {list(VECTOR_DTYPES)}")
+        self._directory = directory
+        self._encoding = encoding
+        self._ivf_lists = int(ivf_lists)
+        self._seed = seed
+        self._dimension = None
+        self._offsets = [0]
+        os.makedirs(directory, exist_ok=True)
+        self._documents_file = open(self._get_path(DOCUMENTS_FILE_NAME + TEMPORARY_FILE_SUFFIX), "wb")
+        self._vectors_file = open(self._get_path(RAW_VECTORS_FILE_NAME), "wb")
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    @property
+    def encoding(self) -> str:
+        return self._encoding
+
+    @property
+    def ivf_lists(self) -> int:
+        return self._ivf_lists
+
+    @property
+    def count(self) -> int:
+        return len(self._offsets) - 1
+
+    def _get_path(self, file_name: str) -> str:
+        return os.path.join(self._directory, file_name)
+
+    def add(self, documents: List[Document], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Appends documents and their embeddings to the store.
+
+        Args:
+            documents (List[Document]): the documents, their metadata is returned with them by the knowledge base
+            vectors (Sequence[Sequence[float]]): the embedding of each document
+        """
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+        if self._dimension is None:
+            self._dimension = vectors.shape[1]
+        elif vectors.shape[1] != self._dimension:
+            raise ValueError(f"Expected vectors of dimension {self._dimension}, received {vectors.shape[1]}")
+
+        for document in documents:
+            record = {OPENSEARCH_TEXT_FIELD: document.page_content, OPENSEARCH_METADATA_FIELD: document.metadata or {}}
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            self._documents_file.write(line)
+            self._offsets.append(self._offsets[-1] + len(line))
+        self._vectors_file.write(vectors.tobytes())
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finalizes the store: trains the inverted lists on a sample of the vectors, writes the vectors and documents
+        ordered by list, then the manifest.
+
+        Returns:
+            Dict[str, Any]: the manifest of the store
+
+        Raises:
+            ValueError: when no document was added
+        """
+        self._documents_file.close()
+        self._vectors_file.close()
+        if not self.count:
+            raise ValueError("No documents were added to the local vector store")
+
+        count = self.count
+        raw_vectors = np.memmap(
+            self._get_path(RAW_VECTORS_FILE_NAME), dtype=np.float32, mode="r", shape=(count, self._dimension)
+        )
+        order = np.arange(count)
+        ivf_lists = min(self.ivf_lists, count)
+        files = [VECTORS_FILE_NAME, OFFSETS_FILE_NAME, DOCUMENTS_FILE_NAME]
+        if ivf_lists:
+            centroids = train_ivf_centroids(raw_vectors, ivf_lists, self._seed)
+            assignments = np.concatenate(
+                [
+                    np.argmax(raw_vectors[start : start + LOCAL_VECTOR_SEARCH_BLOCK_ROWS] @ centroids.T, axis=1)
+                    for start in range(0, count, LOCAL_VECTOR_SEARCH_BLOCK_ROWS)
+                ]
+            )
+            order = np.argsort(assignments, kind="stable")
+            ivf_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=ivf_lists))])
+            np.save(self._get_path(IVF_CENTROIDS_FILE_NAME), centroids)
+            np.save(self._get_path(IVF_OFFSETS_FILE_NAME), ivf_offsets.astype(np.int64))
+            files.extend([IVF_CENTROIDS_FILE_NAME, IVF_OFFSETS_FILE_NAME])
+
+        vectors = open_memmap(
+            self._get_path(VECTORS_FILE_NAME), mode="w+", dtype=VECTOR_DTYPES[self.encoding], shape=raw_vectors.shape
+        )
+        for start in range(0, count, LOCAL_VECTOR_SEARCH_BLOCK_ROWS):
+            rows = order[start : start + LOCAL_VECTOR_SEARCH_BLOCK_ROWS]
+            vectors[start : start + len(rows)] = encode_vectors(raw_vectors[rows], self.encoding)
+        vectors.flush()
+        del vectors, raw_vectors
+        os.remove(self._get_path(RAW_VECTORS_FILE_NAME))
+
+        offsets = np.asarray(self._offsets, dtype=np.int64)
+        temporary_documents_path = self._get_path(DOCUMENTS_FILE_NAME + TEMPORARY_FILE_SUFFIX)
+        if ivf_lists:
+            # the documents are rewritten in the order of the vectors, so that a row indexes both
+            ordered_offsets = [0]
+            with open(temporary_documents_path, "rb") as source_file, open(
+                self._get_path(DOCUMENTS_FILE_NAME), "wb"
+            ) as documents_file:
+                source = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ)
+                for row in order:
+                    line = source[offsets[row] : offsets[row + 1]]
+                    documents_file.write(line)
+                    ordered_offsets.append(ordered_offsets[-1] + len(line))
+                source.close()
+            os.remove(temporary_documents_path)
+            offsets = np.asarray(ordered_offsets, dtype=np.int64)
+        else:
+            os.replace(temporary_documents_path, self._get_path(DOCUMENTS_FILE_NAME))
+        np.save(self._get_path(OFFSETS_FILE_NAME), offsets)
+
+        manifest = {
+            "count": count,
+            "dimension": self._dimension,
+            "encoding": self.encoding,
+            "ivf_lists": ivf_lists,
+            "files": files,
+        }
+        with open(self._get_path(MANIFEST_FILE_NAME + TEMPORARY_FILE_SUFFIX), "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(self._get_path(MANIFEST_FILE_NAME + TEMPORARY_FILE_SUFFIX), self._get_path(MANIFEST_FILE_NAME))
+        logger.info(f"Wrote {count} documents in {ivf_lists} inverted lists to the local vector store {self.directory}")
+        return manifest
+
+
+def download_local_vector_store(
+    uri: str, cache_dir: Optional[str] = LOCAL_VECTOR_STORE_CACHE_DIR, s3_client: Optional[Any] = None
+) -> str:
+    """
+    Downloads the local vector store of an S3 prefix to a directory of cache_dir named after the URI, unless the
+    container already did. The manifest is written last, so an interrupted download is started over by the next
+    invocation. A store is never updated in place: a rebuilt store is published under a new prefix.
+
+    Args:
+        uri (str): the s3://bucket/prefix of the store
+        cache_dir (str): the local directory of the downloaded stores
+        s3_client (Any): S3 client [optional, defaults to the client of the container]
+
+    Returns:
+        str: the local directory of the store
+    """
+    directory = os.path.join(cache_dir, hashlib.sha1(uri.encode("utf-8")).hexdigest()[:16])
+    manifest_path = os.path.join(directory, MANIFEST_FILE_NAME)
+    if os.path.exists(manifest_path):
+        return directory
+
+    s3_client = s3_client or get_service_client("s3")
+    bucket, _, prefix = uri[len(S3_URI_PREFIX) :].partition("/")
+    key_prefix = f"{prefix.strip('/')}/" if prefix.strip("/") else ""
+    manifest_body = s3_client.get_object(Bucket=bucket, Key=key_prefix + MANIFEST_FILE_NAME)["Body"].read()
+    os.makedirs(directory, exist_ok=True)
+    for file_name in json.loads(manifest_body)["files"]:
+        s3_client.download_file(bucket, key_prefix + file_name, os.path.join(directory, file_name))
+    with open(manifest_path + TEMPORARY_FILE_SUFFIX, "wb") as manifest_file:
+        manifest_file.write(manifest_body)
+    os.replace(manifest_path + TEMPORARY_FILE_SUFFIX, manifest_path)
+    logger.info(f"Downloaded the local vector store {uri} to {directory}")
+    return directory
+
+
+def get_local_vector_store(uri: str) -> LocalVectorStore:
+    """
+    Returns the local vector store of an s3://bucket/prefix, downloaded to LOCAL_VECTOR_STORE_CACHE_DIR, or of a local
+    directory, such as one of a lambda layer under /opt. A store is loaded once per container.
+
+    Args:
+        uri (str): the S3 prefix or local directory of the store
+
+    Returns:
+        LocalVectorStore: the store
+    """
+    with _stores_lock:
+        if uri not in _stores:
+            directory = download_local_vector_store(uri) if uri.startswith(S3_URI_PREFIX) else uri
+            _stores[uri] = LocalVectorStore(directory)
+        return _stores[uri]
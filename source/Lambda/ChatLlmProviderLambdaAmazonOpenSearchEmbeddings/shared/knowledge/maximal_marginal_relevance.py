@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+from typing import List, Sequence
+
+import numpy as np
+from utils.constants import DEFAULT_MMR_LAMBDA_MULT
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales each row of a matrix to unit length, so that dot products between rows are cosine similarities. Zero rows
+    are left as they are.
+
+    Args:
+        vectors (np.ndarray): a (rows x dimensions) matrix
+
+    Returns:
+        np.ndarray: the matrix with unit length rows
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def maximal_marginal_relevance(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = DEFAULT_MMR_LAMBDA_MULT,
+) -> List[int]:
+    """
+    Selects k of the candidates by maximal marginal relevance, trading their similarity to the query against their
+    similarity to the candidates already selected. Each selection step scores all candidates at once over the candidate
+    matrix, and only updates the redundancy of the candidates with the similarities to the newly selected one.
+
+    Args:
+        query_vector (Sequence[float]): embedding of the query
+        candidate_vectors (Sequence[Sequence[float]]): embeddings of the candidates, in retrieval order
+        k (int): number of candidates to select
+        lambda_mult (float): weight of relevance against diversity, between 0 (most diverse) and 1 (most relevant)
+
+    Returns:
+        List[int]: the indices of the selected candidates, in selection order
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    number_to_select = min(int(k), len(candidates))
+    if number_to_select <= 0:
+        return []
+
+    candidates = normalize_rows(candidates.reshape(len(candidates), -1))
+    query = normalize_rows(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+    relevance = lambda_mult * (candidates @ query)
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+
+    selected = []
+    for _ in range(number_to_select):
+        scores = np.where(available, relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        index = int(np.argmax(scores))
+        selected.append(index)
+        available[index] = False
+        redundancy = np.maximum(redundancy, candidates @ candidates[index])
+    return selected
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.constants import OPENSEARCH_METADATA_FIELD
+
+# a filter spec has the shape of a Kendra AttributeFilter, with plain values in place of Kendra DocumentAttributeValues
+LOGICAL_FILTER_OPERATORS = ("AndAllFilters", "OrAllFilters", "NotFilter")
+RANGE_FILTER_OPERATORS = {
+    "GreaterThan": "gt",
+    "GreaterThanOrEquals": "gte",
+    "LessThan": "lt",
+    "LessThanOrEquals": "lte",
+}
+FILTER_OPERATORS = LOGICAL_FILTER_OPERATORS + ("EqualsTo", "ContainsAny", "ContainsAll") + tuple(RANGE_FILTER_OPERATORS)
+CYPHER_RANGE_OPERATORS = {"GreaterThan": ">", "GreaterThanOrEquals": ">=", "LessThan": "<", "LessThanOrEquals": "<="}
+
+
+def _get_operator(metadata_filter: Dict) -> Tuple[str, Any]:
+    """
+    Returns the operator of a filter and its operand, validating that the filter has exactly one supported operator.
+
+    Args:
+        metadata_filter (Dict): a filter, such as {"EqualsTo": {"Key": "category", "Value": "faq"}}
+
+    Returns:
+        Tuple[str, Any]: the operator and its operand
+
+    Raises:
+        ValueError: If the filter does not have exactly one supported operator, or a condition misses its key
+    """
+    if not isinstance(metadata_filter, dict) or len(metadata_filter) != 1:
+        raise ValueError(f"A metadata filter must have exactly one operator, received {metadata_filter}")
+
+    operator, operand = next(iter(metadata_filter.items()))
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(f"Unsupported metadata filter operator {operator}, expected one of {list(FILTER_OPERATORS)}")
+    if operator not in LOGICAL_FILTER_OPERATORS and (not isinstance(operand, dict) or "Key" not in operand):
+        raise ValueError(f"The {operator} metadata filter requires a Key and a Value, received {operand}")
+    return operator, operand
+
+
+def build_metadata_filter(
+    filter_spec: Optional[Dict] = None,
+    user_attribute_mapping: Optional[Dict[str, str]] = None,
+    user_context: Optional[Dict] = None,
+) -> Optional[Dict]:
+    """
+    Builds the metadata filter of a request from the static filter spec of the knowledge base and the attributes of the
+    user. Each entry of user_attribute_mapping maps a metadata key to an attribute of the authorizer context, and
+    restricts the documents to those whose metadata value equals the user's attribute, or contains any of them when the
+    attribute is a list. Filters are validated here, so a malformed spec fails when the knowledge base is built.
+
+    Args:
+        filter_spec (Dict): a filter with the shape of a Kendra AttributeFilter, with plain values
+        user_attribute_mapping (Dict[str, str]): metadata key to authorizer context attribute
+        user_context (Dict): the authorizer context of the request
+
+    Returns:
+        Optional[Dict]: the combined filter, None when nothing is filtered
+
+    Raises:
+        ValueError: If the filter spec is malformed, or a mapped attribute is missing from the authorizer context, so
+            that a request is never served unrestricted documents
+    """
+    filters = []
+    if filter_spec:
+        _validate(filter_spec)
+        filters.append(filter_spec)
+
+    for key, attribute in (user_attribute_mapping or {}).items():
+        value = (user_context or {}).get(attribute)
+        if value is None or value == "":
+            raise ValueError(f"User attribute {attribute} is missing from the authorizer context")
+        operator = "ContainsAny" if isinstance(value, list) else "EqualsTo"
+        filters.append({operator: {"Key": key, "Value": value}})
+
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else {"AndAllFilters": filters}
+
+
+def _validate(metadata_filter: Dict) -> None:
+    operator, operand = _get_operator(metadata_filter)
+    if operator == "NotFilter":
+        _validate(operand)
+    elif operator in LOGICAL_FILTER_OPERATORS:
+        for child_filter in operand:
+            _validate(child_filter)
+
+
+def to_opensearch_filter(metadata_filter: Dict, metadata_field: Optional[str] = OPENSEARCH_METADATA_FIELD) -> Dict:
+    """
+    Compiles a metadata filter into an OpenSearch query DSL filter on the metadata fields of the documents. The result
+    is used as an efficient k-NN filter, applied while the vector index is traversed, or as a bool filter of a text
+    query. Exact matches require the filtered fields to be mapped as keywords.
+
+    Args:
+        metadata_filter (Dict): the filter, as built by build_metadata_filter
+        metadata_field (str): the object field holding the document metadata
+
+    Returns:
+        Dict: the OpenSearch filter clause
+    """
+    operator, operand = _get_operator(metadata_filter)
+    if operator == "AndAllFilters":
+        return {"bool": {"filter": [to_opensearch_filter(child, metadata_field) for child in operand]}}
+    if operator == "OrAllFilters":
+        return {
+            "bool": {
+                "should": [to_opensearch_filter(child, metadata_field) for child in operand],
+                "minimum_should_match": 1,
+            }
+        }
+    if operator == "NotFilter":
+        return {"bool": {"must_not": [to_opensearch_filter(operand, metadata_field)]}}
+
+    field = f"{metadata_field}.{operand['Key']}" if metadata_field else operand["Key"]
+    value = operand.get("Value")
+    if operator == "EqualsTo":
+        return {"term": {field: value}}
+    if operator == "ContainsAny":
+        return {"terms": {field: _as_list(value)}}
+    if operator == "ContainsAll":
+        return {"bool": {"filter": [{"term": {field: item}} for item in _as_list(value)]}}
+    return {"range": {field: {RANGE_FILTER_OPERATORS[operator]: value}}}
+
+
+def to_cypher_filter(metadata_filter: Dict, node_variable: Optional[str] = "node") -> Tuple[str, Dict[str, Any]]:
+    """
+    Compiles a metadata filter into a Cypher predicate on the properties of the matched nodes. Values are passed as
+    query parameters and property names are quoted, so a filter cannot inject Cypher. ContainsAny and ContainsAll tell
+    list properties from scalar ones with valueType(), which requires Neo4j 5.13 or later.
+
+    Args:
+        metadata_filter (Dict): the filter, as built by build_metadata_filter
+        node_variable (str): the variable of the nodes in the query
+
+    Returns:
+        Tuple[str, Dict[str, Any]]: the predicate, to follow a WHERE, and its parameters
+    """
+    parameters = {}
+    return _to_cypher_predicate(metadata_filter, node_variable, parameters), parameters
+
+
+def _to_cypher_predicate(metadata_filter: Dict, node_variable: str, parameters: Dict[str, Any]) -> str:
+    operator, operand = _get_operator(metadata_filter)
+    if operator in ("AndAllFilters", "OrAllFilters"):
+        conjunction = " AND " if operator == "AndAllFilters" else " OR "
+        return "(" + conjunction.join(_to_cypher_predicate(child, node_variable, parameters) for child in operand) + ")"
+    if operator == "NotFilter":
+        return f"(NOT {_to_cypher_predicate(operand, node_variable, parameters)})"
+
+    parameter = f"filter_{len(parameters)}"
+    property_name = "`" + str(operand["Key"]).replace("`", "``") + "`"
+    value = operand.get("Value")
+    node_property = f"{node_variable}.{property_name}"
+    if operator == "EqualsTo":
+        parameters[parameter] = value
+        return f"{node_property} = ${parameter}"
+    if operator in ("ContainsAny", "ContainsAll"):
+        parameters[parameter] = _as_list(value)
+        quantifier = "any" if operator == "ContainsAny" else "all"
+        # a list property contains the values, a scalar property equals one of them
+        return (
+            f"{quantifier}(value IN ${parameter} WHERE "
+            f"CASE WHEN valueType({node_property}) STARTS WITH 'LIST' "
+            f"THEN value IN {node_property} ELSE value = {node_property} END)"
+        )
+    parameters[parameter] = value
+    return f"{node_property} {CYPHER_RANGE_OPERATORS[operator]} ${parameter}"
+
+
+def to_kendra_attribute_filter(metadata_filter: Dict) -> Dict:
+    """
+    Converts a metadata filter into a Kendra AttributeFilter, wrapping its plain values into DocumentAttributeValues.
+    Values that already are DocumentAttributeValues are kept.
+
+    Args:
+        metadata_filter (Dict): the filter, as built by build_metadata_filter
+
+    Returns:
+        Dict: the Kendra AttributeFilter
+    """
+    operator, operand = _get_operator(metadata_filter)
+    if operator == "NotFilter":
+        return {operator: to_kendra_attribute_filter(operand)}
+    if operator in LOGICAL_FILTER_OPERATORS:
+        return {operator: [to_kendra_attribute_filter(child) for child in operand]}
+
+    value = operand.get("Value")
+    if isinstance(value, dict):
+        attribute_value = value
+    elif operator in ("ContainsAny", "ContainsAll") or isinstance(value, list):
+        attribute_value = {"StringListValue": [str(item) for item in _as_list(value)]}
+    elif isinstance(value, int) and not isinstance(value, bool):
+        attribute_value = {"LongValue": value}
+    else:
+        attribute_value = {"StringValue": str(value)}
+    return {operator: {"Key": operand["Key"], "Value": attribute_value}}
+
+
+def _as_list(value: Any) -> List[Any]:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
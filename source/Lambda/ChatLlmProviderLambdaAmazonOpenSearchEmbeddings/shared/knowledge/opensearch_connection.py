@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Tuple
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+from opensearchpy import OpenSearch
+from utils.constants import KNN_WARMUP_INTERVAL, METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
+from utils.enum_types import CloudWatchNamespaces, RequestStages
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+# Shared across invocations of the lambda container, so that the connections they keep alive are reused
+_clients: Dict[Tuple[str, int, Any], OpenSearch] = {}
+_primed_clients = set()
+_knn_warmup_times: Dict[str, float] = {}
+_knn_warmup_lock = threading.Lock()
+_knn_warmup_executor = ThreadPoolExecutor(max_workers=1)
+
+
+def get_opensearch_client(host: str, port: int, http_auth: Any, **kwargs: Any) -> OpenSearch:
+    """
+    Returns the OpenSearch client of a domain, created on first use and then kept for the life of the container. The
+    client pools its connections and keeps them alive, so a request reuses the TLS session of the previous ones
+    instead of handshaking again.
+
+    Args:
+        host (str): the endpoint of the domain
+        port (int): the port of the domain
+        http_auth (Any): the credentials of the domain, a client is kept per credentials so a rotated secret is used
+        kwargs: the other arguments of the client, only used when it is created
+
+    Returns:
+        OpenSearch: the client of the domain
+    """
+    key = (host, port, http_auth)
+    if key not in _clients:
+        _clients[key] = OpenSearch(hosts=[{"host": host, "port": port}], http_auth=http_auth, **kwargs)
+    return _clients[key]
+
+
+def prime_opensearch(
+    client: OpenSearch, index_name: str, prime_connection: bool = True, knn_warmup: bool = False
+) -> None:
+    """
+    Primes a client so that the first search of a container does not pay for the connection setup. With
+    prime_connection, a cheap request opens a pooled connection the first time a client is used, and its duration is
+    recorded against the OpenSearchPriming stage. Priming never fails the request, a failed request only leaves the
+    connection cold.
+
+    With knn_warmup, the k-NN warmup API is also called for the index, which loads its native graphs in memory so that
+    the first k-NN search after a domain restart or scale-out does not load them. The warmup runs in the background,
+    at most once per KNN_WARMUP_INTERVAL seconds per index and container.
+
+    Args:
+        client (OpenSearch): the client to prime
+        index_name (str): the index searched by the client
+        prime_connection (bool): whether a connection is opened on the first use of the client
+        knn_warmup (bool): whether the k-NN graphs of the index are warmed up
+    """
+    if prime_connection and id(client) not in _primed_clients:
+        with request_timer.stage(RequestStages.OPENSEARCH_PRIMING):
+            try:
+                client.info()
+                _primed_clients.add(id(client))
+            except Exception as ex:
+                logger.warning(
+                    f"OpenSearch connection priming failed. Error: {ex}", xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR)
+                )
+
+    if knn_warmup:
+        with _knn_warmup_lock:
+            last_warmup_time = _knn_warmup_times.get(index_name)
+            if last_warmup_time is not None and time.monotonic() - last_warmup_time < KNN_WARMUP_INTERVAL:
+                return
+            _knn_warmup_times[index_name] = time.monotonic()
+        _knn_warmup_executor.submit(warm_up_knn_index, client, index_name)
+
+
+def warm_up_knn_index(client: OpenSearch, index_name: str) -> None:
+    """
+    Calls the k-NN warmup API of an index and publishes its duration. The call returns once the graphs of all the
+    shards of the index are loaded.
+
+    Args:
+        client (OpenSearch): the client of the domain
+        index_name (str): the index to warm up
+    """
+    start_time = time.perf_counter()
+    try:
+        response = client.transport.perform_request("GET", f"/_plugins/_knn/warmup/{index_name}")
+    except Exception as ex:
+        logger.warning(
+            f"k-NN warmup of index {index_name} failed. Error: {ex}", xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR)
+        )
+        return
+
+    duration = time.perf_counter() - start_time
+    logger.info(f"k-NN warmup of index {index_name} took {duration:.3f}s: {response}")
+    try:
+        warmup_metrics = EphemeralMetrics(
+            namespace=CloudWatchNamespaces.AWS_OPENSEARCH.value, service=METRICS_SERVICE_NAME
+        )
+        warmup_metrics.add_metric(name="KnnWarmupTime", unit=MetricUnit.Milliseconds, value=duration * 1000)
+        warmup_metrics.flush_metrics()
+    except Exception as ex:
+        logger.error(f"Error publishing the k-NN warmup time: {ex}")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from aws_lambda_powertools import Logger
+from utils.constants import (
+    BYTE_VECTOR_SCALE,
+    DEFAULT_KNN_EF_CONSTRUCTION,
+    DEFAULT_KNN_EF_SEARCH,
+    DEFAULT_KNN_ENGINE,
+    DEFAULT_KNN_M,
+    DEFAULT_KNN_NUMBER_OF_REPLICAS,
+    DEFAULT_KNN_NUMBER_OF_SHARDS,
+    DEFAULT_KNN_SPACE_TYPE,
+    DEFAULT_VECTOR_ENCODING,
+    KNN_GRAPH_MEMORY_OVERHEAD,
+    OPENSEARCH_CONTENT_HASH_FIELD,
+    OPENSEARCH_METADATA_FIELD,
+    OPENSEARCH_TEXT_FIELD,
+    OPENSEARCH_VECTOR_FIELD,
+)
+from utils.enum_types import KnnEngines, VectorEncodings
+
+logger = Logger(utc=True)
+
+BYTES_PER_DIMENSION = {VectorEncodings.FLOAT.value: 4, VectorEncodings.FP16.value: 2, VectorEncodings.BYTE.value: 1}
+BYTES_PER_GRAPH_EDGE = 8
+
+
+def encode_vector(vector: List[float], encoding: Optional[str] = DEFAULT_VECTOR_ENCODING) -> List[Any]:
+    """
+    Encodes an embedding the way the vector field of the index stores it. Byte vectors are scaled from the [-1, 1]
+    range of unit-normalized embeddings to [-127, 127] and rounded, both when documents are indexed and when the index
+    is searched, so that their distances keep the order of the float ones. Float and fp16 vectors are sent as floats,
+    fp16 vectors are quantized by the engine.
+
+    Args:
+        vector (List[float]): the embedding
+        encoding (str): the encoding of the vector field
+
+    Returns:
+        List[Any]: the vector as sent to OpenSearch
+    """
+    if encoding != VectorEncodings.BYTE.value:
+        return vector
+    return [max(-128, min(127, round(value * BYTE_VECTOR_SCALE))) for value in vector]
+
+
+@dataclass
+class KnnIndexConfig:
+    """
+    Declarative definition of the k-NN index searched by the embeddings knowledge base. Changing the engine, the space,
+    the graph parameters, the encoding or the shards requires a new index, while ef_search and the replicas are updated
+    in place.
+
+    Attributes:
+        dimension (int): dimension of the embeddings
+        engine (str): "faiss" or "lucene"
+        space_type (str): distance of the vectors, e.g. "l2", "innerproduct" or "cosinesimil"
+        m (int): graph edges per vector, higher improves recall at the cost of memory
+        ef_construction (int): candidates considered while the graph is built, higher improves recall at the cost of
+            indexing time
+        ef_search (int): candidates considered while the graph is searched, higher improves recall at the cost of
+            latency, only used by faiss, lucene considers k candidates
+        encoding (str): "float", "fp16" (faiss scalar quantization) or "byte" (byte vectors, see encode_vector)
+        number_of_shards (int): primary shards of the index
+        number_of_replicas (int): replicas of each primary shard, each holding a copy of the graphs
+    """
+
+    dimension: int
+    engine: str = DEFAULT_KNN_ENGINE
+    space_type: str = DEFAULT_KNN_SPACE_TYPE
+    m: int = DEFAULT_KNN_M
+    ef_construction: int = DEFAULT_KNN_EF_CONSTRUCTION
+    ef_search: int = DEFAULT_KNN_EF_SEARCH
+    encoding: str = DEFAULT_VECTOR_ENCODING
+    number_of_shards: int = DEFAULT_KNN_NUMBER_OF_SHARDS
+    number_of_replicas: int = DEFAULT_KNN_NUMBER_OF_REPLICAS
+
+    def __post_init__(self):
+        """
+        Validates the combination of engine and encoding.
+
+        Raises:
+            ValueError: if the engine or the encoding is not supported, or fp16 is used with lucene
+        """
+        supported_engines = [engine.value for engine in KnnEngines]
+        if self.engine not in supported_engines:
+            raise ValueError(f"Unsupported k-NN engine {self.engine}, supported engines are {supported_engines}")
+        supported_encodings = [encoding.value for encoding in VectorEncodings]
+        if self.encoding not in supported_encodings:
+            raise ValueError(
+                f"Unsupported vector encoding {self.encoding}, supported encodings are {supported_encodings}"
+            )
+        if self.encoding == VectorEncodings.FP16.value and self.engine != KnnEngines.FAISS.value:
+            raise ValueError("The fp16 vector encoding is only supported by the faiss engine")
+
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "KnnIndexConfig":
+        """
+        Builds the config from its declarative form, e.g.
+            {"Dimension": 768, "Engine": "faiss", "M": 16, "EfConstruction": 128, "EfSearch": 100, "Encoding": "fp16"}
+
+        Args:
+            config (Dict[str, Any]): the declarative config, all keys but Dimension are optional
+
+        Returns:
+            KnnIndexConfig: the config
+        """
+        return cls(
+            dimension=int(config["Dimension"]),
+            engine=config.get("Engine", DEFAULT_KNN_ENGINE),
+            space_type=config.get("SpaceType", DEFAULT_KNN_SPACE_TYPE),
+            m=int(config.get("M", DEFAULT_KNN_M)),
+            ef_construction=int(config.get("EfConstruction", DEFAULT_KNN_EF_CONSTRUCTION)),
+            ef_search=int(config.get("EfSearch", DEFAULT_KNN_EF_SEARCH)),
+            encoding=config.get("Encoding", DEFAULT_VECTOR_ENCODING),
+            number_of_shards=int(config.get("NumberOfShards", DEFAULT_KNN_NUMBER_OF_SHARDS)),
+            number_of_replicas=int(config.get("NumberOfReplicas", DEFAULT_KNN_NUMBER_OF_REPLICAS)),
+        )
+
+    def get_vector_mapping(self) -> Dict[str, Any]:
+        """
+        Returns the mapping of the knn_vector field.
+        """
+        method = {
+            "name": "hnsw",
+            "engine": self.engine,
+            "space_type": self.space_type,
+            "parameters": {"m": self.m, "ef_construction": self.ef_construction},
+        }
+        if self.encoding == VectorEncodings.FP16.value:
+            method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16", "clip": True}}
+
+        mapping = {"type": "knn_vector", "dimension": self.dimension, "method": method}
+        if self.encoding == VectorEncodings.BYTE.value:
+            mapping["data_type"] = "byte"
+        return mapping
+
+    def get_dynamic_settings(self) -> Dict[str, Any]:
+        """
+        Returns the index settings which can be updated on an existing index.
+        """
+        return {"number_of_replicas": self.number_of_replicas, "knn.algo_param.ef_search": self.ef_search}
+
+    def get_index_body(self) -> Dict[str, Any]:
+        """
+        Returns the body of the create index request. String metadata is mapped to keyword fields, so that the term
+        filters built by to_opensearch_filter match them exactly.
+        """
+        return {
+            "settings": {
+                "index": {
+                    "knn": True,
+                    "number_of_shards": self.number_of_shards,
+                    **self.get_dynamic_settings(),
+                }
+            },
+            "mappings": {
+                "dynamic_templates": [
+                    {
+                        "metadata_strings": {
+                            "path_match": f"{OPENSEARCH_METADATA_FIELD}.*",
+                            "match_mapping_type": "string",
+                            "mapping": {"type": "keyword"},
+                        }
+                    }
+                ],
+                "properties": {
+                    OPENSEARCH_TEXT_FIELD: {"type": "text"},
+                    OPENSEARCH_VECTOR_FIELD: self.get_vector_mapping(),
+                    OPENSEARCH_METADATA_FIELD: {"type": "object"},
+                    OPENSEARCH_CONTENT_HASH_FIELD: {"type": "keyword"},
+                },
+            },
+        }
+
+    def estimate_memory_bytes(self, number_of_vectors: int) -> float:
+        """
+        Estimates the memory the graphs of the index take on the domain, about
+        1.1 * (bytes per dimension * dimension + 8 * m) bytes per vector, for the primaries and each replica.
+
+        Args:
+            number_of_vectors (int): the number of indexed documents
+
+        Returns:
+            float: the estimated memory, in bytes
+        """
+        bytes_per_vector = BYTES_PER_DIMENSION[self.encoding] * self.dimension + BYTES_PER_GRAPH_EDGE * self.m
+        return KNN_GRAPH_MEMORY_OVERHEAD * bytes_per_vector * number_of_vectors * (1 + self.number_of_replicas)
+
+
+def get_static_changes(client: Any, index_name: str, config: KnnIndexConfig) -> List[str]:
+    """
+    Compares an existing index with a config, and returns the differences that cannot be applied in place.
+
+    Args:
+        client (Any): OpenSearch client
+        index_name (str): the existing index
+        config (KnnIndexConfig): the config to compare with
+
+    Returns:
+        List[str]: a description of each difference, empty when the index can be updated in place
+    """
+    index_mapping = next(iter(client.indices.get_mapping(index=index_name).values()))
+    current_mapping = index_mapping["mappings"]["properties"].get(OPENSEARCH_VECTOR_FIELD, {})
+    index_settings = next(iter(client.indices.get_settings(index=index_name).values()))["settings"]["index"]
+
+    expected_mapping = config.get_vector_mapping()
+    current_method = current_mapping.get("method", {})
+    current_values = {
+        "dimension": current_mapping.get("dimension"),
+        "data_type": current_mapping.get("data_type", "float"),
+        "engine": current_method.get("engine"),
+        "space_type": current_method.get("space_type"),
+        "parameters": current_method.get("parameters", {}),
+        "number_of_shards": int(index_settings.get("number_of_shards", 0)),
+    }
+    expected_values = {
+        "dimension": expected_mapping["dimension"],
+        "data_type": expected_mapping.get("data_type", "float"),
+        "engine": expected_mapping["method"]["engine"],
+        "space_type": expected_mapping["method"]["space_type"],
+        "parameters": expected_mapping["method"]["parameters"],
+        "number_of_shards": config.number_of_shards,
+    }
+    return [
+        f"{key}: {current_values[key]} -> {expected_values[key]}"
+        for key in expected_values
+        if current_values[key] != expected_values[key]
+    ]
+
+
+def create_or_update_index(client: Any, index_name: str, config: KnnIndexConfig) -> bool:
+    """
+    Creates the index from a config, or updates the dynamic settings of an existing index to the config. The content
+    hash field used by incremental ingestion is added to an existing index which lacks it.
+
+    Args:
+        client (Any): OpenSearch client
+        index_name (str): the index to create or update
+        config (KnnIndexConfig): the config of the index
+
+    Returns:
+        bool: True if the index was created, False if it was updated
+
+    Raises:
+        ValueError: if the existing index differs from the config in a way that requires a new index
+    """
+    if not client.indices.exists(index=index_name):
+        client.indices.create(index=index_name, body=config.get_index_body())
+        logger.info(f"Created index {index_name} with the vector mapping {config.get_vector_mapping()}")
+        return True
+
+    changes = get_static_changes(client, index_name, config)
+    if changes:
+        raise ValueError(
+            f"Index {index_name} differs from the config in settings that require a new index: {', '.join(changes)}"
+        )
+    client.indices.put_settings(index=index_name, body={"index": config.get_dynamic_settings()})
+    client.indices.put_mapping(
+        index=index_name, body={"properties": {OPENSEARCH_CONTENT_HASH_FIELD: {"type": "keyword"}}}
+    )
+    logger.info(f"Updated index {index_name} with the settings {config.get_dynamic_settings()}")
+    return False
+
+
+def swap_alias(client: Any, alias: str, index_name: str) -> List[str]:
+    """
+    Points an alias at an index, removing it from the indices it pointed at in the same atomic request, so that the
+    retrievers reading through the alias switch from the previous index to the new one without a failed search.
+
+    Args:
+        client (Any): OpenSearch client
+        alias (str): the alias read by the retrievers, the OPENSEARCH_INDEX_ID of the knowledge base
+        index_name (str): the index the alias points at from now on
+
+    Returns:
+        List[str]: the indices the alias pointed at before, which can be deleted
+
+    Raises:
+        ValueError: if the alias is the name of an index
+    """
+    if client.indices.exists_alias(name=alias):
+        previous_indices = [index for index in client.indices.get_alias(name=alias) if index != index_name]
+    elif client.indices.exists(index=alias):
+        raise ValueError(
+            f"{alias} is an index, it must be reindexed or deleted before an alias with the same name is created"
+        )
+    else:
+        previous_indices = []
+
+    actions = [{"remove": {"index": index, "alias": alias}} for index in previous_indices]
+    actions.append({"add": {"index": index_name, "alias": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    logger.info(f"Alias {alias} now points at index {index_name} instead of {previous_indices}")
+    return previous_indices
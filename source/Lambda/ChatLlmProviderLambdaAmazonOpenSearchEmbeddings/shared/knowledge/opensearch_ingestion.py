@@ -0,0 +1,717 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import boto3
+from aws_lambda_powertools import Logger
+from langchain.schema import Document
+from langchain_community.embeddings import SagemakerEndpointEmbeddings
+from opensearchpy import helpers
+from shared.knowledge.document_chunker import (
+    StreamingDocument,
+    StreamingTokenChunker,
+    iter_byte_stream_blocks,
+    iter_file_blocks,
+    iter_text_blocks,
+)
+from shared.knowledge.opensearch_connection import get_opensearch_client
+from shared.knowledge.opensearch_index import KnnIndexConfig, create_or_update_index, encode_vector, swap_alias
+from shared.knowledge.opensearch_knowledge_base import (
+    OPENSEARCH_HOST_ENV_VAR,
+    OPENSEARCH_PORT,
+    OPENSEARCH_SECRET_NAME_ENV_VAR,
+    OPENSEARCH_TIMEOUT,
+    SAGEMAKER_EMBEDDING_ENDPOINT,
+    ContentHandler,
+    get_secret,
+)
+from utils.constants import (
+    DEFAULT_INGESTION_BATCH_SIZE,
+    DEFAULT_INGESTION_CHUNK_OVERLAP,
+    DEFAULT_INGESTION_CHUNK_SIZE,
+    DEFAULT_INGESTION_WORKERS,
+    DEFAULT_VECTOR_ENCODING,
+    INGESTION_FILE_EXTENSIONS,
+    INGESTION_INITIAL_BACKOFF,
+    INGESTION_MAX_BACKOFF,
+    INGESTION_MAX_RETRIES,
+    INGESTION_READ_BLOCK_SIZE,
+    INGESTION_SOURCES_PAGE_SIZE,
+    OPENSEARCH_CONTENT_HASH_FIELD,
+    OPENSEARCH_INDEX_ID_ENV_VAR,
+    OPENSEARCH_MAX_TERMS_COUNT,
+    OPENSEARCH_METADATA_FIELD,
+    OPENSEARCH_TEXT_FIELD,
+    OPENSEARCH_VECTOR_FIELD,
+    REBUILD_INDEX_SUFFIX_FORMAT,
+)
+
+logger = Logger(utc=True)
+
+SOURCE_METADATA_KEY = "source"
+VERSION_METADATA_KEY = "version"
+DELETED_CHECKPOINT_KEY = "deleted"
+START_OFFSET_METADATA_KEY = "start_offset"
+END_OFFSET_METADATA_KEY = "end_offset"
+TOKEN_COUNT_METADATA_KEY = "token_count"
+S3_URI_PREFIX = "s3://"
+
+
+def iter_local_documents(
+    path: str, extensions: Optional[List[str]] = INGESTION_FILE_EXTENSIONS
+) -> Iterator[StreamingDocument]:
+    """
+    Lists the text files under a local path, in a stable order. A file is read in blocks when it is chunked.
+
+    Args:
+        path (str): a file or a directory, walked recursively
+        extensions (List[str]): the extensions of the files to read
+
+    Yields:
+        StreamingDocument: a file, with its path as source and its modification time as version
+    """
+    if os.path.isfile(path):
+        file_paths = [path]
+    else:
+        file_paths = sorted(
+            os.path.join(directory, file_name)
+            for directory, _, file_names in os.walk(path)
+            for file_name in file_names
+            if os.path.splitext(file_name)[1].lower() in extensions
+        )
+    for file_path in file_paths:
+        yield StreamingDocument(
+            metadata={SOURCE_METADATA_KEY: file_path, VERSION_METADATA_KEY: str(os.path.getmtime(file_path))},
+            read_blocks=lambda file_path=file_path: iter_file_blocks(file_path),
+        )
+
+
+def iter_s3_documents(
+    uri: str, extensions: Optional[List[str]] = INGESTION_FILE_EXTENSIONS, s3_client: Optional[Any] = None
+) -> Iterator[StreamingDocument]:
+    """
+    Lists the text objects under an S3 prefix, page by page, without listing the whole prefix first. An object is
+    downloaded in blocks when it is chunked, so the objects of completed documents are not downloaded at all.
+
+    Args:
+        uri (str): s3://bucket/prefix
+        extensions (List[str]): the extensions of the objects to read
+        s3_client (Any): S3 client [optional, defaults to a new client]
+
+    Yields:
+        StreamingDocument: an object, with its URI as source and its ETag as version
+    """
+    bucket, _, prefix = uri[len(S3_URI_PREFIX) :].partition("/")
+    s3_client = s3_client or boto3.client("s3")
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for s3_object in page.get("Contents", []):
+            if os.path.splitext(s3_object["Key"])[1].lower() not in extensions:
+                continue
+            yield StreamingDocument(
+                metadata={
+                    SOURCE_METADATA_KEY: f"{S3_URI_PREFIX}{bucket}/{s3_object['Key']}",
+                    VERSION_METADATA_KEY: s3_object["ETag"].strip('"'),
+                },
+                read_blocks=lambda key=s3_object["Key"]: iter_byte_stream_blocks(
+                    s3_client.get_object(Bucket=bucket, Key=key)["Body"].iter_chunks(INGESTION_READ_BLOCK_SIZE)
+                ),
+            )
+
+
+def iter_documents(location: str) -> Iterator[StreamingDocument]:
+    """
+    Lists the documents of an S3 URI or of a local path.
+    """
+    if location.startswith(S3_URI_PREFIX):
+        return iter_s3_documents(location)
+    return iter_local_documents(location)
+
+
+def with_retries(function: Callable, *args: Any, description: Optional[str] = "request") -> Any:
+    """
+    Calls a function, retrying it with exponential backoff when it raises, up to INGESTION_MAX_RETRIES times.
+
+    Raises:
+        Exception: the error of the last attempt
+    """
+    backoff = INGESTION_INITIAL_BACKOFF
+    for attempt in range(INGESTION_MAX_RETRIES + 1):
+        try:
+            return function(*args)
+        except Exception as ex:
+            if attempt == INGESTION_MAX_RETRIES:
+                raise
+            logger.warning(f"{description} failed, retrying in {backoff}s. Error: {ex}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, INGESTION_MAX_BACKOFF)
+
+
+class IngestionCheckpoint:
+    """
+    IngestionCheckpoint records the documents fully written to the index in an append-only JSON lines file, so that an
+    interrupted run resumes after them. A document is skipped only when the same version was written, so a document
+    changed since is written again. Sources deleted from the index are recorded as well, so they are written again if
+    they reappear.
+
+    Attributes:
+        path (str): the checkpoint file, no checkpoint when None
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._completed: Set[Tuple[str, str]] = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as checkpoint_file:
+                for line in checkpoint_file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get(DELETED_CHECKPOINT_KEY):
+                            self._discard(entry[SOURCE_METADATA_KEY])
+                        else:
+                            self._completed.add((entry[SOURCE_METADATA_KEY], entry[VERSION_METADATA_KEY]))
+
+    @property
+    def path(self) -> Optional[str]:
+        return self._path
+
+    def _discard(self, source: str) -> None:
+        self._completed = {completed for completed in self._completed if completed[0] != source}
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as checkpoint_file:
+                checkpoint_file.write(json.dumps(entry) + "\n")
+
+    def is_completed(self, document: Document) -> bool:
+        return (document.metadata[SOURCE_METADATA_KEY], document.metadata[VERSION_METADATA_KEY]) in self._completed
+
+    def complete(self, source: str, version: str) -> None:
+        with self._lock:
+            self._completed.add((source, version))
+            self._append({SOURCE_METADATA_KEY: source, VERSION_METADATA_KEY: version})
+
+    def delete(self, source: str) -> None:
+        with self._lock:
+            self._discard(source)
+            self._append({SOURCE_METADATA_KEY: source, DELETED_CHECKPOINT_KEY: True})
+
+
+class OpenSearchIngestionPipeline:
+    """
+    OpenSearchIngestionPipeline indexes documents in the index searched by OpenSearchKnowledgeBase. Documents are
+    read from their source in blocks and split into chunks of tokens as they are read, chunks are grouped into batches,
+    and each batch is embedded in a single SageMaker call and written in a single _bulk request. No document is held
+    in memory whole, only the hashes of its chunks. Batches are processed by concurrent workers, with at
+    most two batches per worker in memory. Failed calls are retried with exponential backoff, and completed documents
+    are recorded in the checkpoint so an interrupted run resumes where it stopped. Refreshes of the index are turned off
+    while it is loaded.
+
+    Chunk ids are derived from the source and the SHA-256 hash of the chunk text, which is stored in the content_hash
+    field. In incremental mode, the ids of a batch are looked up with one _mget request first and only the chunks not
+    already in the index are embedded and written. Once all chunks of a changed document are written, its chunks with
+    a hash no longer produced by the document are deleted, and with delete_missing the chunks of the sources no longer
+    listed are deleted at the end of the run.
+
+    Attributes:
+        client (Any): OpenSearch client
+        embeddings (Any): embeddings of the knowledge base, e.g. SagemakerEndpointEmbeddings with its ContentHandler
+        index_name (str): the index to write to
+        chunk_size (int): tokens per chunk [optional, defaults to DEFAULT_INGESTION_CHUNK_SIZE]
+        chunk_overlap (int): tokens shared by consecutive chunks [optional, defaults to DEFAULT_INGESTION_CHUNK_OVERLAP]
+        batch_size (int): chunks per embedding call and _bulk request
+            [optional, defaults to DEFAULT_INGESTION_BATCH_SIZE]
+        max_workers (int): batches processed concurrently [optional, defaults to DEFAULT_INGESTION_WORKERS]
+        vector_encoding (str): encoding of the vector field of the index
+            [optional, defaults to DEFAULT_VECTOR_ENCODING]
+        checkpoint (IngestionCheckpoint): the completed documents [optional, defaults to no checkpoint file]
+        incremental (bool): skips the unchanged chunks and deletes the stale ones [optional, defaults to True]
+
+    Methods:
+        ingest(documents, delete_missing): Indexes the documents, returns the number of chunks written
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        embeddings: Any,
+        index_name: str,
+        chunk_size: Optional[int] = DEFAULT_INGESTION_CHUNK_SIZE,
+        chunk_overlap: Optional[int] = DEFAULT_INGESTION_CHUNK_OVERLAP,
+        batch_size: Optional[int] = DEFAULT_INGESTION_BATCH_SIZE,
+        max_workers: Optional[int] = DEFAULT_INGESTION_WORKERS,
+        vector_encoding: Optional[str] = DEFAULT_VECTOR_ENCODING,
+        checkpoint: Optional[IngestionCheckpoint] = None,
+        incremental: Optional[bool] = True,
+    ) -> None:
+        self._client = client
+        self._embeddings = embeddings
+        self._index_name = index_name
+        self._chunker = StreamingTokenChunker(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._batch_size = int(batch_size)
+        self._max_workers = int(max_workers)
+        self._vector_encoding = vector_encoding
+        self._checkpoint = checkpoint or IngestionCheckpoint()
+        self._incremental = bool(incremental)
+        self._pending_chunks: Dict[Tuple[str, str], int] = {}
+        self._document_hashes: Dict[Tuple[str, str], Set[str]] = {}
+        self._pending_lock = threading.Lock()
+        self._seen_sources: Set[str] = set()
+        self._skipped_chunks = 0
+        self._deleted_chunks = 0
+
+    @property
+    def index_name(self) -> str:
+        return self._index_name
+
+    @property
+    def batch_size(self) -> int:
+        return self._batch_size
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @property
+    def checkpoint(self) -> IngestionCheckpoint:
+        return self._checkpoint
+
+    @property
+    def incremental(self) -> bool:
+        return self._incremental
+
+    @property
+    def skipped_chunks(self) -> int:
+        return self._skipped_chunks
+
+    @property
+    def deleted_chunks(self) -> int:
+        return self._deleted_chunks
+
+    @staticmethod
+    def get_content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def get_chunk_id(source: str, content_hash: str) -> str:
+        return hashlib.sha1(f"{source}#{content_hash}".encode("utf-8")).hexdigest()
+
+    def iter_batches(self, documents: Iterable[Union[Document, StreamingDocument]]) -> Iterator[List[Document]]:
+        """
+        Splits the documents not yet completed into chunks as their text is read, and groups the chunks into batches.
+        Chunks repeated within a document are written once. Each document holds one pending chunk until it is fully
+        split, so that it is completed once its last chunk is written and not before.
+
+        Args:
+            documents (Iterable[Union[Document, StreamingDocument]]): the documents to index
+
+        Yields:
+            List[Document]: batches of batch_size chunks, the last one possibly smaller
+        """
+        batch = []
+        for document in documents:
+            source = document.metadata[SOURCE_METADATA_KEY]
+            version = document.metadata[VERSION_METADATA_KEY]
+            self._seen_sources.add(source)
+            if self.checkpoint.is_completed(document):
+                continue
+            key = (source, version)
+            content_hashes = set()
+            with self._pending_lock:
+                self._pending_chunks[key] = 1
+                self._document_hashes[key] = content_hashes
+            for chunk in self._chunker.chunk(iter_text_blocks(document)):
+                content_hash = self.get_content_hash(chunk.text)
+                if content_hash in content_hashes:
+                    continue
+                content_hashes.add(content_hash)
+                with self._pending_lock:
+                    self._pending_chunks[key] += 1
+                batch.append(
+                    Document(
+                        page_content=chunk.text,
+                        metadata={
+                            SOURCE_METADATA_KEY: source,
+                            VERSION_METADATA_KEY: version,
+                            OPENSEARCH_CONTENT_HASH_FIELD: content_hash,
+                            START_OFFSET_METADATA_KEY: chunk.start_offset,
+                            END_OFFSET_METADATA_KEY: chunk.end_offset,
+                            TOKEN_COUNT_METADATA_KEY: chunk.token_count,
+                        },
+                    )
+                )
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+            self.release_chunks([key])
+        if batch:
+            yield batch
+
+    def release_chunks(self, keys: List[Tuple[str, str]]) -> None:
+        """
+        Releases a pending chunk of each (source, version) key, and completes the documents left without any: their
+        stale chunks are deleted and they are recorded in the checkpoint.
+        """
+        with self._pending_lock:
+            completed = []
+            for key in keys:
+                self._pending_chunks[key] -= 1
+                if not self._pending_chunks[key]:
+                    del self._pending_chunks[key]
+                    completed.append((key, self._document_hashes.pop(key)))
+        for (source, version), content_hashes in completed:
+            self.delete_stale_chunks(source, content_hashes)
+            self.checkpoint.complete(source, version)
+
+    def get_existing_ids(self, ids: List[str]) -> Set[str]:
+        """
+        Looks up chunk ids in the index with one _mget request, without fetching their source.
+
+        Args:
+            ids (List[str]): the chunk ids
+
+        Returns:
+            Set[str]: the ids found in the index
+        """
+        response = with_retries(
+            lambda: self._client.mget(index=self.index_name, body={"ids": ids}, _source=False),
+            description="Multi get request",
+        )
+        return {document["_id"] for document in response["docs"] if document.get("found")}
+
+    def delete_stale_chunks(self, source: str, content_hashes: Collection[str]) -> int:
+        """
+        Deletes the chunks of a source whose hash is not one of the current chunks of the source. Does nothing outside
+        of incremental mode. The current hashes are excluded in the delete query itself, unless there are more of them
+        than a terms query takes: the chunks of the source are then paged by hash and the stale ones deleted by id.
+
+        Args:
+            source (str): the source of the document
+            content_hashes (Collection[str]): the hashes of the current chunks of the document
+
+        Returns:
+            int: the number of chunks deleted
+        """
+        if not self.incremental:
+            return 0
+        source_filter = {"term": {f"{OPENSEARCH_METADATA_FIELD}.{SOURCE_METADATA_KEY}": source}}
+        if len(content_hashes) > OPENSEARCH_MAX_TERMS_COUNT:
+            deleted = self._delete_stale_chunks_by_id(source_filter, content_hashes)
+        else:
+            query = {"bool": {"filter": [source_filter]}}
+            if content_hashes:
+                query["bool"]["must_not"] = [{"terms": {OPENSEARCH_CONTENT_HASH_FIELD: sorted(content_hashes)}}]
+            response = with_retries(
+                lambda: self._client.delete_by_query(index=self.index_name, body={"query": query}, conflicts="proceed"),
+                description="Delete by query request",
+            )
+            deleted = response.get("deleted", 0)
+        with self._pending_lock:
+            self._deleted_chunks += deleted
+        return deleted
+
+    def _delete_stale_chunks_by_id(self, source_filter: Dict, content_hashes: Collection[str]) -> int:
+        body = {
+            "size": INGESTION_SOURCES_PAGE_SIZE,
+            "query": {"bool": {"filter": [source_filter]}},
+            "_source": [OPENSEARCH_CONTENT_HASH_FIELD],
+            "sort": [{OPENSEARCH_CONTENT_HASH_FIELD: "asc"}],
+        }
+        deleted = 0
+        while True:
+            hits = self._client.search(index=self.index_name, body=body)["hits"]["hits"]
+            stale_ids = [
+                hit["_id"]
+                for hit in hits
+                if hit["_source"].get(OPENSEARCH_CONTENT_HASH_FIELD) not in content_hashes
+            ]
+            if stale_ids:
+                actions = [{"_op_type": "delete", "_index": self.index_name, "_id": chunk_id} for chunk_id in stale_ids]
+                deleted += with_retries(
+                    lambda: helpers.bulk(self._client, actions, raise_on_error=False)[0],
+                    description="Bulk delete request",
+                )
+            if len(hits) < INGESTION_SOURCES_PAGE_SIZE:
+                return deleted
+            body["search_after"] = hits[-1]["sort"]
+
+    def delete_missing_sources(self) -> List[str]:
+        """
+        Deletes the chunks of the sources in the index that were not listed in the documents of this run. Sources are
+        paged with a composite aggregation, so the index is never read whole.
+
+        Returns:
+            List[str]: the deleted sources
+        """
+        source_field = f"{OPENSEARCH_METADATA_FIELD}.{SOURCE_METADATA_KEY}"
+        composite = {"size": INGESTION_SOURCES_PAGE_SIZE, "sources": [{"source": {"terms": {"field": source_field}}}]}
+        missing_sources = []
+        while True:
+            response = self._client.search(
+                index=self.index_name, body={"size": 0, "aggs": {"sources": {"composite": composite}}}
+            )
+            aggregation = response["aggregations"]["sources"]
+            missing_sources.extend(
+                bucket["key"]["source"]
+                for bucket in aggregation["buckets"]
+                if bucket["key"]["source"] not in self._seen_sources
+            )
+            if len(aggregation["buckets"]) < INGESTION_SOURCES_PAGE_SIZE or "after_key" not in aggregation:
+                break
+            composite["after"] = aggregation["after_key"]
+
+        for start in range(0, len(missing_sources), INGESTION_SOURCES_PAGE_SIZE):
+            sources = missing_sources[start : start + INGESTION_SOURCES_PAGE_SIZE]
+            response = with_retries(
+                lambda: self._client.delete_by_query(
+                    index=self.index_name, body={"query": {"terms": {source_field: sources}}}, conflicts="proceed"
+                ),
+                description="Delete by query request",
+            )
+            self._deleted_chunks += response.get("deleted", 0)
+            for source in sources:
+                self.checkpoint.delete(source)
+        return missing_sources
+
+    def write_batch(self, batch: List[Document]) -> int:
+        """
+        Embeds a batch of chunks in one call and writes them in one _bulk request, then completes the documents whose
+        chunks are all written. In incremental mode, chunks already in the index are skipped, and the stale chunks of
+        the completed documents are deleted.
+
+        Args:
+            batch (List[Document]): the chunks to write
+
+        Returns:
+            int: the number of chunks written
+        """
+        ids = [
+            self.get_chunk_id(chunk.metadata[SOURCE_METADATA_KEY], chunk.metadata[OPENSEARCH_CONTENT_HASH_FIELD])
+            for chunk in batch
+        ]
+        existing_ids = self.get_existing_ids(ids) if self.incremental else set()
+        new_chunks = [(chunk_id, chunk) for chunk_id, chunk in zip(ids, batch) if chunk_id not in existing_ids]
+
+        written = 0
+        if new_chunks:
+            texts = [chunk.page_content for _, chunk in new_chunks]
+            vectors = with_retries(self._embeddings.embed_documents, texts, len(texts), description="Embedding request")
+            actions = [
+                {
+                    "_index": self.index_name,
+                    "_id": chunk_id,
+                    OPENSEARCH_TEXT_FIELD: chunk.page_content,
+                    OPENSEARCH_VECTOR_FIELD: encode_vector(vector, self._vector_encoding),
+                    OPENSEARCH_CONTENT_HASH_FIELD: chunk.metadata[OPENSEARCH_CONTENT_HASH_FIELD],
+                    OPENSEARCH_METADATA_FIELD: {
+                        key: chunk.metadata[key]
+                        for key in (
+                            SOURCE_METADATA_KEY,
+                            START_OFFSET_METADATA_KEY,
+                            END_OFFSET_METADATA_KEY,
+                            TOKEN_COUNT_METADATA_KEY,
+                        )
+                    },
+                }
+                for (chunk_id, chunk), vector in zip(new_chunks, vectors)
+            ]
+            # 429 responses of single documents are retried by the bulk helper, errors of the request by with_retries
+            written, _ = with_retries(
+                lambda: helpers.bulk(
+                    self._client,
+                    actions,
+                    max_retries=INGESTION_MAX_RETRIES,
+                    initial_backoff=INGESTION_INITIAL_BACKOFF,
+                    max_backoff=INGESTION_MAX_BACKOFF,
+                ),
+                description="Bulk request",
+            )
+
+        with self._pending_lock:
+            self._skipped_chunks += len(existing_ids)
+        self.release_chunks(
+            [(chunk.metadata[SOURCE_METADATA_KEY], chunk.metadata[VERSION_METADATA_KEY]) for chunk in batch]
+        )
+        return written
+
+    def ingest(self, documents: Iterable[Document], delete_missing: Optional[bool] = False) -> int:
+        """
+        Indexes the documents, with max_workers batches in flight. The refresh interval of the index is restored, and
+        the index refreshed, once the documents are written or the run fails.
+
+        Args:
+            documents (Iterable[Document]): the documents to index, e.g. from iter_documents
+            delete_missing (bool): deletes the chunks of the sources not in the documents, which must then list every
+                source of the index [optional, defaults to False]
+
+        Returns:
+            int: the number of chunks written
+
+        Raises:
+            Exception: the error of the first batch that failed after its retries
+        """
+        start_time = time.perf_counter()
+        index_settings = next(iter(self._client.indices.get_settings(index=self.index_name).values()))
+        refresh_interval = index_settings["settings"]["index"].get("refresh_interval")
+        self._client.indices.put_settings(index=self.index_name, body={"index": {"refresh_interval": "-1"}})
+
+        written = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                in_flight = set()
+                for batch in self.iter_batches(documents):
+                    if len(in_flight) >= 2 * self.max_workers:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        written += sum(future.result() for future in done)
+                    in_flight.add(executor.submit(self.write_batch, batch))
+                written += sum(future.result() for future in in_flight)
+            if delete_missing:
+                self.delete_missing_sources()
+        finally:
+            self._client.indices.put_settings(
+                index=self.index_name, body={"index": {"refresh_interval": refresh_interval}}
+            )
+            self._client.indices.refresh(index=self.index_name)
+
+        logger.info(
+            f"Wrote {written} chunks to index {self.index_name} in {time.perf_counter() - start_time:.1f}s, skipped "
+            f"{self.skipped_chunks} unchanged chunks and deleted {self.deleted_chunks} stale chunks"
+        )
+        return written
+
+
+def rebuild_index(
+    client: Any,
+    embeddings: Any,
+    alias: str,
+    config: KnnIndexConfig,
+    documents: Iterable[Document],
+    index_name: Optional[str] = None,
+    delete_previous: Optional[bool] = True,
+    **kwargs: Any,
+) -> str:
+    """
+    Rebuilds the index behind an alias blue/green: the documents are written to a new index, created from the
+    declarative config, and the alias is swapped to it in one atomic request once it is complete. Retrievers reading
+    through the alias never see a partially built index, and a failed rebuild leaves the alias on the previous index.
+
+    Args:
+        client (Any): OpenSearch client
+        embeddings (Any): embeddings of the knowledge base
+        alias (str): the alias searched by the knowledge base, i.e. its OPENSEARCH_INDEX_ID
+        config (KnnIndexConfig): the config of the new index
+        documents (Iterable[Document]): all documents of the knowledge base
+        index_name (str): the new index, to resume an interrupted rebuild [optional, defaults to a timestamped name]
+        delete_previous (bool): deletes the indices the alias pointed to [optional, defaults to True]
+        **kwargs: other arguments of OpenSearchIngestionPipeline, e.g. batch_size or checkpoint
+
+    Returns:
+        str: the name of the new index
+    """
+    index_name = index_name or f"{alias}-{time.strftime(REBUILD_INDEX_SUFFIX_FORMAT, time.gmtime())}"
+    create_or_update_index(client, index_name, config)
+    pipeline = OpenSearchIngestionPipeline(
+        client, embeddings, index_name, vector_encoding=config.encoding, incremental=False, **kwargs
+    )
+    pipeline.ingest(documents)
+
+    previous_indices = swap_alias(client, alias, index_name)
+    if delete_previous and previous_indices:
+        client.indices.delete(index=",".join(previous_indices))
+    return index_name
+
+
+def main() -> None:
+    """
+    Indexes the documents of a local path or S3 prefix in the index of the knowledge base, configured with the same
+    environment variables as the lambda, e.g.
+
+        python -m shared.knowledge.opensearch_ingestion s3://bucket/prefix --checkpoint ingestion.checkpoint
+
+    With --rebuild, --index is an alias and all documents are written to a new index the alias is then swapped to.
+    """
+    parser = argparse.ArgumentParser(description="Indexes documents in the OpenSearch index of the knowledge base")
+    parser.add_argument("location", help="local file or directory, or s3://bucket/prefix")
+    parser.add_argument("--index", default=os.environ.get(OPENSEARCH_INDEX_ID_ENV_VAR))
+    parser.add_argument("--index-config", help="JSON file with the declarative KnnIndexConfig of the index")
+    parser.add_argument("--checkpoint", help="checkpoint file, an interrupted run resumes from it")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_INGESTION_CHUNK_SIZE, help="tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=DEFAULT_INGESTION_CHUNK_OVERLAP, help="tokens of overlap")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_INGESTION_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_INGESTION_WORKERS)
+    parser.add_argument("--delete-missing", action="store_true", help="deletes the sources no longer in location")
+    parser.add_argument("--rebuild", action="store_true", help="rebuilds the index behind the --index alias")
+    parser.add_argument("--rebuild-index", help="the new index of an interrupted rebuild to resume")
+    args = parser.parse_args()
+    if args.rebuild and not args.index_config:
+        parser.error("--rebuild requires --index-config")
+
+    secret = get_secret(os.environ[OPENSEARCH_SECRET_NAME_ENV_VAR])
+    client = get_opensearch_client(
+        os.environ[OPENSEARCH_HOST_ENV_VAR],
+        OPENSEARCH_PORT,
+        (secret["username"], secret["password"]),
+        use_ssl=True,
+        verify_certs=True,
+        timeout=OPENSEARCH_TIMEOUT,
+    )
+    index_config = None
+    if args.index_config:
+        with open(args.index_config) as index_config_file:
+            index_config = KnnIndexConfig.from_dict(json.load(index_config_file))
+    embeddings = SagemakerEndpointEmbeddings(
+        endpoint_name=os.environ[SAGEMAKER_EMBEDDING_ENDPOINT],
+        region_name=os.environ["AWS_REGION"],
+        content_handler=ContentHandler(),
+    )
+    pipeline_kwargs = {
+        "chunk_size": args.chunk_size,
+        "chunk_overlap": args.chunk_overlap,
+        "batch_size": args.batch_size,
+        "max_workers": args.workers,
+        "checkpoint": IngestionCheckpoint(args.checkpoint),
+    }
+
+    if args.rebuild:
+        rebuild_index(
+            client,
+            embeddings,
+            args.index,
+            index_config,
+            iter_documents(args.location),
+            index_name=args.rebuild_index,
+            **pipeline_kwargs,
+        )
+        return
+
+    vector_encoding = DEFAULT_VECTOR_ENCODING
+    if index_config:
+        create_or_update_index(client, args.index, index_config)
+        vector_encoding = index_config.encoding
+    pipeline = OpenSearchIngestionPipeline(
+        client, embeddings, args.index, vector_encoding=vector_encoding, **pipeline_kwargs
+    )
+    pipeline.ingest(iter_documents(args.location), delete_missing=args.delete_missing)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,30 @@ import boto3
 import time
 from opensearchpy import OpenSearch
 from shared.knowledge.knowledge_base import KnowledgeBase
+from shared.knowledge.metadata_filter import build_metadata_filter
+from shared.knowledge.opensearch_connection import get_opensearch_client, prime_opensearch
 from shared.knowledge.opensearch_retriever import CustomOpenSearchRetriever
-from utils.constants import DEFAULT_OPENSEARCH_NUMBER_OF_DOCS, DEFAULT_RETURN_SOURCE_DOCS, OPENSEARCH_INDEX_ID_ENV_VAR
+from utils.constants import (
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_OPENSEARCH_EFFICIENT_FILTER,
+    DEFAULT_OPENSEARCH_KNN_WARMUP,
+    DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
+    DEFAULT_OPENSEARCH_PRIME_CONNECTION,
+    DEFAULT_OPENSEARCH_REQUEST_CACHE,
+    DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+    DEFAULT_OPENSEARCH_SESSION_PREFERENCE,
+    DEFAULT_OPENSEARCH_TERMINATE_AFTER,
+    DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+    DEFAULT_RETURN_SOURCE_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    DEFAULT_VECTOR_ENCODING,
+    OPENSEARCH_INDEX_ID_ENV_VAR,
+    USER_ID_EVENT_KEY,
+)
 from utils.enum_types import KnowledgeBaseTypes
 from langchain_community.vectorstores import OpenSearchVectorSearch 
 from typing import Any, Dict, List, Optional, Sequence
@@ -75,6 +97,27 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
 
         index_name (str): OpenSearch index name
         number_of_docs (int): Number of documents to query for [Optional]
+        min_score (float): Score below which a retrieved document is dropped [Optional]
+        min_number_of_docs (int): Number of documents kept whatever their scores [Optional]
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap [Optional]
+        search_type (str): "similarity" or "mmr" to rerank fetch_k candidates by maximal marginal relevance [Optional]
+        fetch_k (int): Number of candidates reranked by maximal marginal relevance [Optional]
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance [Optional]
+        metadata_filter (Dict): Filter on the document metadata, from MetadataFilter and UserAttributeMapping [Optional]
+        search_template_id (str): Id of a stored search template run in place of the query [Optional]
+        request_cache (bool): Whether the results are cached in the shard request cache [Optional]
+        preference (str): The user id when SessionPreference is set, so that the searches of a user hit the same shard
+            copies and their caches [Optional]
+        track_total_hits (bool): Whether the total number of hits is counted [Optional]
+        search_timeout (str): Time after which a search returns its partial results [Optional]
+        terminate_after (int): Documents collected per shard before a search stops early [Optional]
+        prime_connection (bool): Whether a pooled connection is opened when a container first sets up the knowledge base
+            [Optional]
+        knn_warmup (bool): Whether the k-NN graphs of the index are loaded in memory when a container starts, at most
+            once per KNN_WARMUP_INTERVAL [Optional]
+        vector_encoding (str): Encoding of the vector field of the index, as set by its KnnIndexConfig [Optional]
+        efficient_filter (bool): Whether the filter is applied inside the k-NN search, requires the lucene or faiss
+            engine, or as a bool filter of the k-NN query [Optional]
         retriever (CustomOpenSearchRetriever): Custom OpenSearch retriever
 
     Methods:
@@ -86,6 +129,7 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
     def __init__(
         self,
         opensearch_knowledge_base_params: Optional[Dict[str, Any]] = {},
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._check_env_variables()
         
@@ -108,6 +152,38 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
             "ReturnSourceDocs",
             DEFAULT_RETURN_SOURCE_DOCS,
         )
+        self.min_score = opensearch_knowledge_base_params.get("MinScore", DEFAULT_MIN_SCORE)
+        self.min_number_of_docs = opensearch_knowledge_base_params.get("MinNumberOfDocs", DEFAULT_MIN_NUMBER_OF_DOCS)
+        self.score_gap_cutoff = opensearch_knowledge_base_params.get("ScoreGapCutoff", DEFAULT_SCORE_GAP_CUTOFF)
+        self.search_type = opensearch_knowledge_base_params.get("SearchType", DEFAULT_SEARCH_TYPE)
+        self.fetch_k = opensearch_knowledge_base_params.get("FetchK", DEFAULT_MMR_FETCH_K)
+        self.lambda_mult = opensearch_knowledge_base_params.get("LambdaMult", DEFAULT_MMR_LAMBDA_MULT)
+        self.metadata_filter = build_metadata_filter(
+            opensearch_knowledge_base_params.get("MetadataFilter"),
+            opensearch_knowledge_base_params.get("UserAttributeMapping"),
+            user_context,
+        )
+        self.search_template_id = opensearch_knowledge_base_params.get("SearchTemplateId")
+        self.request_cache = opensearch_knowledge_base_params.get("RequestCache", DEFAULT_OPENSEARCH_REQUEST_CACHE)
+        session_preference = opensearch_knowledge_base_params.get(
+            "SessionPreference", DEFAULT_OPENSEARCH_SESSION_PREFERENCE
+        )
+        self.preference = (user_context or {}).get(USER_ID_EVENT_KEY) if session_preference else None
+        self.track_total_hits = opensearch_knowledge_base_params.get(
+            "TrackTotalHits", DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS
+        )
+        self.search_timeout = opensearch_knowledge_base_params.get("SearchTimeout", DEFAULT_OPENSEARCH_SEARCH_TIMEOUT)
+        self.terminate_after = opensearch_knowledge_base_params.get(
+            "TerminateAfter", DEFAULT_OPENSEARCH_TERMINATE_AFTER
+        )
+        self.prime_connection = opensearch_knowledge_base_params.get(
+            "PrimeConnection", DEFAULT_OPENSEARCH_PRIME_CONNECTION
+        )
+        self.knn_warmup = opensearch_knowledge_base_params.get("KnnWarmup", DEFAULT_OPENSEARCH_KNN_WARMUP)
+        self.vector_encoding = opensearch_knowledge_base_params.get("VectorEncoding", DEFAULT_VECTOR_ENCODING)
+        self.efficient_filter = opensearch_knowledge_base_params.get(
+            "EfficientFilter", DEFAULT_OPENSEARCH_EFFICIENT_FILTER
+        )
       
         # Initialize the ContentHandler
         content_handler = ContentHandler()
@@ -123,9 +199,42 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
                 opensearch_url="https://" + OPENSEARCH_HOST + ":443",
                 http_auth=OPENSEARCH_AUTH
             )
+        # the vector store searches with the client kept by the container, whose connections stay open across requests
+        self.docsearch.client = get_opensearch_client(
+            OPENSEARCH_HOST,
+            OPENSEARCH_PORT,
+            OPENSEARCH_AUTH,
+            use_ssl=OPENSEARCH_USE_SSL,
+            verify_certs=OPENSEARCH_VERIFY_CERTIFICATES,
+            timeout=OPENSEARCH_TIMEOUT,
+        )
+        prime_opensearch(
+            self.docsearch.client, self.index_id, prime_connection=self.prime_connection, knn_warmup=self.knn_warmup
+        )
       
         self.retriever = CustomOpenSearchRetriever(
-         index_id=self.index_id, top_k=self.number_of_docs, return_source_documents=self.return_source_documents,  docsearch=self.docsearch,embeddings=self.embeddings)
+            index_id=self.index_id,
+            top_k=self.number_of_docs,
+            return_source_documents=self.return_source_documents,
+            docsearch=self.docsearch,
+            embeddings=self.embeddings,
+            search_type=self.search_type,
+            fetch_k=self.fetch_k,
+            lambda_mult=self.lambda_mult,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+            metadata_filter=self.metadata_filter,
+            efficient_filter=self.efficient_filter,
+            search_template_id=self.search_template_id,
+            request_cache=self.request_cache,
+            preference=self.preference,
+            track_total_hits=self.track_total_hits,
+            search_timeout=self.search_timeout,
+            terminate_after=self.terminate_after,
+            vector_encoding=self.vector_encoding,
+        )
+
     def _check_env_variables(self) -> None:
         """
         Checks if the OpenSearch related environment variables exist.
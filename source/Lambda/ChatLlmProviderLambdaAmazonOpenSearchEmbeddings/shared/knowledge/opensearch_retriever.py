@@ -7,17 +7,42 @@ from typing import Any, Dict, List, Optional, Sequence
 from langchain_community.embeddings import SagemakerEndpointEmbeddings
 from langchain_community.embeddings.sagemaker_endpoint import EmbeddingsContentHandler
 from langchain_community.vectorstores import OpenSearchVectorSearch  
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from opensearchpy import exceptions as opensearch_exceptions
-from utils.constants import METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
-from utils.enum_types import CloudWatchNamespaces
+from shared.knowledge.maximal_marginal_relevance import maximal_marginal_relevance
+from shared.knowledge.metadata_filter import to_opensearch_filter
+from shared.knowledge.opensearch_index import encode_vector
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+from shared.knowledge.relevance_filter import select_relevant_documents
+from utils.constants import (
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_OPENSEARCH_EFFICIENT_FILTER,
+    DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
+    DEFAULT_OPENSEARCH_REQUEST_CACHE,
+    DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+    DEFAULT_OPENSEARCH_TERMINATE_AFTER,
+    DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    DEFAULT_VECTOR_ENCODING,
+    DOCUMENT_SCORE_METADATA_KEY,
+    OPENSEARCH_TEXT_FIELD,
+    OPENSEARCH_VECTOR_FIELD,
+    TRACE_ID_ENV_VAR,
+)
+from utils.enum_types import CloudWatchNamespaces, RetrievalSearchTypes
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.AWS_OPENSEARCH.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.AWS_OPENSEARCH)
 from enum import Enum
 
 
@@ -37,7 +62,25 @@ class CustomOpenSearchRetriever(BaseRetriever):
     Attributes:
         client (Any): OpenSearch client
         index_name (str): OpenSearch index name
-        top_k (int): Number of documents to return
+        top_k (int): Number of documents to fetch, the most returned
+        search_type (str): How documents are selected, by similarity or by maximal marginal relevance ("mmr")
+        fetch_k (int): Number of candidates fetched for maximal marginal relevance
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance
+        min_score (float): Score below which a fetched document is dropped, no threshold when None
+        min_number_of_docs (int): Number of documents returned whatever their scores
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap
+        metadata_filter (Dict): Filter on the document metadata, as built by build_metadata_filter, no filter when None
+        efficient_filter (bool): Whether the filter is applied inside the k-NN search (lucene and faiss engines), or as
+            a bool filter of the k-NN query
+        search_template_id (str): Id of a stored search template run in place of the k-NN query, with the params
+            query_vector, k and filter (the OpenSearch filter, rendered with toJson), no template when None
+        request_cache (bool): Whether the results are cached in the shard request cache
+        preference (str): Routes the searches with the same value to the same shard copies, no routing when None
+        track_total_hits (bool): Whether the total number of hits is counted
+        search_timeout (str): Time after which a search returns its partial results, no bound when None
+        terminate_after (int): Documents collected per shard before a search stops early, no bound when None
+        vector_encoding (str): Encoding of the vector field of the index, byte query vectors are encoded with
+            encode_vector
     """
 
     index_id: Any
@@ -45,25 +88,73 @@ class CustomOpenSearchRetriever(BaseRetriever):
     return_source_documents: bool
     docsearch: Any
     embeddings: Any
+    search_type: str
+    fetch_k: int
+    lambda_mult: float
+    min_score: Optional[float]
+    min_number_of_docs: int
+    score_gap_cutoff: bool
+    metadata_filter: Optional[Dict] = None
+    efficient_filter: bool = DEFAULT_OPENSEARCH_EFFICIENT_FILTER
+    search_template_id: Optional[str] = None
+    request_cache: bool = DEFAULT_OPENSEARCH_REQUEST_CACHE
+    preference: Optional[str] = None
+    track_total_hits: bool = DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS
+    search_timeout: Optional[str] = DEFAULT_OPENSEARCH_SEARCH_TIMEOUT
+    terminate_after: Optional[int] = DEFAULT_OPENSEARCH_TERMINATE_AFTER
+    vector_encoding: str = DEFAULT_VECTOR_ENCODING
+
     def __init__(
         self,
         index_id: Any,
         docsearch: Any,
         embeddings:Any,
-        top_k: Optional[int] = 10,
+        top_k: Optional[int] = DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
         return_source_documents: Optional[bool] = False,
+        search_type: Optional[str] = DEFAULT_SEARCH_TYPE,
+        fetch_k: Optional[int] = DEFAULT_MMR_FETCH_K,
+        lambda_mult: Optional[float] = DEFAULT_MMR_LAMBDA_MULT,
+        min_score: Optional[float] = DEFAULT_MIN_SCORE,
+        min_number_of_docs: Optional[int] = DEFAULT_MIN_NUMBER_OF_DOCS,
+        score_gap_cutoff: Optional[bool] = DEFAULT_SCORE_GAP_CUTOFF,
+        metadata_filter: Optional[Dict] = None,
+        efficient_filter: Optional[bool] = DEFAULT_OPENSEARCH_EFFICIENT_FILTER,
+        search_template_id: Optional[str] = None,
+        request_cache: Optional[bool] = DEFAULT_OPENSEARCH_REQUEST_CACHE,
+        preference: Optional[str] = None,
+        track_total_hits: Optional[bool] = DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+        search_timeout: Optional[str] = DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+        terminate_after: Optional[int] = DEFAULT_OPENSEARCH_TERMINATE_AFTER,
+        vector_encoding: Optional[str] = DEFAULT_VECTOR_ENCODING,
     ):
         super().__init__(
-            index_id=index_id, top_k=top_k, return_source_documents=return_source_documents
-        )  
+            index_id=index_id,
+            top_k=top_k,
+            return_source_documents=return_source_documents,
+            search_type=search_type,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            min_score=min_score,
+            min_number_of_docs=min_number_of_docs,
+            score_gap_cutoff=score_gap_cutoff,
+            metadata_filter=metadata_filter,
+            efficient_filter=efficient_filter,
+            search_template_id=search_template_id,
+            request_cache=request_cache,
+            preference=preference,
+            track_total_hits=track_total_hits,
+            search_timeout=search_timeout,
+            terminate_after=terminate_after,
+            vector_encoding=vector_encoding,
+        )
         self.index_id = index_id
         self.top_k = top_k
         self.return_source_documents = return_source_documents
         self.docsearch = docsearch
         self.embeddings = embeddings
 
-    @tracer.capture_method(capture_response=True)
-    @metrics.log_metrics
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def _get_relevant_documents(self, query: str) -> List[Document]:
         """
         Run search on OpenSearch index and get top k documents.
@@ -77,9 +168,7 @@ class CustomOpenSearchRetriever(BaseRetriever):
             subsegment.put_annotation("operation", "retrieve/query")
             metrics.add_metric(name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY.value, unit=MetricUnit.Count, value=1)
             try:
-                cleaned_docs = self._opensearch_query(query)
-                documents = [Document(page_content=doc) for doc in cleaned_docs]
-                return documents
+                return self._opensearch_query(query)
             except opensearch_exceptions.OpenSearchException as e:
                 logger.error(
                     f"OpenSearch query failed, returning empty docs. Query: {query}\nException: {e}",
@@ -91,20 +180,27 @@ class CustomOpenSearchRetriever(BaseRetriever):
 
             return []
 
-    @tracer.capture_method(capture_response=True)
-    def _opensearch_query(self, query: str):
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def _opensearch_query(self, query: str) -> List[Document]:
         """
-        Execute a query on the OpenSearch index and return a list of ResultItem-like responses.
+        Execute a query on the OpenSearch index and return a list of cleaned documents.
 
         Args:
             query (str): Query to search for in the OpenSearch index
 
         Returns:
-            Sequence[ResultItem]: List of OpenSearch query response items
+            List[Document]: List of cleaned documents
         """
         try:
             start_time = time.time()
-            response = self.docsearch.similarity_search(query, k=10)
+            if self.search_type == RetrievalSearchTypes.MMR.value:
+                response = self._max_marginal_relevance_search(query)
+            else:
+                search_response = self._search(
+                    self._get_knn_request(self.embeddings.embed_query(query), self.top_k, exclude_vectors=True)
+                )
+                response = [self._get_hit_document(hit) for hit in search_response["hits"]["hits"]]
             end_time = time.time()
             metrics.add_metric(
                 name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY_PROCESSING_TIME.value,
@@ -112,23 +208,204 @@ class CustomOpenSearchRetriever(BaseRetriever):
                 value=(end_time - start_time),
             )
 
-            cleaned_docs = self._get_clean_docs(response)
-            for doc in cleaned_docs:
-                print(doc)
-            return cleaned_docs
+            return select_relevant_documents(
+                self._get_clean_docs(response),
+                min_score=self.min_score,
+                min_number_of_docs=self.min_number_of_docs,
+                score_gap_cutoff=self.score_gap_cutoff,
+            )
 
         except opensearch_exceptions.OpenSearchException as e:
             logger.error(f"OpenSearch query failed: {e}")
             return []
   
-    def _get_clean_docs(self,docs):
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def get_relevant_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        """
+        Retrieves the documents of several queries in one round trip each to the embedding endpoint and to OpenSearch:
+        the queries are embedded in a single batched call, searched with a single _msearch (or _msearch/template)
+        request, and their results fused with reciprocal rank fusion. The queries are searched by similarity.
+
+        Args:
+            queries (List[str]): the question followed by the generated queries
+
+        Returns:
+            List[Document]: the top_k fused documents, best first
+        """
+        with tracer.provider.in_subsegment("## opensearch_query") as subsegment:
+            subsegment.put_annotation("service", "opensearch")
+            subsegment.put_annotation("operation", "retrieve/msearch")
+            metrics.add_metric(name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY.value, unit=MetricUnit.Count, value=1)
+            try:
+                start_time = time.time()
+                query_vectors = self.embeddings.embed_documents(queries)
+                body = []
+                for query_vector in query_vectors:
+                    body.append({"index": self.docsearch.index_name, **self._get_request_params()})
+                    body.append(self._get_knn_request(query_vector, self.top_k, exclude_vectors=True))
+                if self.search_template_id:
+                    response = self.docsearch.client.msearch_template(body=body)
+                else:
+                    response = self.docsearch.client.msearch(body=body)
+                end_time = time.time()
+                metrics.add_metric(
+                    name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY_PROCESSING_TIME.value,
+                    unit=MetricUnit.Seconds,
+                    value=(end_time - start_time),
+                )
+            except opensearch_exceptions.OpenSearchException as e:
+                logger.error(
+                    f"OpenSearch multi-query search failed, returning empty docs. Queries: {queries}\nException: {e}",
+                    xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
+                )
+                metrics.add_metric(
+                    name=OpenSearchCloudWatchMetrics.OPENSEARCH_FAILURES.value, unit=MetricUnit.Count, value=1
+                )
+                return []
+
+        ranked_lists = []
+        for query_response in response["responses"]:
+            docs = [self._get_hit_document(hit) for hit in query_response.get("hits", {}).get("hits", [])]
+            ranked_lists.append(
+                select_relevant_documents(
+                    self._get_clean_docs(docs),
+                    min_score=self.min_score,
+                    min_number_of_docs=self.min_number_of_docs,
+                    score_gap_cutoff=self.score_gap_cutoff,
+                )
+            )
+        return reciprocal_rank_fusion(ranked_lists, top_k=self.top_k)
+
+    def _get_knn_request(self, query_vector: List[float], k: int, exclude_vectors: Optional[bool] = False) -> Dict:
+        """
+        Builds the body of a k-NN search, or of a search template run when a stored template is configured. The body
+        carries the bounds of the search, and stops counting the total hits, which the retriever never reads. The query
+        vector is encoded like the vector field of the index.
+
+        Args:
+            query_vector (List[float]): the embedding of the query
+            k (int): the number of neighbours to search for
+            exclude_vectors (bool): whether the document vectors are left out of the response
+
+        Returns:
+            Dict: the body of the search, or of the search template run
+        """
+        query_vector = encode_vector(query_vector, self.vector_encoding)
+        if self.search_template_id:
+            params = {"query_vector": query_vector, "k": k}
+            if self.metadata_filter:
+                params["filter"] = to_opensearch_filter(self.metadata_filter)
+            return {"id": self.search_template_id, "params": params}
+
+        body = {"size": k, "query": self._get_knn_query(query_vector, k), "track_total_hits": self.track_total_hits}
+        if exclude_vectors:
+            body["_source"] = {"excludes": [OPENSEARCH_VECTOR_FIELD]}
+        if self.search_timeout:
+            body["timeout"] = self.search_timeout
+        if self.terminate_after:
+            body["terminate_after"] = self.terminate_after
+        return body
+
+    def _get_request_params(self) -> Dict[str, str]:
+        """
+        Returns the request parameters of a search, which are also the header fields of a multi-search. The request
+        cache is not available to search templates.
+        """
+        request_params = {}
+        if self.preference:
+            request_params["preference"] = self.preference
+        if self.request_cache and not self.search_template_id:
+            request_params["request_cache"] = "true"
+        return request_params
+
+    def _search(self, body: Dict) -> Dict:
+        """
+        Runs a search, or a search template when a stored template is configured, on the index.
+
+        Args:
+            body (Dict): the body built by _get_knn_request
+
+        Returns:
+            Dict: the search response
+        """
+        if self.search_template_id:
+            return self.docsearch.client.search_template(
+                index=self.docsearch.index_name, body=body, **self._get_request_params()
+            )
+        return self.docsearch.client.search(index=self.docsearch.index_name, body=body, **self._get_request_params())
+
+    def _get_hit_document(self, hit: Dict) -> Document:
+        """
+        Converts a search hit to a Document, with the hit score in its metadata.
+        """
+        source = hit.get("_source") or {}
+        return Document(
+            page_content=source.get(OPENSEARCH_TEXT_FIELD) or "",
+            metadata={**(source.get("metadata") or {}), DOCUMENT_SCORE_METADATA_KEY: hit.get("_score")},
+        )
+
+    def _get_knn_query(self, query_vector: List[float], k: int) -> Dict:
+        """
+        Builds the k-NN query of a vector. With a metadata filter, the filter is either applied while the vector index
+        is traversed, so that k documents matching it are returned, or as a bool filter around the k-NN query.
+
+        Args:
+            query_vector (List[float]): the embedding of the query
+            k (int): the number of neighbours to search for
+
+        Returns:
+            Dict: the query clause of the search request
+        """
+        knn_query = {"knn": {OPENSEARCH_VECTOR_FIELD: {"vector": query_vector, "k": k}}}
+        if not self.metadata_filter:
+            return knn_query
+        opensearch_filter = to_opensearch_filter(self.metadata_filter)
+        if self.efficient_filter:
+            knn_query["knn"][OPENSEARCH_VECTOR_FIELD]["filter"] = opensearch_filter
+            return knn_query
+        return {"bool": {"filter": opensearch_filter, "must": [knn_query]}}
+
+    def _max_marginal_relevance_search(self, query: str) -> List[Document]:
+        """
+        Fetches fetch_k candidates together with their vectors in a single k-NN query, and selects top_k of them by
+        maximal marginal relevance.
+
+        Args:
+            query (str): Query to search for in the OpenSearch index
+
+        Returns:
+            List[Document]: List of selected documents, in selection order
+        """
+        query_vector = self.embeddings.embed_query(query)
+        response = self._search(self._get_knn_request(query_vector, self.fetch_k))
+        hits = [hit for hit in response["hits"]["hits"] if hit.get("_source", {}).get(OPENSEARCH_VECTOR_FIELD)]
+        selected = maximal_marginal_relevance(
+            query_vector,
+            [hit["_source"][OPENSEARCH_VECTOR_FIELD] for hit in hits],
+            k=self.top_k,
+            lambda_mult=self.lambda_mult,
+        )
+        return [self._get_hit_document(hits[index]) for index in selected]
+
+    def _get_clean_docs(self, docs) -> List[Document]:
+        """
+        Parses and cleans the documents returned from OpenSearch. The document metadata (source, id) is only kept when
+        source documents are to be returned, the score is always kept.
+
+        Args:
+            docs (List[Document]): List of documents returned by the vector search
+
+        Returns:
+            List[Document]: List of cleaned documents
+        """
         cleaned_docs = []
-    
+
         for doc in docs:
-           
-           if hasattr(doc, 'page_content'):
-                cleaned_docs.append(doc.page_content)
-    
-        return cleaned_docs
+            if getattr(doc, "page_content", None):
+                metadata = dict(doc.metadata) if self.return_source_documents else {}
+                if DOCUMENT_SCORE_METADATA_KEY in doc.metadata:
+                    metadata[DOCUMENT_SCORE_METADATA_KEY] = doc.metadata[DOCUMENT_SCORE_METADATA_KEY]
+                cleaned_docs.append(Document(page_content=doc.page_content, metadata=metadata))
 
-    
\ No newline at end of file
+        return cleaned_docs
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+from typing import List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from utils.constants import (
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DOCUMENT_SCORE_METADATA_KEY,
+    SCORE_GAP_MIN_RATIO,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+
+def select_relevant_documents(
+    documents: List[Document],
+    min_score: Optional[float] = DEFAULT_MIN_SCORE,
+    min_number_of_docs: Optional[int] = DEFAULT_MIN_NUMBER_OF_DOCS,
+    score_gap_cutoff: Optional[bool] = DEFAULT_SCORE_GAP_CUTOFF,
+) -> List[Document]:
+    """
+    Adapts the number of retrieved documents to their scores, so that a question with a few clear matches does not
+    fill the context with weak ones. The documents, fetched up to the retriever's top_k, are ranked by score and cut
+    after the last one clearing min_score. With score_gap_cutoff, they are further cut at the largest drop between
+    two consecutive scores, when that drop is SCORE_GAP_MIN_RATIO times the mean of the other drops. At least
+    min_number_of_docs documents are always kept. Documents are returned unchanged when any of them carries no
+    score.
+
+    Args:
+        documents (List[Document]): the retrieved documents, with their score in the metadata
+        min_score (float): score below which a document is dropped, no threshold when None
+        min_number_of_docs (int): number of documents kept whatever their scores
+        score_gap_cutoff (bool): whether to cut the documents at the largest score gap
+
+    Returns:
+        List[Document]: the relevant documents, best first
+    """
+    scores = [(document.metadata or {}).get(DOCUMENT_SCORE_METADATA_KEY) for document in documents]
+    if not documents or any(score is None for score in scores):
+        return documents
+
+    scores = np.asarray(scores, dtype=np.float64)
+    ranking = np.argsort(-scores, kind="stable")
+    scores = scores[ranking]
+    min_number_of_docs = min(int(min_number_of_docs), len(documents))
+
+    kept = len(documents) if min_score is None else int((scores >= float(min_score)).sum())
+    if score_gap_cutoff and kept > max(min_number_of_docs, 1):
+        gaps = scores[: kept - 1] - scores[1:kept]
+        # a cut after position i keeps i + 1 documents, so positions keeping fewer than min_number_of_docs are skipped
+        offset = max(min_number_of_docs - 1, 0)
+        largest = offset + int(np.argmax(gaps[offset:]))
+        other_gaps = np.delete(gaps, largest)
+        if other_gaps.size and gaps[largest] > 0 and gaps[largest] >= SCORE_GAP_MIN_RATIO * other_gaps.mean():
+            kept = largest + 1
+
+    kept = max(kept, min_number_of_docs)
+    request_timer.set_flag(RequestFlags.RELEVANT_DOCUMENTS, kept)
+    return [documents[index] for index in ranking[:kept]]
@@ -14,7 +14,7 @@
 
 import os
 import time
-from typing import List
+from typing import List, Sequence
 
 from aws_lambda_powertools import Logger, Tracer
 from botocore.exceptions import ClientError
@@ -27,7 +27,9 @@ from langchain.schema import (
     messages_to_dict,
 )
 from utils.constants import DDB_MESSAGE_TTL_ENV_VAR, DEFAULT_DDB_MESSAGE_TTL, TRACE_ID_ENV_VAR
-from utils.enum_types import ConversationMemoryTypes
+from utils.enum_types import ConversationMemoryTypes, RequestStages
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
@@ -53,7 +55,8 @@ class DynamoDBChatMessageHistory(BaseChatMessageHistory):
         self.user_id = user_id
 
     @property
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def messages(self) -> List[BaseMessage]:  # type: ignore
         """Retrieve the messages from DynamoDB"""
 
@@ -65,11 +68,12 @@ class DynamoDBChatMessageHistory(BaseChatMessageHistory):
             subsegment.put_annotation("operation", "get_item")
 
             try:
-                response = self.table.get_item(
-                    Key={"UserId": self.user_id, "ConversationId": self.conversation_id},
-                    ProjectionExpression="History",
-                    ConsistentRead=True,
-                )
+                with request_timer.stage(RequestStages.MEMORY_READ):
+                    response = self.table.get_item(
+                        Key={"UserId": self.user_id, "ConversationId": self.conversation_id},
+                        ProjectionExpression="History",
+                        ConsistentRead=True,
+                    )
             except ClientError as err:
                 if err.response["Error"]["Code"] == "ResourceNotFoundException":
                     logger.warning(
@@ -106,15 +110,42 @@ class DynamoDBChatMessageHistory(BaseChatMessageHistory):
                 expiry_period = int(os.getenv(DDB_MESSAGE_TTL_ENV_VAR, DEFAULT_DDB_MESSAGE_TTL))
                 ttl = int(time.time()) + expiry_period
                 # update_item will put item if key does not exist
-                self.table.update_item(
-                    Key={
-                        "UserId": self.user_id,
-                        "ConversationId": self.conversation_id,
-                    },
-                    UpdateExpression="SET #History = :messages, #TTL = :ttl",
-                    ExpressionAttributeNames={"#History": "History", "#TTL": "TTL"},
-                    ExpressionAttributeValues={":messages": messages, ":ttl": ttl},
-                )
+                with request_timer.stage(RequestStages.MEMORY_WRITE):
+                    self.table.update_item(
+                        Key={
+                            "UserId": self.user_id,
+                            "ConversationId": self.conversation_id,
+                        },
+                        UpdateExpression="SET #History = :messages, #TTL = :ttl",
+                        ExpressionAttributeNames={"#History": "History", "#TTL": "TTL"},
+                        ExpressionAttributeValues={":messages": messages, ":ttl": ttl},
+                    )
+            except ClientError as err:
+                logger.error(err, xray_trace_id=os.environ[TRACE_ID_ENV_VAR],)
+
+    @tracer.capture_method
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """Append the messages to the record in DynamoDB with a single update, without reading the history first"""
+        # fmt: off
+        with tracer.provider.in_subsegment("## chat_history") as subsegment: # NOSONAR python:S1192 - subsegment name for x-ray tracing
+        # fmt: on
+            subsegment.put_annotation("service", "dynamodb")
+            subsegment.put_annotation("operation", "update_item")
+            try:
+                expiry_period = int(os.getenv(DDB_MESSAGE_TTL_ENV_VAR, DEFAULT_DDB_MESSAGE_TTL))
+                ttl = int(time.time()) + expiry_period
+                # list_append onto an empty list creates the history of a new conversation
+                with request_timer.stage(RequestStages.MEMORY_WRITE):
+                    self.table.update_item(
+                        Key={
+                            "UserId": self.user_id,
+                            "ConversationId": self.conversation_id,
+                        },
+                        UpdateExpression="SET #History = list_append(if_not_exists(#History, :empty), :messages), "
+                        "#TTL = :ttl",
+                        ExpressionAttributeNames={"#History": "History", "#TTL": "TTL"},
+                        ExpressionAttributeValues={":messages": messages_to_dict(messages), ":empty": [], ":ttl": ttl},
+                    )
             except ClientError as err:
                 logger.error(err, xray_trace_id=os.environ[TRACE_ID_ENV_VAR],)
 
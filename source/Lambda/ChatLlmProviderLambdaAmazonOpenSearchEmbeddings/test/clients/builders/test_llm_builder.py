@@ -52,6 +52,7 @@ def test_knowledge_base_builder(rag_enabled, llm_config, setup_environment):
         assert builder.knowledge_base.kendra_index_id == "fake-kendra-index-id"
         assert builder.knowledge_base.number_of_docs == 2
         assert builder.knowledge_base.return_source_documents == False
+        assert builder.knowledge_base.retriever_callbacks is None
     else:
         assert builder.knowledge_base == None
 
@@ -15,11 +15,15 @@
 import json
 import os
 from copy import deepcopy
+from unittest import mock
 
 import pytest
 from clients.factories.knowledge_base_factory import KnowledgeBaseFactory
+from langchain.schema import Document
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
-from utils.constants import DEFAULT_HUGGINGFACE_PROMPT, KENDRA_INDEX_ID_ENV_VAR
+from shared.knowledge.local_vector_knowledge_base import LocalVectorKnowledgeBase
+from shared.knowledge.local_vector_store import LocalVectorStoreWriter
+from utils.constants import DEFAULT_HUGGINGFACE_PROMPT, KENDRA_INDEX_ID_ENV_VAR, LOCAL_VECTOR_STORE_URI_ENV_VAR
 
 
 @pytest.mark.parametrize("prompt, is_streaming, rag_enabled", [(DEFAULT_HUGGINGFACE_PROMPT, False, False)])
@@ -79,3 +83,45 @@ def test_get_kb_missing_type(llm_config):
     response = KnowledgeBaseFactory().get_knowledge_base(config, errors_list)
     assert response is None
     assert errors_list == ["Missing required field (KnowledgeBaseType) in the configuration"]
+
+
+@pytest.fixture
+def local_vector_environment(tmp_path):
+    writer = LocalVectorStoreWriter(str(tmp_path))
+    writer.add([Document(page_content="fake-chunk")], [[1.0, 0.0]])
+    writer.close()
+    with mock.patch.dict(
+        os.environ,
+        {
+            LOCAL_VECTOR_STORE_URI_ENV_VAR: str(tmp_path),
+            "SAGEMAKER_EMBEDDING_ENDPOINT": "fake-endpoint",
+            "AWS_REGION": "us-east-1",
+        },
+    ):
+        yield
+
+
+@pytest.mark.parametrize("prompt, is_streaming, rag_enabled", [(DEFAULT_HUGGINGFACE_PROMPT, False, False)])
+def test_get_local_vector_kb(llm_config, local_vector_environment):
+    errors_list = []
+    config = deepcopy(json.loads(llm_config["Parameter"]["Value"]))
+    config["KnowledgeBaseType"] = "LocalVector"
+    config["KnowledgeBaseParams"] = {"NumberOfDocs": 3, "IvfNprobe": 4}
+
+    response = KnowledgeBaseFactory().get_knowledge_base(config, errors_list)
+
+    assert type(response) == LocalVectorKnowledgeBase
+    assert response.retriever.top_k == 3
+    assert response.retriever.nprobe == 4
+    assert response.retriever.store.count == 1
+    assert errors_list == []
+
+
+@pytest.mark.parametrize("prompt, is_streaming, rag_enabled", [(DEFAULT_HUGGINGFACE_PROMPT, False, False)])
+def test_local_vector_kb_rejects_filters(llm_config, local_vector_environment):
+    config = deepcopy(json.loads(llm_config["Parameter"]["Value"]))
+    config["KnowledgeBaseType"] = "LocalVector"
+    config["KnowledgeBaseParams"] = {"MetadataFilter": {"EqualsTo": {"Key": "category", "Value": "faq"}}}
+
+    with pytest.raises(ValueError, match="not supported"):
+        KnowledgeBaseFactory().get_knowledge_base(config, [])
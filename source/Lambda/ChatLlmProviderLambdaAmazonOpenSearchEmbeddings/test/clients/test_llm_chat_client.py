@@ -21,7 +21,9 @@ import pytest
 from botocore.exceptions import ClientError
 from clients.builders.huggingface_builder import HuggingFaceBuilder
 from clients.huggingface_client import HuggingFaceClient
+from langchain.schema import AIMessage, HumanMessage
 from llm_models.huggingface import HuggingFaceLLM
+from shared.knowledge.faq_index import FaqMatch
 from utils.constants import (
     CONVERSATION_ID_EVENT_KEY,
     DEFAULT_HUGGINGFACE_PLACEHOLDERS,
@@ -127,6 +129,20 @@ def test_question_valid_length(llm_client):
         )
 
 
+def test_check_event_keeps_user_context(llm_client):
+    authorizer = {USER_ID_EVENT_KEY: "fake-user-id", "TenantId": "fake-tenant"}
+    event_body = llm_client.check_event(
+        {
+            "requestContext": {"authorizer": authorizer},
+            "connectionId": "fake-id",
+            "body": json.dumps({"question": "Hi"}),
+        }
+    )
+
+    assert event_body[USER_ID_EVENT_KEY] == "fake-user-id"
+    assert llm_client.user_context == authorizer
+
+
 def test_question_invalid_length(setup_environment, llm_client):
     invalid_question = "q" * (USER_QUERY_LENGTH + 1)
     with pytest.raises(ValueError) as error:
@@ -312,3 +328,45 @@ def test_construct_chat_model_new_prompt(llm_config, ssm_stubber, setup_environm
     assert llm_client.builder.llm_model.prompt_template.template == PROMPT
 
     ssm_stubber.deactivate()
+
+
+def test_get_faq_answer_without_faq_index(llm_client):
+    with patch("clients.llm_chat_client.get_faq_index", return_value=None):
+        assert llm_client.get_faq_answer({QUESTION_EVENT_KEY: "What is the refund policy?"}) is None
+
+
+def test_get_faq_answer_hit(setup_environment, llm_client):
+    event_body = {
+        QUESTION_EVENT_KEY: "What is the refund policy?",
+        CONVERSATION_ID_EVENT_KEY: "fake-conversation-id",
+        USER_ID_EVENT_KEY: "fake-user-id",
+    }
+    faq_match = FaqMatch("What is the refund policy?", "Refunds are accepted within 30 days.", 1.0, True)
+    with patch("clients.llm_chat_client.get_faq_index") as mocked_get_faq_index, patch(
+        "clients.llm_chat_client.WebsocketHandler"
+    ) as mocked_websocket_handler, patch("clients.llm_chat_client.DynamoDBChatMessageHistory") as mocked_history:
+        mocked_get_faq_index.return_value.match.return_value = faq_match
+
+        assert llm_client.get_faq_answer(event_body) == "Refunds are accepted within 30 days."
+
+    mocked_websocket_handler.assert_called_once_with(
+        connection_id="fake-connection_id", conversation_id="fake-conversation-id"
+    )
+    mocked_websocket_handler.return_value.post_token_to_connection.assert_called_once_with(faq_match.answer)
+    mocked_history.assert_called_once_with(
+        table_name="fake-table", user_id="fake-user-id", conversation_id="fake-conversation-id"
+    )
+    mocked_history.return_value.add_messages.assert_called_once_with(
+        [HumanMessage(content="What is the refund policy?"), AIMessage(content=faq_match.answer)]
+    )
+
+
+def test_get_faq_answer_falls_back_on_failure(setup_environment, llm_client):
+    with patch("clients.llm_chat_client.get_faq_index") as mocked_get_faq_index, patch(
+        "clients.llm_chat_client.WebsocketHandler"
+    ) as mocked_websocket_handler:
+        mocked_get_faq_index.return_value.match.side_effect = Exception("Embedding endpoint unavailable")
+
+        assert llm_client.get_faq_answer({QUESTION_EVENT_KEY: "What is the refund policy?"}) is None
+
+    mocked_websocket_handler.assert_not_called()
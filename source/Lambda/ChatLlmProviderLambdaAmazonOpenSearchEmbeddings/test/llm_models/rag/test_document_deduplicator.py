@@ -0,0 +1,153 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+from typing import Any, List
+
+import numpy as np
+import pytest
+from langchain.schema import BaseRetriever, Document
+from llm_models.rag.document_deduplicator import DocumentDeduplicator, get_shingle_hashes
+from utils.constants import DEDUPLICATION_CANDIDATE_FACTOR, DEFAULT_DEDUPLICATION_THRESHOLD, MINHASH_NUM_PERMUTATIONS
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+CHUNK = (
+    "Amazon Kendra is an intelligent search service powered by machine learning. It indexes documents stored in "
+    "many repositories and returns precise answers to questions asked in natural language."
+)
+OVERLAPPING_CHUNK = CHUNK + " It scales."
+OTHER_CHUNK = "Amazon OpenSearch Service makes it easy to deploy, operate and scale OpenSearch clusters in the cloud."
+THIRD_CHUNK = "Amazon Bedrock offers foundation models from leading providers through a single API."
+
+
+class TopKRetriever(BaseRetriever):
+    top_k: int = 2
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        return []
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    yield
+
+
+@pytest.fixture
+def deduplicator():
+    yield DocumentDeduplicator()
+
+
+def test_defaults(deduplicator):
+    assert deduplicator.threshold == DEFAULT_DEDUPLICATION_THRESHOLD
+    assert deduplicator.num_permutations == MINHASH_NUM_PERMUTATIONS
+    assert deduplicator.top_k is None
+
+
+def test_get_shingle_hashes():
+    assert len(get_shingle_hashes("one two three four")) == 2
+    assert len(get_shingle_hashes("One, two.")) == 1
+    assert len(get_shingle_hashes("")) == 0
+    assert np.array_equal(np.sort(get_shingle_hashes("a b c d")), np.sort(get_shingle_hashes("A b C d!")))
+
+
+def test_minhash_similarity(deduplicator):
+    similarities = deduplicator.get_similarity_matrix(
+        [Document(page_content=CHUNK), Document(page_content=OVERLAPPING_CHUNK), Document(page_content=OTHER_CHUNK)]
+    )
+
+    assert similarities.shape == (3, 3)
+    assert np.allclose(np.diag(similarities), 1.0)
+    assert np.allclose(similarities, similarities.T)
+    assert similarities[0, 1] >= DEFAULT_DEDUPLICATION_THRESHOLD
+    assert similarities[0, 2] < 0.2
+
+
+def test_embedding_similarity(deduplicator):
+    similarities = deduplicator.get_similarity_matrix(
+        [
+            Document(page_content="a", metadata={"embedding": [1.0, 0.0]}),
+            Document(page_content="b", metadata={"embedding": [2.0, 0.0]}),
+            Document(page_content="c", metadata={"embedding": [0.0, 3.0]}),
+        ]
+    )
+
+    assert np.allclose(similarities, [[1.0, 1.0, 0.0], [1.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+
+
+def test_deduplicate_keeps_retrieval_order(deduplicator):
+    documents = [
+        Document(page_content=CHUNK),
+        Document(page_content=OTHER_CHUNK),
+        Document(page_content=OVERLAPPING_CHUNK),
+    ]
+
+    assert deduplicator.deduplicate(documents) == documents[:2]
+    assert request_timer.flags[RequestFlags.DUPLICATE_DOCUMENTS.value] == 1
+
+
+def test_deduplicate_keeps_highest_score(deduplicator):
+    documents = [
+        Document(page_content=CHUNK, metadata={"score": 0.5}),
+        Document(page_content=OTHER_CHUNK, metadata={"score": 0.7}),
+        Document(page_content=OVERLAPPING_CHUNK, metadata={"score": 0.9}),
+    ]
+
+    assert deduplicator.deduplicate(documents) == documents[1:]
+
+
+def test_deduplicate_without_duplicates(deduplicator):
+    documents = [Document(page_content=CHUNK), Document(page_content=OTHER_CHUNK)]
+
+    assert deduplicator.deduplicate(documents) == documents
+    assert request_timer.flags[RequestFlags.DUPLICATE_DOCUMENTS.value] == 0
+    assert deduplicator.deduplicate(documents[:1]) == documents[:1]
+
+
+def test_deduplicate_threshold():
+    documents = [Document(page_content=CHUNK), Document(page_content=OVERLAPPING_CHUNK)]
+
+    assert DocumentDeduplicator(threshold=1.0).deduplicate(documents) == documents
+
+
+def test_deduplicate_keeps_top_k_distinct_documents():
+    documents = [
+        Document(page_content=CHUNK, metadata={"score": 0.9}),
+        Document(page_content=OVERLAPPING_CHUNK, metadata={"score": 0.8}),
+        Document(page_content=OTHER_CHUNK, metadata={"score": 0.7}),
+        Document(page_content=THIRD_CHUNK, metadata={"score": 0.6}),
+    ]
+    deduplicator = DocumentDeduplicator(top_k=2)
+
+    assert deduplicator.deduplicate(documents) == [documents[0], documents[2]]
+    assert request_timer.flags[RequestFlags.DUPLICATE_DOCUMENTS.value] == 1
+    assert deduplicator.deduplicate(documents[2:]) == documents[2:]
+    assert deduplicator.deduplicate(documents[:1]) == documents[:1]
+
+
+def test_over_fetch():
+    retriever = TopKRetriever()
+    deduplicator = DocumentDeduplicator()
+
+    deduplicator.over_fetch(retriever)
+    deduplicator.over_fetch(retriever)
+
+    assert deduplicator.top_k == 2
+    assert retriever.top_k == 2 * DEDUPLICATION_CANDIDATE_FACTOR
+
+
+def test_over_fetch_without_top_k(deduplicator):
+    deduplicator.over_fetch(object())
+
+    assert deduplicator.top_k is None
@@ -0,0 +1,163 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+from typing import Any, List, Optional
+
+import pytest
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import AIMessage, BaseRetriever, Document, HumanMessage
+from llm_models.rag.adaptive_condense_question_chain import (
+    AdaptiveCondenseQuestionChain,
+    _rewrite_cache,
+    get_rewrite_cache_key,
+)
+from llm_models.rag.multi_query_generator import MultiQueryGenerator
+from llm_models.rag.speculative_retrieval_chain import SpeculativeConversationalRetrievalChain, get_question_similarity
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+CHAT_HISTORY = [HumanMessage(content="What is Amazon Kendra?"), AIMessage(content="An intelligent search service.")]
+
+
+class FakeRetriever(BaseRetriever):
+    queries: List[str] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        self.queries.append(query)
+        return [Document(page_content=f"document for {query}")]
+
+
+class RetrieverEndHandler(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.documents = []
+
+    def on_retriever_end(self, documents: List[Document], **kwargs: Any) -> None:
+        self.documents.append(documents)
+
+
+def get_chain(
+    condensed_question: str, query_generator: Optional[MultiQueryGenerator] = None
+) -> SpeculativeConversationalRetrievalChain:
+    _rewrite_cache.clear()
+    request_timer.reset()
+    chain = SpeculativeConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=FakeRetriever(),
+        condense_question_llm=FakeListLLM(responses=[condensed_question]),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        get_chat_history=lambda chat_history: chat_history,
+        return_source_documents=True,
+        query_generator=query_generator,
+    )
+    chain.question_generator = AdaptiveCondenseQuestionChain.from_llm_chain(chain.question_generator)
+    return chain
+
+
+@pytest.mark.parametrize(
+    "question, other_question, expected",
+    [
+        ("How much does Kendra cost?", "how much does kendra cost", 1.0),
+        ("How much does Kendra cost?", "How much does Amazon Kendra cost?", 5 / 6),
+        ("Why?", "What is Amazon Kendra?", 0.0),
+        ("", "", 1.0),
+    ],
+)
+def test_get_question_similarity(question, other_question, expected):
+    assert get_question_similarity(question, other_question) == pytest.approx(expected)
+
+
+def test_speculative_documents_used_for_minor_rewrite():
+    chain = get_chain("How much does Amazon Kendra cost?")
+    handler = RetrieverEndHandler()
+
+    result = chain(
+        {"question": "How much does Kendra cost?", "chat_history": CHAT_HISTORY},
+        callbacks=[handler],
+    )
+
+    assert result["answer"] == "fake-answer"
+    assert chain.retriever.queries == ["How much does Kendra cost?"]
+    assert result["source_documents"][0].page_content == "document for How much does Kendra cost?"
+    assert handler.documents == [result["source_documents"]]
+    assert request_timer.flags[RequestFlags.SPECULATIVE_RETRIEVAL_HIT.value] is True
+
+
+def test_speculative_retrieval_uses_the_generated_queries():
+    chain = get_chain(
+        "How much does Amazon Kendra cost?",
+        query_generator=MultiQueryGenerator.from_llm(FakeListLLM(responses=["What is the price of Kendra?"])),
+    )
+    handler = RetrieverEndHandler()
+
+    result = chain(
+        {"question": "How much does Kendra cost?", "chat_history": CHAT_HISTORY},
+        callbacks=[handler],
+    )
+
+    assert sorted(chain.retriever.queries) == ["How much does Kendra cost?", "What is the price of Kendra?"]
+    # the fused documents are as many as those of a single query
+    assert [document.page_content for document in result["source_documents"]] == [
+        "document for How much does Kendra cost?"
+    ]
+    assert handler.documents == [result["source_documents"]]
+    assert request_timer.flags[RequestFlags.SPECULATIVE_RETRIEVAL_HIT.value] is True
+
+
+def test_retrieval_rerun_for_major_rewrite():
+    chain = get_chain("What is the price of an Amazon Kendra enterprise edition index?")
+    handler = RetrieverEndHandler()
+
+    result = chain(
+        {"question": "And for the bigger one?", "chat_history": CHAT_HISTORY},
+        callbacks=[handler],
+    )
+
+    assert chain.retriever.queries == [
+        "And for the bigger one?",
+        "What is the price of an Amazon Kendra enterprise edition index?",
+    ]
+    assert result["source_documents"][0].page_content.endswith("enterprise edition index?")
+    assert handler.documents == [result["source_documents"]]
+    assert request_timer.flags[RequestFlags.SPECULATIVE_RETRIEVAL_HIT.value] is False
+
+
+@pytest.mark.parametrize(
+    "question, chat_history",
+    [
+        ("How much does Kendra cost?", []),
+        ("What is the pricing model for Amazon Kendra enterprise edition indexes?", CHAT_HISTORY),
+    ],
+)
+def test_no_speculation_without_condensing(question, chat_history):
+    chain = get_chain("unexpected-call")
+
+    result = chain({"question": question, "chat_history": chat_history})
+
+    assert chain.retriever.queries == [question]
+    assert result["answer"] == "fake-answer"
+    assert RequestFlags.SPECULATIVE_RETRIEVAL_HIT.value not in request_timer.flags
+
+
+def test_no_speculation_for_cached_rewrite():
+    chain = get_chain("unexpected-call")
+    _rewrite_cache[get_rewrite_cache_key(CHAT_HISTORY, "And for the bigger one?")] = "What about enterprise edition?"
+
+    result = chain({"question": "And for the bigger one?", "chat_history": CHAT_HISTORY})
+
+    assert chain.retriever.queries == ["What about enterprise edition?"]
+    assert result["answer"] == "fake-answer"
+    assert request_timer.flags[RequestFlags.CONDENSE_CACHE_HIT.value] is True
+    assert RequestFlags.SPECULATIVE_RETRIEVAL_HIT.value not in request_timer.flags
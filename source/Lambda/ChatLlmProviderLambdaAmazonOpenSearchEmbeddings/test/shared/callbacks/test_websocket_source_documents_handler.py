@@ -0,0 +1,104 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import json
+from typing import Any, List
+from unittest import mock
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import BaseRetriever, Document
+from llm_models.rag.context_packing_chain import ContextPackingConversationalRetrievalChain
+from llm_models.rag.document_deduplicator import DocumentDeduplicator
+from shared.callbacks.websocket_source_documents_handler import WebsocketSourceDocumentsHandler
+from utils.constants import COMBINE_DOCUMENTS_INPUT_KEY, CONVERSATION_ID_EVENT_KEY, SOURCE_DOCUMENTS_RESPONSE_KEY
+from utils.helpers import format_source_documents
+
+
+class FakeRetriever(BaseRetriever):
+    documents: List[Document] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        return self.documents
+
+
+@pytest.fixture
+def source_documents_handler(setup_environment):
+    yield WebsocketSourceDocumentsHandler(connection_id="fake-id", conversation_id="fake-conversation-id")
+
+
+def test_on_chain_start_posts_sources(source_documents_handler, apigateway_stubber):
+    apigateway_stubber.add_response(
+        "post_to_connection",
+        {},
+        expected_params={
+            "ConnectionId": "fake-id",
+            "Data": json.dumps(
+                {
+                    SOURCE_DOCUMENTS_RESPONSE_KEY: [{"id": "doc-1", "source": "fake-url-1", "snippet": "some-content"}],
+                    CONVERSATION_ID_EVENT_KEY: "fake-conversation-id",
+                }
+            ),
+        },
+    )
+    apigateway_stubber.activate()
+    source_documents_handler.on_chain_start(
+        {},
+        {
+            COMBINE_DOCUMENTS_INPUT_KEY: [
+                Document(page_content="some-content", metadata={"id": "doc-1", "source": "fake-url-1"})
+            ],
+            "question": "fake-question",
+        },
+    )
+    apigateway_stubber.deactivate()
+
+
+def test_on_chain_start_does_not_raise_on_post_failure(source_documents_handler, apigateway_stubber):
+    apigateway_stubber.add_client_error("post_to_connection", service_error_code="GoneException")
+    apigateway_stubber.activate()
+    source_documents_handler.on_chain_start({}, {COMBINE_DOCUMENTS_INPUT_KEY: [Document(page_content="some-content")]})
+    apigateway_stubber.deactivate()
+
+
+def test_on_chain_start_ignores_other_chains(source_documents_handler):
+    with mock.patch.object(source_documents_handler, "post_sources_to_connection") as mock_post_sources:
+        source_documents_handler.on_chain_start({}, {"question": "fake-question", "chat_history": []})
+        source_documents_handler.on_chain_start({}, "fake-question")
+
+    mock_post_sources.assert_not_called()
+
+
+def test_posts_the_documents_placed_in_the_prompt(source_documents_handler):
+    documents = [
+        Document(page_content="Amazon Kendra is a search service. It indexes documents.", metadata={"id": "doc-1"}),
+        Document(page_content="Amazon Kendra is a search service. It indexes documents!", metadata={"id": "doc-2"}),
+        Document(page_content="Amazon Bedrock serves foundation models.", metadata={"id": "doc-3"}),
+    ]
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=FakeRetriever(documents=documents),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        document_deduplicator=DocumentDeduplicator(),
+    )
+
+    with mock.patch.object(source_documents_handler, "post_sources_to_connection") as mock_post_sources:
+        result = chain(
+            {"question": "What is Amazon Kendra?", "chat_history": []}, callbacks=[source_documents_handler]
+        )
+
+    assert result["source_documents"] == [documents[0], documents[2]]
+    mock_post_sources.assert_called_once_with(format_source_documents(result["source_documents"]))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import pytest
+from langchain.schema import Document
+from shared.knowledge.document_chunker import (
+    StreamingDocument,
+    StreamingTokenChunker,
+    iter_byte_stream_blocks,
+    iter_file_blocks,
+    iter_text_blocks,
+)
+
+TEXT = "The quick brown fox, jumps over the lazy dog.\n\nA second paragraph follows " + "x" * 70 + " here."
+
+
+def test_chunks_are_independent_of_block_size():
+    chunker = StreamingTokenChunker(chunk_size=5, chunk_overlap=2)
+    expected_chunks = list(chunker.chunk([TEXT]))
+
+    for block_size in (1, 2, 7, 64):
+        blocks = [TEXT[start : start + block_size] for start in range(0, len(TEXT), block_size)]
+        assert list(chunker.chunk(blocks)) == expected_chunks
+
+
+def test_chunk_offsets_and_overlap():
+    chunks = list(StreamingTokenChunker(chunk_size=5, chunk_overlap=2).chunk([TEXT]))
+
+    assert chunks[0].text == "The quick brown fox,"
+    assert chunks[1].text == "fox, jumps over the"
+    assert all(TEXT[chunk.start_offset : chunk.end_offset] == chunk.text for chunk in chunks)
+    assert all(chunk.token_count == 5 for chunk in chunks[:-1])
+    assert chunks[-1].text.endswith("here.")
+
+
+def test_long_words_are_split():
+    chunks = list(StreamingTokenChunker(chunk_size=2, chunk_overlap=0).chunk(["y" * 70]))
+
+    assert [chunk.text for chunk in chunks] == ["y" * 64, "y" * 6]
+
+
+def test_empty_text_has_no_chunks():
+    assert list(StreamingTokenChunker().chunk(["", "  \n"])) == []
+
+
+def test_invalid_overlap():
+    with pytest.raises(ValueError, match="chunk_overlap"):
+        StreamingTokenChunker(chunk_size=4, chunk_overlap=4)
+
+
+def test_text_blocks(tmp_path):
+    path = tmp_path / "document.txt"
+    path.write_text("abcdefgh")
+
+    assert list(iter_file_blocks(str(path), block_size=3)) == ["abc", "def", "gh"]
+    assert list(iter_byte_stream_blocks([b"caf\xc3", b"\xa9 \xff"])) == ["caf", "é �"]
+    assert list(iter_text_blocks(Document(page_content="in memory"))) == ["in memory"]
+    assert list(iter_text_blocks(StreamingDocument({}, lambda: iter(["a", "b"])))) == ["a", "b"]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import json
+from unittest import mock
+
+import pytest
+from shared.knowledge.faq_index import FaqIndex, get_faq_index, normalize_question
+from shared.knowledge.faq_ingestion import build_faq_index, iter_faq_entries
+from shared.knowledge.local_vector_store import LocalVectorStore
+from shared.knowledge.opensearch_knowledge_base import SAGEMAKER_EMBEDDING_ENDPOINT
+from utils.constants import FAQ_INDEX_URI_ENV_VAR, FAQ_MATCH_THRESHOLD_ENV_VAR
+
+FAQ_ENTRIES = [
+    {
+        "question": "What is the refund policy?",
+        "answer": "Refunds are accepted within 30 days.",
+        "alternate_questions": ["Can I get my money back?"],
+    },
+    {"question": "How do I reset my password?", "answer": "Use the forgot password link."},
+    {"question": "what is the REFUND policy", "answer": "A repeated question is skipped."},
+]
+
+VECTORS = {
+    "What is the refund policy?": [1.0, 0.0, 0.0],
+    "Can I get my money back?": [0.0, 1.0, 0.0],
+    "How do I reset my password?": [0.0, 0.0, 1.0],
+    "I would like a refund": [0.9, 0.2, 0.0],
+    "How do I change my email?": [0.5, 0.0, 0.6],
+}
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.queries = []
+
+    def embed_documents(self, texts, chunk_size=None):
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return VECTORS[text]
+
+
+@pytest.fixture
+def faq_directory(tmp_path):
+    directory = str(tmp_path / "faq")
+    build_faq_index(FakeEmbeddings(), directory, FAQ_ENTRIES, batch_size=2)
+    yield directory
+
+
+def test_normalize_question():
+    assert normalize_question("  What's the REFUND policy?! ") == "what s the refund policy"
+    assert normalize_question("?!") == ""
+
+
+def test_build_faq_index_skips_repeated_questions(faq_directory):
+    store = LocalVectorStore(faq_directory)
+
+    assert store.count == 3
+    assert [store.get_document(row).page_content for row in range(store.count)] == [
+        "What is the refund policy?",
+        "Can I get my money back?",
+        "How do I reset my password?",
+    ]
+    assert store.get_document(1).metadata == {
+        "answer": "Refunds are accepted within 30 days.",
+        "question": "What is the refund policy?",
+    }
+
+
+def test_exact_match_skips_the_embedding(faq_directory):
+    embeddings = FakeEmbeddings()
+    faq_index = FaqIndex(LocalVectorStore(faq_directory), embeddings=embeddings)
+
+    faq_match = faq_index.match("can i get my MONEY back")
+
+    assert faq_match.answer == "Refunds are accepted within 30 days."
+    assert faq_match.exact and faq_match.score == 1.0
+    assert embeddings.queries == []
+
+
+def test_embedding_match_above_threshold(faq_directory):
+    faq_index = FaqIndex(LocalVectorStore(faq_directory), embeddings=FakeEmbeddings(), threshold=0.9)
+
+    faq_match = faq_index.match("I would like a refund")
+
+    assert faq_match.question == "What is the refund policy?"
+    assert not faq_match.exact
+    assert faq_match.score == pytest.approx(0.976, abs=1e-3)
+
+
+def test_embedding_match_below_threshold(faq_directory):
+    faq_index = FaqIndex(LocalVectorStore(faq_directory), embeddings=FakeEmbeddings(), threshold=0.9)
+
+    assert faq_index.match("How do I change my email?") is None
+
+
+def test_match_without_embeddings_is_exact_only(faq_directory):
+    faq_index = FaqIndex(LocalVectorStore(faq_directory))
+
+    assert faq_index.match("How do I reset my password").answer == "Use the forgot password link."
+    assert faq_index.match("I would like a refund") is None
+    assert faq_index.match("???") is None
+
+
+def test_get_faq_index(faq_directory):
+    environment = {
+        FAQ_INDEX_URI_ENV_VAR: faq_directory,
+        FAQ_MATCH_THRESHOLD_ENV_VAR: "0.95",
+        SAGEMAKER_EMBEDDING_ENDPOINT: "",
+    }
+    with mock.patch.dict("os.environ", environment):
+        faq_index = get_faq_index()
+        assert faq_index.threshold == 0.95
+        assert faq_index.embeddings is None
+        assert get_faq_index() is faq_index
+
+    with mock.patch.dict("os.environ", {FAQ_INDEX_URI_ENV_VAR: ""}):
+        assert get_faq_index() is None
+
+
+def test_iter_faq_entries(tmp_path):
+    path = tmp_path / "faq.jsonl"
+    path.write_text("\n".join(json.dumps(entry) for entry in FAQ_ENTRIES[:2]) + "\n\n")
+    assert list(iter_faq_entries(str(path))) == FAQ_ENTRIES[:2]
+
+    path.write_text(json.dumps({"question": "A question without an answer"}))
+    with pytest.raises(ValueError):
+        list(iter_faq_entries(str(path)))
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+import os
+import shutil
+from unittest import mock
+
+import numpy as np
+import pytest
+from langchain.schema import Document
+from shared.knowledge.local_vector_ingestion import build_local_vector_store, upload_local_vector_store
+from shared.knowledge.local_vector_retriever import LocalVectorRetriever
+from shared.knowledge.local_vector_store import (
+    LocalVectorStore,
+    LocalVectorStoreWriter,
+    download_local_vector_store,
+    get_local_vector_store,
+)
+from shared.knowledge.opensearch_ingestion import iter_local_documents
+
+
+def get_vectors(count=2000, dimension=32, clusters=20, seed=7):
+    random_state = np.random.RandomState(seed)
+    centers = random_state.normal(size=(clusters, dimension))
+    vectors = centers[random_state.randint(clusters, size=count)] + 0.3 * random_state.normal(size=(count, dimension))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def write_store(directory, vectors, batch_size=300, **kwargs):
+    writer = LocalVectorStoreWriter(str(directory), **kwargs)
+    for start in range(0, len(vectors), batch_size):
+        rows = range(start, min(start + batch_size, len(vectors)))
+        documents = [Document(page_content=f"chunk {row}", metadata={"row": row}) for row in rows]
+        writer.add(documents, vectors[rows.start : rows.stop])
+    writer.close()
+    return LocalVectorStore(str(directory))
+
+
+def get_exact_top_k(vectors, queries, k):
+    return [list(np.argsort(-(vectors @ query))[:k]) for query in queries]
+
+
+def get_document_rows(store, results):
+    return [store.get_document(row).metadata["row"] for row, _ in results]
+
+
+def test_exact_search(tmp_path):
+    vectors = get_vectors()
+    queries = get_vectors(count=5, seed=8)
+    store = write_store(tmp_path, vectors)
+
+    results = store.search(queries, 10)
+
+    assert (store.count, store.dimension, store.ivf_lists) == (2000, 32, 0)
+    assert [get_document_rows(store, query_results) for query_results in results] == get_exact_top_k(
+        vectors, queries, 10
+    )
+    row, score = results[0][0]
+    assert score == pytest.approx(float(vectors[row] @ queries[0]), abs=1e-5)
+    assert store.get_document(row) == Document(page_content=f"chunk {row}", metadata={"row": row})
+
+
+def test_byte_encoded_search(tmp_path):
+    vectors = get_vectors()
+    queries = get_vectors(count=5, seed=8)
+    store = write_store(tmp_path, vectors, encoding="byte")
+
+    results = store.search(queries, 10)
+
+    assert store.encoding == "byte" and os.path.getsize(tmp_path / "vectors.npy") < vectors.nbytes / 3
+    for query, query_results, exact_rows in zip(queries, results, get_exact_top_k(vectors, queries, 10)):
+        assert len(set(get_document_rows(store, query_results)) & set(exact_rows)) >= 9
+        for row, score in query_results:
+            assert score == pytest.approx(float(vectors[store.get_document(row).metadata["row"]] @ query), abs=0.02)
+
+
+def test_ivf_search(tmp_path):
+    vectors = get_vectors()
+    queries = get_vectors(count=20, seed=8)
+    store = write_store(tmp_path, vectors, ivf_lists=16)
+    exact_top_k = get_exact_top_k(vectors, queries, 10)
+
+    probed_results = store.search(queries, 10, nprobe=4)
+    all_results = store.search(queries, 10, nprobe=16)
+
+    assert store.ivf_lists == 16
+    assert [get_document_rows(store, query_results) for query_results in all_results] == exact_top_k
+    recall = np.mean(
+        [
+            len(set(get_document_rows(store, query_results)) & set(exact_rows)) / 10
+            for query_results, exact_rows in zip(probed_results, exact_top_k)
+        ]
+    )
+    assert recall >= 0.9
+
+
+def test_writer_rejects_an_empty_store(tmp_path):
+    with pytest.raises(ValueError, match="No documents"):
+        LocalVectorStoreWriter(str(tmp_path)).close()
+    assert not os.path.exists(tmp_path / "manifest.json")
+
+
+def test_download_local_vector_store(tmp_path):
+    write_store(tmp_path / "built", get_vectors(count=50))
+    s3_client = mock.MagicMock()
+    upload_local_vector_store(str(tmp_path / "built"), "s3://fake-bucket/stores/v1/", s3_client=s3_client)
+    uploaded = {call.args[2]: call.args[0] for call in s3_client.upload_file.call_args_list}
+    assert list(uploaded)[-1] == "stores/v1/manifest.json"
+
+    s3_client.get_object.side_effect = lambda Bucket, Key: {"Body": open(uploaded[Key], "rb")}
+    s3_client.download_file.side_effect = lambda bucket, key, path: shutil.copy(uploaded[key], path)
+    cache_dir = str(tmp_path / "cache")
+    directory = download_local_vector_store("s3://fake-bucket/stores/v1", cache_dir, s3_client=s3_client)
+    assert download_local_vector_store("s3://fake-bucket/stores/v1", cache_dir, s3_client=s3_client) == directory
+
+    assert s3_client.get_object.call_count == 1
+    assert s3_client.download_file.call_count == 3
+    assert LocalVectorStore(directory).count == 50
+
+
+def test_get_local_vector_store_is_cached(tmp_path):
+    write_store(tmp_path, get_vectors(count=50))
+
+    assert get_local_vector_store(str(tmp_path)) is get_local_vector_store(str(tmp_path))
+
+
+def test_build_local_vector_store(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.txt").write_text("one two three four five six seven")
+    (tmp_path / "docs" / "b.txt").write_text("eight nine")
+    embeddings = mock.MagicMock()
+    embeddings.embed_documents.side_effect = lambda texts, chunk_size: [[len(text), 1.0] for text in texts]
+
+    manifest = build_local_vector_store(
+        embeddings,
+        str(tmp_path / "store"),
+        iter_local_documents(str(tmp_path / "docs")),
+        chunk_size=4,
+        chunk_overlap=1,
+        batch_size=2,
+        max_workers=1,
+    )
+
+    store = LocalVectorStore(str(tmp_path / "store"))
+    assert manifest["count"] == store.count == 3
+    assert [store.get_document(row).page_content for row in range(store.count)] == [
+        "one two three four",
+        "four five six seven",
+        "eight nine",
+    ]
+    assert store.get_document(2).metadata == {
+        "source": str(tmp_path / "docs" / "b.txt"),
+        "start_offset": 0,
+        "end_offset": 10,
+        "token_count": 2,
+    }
+    assert not [file_name for file_name in os.listdir(tmp_path / "store") if file_name.endswith(".tmp")]
+
+
+@pytest.fixture
+def retriever(tmp_path):
+    # chunk 1 is a near-duplicate of chunk 0, the queries are the axes of chunks 0, 2 and 3
+    vectors = np.array([[1, 0, 0, 0], [1, 0.1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]], dtype=np.float32)
+    store = write_store(tmp_path, vectors)
+    query_vectors = {"first": [1.0, 0.0, 0.0, 0.0], "second": [0.0, 1.0, 0.0, 0.0], "third": [0.0, 0.0, 1.0, 0.0]}
+    embeddings = mock.MagicMock()
+    embeddings.embed_query.side_effect = lambda query: query_vectors[query]
+    embeddings.embed_documents.side_effect = lambda queries: [query_vectors[query] for query in queries]
+    yield LocalVectorRetriever(store=store, embeddings=embeddings, top_k=2)
+
+
+def test_retriever_similarity(retriever):
+    documents = retriever.get_relevant_documents("first")
+
+    assert [document.page_content for document in documents] == ["chunk 0", "chunk 1"]
+    assert list(documents[0].metadata) == ["score"]
+    assert documents[0].metadata["score"] == pytest.approx(1.0)
+
+
+def test_retriever_return_source_documents_and_min_score(retriever):
+    retriever.return_source_documents = True
+    retriever.min_score = 0.5
+    retriever.top_k = 4
+
+    documents = retriever.get_relevant_documents("third")
+
+    assert documents == [Document(page_content="chunk 3", metadata={"row": 3, "score": pytest.approx(1.0)})]
+
+
+def test_retriever_mmr(retriever):
+    retriever.search_type = "mmr"
+    retriever.fetch_k = 4
+    retriever.lambda_mult = 0.3
+
+    documents = retriever.get_relevant_documents("first")
+
+    assert [document.page_content for document in documents] == ["chunk 0", "chunk 2"]
+
+
+def test_retriever_multiple_queries(retriever):
+    documents = retriever.get_relevant_documents_for_queries(["first", "second"])
+
+    # chunk 1 is found by both queries, so it ranks first once fused
+    assert [document.page_content for document in documents] == ["chunk 1", "chunk 0"]
+    retriever.embeddings.embed_documents.assert_called_once_with(["first", "second"])
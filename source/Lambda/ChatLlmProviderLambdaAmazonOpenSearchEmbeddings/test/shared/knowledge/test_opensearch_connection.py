@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from shared.knowledge import opensearch_connection
+from shared.knowledge.opensearch_connection import get_opensearch_client, prime_opensearch, warm_up_knn_index
+from utils.constants import KNN_WARMUP_INTERVAL
+from utils.enum_types import RequestStages
+from utils.request_timer import request_timer
+
+
+@pytest.fixture(autouse=True)
+def reset_container_state():
+    opensearch_connection._clients.clear()
+    opensearch_connection._primed_clients.clear()
+    opensearch_connection._knn_warmup_times.clear()
+    request_timer.reset()
+    yield
+
+
+@mock.patch("shared.knowledge.opensearch_connection.OpenSearch")
+def test_client_is_kept_per_domain_and_credentials(mock_opensearch):
+    mock_opensearch.side_effect = lambda **kwargs: mock.MagicMock()
+    client = get_opensearch_client("fake-host", 443, ("user", "password"), use_ssl=True)
+
+    assert get_opensearch_client("fake-host", 443, ("user", "password"), use_ssl=True) is client
+    assert get_opensearch_client("fake-host", 443, ("user", "rotated-password"), use_ssl=True) is not client
+    assert mock_opensearch.call_count == 2
+    mock_opensearch.assert_any_call(
+        hosts=[{"host": "fake-host", "port": 443}], http_auth=("user", "password"), use_ssl=True
+    )
+
+
+def test_connection_is_primed_once():
+    client = mock.MagicMock()
+
+    prime_opensearch(client, "fake-index")
+    prime_opensearch(client, "fake-index")
+
+    client.info.assert_called_once_with()
+    assert RequestStages.OPENSEARCH_PRIMING.value in request_timer.stage_durations
+
+
+def test_failed_priming_is_retried_and_does_not_raise():
+    client = mock.MagicMock()
+    client.info.side_effect = Exception("fake-error")
+
+    prime_opensearch(client, "fake-index")
+    prime_opensearch(client, "fake-index")
+
+    assert client.info.call_count == 2
+
+
+def test_priming_can_be_disabled():
+    client = mock.MagicMock()
+
+    prime_opensearch(client, "fake-index", prime_connection=False)
+
+    client.info.assert_not_called()
+    assert request_timer.stage_durations == {}
+
+
+@mock.patch("shared.knowledge.opensearch_connection.time.monotonic")
+@mock.patch("shared.knowledge.opensearch_connection._knn_warmup_executor")
+def test_knn_warmup_is_rate_limited(mock_executor, mock_monotonic):
+    client = mock.MagicMock()
+    mock_monotonic.return_value = 1000.0
+
+    prime_opensearch(client, "fake-index", knn_warmup=True)
+    prime_opensearch(client, "fake-index", knn_warmup=True)
+    prime_opensearch(client, "other-index", knn_warmup=True)
+    mock_monotonic.return_value = 1000.0 + KNN_WARMUP_INTERVAL
+    prime_opensearch(client, "fake-index", knn_warmup=True)
+
+    assert mock_executor.submit.call_args_list == [
+        mock.call(warm_up_knn_index, client, "fake-index"),
+        mock.call(warm_up_knn_index, client, "other-index"),
+        mock.call(warm_up_knn_index, client, "fake-index"),
+    ]
+
+
+def test_knn_warmup_request():
+    client = mock.MagicMock()
+    client.transport.perform_request.return_value = {"_shards": {"total": 2, "successful": 2, "failed": 0}}
+
+    warm_up_knn_index(client, "fake-index")
+
+    client.transport.perform_request.assert_called_once_with("GET", "/_plugins/_knn/warmup/fake-index")
+
+
+def test_failed_knn_warmup_does_not_raise():
+    client = mock.MagicMock()
+    client.transport.perform_request.side_effect = Exception("fake-error")
+
+    warm_up_knn_index(client, "fake-index")
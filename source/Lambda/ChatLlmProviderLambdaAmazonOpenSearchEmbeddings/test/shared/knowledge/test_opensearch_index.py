@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from shared.knowledge.opensearch_index import (
+    KnnIndexConfig,
+    create_or_update_index,
+    encode_vector,
+    get_static_changes,
+    swap_alias,
+)
+
+
+def get_index_client(config):
+    client = mock.MagicMock()
+    client.indices.exists.return_value = True
+    client.indices.get_mapping.return_value = {
+        "fake-index": {"mappings": {"properties": {"vector_field": config.get_vector_mapping()}}}
+    }
+    client.indices.get_settings.return_value = {
+        "fake-index": {"settings": {"index": {"number_of_shards": str(config.number_of_shards)}}}
+    }
+    return client
+
+
+def test_config_from_dict():
+    config = KnnIndexConfig.from_dict(
+        {"Dimension": 768, "Engine": "faiss", "M": 8, "EfSearch": 64, "Encoding": "fp16", "NumberOfReplicas": 2}
+    )
+
+    assert config == KnnIndexConfig(
+        dimension=768, engine="faiss", m=8, ef_search=64, encoding="fp16", number_of_replicas=2
+    )
+
+
+@pytest.mark.parametrize(
+    "config, error",
+    [
+        ({"Dimension": 8, "Engine": "nmslib"}, "Unsupported k-NN engine nmslib"),
+        ({"Dimension": 8, "Encoding": "int4"}, "Unsupported vector encoding int4"),
+        ({"Dimension": 8, "Engine": "lucene", "Encoding": "fp16"}, "only supported by the faiss engine"),
+    ],
+)
+def test_invalid_config(config, error):
+    with pytest.raises(ValueError, match=error):
+        KnnIndexConfig.from_dict(config)
+
+
+def test_index_body():
+    config = KnnIndexConfig(dimension=768, encoding="fp16", number_of_shards=2, number_of_replicas=1)
+
+    body = config.get_index_body()
+
+    assert body["settings"] == {
+        "index": {"knn": True, "number_of_shards": 2, "number_of_replicas": 1, "knn.algo_param.ef_search": 100}
+    }
+    assert body["mappings"]["properties"]["vector_field"] == {
+        "type": "knn_vector",
+        "dimension": 768,
+        "method": {
+            "name": "hnsw",
+            "engine": "faiss",
+            "space_type": "l2",
+            "parameters": {
+                "m": 16,
+                "ef_construction": 128,
+                "encoder": {"name": "sq", "parameters": {"type": "fp16", "clip": True}},
+            },
+        },
+    }
+    assert body["mappings"]["dynamic_templates"][0]["metadata_strings"]["mapping"] == {"type": "keyword"}
+
+
+def test_byte_vectors():
+    config = KnnIndexConfig(dimension=3, engine="lucene", encoding="byte")
+
+    assert config.get_vector_mapping()["data_type"] == "byte"
+    assert encode_vector([1.0, -0.5, -1.2], "byte") == [127, -64, -128]
+    assert encode_vector([1.0, -0.5], "float") == [1.0, -0.5]
+
+
+def test_memory_estimate_halves_with_fp16():
+    float_config = KnnIndexConfig(dimension=768, number_of_replicas=0)
+    fp16_config = KnnIndexConfig(dimension=768, encoding="fp16", number_of_replicas=0)
+
+    assert float_config.estimate_memory_bytes(1000) == pytest.approx(1.1 * (4 * 768 + 8 * 16) * 1000)
+    assert fp16_config.estimate_memory_bytes(1000) / float_config.estimate_memory_bytes(1000) < 0.55
+    assert KnnIndexConfig(dimension=768).estimate_memory_bytes(1000) == 2 * float_config.estimate_memory_bytes(1000)
+
+
+def test_index_is_created():
+    client = mock.MagicMock()
+    client.indices.exists.return_value = False
+    config = KnnIndexConfig(dimension=8)
+
+    assert create_or_update_index(client, "fake-index", config)
+    client.indices.create.assert_called_once_with(index="fake-index", body=config.get_index_body())
+
+
+def test_dynamic_settings_are_updated():
+    client = get_index_client(KnnIndexConfig(dimension=8))
+    config = KnnIndexConfig(dimension=8, ef_search=256, number_of_replicas=2)
+
+    assert not create_or_update_index(client, "fake-index", config)
+    client.indices.create.assert_not_called()
+    client.indices.put_settings.assert_called_once_with(
+        index="fake-index", body={"index": {"number_of_replicas": 2, "knn.algo_param.ef_search": 256}}
+    )
+    client.indices.put_mapping.assert_called_once_with(
+        index="fake-index", body={"properties": {"content_hash": {"type": "keyword"}}}
+    )
+
+
+def test_static_changes_require_a_new_index():
+    client = get_index_client(KnnIndexConfig(dimension=8))
+    config = KnnIndexConfig(dimension=8, encoding="byte", m=32)
+
+    assert get_static_changes(client, "fake-index", config) == [
+        "data_type: float -> byte",
+        "parameters: {'m': 16, 'ef_construction': 128} -> {'m': 32, 'ef_construction': 128}",
+    ]
+    with pytest.raises(ValueError, match="require a new index"):
+        create_or_update_index(client, "fake-index", config)
+    client.indices.put_settings.assert_not_called()
+
+
+def test_swap_alias():
+    client = mock.MagicMock()
+    client.indices.exists_alias.return_value = True
+    client.indices.get_alias.return_value = {"kb-20240101000000": {"aliases": {"kb": {}}}}
+
+    assert swap_alias(client, "kb", "kb-20240201000000") == ["kb-20240101000000"]
+    client.indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"remove": {"index": "kb-20240101000000", "alias": "kb"}},
+                {"add": {"index": "kb-20240201000000", "alias": "kb"}},
+            ]
+        }
+    )
+
+
+def test_swap_alias_over_index():
+    client = mock.MagicMock()
+    client.indices.exists_alias.return_value = False
+    client.indices.exists.return_value = True
+
+    with pytest.raises(ValueError, match="kb is an index"):
+        swap_alias(client, "kb", "kb-20240201000000")
+    client.indices.update_aliases.assert_not_called()
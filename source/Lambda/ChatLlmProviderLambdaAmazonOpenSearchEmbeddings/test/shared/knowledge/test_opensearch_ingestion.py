@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import json
+from unittest import mock
+
+import pytest
+from langchain.schema import Document
+from shared.knowledge.opensearch_ingestion import (
+    IngestionCheckpoint,
+    OpenSearchIngestionPipeline,
+    iter_local_documents,
+    iter_s3_documents,
+    rebuild_index,
+    with_retries,
+)
+from shared.knowledge.opensearch_index import KnnIndexConfig
+
+
+def get_document(source, text, version="v1"):
+    return Document(page_content=text, metadata={"source": source, "version": version})
+
+
+@pytest.fixture
+def client():
+    client = mock.MagicMock()
+    client.indices.get_settings.return_value = {"fake-index": {"settings": {"index": {"refresh_interval": "5s"}}}}
+    client.mget.return_value = {"docs": []}
+    client.delete_by_query.return_value = {"deleted": 0}
+    yield client
+
+
+@pytest.fixture
+def embeddings():
+    embeddings = mock.MagicMock()
+    embeddings.embed_documents.side_effect = lambda texts, chunk_size: [[float(len(text)), 0.0] for text in texts]
+    yield embeddings
+
+
+@pytest.fixture
+def mock_bulk():
+    with mock.patch("shared.knowledge.opensearch_ingestion.helpers.bulk") as mock_bulk:
+        mock_bulk.side_effect = lambda client, actions, **kwargs: (len(actions), [])
+        yield mock_bulk
+
+
+def test_iter_local_documents(tmp_path):
+    (tmp_path / "b.txt").write_text("second")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "a.md").write_text("first")
+    (tmp_path / "image.png").write_bytes(b"\x89PNG")
+
+    documents = list(iter_local_documents(str(tmp_path)))
+
+    assert ["".join(document.iter_blocks()) for document in documents] == ["second", "first"]
+    assert documents[0].metadata["source"] == str(tmp_path / "b.txt")
+    assert documents[0].metadata["version"]
+
+
+def test_iter_s3_documents():
+    s3_client = mock.MagicMock()
+    s3_client.get_paginator.return_value.paginate.return_value = [
+        {"Contents": [{"Key": "docs/a.txt", "ETag": '"etag-a"'}, {"Key": "docs/b.pdf", "ETag": '"etag-b"'}]}
+    ]
+    body = mock.MagicMock()
+    body.iter_chunks.return_value = [b"text of a \xc3", b"\xa9t\xc3\xa9"]
+    s3_client.get_object.return_value = {"Body": body}
+
+    documents = list(iter_s3_documents("s3://fake-bucket/docs/", s3_client=s3_client))
+
+    assert [document.metadata for document in documents] == [
+        {"source": "s3://fake-bucket/docs/a.txt", "version": "etag-a"}
+    ]
+    s3_client.get_paginator.return_value.paginate.assert_called_once_with(Bucket="fake-bucket", Prefix="docs/")
+    s3_client.get_object.assert_not_called()
+    assert "".join(documents[0].iter_blocks()) == "text of a été"
+    s3_client.get_object.assert_called_once_with(Bucket="fake-bucket", Key="docs/a.txt")
+
+
+@mock.patch("shared.knowledge.opensearch_ingestion.time.sleep")
+def test_with_retries(mock_sleep):
+    function = mock.MagicMock(side_effect=[Exception("throttled"), Exception("throttled"), "result"])
+
+    assert with_retries(function, "argument") == "result"
+    assert function.call_count == 3
+    assert mock_sleep.call_args_list == [mock.call(1), mock.call(2)]
+
+
+def test_ingest(client, embeddings, mock_bulk, tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoint")
+    pipeline = OpenSearchIngestionPipeline(
+        client,
+        embeddings,
+        "fake-index",
+        chunk_size=4,
+        chunk_overlap=0,
+        batch_size=2,
+        max_workers=2,
+        checkpoint=IngestionCheckpoint(checkpoint_path),
+    )
+    documents = [get_document("a.txt", "first chunk of a\n\nsecond chunk of a"), get_document("b.txt", "only b")]
+
+    assert pipeline.ingest(documents) == 3
+
+    assert embeddings.embed_documents.call_count == 2
+    actions = [action for call in mock_bulk.call_args_list for action in call.args[1]]
+    assert sorted(action["text"] for action in actions) == ["first chunk of a", "only b", "second chunk of a"]
+    assert all(action["_index"] == "fake-index" and len(action["_id"]) == 40 for action in actions)
+    assert {action["metadata"]["source"] for action in actions} == {"a.txt", "b.txt"}
+    assert all(action["content_hash"] == pipeline.get_content_hash(action["text"]) for action in actions)
+    assert {
+        action["text"]: (action["metadata"]["start_offset"], action["metadata"]["end_offset"]) for action in actions
+    } == {"first chunk of a": (0, 16), "second chunk of a": (18, 35), "only b": (0, 6)}
+    assert all(action["metadata"]["token_count"] in (2, 4) for action in actions)
+    with open(checkpoint_path) as checkpoint_file:
+        entries = [json.loads(line) for line in checkpoint_file]
+    assert sorted(entry["source"] for entry in entries) == ["a.txt", "b.txt"]
+    assert client.indices.put_settings.call_args_list == [
+        mock.call(index="fake-index", body={"index": {"refresh_interval": "-1"}}),
+        mock.call(index="fake-index", body={"index": {"refresh_interval": "5s"}}),
+    ]
+    client.indices.refresh.assert_called_once_with(index="fake-index")
+
+
+def test_ingest_resumes_from_checkpoint(client, embeddings, mock_bulk, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint"
+    checkpoint_path.write_text(json.dumps({"source": "a.txt", "version": "v1"}) + "\n")
+    pipeline = OpenSearchIngestionPipeline(
+        client, embeddings, "fake-index", checkpoint=IngestionCheckpoint(str(checkpoint_path))
+    )
+
+    written = pipeline.ingest(
+        [get_document("a.txt", "unchanged"), get_document("b.txt", "new"), get_document("c.txt", "changed", "v2")]
+    )
+
+    assert written == 2
+    embeddings.embed_documents.assert_called_once_with(["new", "changed"], 2)
+
+
+@mock.patch("shared.knowledge.opensearch_ingestion.time.sleep")
+def test_failed_batch_is_not_checkpointed(mock_sleep, client, embeddings, mock_bulk, tmp_path):
+    mock_bulk.side_effect = Exception("cluster unavailable")
+    checkpoint_path = str(tmp_path / "checkpoint")
+    pipeline = OpenSearchIngestionPipeline(
+        client, embeddings, "fake-index", checkpoint=IngestionCheckpoint(checkpoint_path)
+    )
+
+    with pytest.raises(Exception, match="cluster unavailable"):
+        pipeline.ingest([get_document("a.txt", "text of a")])
+
+    assert not IngestionCheckpoint(checkpoint_path).is_completed(get_document("a.txt", "text of a"))
+    client.indices.put_settings.assert_called_with(index="fake-index", body={"index": {"refresh_interval": "5s"}})
+
+
+def test_incremental_ingest_skips_unchanged_chunks(client, embeddings, mock_bulk):
+    pipeline = OpenSearchIngestionPipeline(client, embeddings, "fake-index", chunk_size=2, chunk_overlap=0)
+    unchanged_id = pipeline.get_chunk_id("a.txt", pipeline.get_content_hash("unchanged chunk"))
+    client.mget.side_effect = lambda index, body, _source: {
+        "docs": [{"_id": chunk_id, "found": chunk_id == unchanged_id} for chunk_id in body["ids"]]
+    }
+    client.delete_by_query.return_value = {"deleted": 1}
+    content_hashes = sorted([pipeline.get_content_hash("unchanged chunk"), pipeline.get_content_hash("edited chunk")])
+
+    written = pipeline.ingest([get_document("a.txt", "unchanged chunk\n\nedited chunk\n\nedited chunk", "v2")])
+
+    assert written == 1
+    assert pipeline.skipped_chunks == 1
+    assert pipeline.deleted_chunks == 1
+    embeddings.embed_documents.assert_called_once_with(["edited chunk"], 1)
+    client.delete_by_query.assert_called_once_with(
+        index="fake-index",
+        body={
+            "query": {
+                "bool": {
+                    "filter": [{"term": {"metadata.source": "a.txt"}}],
+                    "must_not": [{"terms": {"content_hash": content_hashes}}],
+                }
+            }
+        },
+        conflicts="proceed",
+    )
+
+
+def test_ingest_deletes_missing_sources(client, embeddings, mock_bulk, tmp_path):
+    checkpoint_path = tmp_path / "checkpoint"
+    entries = [{"source": "a.txt", "version": "v1"}, {"source": "gone.txt", "version": "v1"}]
+    checkpoint_path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    client.search.return_value = {
+        "aggregations": {"sources": {"buckets": [{"key": {"source": "a.txt"}}, {"key": {"source": "gone.txt"}}]}}
+    }
+    pipeline = OpenSearchIngestionPipeline(
+        client, embeddings, "fake-index", checkpoint=IngestionCheckpoint(str(checkpoint_path))
+    )
+
+    assert pipeline.ingest([get_document("a.txt", "unchanged")], delete_missing=True) == 0
+
+    client.delete_by_query.assert_called_once_with(
+        index="fake-index", body={"query": {"terms": {"metadata.source": ["gone.txt"]}}}, conflicts="proceed"
+    )
+    checkpoint = IngestionCheckpoint(str(checkpoint_path))
+    assert checkpoint.is_completed(get_document("a.txt", "unchanged"))
+    assert not checkpoint.is_completed(get_document("gone.txt", "reappeared"))
+
+
+def test_rebuild_index(client, embeddings, mock_bulk):
+    client.indices.exists.return_value = False
+    client.indices.exists_alias.return_value = True
+    client.indices.get_alias.return_value = {"kb-20240101000000": {"aliases": {"kb": {}}}}
+    client.indices.get_settings.return_value = {"kb-new": {"settings": {"index": {"refresh_interval": "5s"}}}}
+    config = KnnIndexConfig(dimension=2)
+
+    index_name = rebuild_index(client, embeddings, "kb", config, [get_document("a.txt", "text of a")])
+
+    assert index_name.startswith("kb-")
+    client.indices.create.assert_called_once_with(index=index_name, body=config.get_index_body())
+    client.mget.assert_not_called()
+    client.delete_by_query.assert_not_called()
+    assert mock_bulk.call_args.args[1][0]["_index"] == index_name
+    client.indices.update_aliases.assert_called_once_with(
+        body={
+            "actions": [
+                {"remove": {"index": "kb-20240101000000", "alias": "kb"}},
+                {"add": {"index": index_name, "alias": "kb"}},
+            ]
+        }
+    )
+    client.indices.delete.assert_called_once_with(index="kb-20240101000000")
+
+
+@mock.patch("shared.knowledge.opensearch_ingestion.OPENSEARCH_MAX_TERMS_COUNT", 1)
+def test_stale_chunks_of_large_documents_are_deleted_by_id(client, embeddings, mock_bulk):
+    client.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_id": "current-id", "_source": {"content_hash": "current"}, "sort": ["current"]},
+                {"_id": "stale-id", "_source": {"content_hash": "stale"}, "sort": ["stale"]},
+            ]
+        }
+    }
+    pipeline = OpenSearchIngestionPipeline(client, embeddings, "fake-index")
+
+    assert pipeline.delete_stale_chunks("a.txt", {"current", "other"}) == 1
+
+    client.delete_by_query.assert_not_called()
+    mock_bulk.assert_called_once_with(
+        client, [{"_op_type": "delete", "_index": "fake-index", "_id": "stale-id"}], raise_on_error=False
+    )
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from langchain.docstore.document import Document
+from shared.knowledge.opensearch_retriever import CustomOpenSearchRetriever
+
+QUERY_VECTOR = [1.0, 0.0, 0.0]
+HITS = [
+    {"_id": "1", "_score": 1.0, "_source": {"text": "doc-1", "metadata": {"source": "a"}, "vector_field": [1.0, 0.0, 0.0]}},
+    {"_id": "2", "_score": 0.99, "_source": {"text": "doc-2", "metadata": {"source": "a"}, "vector_field": [0.99, 0.01, 0.0]}},
+    {"_id": "3", "_score": 0.85, "_source": {"text": "doc-3", "metadata": {"source": "b"}, "vector_field": [0.7, 0.7, 0.0]}},
+]
+
+
+@pytest.fixture
+def docsearch():
+    docsearch = mock.MagicMock()
+    docsearch.index_name = "fake-index"
+    docsearch.client.search.return_value = {"hits": {"hits": HITS}}
+    yield docsearch
+
+
+@pytest.fixture
+def embeddings():
+    embeddings = mock.MagicMock()
+    embeddings.embed_query.return_value = QUERY_VECTOR
+    yield embeddings
+
+
+def test_similarity_search(docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(index_id="fake-index", docsearch=docsearch, embeddings=embeddings, top_k=3)
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="doc-1", metadata={"score": 1.0}),
+        Document(page_content="doc-2", metadata={"score": 0.99}),
+        Document(page_content="doc-3", metadata={"score": 0.85}),
+    ]
+    docsearch.client.search.assert_called_once_with(
+        index="fake-index",
+        body={
+            "size": 3,
+            "query": {"knn": {"vector_field": {"vector": QUERY_VECTOR, "k": 3}}},
+            "track_total_hits": False,
+            "_source": {"excludes": ["vector_field"]},
+        },
+    )
+
+
+def test_max_marginal_relevance_search(docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=2,
+        return_source_documents=True,
+        search_type="mmr",
+        fetch_k=3,
+        lambda_mult=0.3,
+    )
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="doc-1", metadata={"source": "a", "score": 1.0}),
+        Document(page_content="doc-3", metadata={"source": "b", "score": 0.85}),
+    ]
+    docsearch.client.search.assert_called_once_with(
+        index="fake-index",
+        body={
+            "size": 3,
+            "query": {"knn": {"vector_field": {"vector": QUERY_VECTOR, "k": 3}}},
+            "track_total_hits": False,
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "min_score, score_gap_cutoff, expected_contents",
+    [(0.9, False, ["doc-1", "doc-2"]), (0.995, False, ["doc-1"]), (None, True, ["doc-1", "doc-2"])],
+)
+def test_relevant_documents(min_score, score_gap_cutoff, expected_contents, docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=3,
+        min_score=min_score,
+        score_gap_cutoff=score_gap_cutoff,
+    )
+
+    assert [document.page_content for document in retriever.get_relevant_documents("fake-query")] == expected_contents
+
+
+def test_multi_query_search(docsearch, embeddings):
+    embeddings.embed_documents.return_value = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+    docsearch.client.msearch.return_value = {
+        "responses": [{"hits": {"hits": HITS[:2]}}, {"hits": {"hits": [HITS[2], HITS[1]]}}]
+    }
+    retriever = CustomOpenSearchRetriever(index_id="fake-index", docsearch=docsearch, embeddings=embeddings, top_k=2)
+
+    documents = retriever.get_relevant_documents_for_queries(["fake-query", "other-query"])
+
+    assert [document.page_content for document in documents] == ["doc-2", "doc-1"]
+    embeddings.embed_documents.assert_called_once_with(["fake-query", "other-query"])
+    docsearch.client.msearch.assert_called_once_with(
+        body=[
+            {"index": "fake-index"},
+            {
+                "size": 2,
+                "query": {"knn": {"vector_field": {"vector": [1.0, 0.0, 0.0], "k": 2}}},
+                "track_total_hits": False,
+                "_source": {"excludes": ["vector_field"]},
+            },
+            {"index": "fake-index"},
+            {
+                "size": 2,
+                "query": {"knn": {"vector_field": {"vector": [0.0, 1.0, 0.0], "k": 2}}},
+                "track_total_hits": False,
+                "_source": {"excludes": ["vector_field"]},
+            },
+        ]
+    )
+
+
+KNN_QUERY = {"knn": {"vector_field": {"vector": QUERY_VECTOR, "k": 3}}}
+TENANT_FILTER = {"term": {"metadata.tenant": "fake-tenant"}}
+
+
+@pytest.mark.parametrize(
+    "efficient_filter, expected_query",
+    [
+        (True, {"knn": {"vector_field": {"vector": QUERY_VECTOR, "k": 3, "filter": TENANT_FILTER}}}),
+        (False, {"bool": {"filter": TENANT_FILTER, "must": [KNN_QUERY]}}),
+    ],
+)
+def test_filtered_similarity_search(efficient_filter, expected_query, docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=3,
+        metadata_filter={"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+        efficient_filter=efficient_filter,
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    docsearch.client.search.assert_called_once_with(
+        index="fake-index",
+        body={
+            "size": 3,
+            "query": expected_query,
+            "track_total_hits": False,
+            "_source": {"excludes": ["vector_field"]},
+        },
+    )
+
+
+def test_filtered_max_marginal_relevance_search(docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=2,
+        search_type="mmr",
+        fetch_k=3,
+        metadata_filter={"ContainsAny": {"Key": "groups", "Value": ["admins"]}},
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    docsearch.client.search.assert_called_once_with(
+        index="fake-index",
+        body={
+            "size": 3,
+            "query": {
+                "knn": {
+                    "vector_field": {
+                        "vector": QUERY_VECTOR,
+                        "k": 3,
+                        "filter": {"terms": {"metadata.groups": ["admins"]}},
+                    }
+                }
+            },
+            "track_total_hits": False,
+        },
+    )
+
+
+def test_bounded_cached_search(docsearch, embeddings):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=3,
+        request_cache=True,
+        preference="fake-user",
+        track_total_hits=True,
+        search_timeout="500ms",
+        terminate_after=1000,
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    docsearch.client.search.assert_called_once_with(
+        index="fake-index",
+        body={
+            "size": 3,
+            "query": KNN_QUERY,
+            "track_total_hits": True,
+            "_source": {"excludes": ["vector_field"]},
+            "timeout": "500ms",
+            "terminate_after": 1000,
+        },
+        preference="fake-user",
+        request_cache="true",
+    )
+
+
+def test_search_template(docsearch, embeddings):
+    embeddings.embed_documents.return_value = [QUERY_VECTOR]
+    docsearch.client.search_template.return_value = {"hits": {"hits": HITS}}
+    docsearch.client.msearch_template.return_value = {"responses": [{"hits": {"hits": HITS[:2]}}]}
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        embeddings=embeddings,
+        top_k=3,
+        metadata_filter={"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+        search_template_id="fake-template",
+        request_cache=True,
+        preference="fake-user",
+    )
+
+    assert len(retriever.get_relevant_documents("fake-query")) == 3
+    assert len(retriever.get_relevant_documents_for_queries(["fake-query"])) == 2
+
+    params = {"query_vector": QUERY_VECTOR, "k": 3, "filter": TENANT_FILTER}
+    docsearch.client.search_template.assert_called_once_with(
+        index="fake-index", body={"id": "fake-template", "params": params}, preference="fake-user"
+    )
+    docsearch.client.msearch_template.assert_called_once_with(
+        body=[{"index": "fake-index", "preference": "fake-user"}, {"id": "fake-template", "params": params}]
+    )
+    docsearch.client.search.assert_not_called()
+
+
+def test_byte_encoded_query_vector(docsearch, embeddings):
+    embeddings.embed_query.return_value = [0.6, -0.8, 0.0]
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index", docsearch=docsearch, embeddings=embeddings, top_k=3, vector_encoding="byte"
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    assert docsearch.client.search.call_args.kwargs["body"]["query"] == {
+        "knn": {"vector_field": {"vector": [76, -102, 0], "k": 3}}
+    }
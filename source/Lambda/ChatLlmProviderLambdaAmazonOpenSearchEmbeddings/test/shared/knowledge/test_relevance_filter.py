@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import pytest
+from langchain.schema import Document
+from shared.knowledge.relevance_filter import select_relevant_documents
+
+
+def get_documents(*scores):
+    return [Document(page_content=f"doc-{index}", metadata={"score": score}) for index, score in enumerate(scores)]
+
+
+def get_contents(documents):
+    return [document.page_content for document in documents]
+
+
+def test_defaults_keep_all_documents():
+    documents = get_documents(0.9, 0.5, 0.1)
+    assert select_relevant_documents(documents) == documents
+
+
+def test_documents_without_score_are_unchanged():
+    documents = get_documents(0.9, 0.1) + [Document(page_content="doc-2")]
+    assert select_relevant_documents(documents, min_score=0.5, score_gap_cutoff=True) == documents
+
+
+def test_documents_are_ranked_by_score():
+    assert get_contents(select_relevant_documents(get_documents(0.2, 0.9, 0.5))) == ["doc-1", "doc-2", "doc-0"]
+
+
+@pytest.mark.parametrize(
+    "min_score, min_number_of_docs, expected_contents",
+    [
+        (0.5, 1, ["doc-0", "doc-1"]),
+        (0.95, 1, ["doc-0"]),
+        (0.95, 0, []),
+        (0.95, 3, ["doc-0", "doc-1", "doc-2"]),
+        (0.95, 10, ["doc-0", "doc-1", "doc-2", "doc-3"]),
+    ],
+)
+def test_min_score(min_score, min_number_of_docs, expected_contents):
+    documents = get_documents(0.9, 0.6, 0.3, 0.1)
+    relevant_documents = select_relevant_documents(
+        documents, min_score=min_score, min_number_of_docs=min_number_of_docs
+    )
+    assert get_contents(relevant_documents) == expected_contents
+
+
+@pytest.mark.parametrize(
+    "scores, min_number_of_docs, expected_count",
+    [
+        ((0.91, 0.9, 0.89, 0.5, 0.49), 1, 3),
+        ((0.91, 0.9, 0.89, 0.5, 0.49), 4, 5),
+        ((0.9, 0.8, 0.7, 0.6, 0.5), 1, 5),
+        ((0.9, 0.3), 1, 2),
+        ((12.0, 4.0, 3.5, 3.0), 1, 1),
+    ],
+)
+def test_score_gap_cutoff(scores, min_number_of_docs, expected_count):
+    relevant_documents = select_relevant_documents(
+        get_documents(*scores), min_number_of_docs=min_number_of_docs, score_gap_cutoff=True
+    )
+    assert len(relevant_documents) == expected_count
+
+
+def test_score_gap_cutoff_after_min_score():
+    relevant_documents = select_relevant_documents(
+        get_documents(0.95, 0.6, 0.58, 0.56, 0.2), min_score=0.5, score_gap_cutoff=True
+    )
+    assert get_contents(relevant_documents) == ["doc-0"]
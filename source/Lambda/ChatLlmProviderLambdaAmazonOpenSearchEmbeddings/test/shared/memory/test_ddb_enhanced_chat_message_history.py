@@ -178,3 +178,12 @@ def test_clear_error(caplog):
         )
         memory.clear()
         assert "delete error" in caplog.text
+
+
+def test_add_messages_appends_in_one_update(setup_test_table):
+    memory = DynamoDBChatMessageHistory(table_name, "fake-user-id", "fake-conversation-id")
+    message1 = HumanMessage(content="Hello AI!")
+    message2 = AIMessage(content="Hello from AI!")
+    memory.add_messages([message1, message2])
+    memory.add_messages([message1])
+    assert memory.messages == [message1, message2, message1]
@@ -26,13 +26,19 @@ OPENSEARCH_HOST = "OPENSEARCH_HOST"
 OPENSEARCH_AUTH = "OPENSEARCH_AUTH"
 OPENSEARCH_PORT = "OPENSEARCH_PORT"
 OPENSEARCH_INDEX_ID_ENV_VAR = "OPENSEARCH_INDEX_ID"
+LOCAL_VECTOR_STORE_URI_ENV_VAR = "LOCAL_VECTOR_STORE_URI"  # s3:// prefix or local directory, e.g. of a layer
+FAQ_INDEX_URI_ENV_VAR = "FAQ_INDEX_URI"  # s3:// prefix or local directory, the FAQ fast path is off when unset
+FAQ_MATCH_THRESHOLD_ENV_VAR = "FAQ_MATCH_THRESHOLD"
 WEBSOCKET_CALLBACK_URL_ENV_VAR = "WEBSOCKET_CALLBACK_URL"
-DEFAULT_OPENSEARCH_NUMBER_OF_DOCS = "DEFAULT_OPENSEARCH_NUMBER_OF_DOCS"
+DEFAULT_OPENSEARCH_NUMBER_OF_DOCS = 10
 RAG_ENABLED_ENV_VAR = "RAG_ENABLED"
 DDB_MESSAGE_TTL_ENV_VAR = "DDB_MESSAGE_TTL"
 USE_CASE_UUID_ENV_VAR = "USE_CASE_UUID"
 TRACE_ID_ENV_VAR = "_X_AMZN_TRACE_ID"
 TRACE_ID_ENV_VAR = "_X_AMZN_TRACE_ID"
+TRACE_CAPTURE_MODE_ENV_VAR = "TRACE_CAPTURE_MODE"
+TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR = "TRACE_CAPTURE_SAMPLE_RATE"
+TRACE_CAPTURE_MAX_SIZE_ENV_VAR = "TRACE_CAPTURE_MAX_SIZE"
 CHAT_REQUIRED_ENV_VARS = [
     LLM_PARAMETERS_SSM_KEY_ENV_VAR,
     CONVERSATION_TABLE_NAME_ENV_VAR,
@@ -49,6 +55,49 @@ PROMPT_EVENT_KEY = "promptTemplate"
 
 # Chat constants across models
 END_CONVERSATION_TOKEN = "##END_CONVERSATION##"
+SOURCE_DOCUMENTS_RESPONSE_KEY = "sourceDocuments"
+SOURCE_DOCUMENT_SNIPPET_LENGTH = 300
+COMBINE_DOCUMENTS_INPUT_KEY = "input_documents"  # input of the chain stuffing the final documents into the prompt
+CONDENSE_SELF_CONTAINED_MIN_WORDS = 8  # shorter follow-up questions are always condensed
+CONDENSE_REWRITE_CACHE_SIZE = 256
+# words that usually refer back to earlier turns of the conversation, making a question depend on the chat history
+CONDENSE_ANAPHORA_WORDS = {
+    "it",
+    "its",
+    "it's",
+    "itself",
+    "they",
+    "them",
+    "their",
+    "theirs",
+    "themselves",
+    "this",
+    "these",
+    "those",
+    "he",
+    "him",
+    "his",
+    "she",
+    "her",
+    "hers",
+    "former",
+    "latter",
+    "above",
+    "previous",
+    "earlier",
+    "same",
+    "else",
+    "another",
+    "one",
+    "ones",
+}
+CONDENSE_FOLLOW_UP_PREFIXES = ("and ", "but ", "also ", "so ", "what about", "how about", "then ")
+SPECULATIVE_RETRIEVAL_MIN_SIMILARITY = 0.6  # word overlap of the raw and condensed questions needed to keep the documents
+SPECULATIVE_RETRIEVAL_MAX_WORKERS = 2
+DEFAULT_MULTI_QUERY_MODE = "paraphrase"
+DEFAULT_MULTI_QUERY_NUM_QUERIES = 3  # queries generated for a question, searched along with the question itself
+MULTI_QUERY_MAX_WORKERS = 4
+RRF_K = 60  # rank offset of reciprocal rank fusion, a higher value flattens the weight of the top ranks
 USER_QUERY_LENGTH = 2500
 PROMPT_LENGTH = 2000
 METRICS_SERVICE_NAME = f"GAABUseCase-{os.getenv(USE_CASE_UUID_ENV_VAR)}"
@@ -57,8 +106,93 @@ DEFAULT_RAG_CHAIN_TYPE = "stuff"
 DEFAULT_KENDRA_NUMBER_OF_DOCS = 2
 DEFAULT_OPENSEARCH_NUMBER_OF_DOCS 
 DEFAULT_RETURN_SOURCE_DOCS = False
+DEFAULT_SEARCH_TYPE = "similarity"
+DEFAULT_MMR_FETCH_K = 20  # candidates fetched with their vectors for maximal marginal relevance
+DEFAULT_MMR_LAMBDA_MULT = 0.5
+DEFAULT_MIN_SCORE = None  # no relevance threshold, every fetched document is kept
+DEFAULT_MIN_NUMBER_OF_DOCS = 1  # documents kept whatever their scores
+DEFAULT_SCORE_GAP_CUTOFF = False
+SCORE_GAP_MIN_RATIO = 2.0  # the largest score gap only cuts the documents when this many times the mean other gap
+KENDRA_SCORE_CONFIDENCE_VALUES = {"VERY_HIGH": 1.0, "HIGH": 0.75, "MEDIUM": 0.5, "LOW": 0.25, "NOT_AVAILABLE": 0.0}
+OPENSEARCH_METADATA_FIELD = "metadata"  # object field of the indexed documents holding their metadata
+DEFAULT_OPENSEARCH_EFFICIENT_FILTER = True  # filter inside the k-NN search, requires the lucene or faiss engine
+DEFAULT_OPENSEARCH_REQUEST_CACHE = False  # cache the results of identical searches in the shard request cache
+DEFAULT_OPENSEARCH_SESSION_PREFERENCE = False  # route the searches of a user to the same shard copies
+DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS = False  # the retrievers never read the total number of hits
+DEFAULT_OPENSEARCH_SEARCH_TIMEOUT = None  # e.g. "2s", partial results are returned after it
+DEFAULT_OPENSEARCH_TERMINATE_AFTER = None  # documents collected per shard before a search stops early
+DEFAULT_OPENSEARCH_PRIME_CONNECTION = True  # open a pooled connection when the knowledge base is first set up
+DEFAULT_OPENSEARCH_KNN_WARMUP = False  # load the k-NN graphs of the index in memory when a container starts
+KNN_WARMUP_INTERVAL = 3600  # seconds between two k-NN warmups of an index by the same container
+OPENSEARCH_TEXT_FIELD = "text"  # field of the indexed documents holding their text
+OPENSEARCH_VECTOR_FIELD = "vector_field"  # knn_vector field of the indexed documents holding their embedding
+OPENSEARCH_CONTENT_HASH_FIELD = "content_hash"  # keyword field of the indexed chunks holding the hash of their text
+DEFAULT_KNN_ENGINE = "faiss"
+DEFAULT_KNN_SPACE_TYPE = "l2"
+DEFAULT_KNN_M = 16  # graph edges per vector, memory grows with it by 8 bytes per edge
+DEFAULT_KNN_EF_CONSTRUCTION = 128
+DEFAULT_KNN_EF_SEARCH = 100
+DEFAULT_VECTOR_ENCODING = "float"
+DEFAULT_KNN_NUMBER_OF_SHARDS = 1
+DEFAULT_KNN_NUMBER_OF_REPLICAS = 1
+KNN_GRAPH_MEMORY_OVERHEAD = 1.1  # HNSW memory is about 1.1 * (bytes per dimension * dimension + 8 * m) per vector
+BYTE_VECTOR_SCALE = 127  # unit-normalized embeddings are scaled to [-127, 127] for byte vectors
+DEFAULT_INGESTION_CHUNK_SIZE = 256  # tokens per indexed chunk
+DEFAULT_INGESTION_CHUNK_OVERLAP = 32  # tokens shared by consecutive chunks of a document
+INGESTION_READ_BLOCK_SIZE = 64 * 1024  # characters, or bytes from S3, read from a document at a time
+INGESTION_MAX_TOKEN_CHARACTERS = 32  # longer runs of word characters are split, so no token grows unbounded
+OPENSEARCH_MAX_TERMS_COUNT = 65536  # default index.max_terms_count, the most values of a terms query
+DEFAULT_INGESTION_BATCH_SIZE = 32  # chunks per embedding call and per _bulk request, within the 6 MB endpoint payload
+DEFAULT_INGESTION_WORKERS = 4  # batches embedded and written concurrently
+INGESTION_MAX_RETRIES = 5
+INGESTION_INITIAL_BACKOFF = 1  # seconds, doubled after each retry
+INGESTION_MAX_BACKOFF = 30  # seconds
+INGESTION_FILE_EXTENSIONS = [".txt", ".md", ".html", ".htm", ".json", ".csv"]
+INGESTION_SOURCES_PAGE_SIZE = 500  # sources per composite aggregation page and per delete request
+REBUILD_INDEX_SUFFIX_FORMAT = "%Y%m%d%H%M%S"  # suffix of the indices built behind an alias, in UTC
+DEFAULT_LOCAL_VECTOR_NUMBER_OF_DOCS = 10
+LOCAL_VECTOR_STORE_CACHE_DIR = "/tmp/local_vector_store"  # local vector stores downloaded from S3, one directory each
+LOCAL_VECTOR_SEARCH_BLOCK_ROWS = 4096  # rows scored per matrix product, keeps the float32 copy of a block in cache
+DEFAULT_IVF_LISTS = 0  # inverted lists of a local vector store, 0 for an exact search over all vectors
+DEFAULT_IVF_NPROBE = 8  # inverted lists scanned per query, a higher value trades latency for recall
+IVF_TRAINING_ITERATIONS = 10  # k-means iterations training the centroids of the inverted lists
+IVF_TRAINING_SAMPLES_PER_LIST = 256  # vectors sampled per inverted list to train the centroids
+DEFAULT_FAQ_MATCH_THRESHOLD = 0.92  # cosine similarity from which a question is answered from the FAQ index
+FAQ_ANSWER_METADATA_KEY = "answer"  # metadata of the FAQ index documents holding the stored answer
 DEFAULT_MAX_TOKENS_TO_SAMPLE = 256
+DEFAULT_CONDENSING_MAX_TOKENS_TO_SAMPLE = 128  # a standalone question is short, so the condensing model is capped
+DEFAULT_CONDENSING_TEMPERATURE = 0.0
 DEFAULT_VERBOSE_MODE = False
+DEFAULT_SPECULATIVE_RETRIEVAL = False
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2048  # maximum tokens of retrieved documents placed in a RAG prompt
+ESTIMATED_CHARACTERS_PER_TOKEN = 4
+DOCUMENT_SCORE_METADATA_KEY = "score"
+DOCUMENT_EMBEDDING_METADATA_KEY = "embedding"
+DEFAULT_DEDUPLICATION_THRESHOLD = 0.8  # estimated similarity above which a retrieved document is a near-duplicate
+DEDUPLICATION_CANDIDATE_FACTOR = 2  # candidates fetched per kept document when near-duplicates are removed
+MINHASH_NUM_PERMUTATIONS = 64
+MINHASH_SHINGLE_SIZE = 3  # words per shingle
+MINHASH_SEED = 1
+DEFAULT_RERANK_TOP_N = 3  # documents kept after reranking
+DEFAULT_RERANK_TIMEOUT = 1.0  # seconds to wait for the rerank endpoint before the retrieval order is used
+RERANK_MAX_WORKERS = 2
+DEFAULT_COMPRESSION_TOP_SENTENCES = 3  # most relevant sentences kept from each document
+DEFAULT_COMPRESSION_CONTEXT_SENTENCES = 1  # sentences kept on each side of a relevant sentence
+DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_OUTPUT_TOKENS_PARAM_NAMES = (
+    "maxTokenCount",
+    "maxTokens",
+    "max_tokens_to_sample",
+    "max_gen_len",
+    "max_tokens",
+    "max_new_tokens",
+    "max_length",
+)
+DEFAULT_TRACE_CAPTURE_MODE = "truncated"
+DEFAULT_TRACE_CAPTURE_SAMPLE_RATE = 10  # percentage of calls whose response is captured in sampled mode
+DEFAULT_TRACE_CAPTURE_MAX_SIZE = 4096  # characters of a serialized response kept in the trace
 
 RAG_KEY = "RAG"
 HUGGINGFACE_RAG = LLMProviderTypes.HUGGING_FACE.value + RAG_KEY
@@ -152,6 +286,7 @@ MAX_HUGGINGFACE_TEMPERATURE = 100.0
 DEFAULT_HUGGINGFACE_RAG_ENABLED_MODE = True
 DEFAULT_HUGGINGFACE_STREAMING_MODE = False
 DEFAULT_HUGGINGFACE_MODEL = "google/flan-t5-xxl"
+DEFAULT_HUGGINGFACE_CONTEXT_WINDOW = 1024
 
 DEFAULT_HUGGINGFACE_PROMPT = DEFAULT_CHAT_PROMPT
 DEFAULT_HUGGINGFACE_PLACEHOLDERS = [
@@ -185,6 +320,7 @@ DEFAULT_ANTHROPIC_MODEL = "claude-instant-v1"
 DEFAULT_ANTHROPIC_TEMPERATURE = 1.0
 DEFAULT_ANTHROPIC_RAG_ENABLED_MODE = True
 DEFAULT_ANTHROPIC_STREAMING_MODE = True
+DEFAULT_ANTHROPIC_CONTEXT_WINDOW = 100000
 
 DEFAULT_ANTHROPIC_PROMPT = """
 
@@ -269,6 +405,13 @@ DEFAULT_BEDROCK_TEMPERATURE_MAP = {
     BedrockModelProviders.META.value: 0.5,
     BedrockModelProviders.COHERE.value: 0.75,
 }
+BEDROCK_CONTEXT_WINDOW_MAP = {
+    BedrockModelProviders.AMAZON.value: 8000,
+    BedrockModelProviders.AI21.value: 8191,
+    BedrockModelProviders.ANTHROPIC.value: 100000,
+    BedrockModelProviders.META.value: 4096,
+    BedrockModelProviders.COHERE.value: 4000,
+}
 BEDROCK_STOP_SEQUENCES = {
     BedrockModelProviders.ANTHROPIC.value: [],
     BedrockModelProviders.AMAZON.value: ["|"],
@@ -340,6 +483,21 @@ DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE = PromptTemplate.from_template(
     f"[INST] {CONDENSE_QUESTION_PROMPT.template} [/INST]"
 )
 
+MULTI_QUERY_PARAPHRASE_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    """Write {num_queries} different versions of the following question, to search a knowledge base for the documents that answer it. Vary the wording and the terms used, but keep the meaning. Write one version per line, without numbering or any other text.
+
+Question: {question}
+Versions:"""
+)
+
+# hypothetical document embeddings (HyDE): the passage is searched for, as it is closer to the documents than the question
+MULTI_QUERY_HYDE_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    """Write a short passage, of a few sentences, that answers the following question as a document of a knowledge base would.
+
+Question: {question}
+Passage:"""
+)
+
 # Chat environment variables
 LLM_PARAMETERS_SSM_KEY_ENV_VAR = "SSM_LLM_CONFIG_KEY"
 LLM_PROVIDER_API_KEY_ENV_VAR = "LLM_API_KEY_NAME"
@@ -20,6 +20,36 @@ class KnowledgeBaseTypes(str, Enum):
 
     Kendra = "Kendra"
     OpenSearch = "OpenSearch"
+    LocalVector = "LocalVector"
+
+
+class RetrievalSearchTypes(str, Enum):
+    """Supported ways of selecting the retrieved documents"""
+
+    SIMILARITY = "similarity"
+    MMR = "mmr"
+
+
+class KnnEngines(str, Enum):
+    """Supported engines of the k-NN vector index"""
+
+    FAISS = "faiss"
+    LUCENE = "lucene"
+
+
+class VectorEncodings(str, Enum):
+    """Supported encodings of the vectors of the k-NN index"""
+
+    FLOAT = "float"
+    FP16 = "fp16"
+    BYTE = "byte"
+
+
+class MultiQueryModes(str, Enum):
+    """Supported ways of generating the additional queries of a multi-query retrieval"""
+
+    PARAPHRASE = "paraphrase"
+    HYDE = "hyde"
 
 
 class ConversationMemoryTypes(str, Enum):
@@ -46,6 +76,50 @@ class BedrockModelProviders(str, Enum):
     COHERE = "COHERE"
 
 
+class RequestStages(str, Enum):
+    """Stages of a chat request whose durations are reported to the request timer"""
+
+    FAQ_MATCH = "FaqMatch"
+    LLM_CONFIG = "LlmConfig"
+    API_KEY = "ApiKey"
+    KNOWLEDGE_BASE = "KnowledgeBase"
+    OPENSEARCH_PRIMING = "OpenSearchPriming"
+    LLM_SETUP = "LlmSetup"
+    MEMORY_READ = "MemoryRead"
+    CONDENSE_LLM = "CondenseLlm"
+    QUERY_EXPANSION = "QueryExpansion"
+    RETRIEVAL = "Retrieval"
+    RERANK = "Rerank"
+    ANSWER_LLM = "AnswerLlm"
+    WEBSOCKET_POST = "WebsocketPost"
+    MEMORY_WRITE = "MemoryWrite"
+    TOTAL = "Total"
+
+
+class RequestFlags(str, Enum):
+    """Flags describing a chat request that are reported alongside the stage durations"""
+
+    COLD_START = "ColdStart"
+    CONDENSE_SKIPPED = "CondenseSkipped"
+    CONDENSE_CACHE_HIT = "CondenseCacheHit"
+    SPECULATIVE_RETRIEVAL_HIT = "SpeculativeRetrievalHit"
+    CONTEXT_TOKENS = "ContextTokens"
+    DUPLICATE_DOCUMENTS = "DuplicateDocuments"
+    RERANK_FALLBACK = "RerankFallback"
+    COMPRESSION_RATIO = "CompressionRatio"
+    RELEVANT_DOCUMENTS = "RelevantDocuments"
+    EXPANDED_QUERIES = "ExpandedQueries"
+    FAQ_HIT = "FaqHit"
+
+
+class TraceCaptureModes(str, Enum):
+    """Supported policies for capturing method responses in X-Ray traces"""
+
+    OFF = "off"
+    SAMPLED = "sampled"
+    TRUNCATED = "truncated"
+
+
 class CloudWatchNamespaces(str, Enum):
     """Supported Cloudwatch Namespaces"""
 
@@ -54,8 +128,8 @@ class CloudWatchNamespaces(str, Enum):
     AWS_KENDRA = "AWS/Kendra"
     AWS_OPENSEARCH = "AWS/OpenSearch"
     LANGCHAIN_LLM = "Langchain/LLM"
+    REQUEST_STAGES = "Solution/RequestStages"
     USE_CASE_DEPLOYMENTS = "Solution/UseCaseDeployments"
-    COLD_STARTS = "Solution/ColdStarts"
 
 
 class CloudWatchMetrics(str, Enum):
@@ -76,6 +150,13 @@ class CloudWatchMetrics(str, Enum):
     LANGCHAIN_QUERY = "LangchainQueries"
     LANGCHAIN_FAILURES = "LangchainFailures"
     LANGCHAIN_QUERY_PROCESSING_TIME = "LangchainQueryProcessingTime"
+    LLM_TIME_TO_FIRST_TOKEN = "TimeToFirstToken"
+    LLM_INTER_TOKEN_LATENCY_P50 = "InterTokenLatencyP50"
+    LLM_INTER_TOKEN_LATENCY_P90 = "InterTokenLatencyP90"
+    LLM_INTER_TOKEN_LATENCY_P99 = "InterTokenLatencyP99"
+    LLM_TOKENS_PER_SECOND = "TokensPerSecond"
+    LLM_STREAMED_TOKENS = "StreamedTokens"
+    WEBSOCKET_POST_TO_CONNECTION_TIME = "PostToConnectionTime"
     INCORRECT_INPUT_FAILURES = "IncorrectInputFailures"
     KENDRA_QUERY = "KendraQueries"
     KENDRA_FETCHED_DOCUMENTS = "KendraFetchedDocuments"
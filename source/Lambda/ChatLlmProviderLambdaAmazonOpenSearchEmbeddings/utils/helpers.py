@@ -13,16 +13,18 @@
 ######################################################################################################################
 
 import json
+import math
 import os
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
-from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools import Logger
 from aws_lambda_powertools.metrics import MetricUnit
-from utils.constants import METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
+from utils.constants import SOURCE_DOCUMENT_SNIPPET_LENGTH, TRACE_ID_ENV_VAR
 from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
 
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 TYPE_CASTING_MAP = {
     "integer": int,
@@ -117,3 +119,54 @@ def validate_prompt_template(prompt_template: str, required_placeholders: List[s
             else:
                 found = True
                 start += len(formatted_placeholder)
+
+
+def format_source_documents(documents: List[Any], snippet_length: int = SOURCE_DOCUMENT_SNIPPET_LENGTH) -> List[Dict[str, Any]]:
+    """
+    Converts retrieved documents into a compact, JSON serializable list of source references that can be sent to the
+    websocket client. Only the document id, source, score and a snippet of the page content are kept.
+
+    Args:
+        documents (List[Any]): List of Langchain Document objects (or dicts with the same keys) returned by a retriever
+        snippet_length (int): Maximum number of characters of the page content to keep in the snippet
+
+    Returns:
+        List[Dict[str, Any]]: List of compact source references
+    """
+    sources = []
+    for index, document in enumerate(documents or []):
+        if isinstance(document, dict):
+            page_content = document.get("page_content") or ""
+            metadata = document.get("metadata") or {}
+        else:
+            page_content = getattr(document, "page_content", "") or ""
+            metadata = getattr(document, "metadata", {}) or {}
+
+        source = {
+            "id": str(metadata.get("id", index)),
+            "source": metadata.get("source"),
+            "score": metadata.get("score"),
+            "snippet": page_content[:snippet_length],
+        }
+        sources.append({key: value for key, value in source.items() if value is not None})
+
+    return sources
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Computes the given percentile of a list of values using the nearest-rank method.
+
+    Args:
+        values (List[float]): Values to compute the percentile over
+        pct (float): Percentile to compute, between 0 and 100
+
+    Returns:
+        Optional[float]: The percentile value, or None if no values were provided
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(int(math.ceil(pct / 100.0 * len(ordered))), 1)
+    return ordered[min(rank, len(ordered)) - 1]
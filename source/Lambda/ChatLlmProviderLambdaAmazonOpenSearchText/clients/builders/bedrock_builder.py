@@ -15,7 +15,7 @@
 import os
 from typing import Dict, Optional
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from clients.builders.llm_builder import LLMBuilder
 from llm_models.bedrock import BedrockLLM
@@ -23,16 +23,18 @@ from llm_models.rag.bedrock_retrieval import BedrockRetrievalLLM
 from utils.constants import (
     BEDROCK_MODEL_MAP,
     DEFAULT_BEDROCK_RAG_ENABLED_MODE,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_SPECULATIVE_RETRIEVAL,
     MEMORY_CONFIG,
-    METRICS_SERVICE_NAME,
     RAG_KEY,
     TRACE_ID_ENV_VAR,
 )
 from utils.enum_types import BedrockModelProviders, CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class BedrockBuilder(LLMBuilder):
@@ -81,8 +83,6 @@ class BedrockBuilder(LLMBuilder):
             metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES.value, unit=MetricUnit.Count, value=1)
             bedrock_family = BedrockModelProviders.AMAZON.value
             bedrock_model = BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"]
-        finally:
-            metrics.flush_metrics()
 
         self.model_family = bedrock_family
         self.model = bedrock_model
@@ -139,6 +139,16 @@ class BedrockBuilder(LLMBuilder):
         if self.rag_enabled and not self.knowledge_base:
             raise ValueError("KnowledgeBase is required for RAG-enabled Bedrock chat model.")
         elif self.rag_enabled and self.knowledge_base:
-            self.llm_model = BedrockRetrievalLLM(**self.model_params)
+            self.llm_model = BedrockRetrievalLLM(
+                **self.model_params,
+                condensing_model=llm_params.get("CondensingModelId"),
+                condensing_model_params=llm_params.get("CondensingModelParams"),
+                speculative_retrieval=llm_params.get("SpeculativeRetrieval", DEFAULT_SPECULATIVE_RETRIEVAL),
+                context_token_budget=llm_params.get("ContextTokenBudget", DEFAULT_CONTEXT_TOKEN_BUDGET),
+                deduplication_threshold=llm_params.get("DeduplicationThreshold"),
+                rerank_params=llm_params.get("RerankParams"),
+                compression_params=llm_params.get("CompressionParams"),
+                multi_query_params=llm_params.get("MultiQueryParams"),
+            )
         else:
             self.llm_model = BedrockLLM(**self.model_params, rag_enabled=self.rag_enabled)
@@ -21,6 +21,7 @@ from botocore.exceptions import ClientError
 from clients.factories.conversation_memory_factory import ConversationMemoryFactory
 from clients.factories.knowledge_base_factory import KnowledgeBaseFactory
 from helper import get_service_client
+from shared.callbacks.websocket_source_documents_handler import WebsocketSourceDocumentsHandler
 from shared.callbacks.websocket_streaming_handler import WebsocketStreamingCallbackHandler
 from utils.constants import LLM_PROVIDER_API_KEY_ENV_VAR, MEMORY_CONFIG, RAG_KEY, TRACE_ID_ENV_VAR
 
@@ -63,6 +64,7 @@ class LLMBuilder(ABC):
         set_llm_model(): Sets the value of the lLM model in the builder based on the selected LLM Provider
         set_api_key(): Sets the value of the API key for the LLM model
         set_streaming_callbacks(): Sets the value of callbacks for the LLM model
+        set_source_documents_callbacks(): Sets the callbacks on the knowledge base retriever which send the source documents to the client
     """
 
     def __init__(
@@ -223,16 +225,33 @@ class LLMBuilder(ABC):
     def conversation_id(self, conversation_id) -> None:
         self._conversation_id = conversation_id
 
-    def set_knowledge_base(self) -> None:
+    def set_knowledge_base(self, user_context: Optional[Dict] = None) -> None:
         """
         Sets the knowledge base object that is used to supplement the LLM context using information from the user's knowledge base
+
+        Args:
+            user_context (Dict): authorizer context of the request, for the filters on user attributes [optional]
         """
         if self.rag_enabled:
-            self.knowledge_base = KnowledgeBaseFactory().get_knowledge_base(self.llm_config, self.errors)
+            self.knowledge_base = KnowledgeBaseFactory().get_knowledge_base(self.llm_config, self.errors, user_context)
+            self.set_source_documents_callbacks()
         else:
             self.knowledge_base = None
             logger.info("Proceeding to build the LLM without the Knowledge Base as its not specified.")
 
+    def set_source_documents_callbacks(self) -> None:
+        """
+        Sets the retriever callbacks on the knowledge base which send the source documents placed in the prompt to the websocket
+        client as soon as they are known, when the knowledge base is configured to return source documents.
+        """
+        if self.knowledge_base and getattr(self.knowledge_base, "return_source_documents", False):
+            self.knowledge_base.retriever_callbacks = [
+                WebsocketSourceDocumentsHandler(
+                    connection_id=self.connection_id,
+                    conversation_id=self.conversation_id,
+                )
+            ]
+
     def set_memory_constants(self, llm_provider) -> None:
         memory_config_key = llm_provider + RAG_KEY if self.rag_enabled else llm_provider
         keys = MEMORY_CONFIG[memory_config_key]
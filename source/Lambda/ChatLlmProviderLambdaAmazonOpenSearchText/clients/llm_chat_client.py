@@ -34,7 +34,9 @@ from utils.constants import (
     USER_ID_EVENT_KEY,
     USER_QUERY_LENGTH,
 )
-from utils.enum_types import LLMProviderTypes
+from utils.enum_types import LLMProviderTypes, RequestStages
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
@@ -52,6 +54,7 @@ class LLMChatClient(ABC):
         llm_config (Dict): Stores the configuration that the admin sets on a use-case, fetched from SSM Parameter store
         rag_enabled (bool): Stores the value of the RAG feature flag that is set on the use-case
         connection_id (str): The connection ID for the websocket client
+        user_context (Dict): The authorizer context of the request, used to restrict the retrieved documents to the user
 
     Methods:
         check_env(List[str]): Checks if the environment variable list provided, along with other required environment variables, are set.
@@ -69,12 +72,14 @@ class LLMChatClient(ABC):
         llm_config: Optional[Dict] = None,
         rag_enabled: Optional[Union[str, bool]] = None,
         connection_id: Optional[str] = None,
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._builder = builder
         self._llm_config = llm_config
         # convert string env to bool
         self._rag_enabled = rag_enabled if type(rag_enabled) == bool else rag_enabled.lower() == "true"
         self._connection_id = connection_id
+        self._user_context = user_context
 
     @property
     def builder(self) -> Optional[LLMBuilder]:
@@ -108,6 +113,14 @@ class LLMChatClient(ABC):
     def connection_id(self, connection_id) -> None:
         self._connection_id = connection_id
 
+    @property
+    def user_context(self) -> Optional[Dict]:
+        return self._user_context
+
+    @user_context.setter
+    def user_context(self, user_context) -> None:
+        self._user_context = user_context
+
     @classmethod
     def check_env(cls, additional_keys: Optional[List[str]] = []) -> None:
         """
@@ -135,6 +148,7 @@ class LLMChatClient(ABC):
         """
         Checks if the event it receives is as expected (checking for required fields),
         and adds the user id into the event body (comes from requestContext from custom authorizer).
+        The authorizer context is kept as the user context, for the knowledge base filters on user attributes.
         If the event body does not contain the conversation_id, it also adds it in.
 
         Args:
@@ -188,9 +202,11 @@ class LLMChatClient(ABC):
 
         parsed_event_body[CONVERSATION_ID_EVENT_KEY] = self.get_event_conversation_id(parsed_event_body)
         parsed_event_body[USER_ID_EVENT_KEY] = user_id
+        self.user_context = event["requestContext"]["authorizer"]
         return parsed_event_body
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def get_llm_config(self) -> Dict:
         """
         Retrieves the configuration that the admin sets on a use-case from the SSM Parameter store
@@ -205,8 +221,9 @@ class LLMChatClient(ABC):
             ssm_param_key = os.getenv(LLM_PARAMETERS_SSM_KEY_ENV_VAR)
             try:
                 if ssm_param_key:
-                    ssm_client = get_service_client(service_name="ssm")
-                    llm_config = ssm_client.get_parameter(Name=ssm_param_key, WithDecryption=True)
+                    with request_timer.stage(RequestStages.LLM_CONFIG):
+                        ssm_client = get_service_client(service_name="ssm")
+                        llm_config = ssm_client.get_parameter(Name=ssm_param_key, WithDecryption=True)
                     self.llm_config = json.loads(llm_config["Parameter"]["Value"])
                     return self.llm_config
                 else:
@@ -253,11 +270,14 @@ class LLMChatClient(ABC):
                 )
                 raise ValueError(f"Builder is not set for this LLMChatClient.")
 
-            self.builder.set_knowledge_base()
+            with request_timer.stage(RequestStages.KNOWLEDGE_BASE):
+                self.builder.set_knowledge_base(self.user_context)
             self.builder.set_memory_constants(llm_provider)
             self.builder.set_conversation_memory(user_id, conversation_id)
-            self.builder.set_api_key()
-            self.builder.set_llm_model()
+            with request_timer.stage(RequestStages.API_KEY):
+                self.builder.set_api_key()
+            with request_timer.stage(RequestStages.LLM_SETUP):
+                self.builder.set_llm_model()
 
         else:
             error_message = (
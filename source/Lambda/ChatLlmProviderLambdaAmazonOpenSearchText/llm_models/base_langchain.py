@@ -17,19 +17,22 @@ import time
 from abc import ABC
 from typing import Any, Dict, List, Optional, Tuple
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from langchain.chains import ConversationChain
 from langchain.prompts import PromptTemplate
 from langchain.schema import BaseMemory
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
 from shared.knowledge.knowledge_base import KnowledgeBase
-from utils.constants import METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
+from utils.constants import TRACE_ID_ENV_VAR
 from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
 from utils.helpers import type_cast, validate_prompt_template
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 tracer = Tracer()
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class BaseLangChainModel(ABC):
@@ -249,7 +252,8 @@ class BaseLangChainModel(ABC):
             llm=self.llm, verbose=self.verbose, memory=self.conversation_memory, prompt=self.prompt_template
         )
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def generate(self, question: str) -> Dict[str, Any]:
         """
         Fetches the response from the LLM
@@ -272,7 +276,7 @@ class BaseLangChainModel(ABC):
 
             try:
                 start_time = time.time()
-                response = self.conversation_chain.predict(input=question)
+                response = self.conversation_chain.predict(input=question, callbacks=[StageTimingCallbackHandler()])
                 end_time = time.time()
 
                 metrics.add_metric(
@@ -289,8 +293,6 @@ class BaseLangChainModel(ABC):
                 )
                 metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES.value, unit=MetricUnit.Count, value=1)
                 raise ex
-            finally:
-                metrics.flush_metrics()
 
     def get_prompt_details(
         self,
@@ -336,43 +338,38 @@ class BaseLangChainModel(ABC):
             )
             prompt_template_text = default_prompt_template
 
-        finally:
-            metrics.flush_metrics()
-
         return (
             PromptTemplate(template=prompt_template_text, input_variables=default_prompt_template_placeholders),
             default_prompt_template_placeholders,
         )
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def get_clean_model_params(self, model_params) -> Dict:
         """
         Sanitizes the model parameters. Implementation is model specific
         Args: None
         Returns: None
         """
-        try:
-            if not model_params:
-                return {}
-
-            sanitized_model_params = {}
-
-            for param_name, param_value in model_params.items():
-                if param_name is not None and param_value is not None:
-                    # If type_cast fails, error is logged and CloudWatchMetrics.INCORRECT_INPUT_FAILURES.value is incremented.
-                    # Method returns None and the parameter is skipped from being used in the model, instead of causing a failure.
-                    sanitized_param_value = type_cast(param_value.get("Value"), param_value.get("Type"))
-                    if sanitized_param_value:
-                        sanitized_model_params[param_name] = sanitized_param_value
-                else:
-                    logger.error(
-                        f"Malformed model parameters received with parameter name: {param_name} and value: {param_value}",
-                        xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
-                    )
-                    metrics.add_metric(
-                        name=CloudWatchMetrics.INCORRECT_INPUT_FAILURES.value, unit=MetricUnit.Count, value=1
-                    )
-        finally:
-            metrics.flush_metrics()
+        if not model_params:
+            return {}
+
+        sanitized_model_params = {}
+
+        for param_name, param_value in model_params.items():
+            if param_name is not None and param_value is not None:
+                # If type_cast fails, error is logged and CloudWatchMetrics.INCORRECT_INPUT_FAILURES.value is incremented.
+                # Method returns None and the parameter is skipped from being used in the model, instead of causing a failure.
+                sanitized_param_value = type_cast(param_value.get("Value"), param_value.get("Type"))
+                if sanitized_param_value:
+                    sanitized_model_params[param_name] = sanitized_param_value
+            else:
+                logger.error(
+                    f"Malformed model parameters received with parameter name: {param_name} and value: {param_value}",
+                    xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
+                )
+                metrics.add_metric(
+                    name=CloudWatchMetrics.INCORRECT_INPUT_FAILURES.value, unit=MetricUnit.Count, value=1
+                )
 
         return sanitized_model_params
@@ -0,0 +1,205 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import re
+from typing import List, Optional
+
+import numpy as np
+from aws_lambda_powertools import Logger
+from langchain.schema import Document
+from utils.constants import (
+    BM25_B,
+    BM25_K1,
+    DEFAULT_COMPRESSION_CONTEXT_SENTENCES,
+    DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT,
+    DEFAULT_COMPRESSION_TOP_SENTENCES,
+    ESTIMATED_CHARACTERS_PER_TOKEN,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+TERM_PATTERN = re.compile(r"\w+")
+SKIPPED_SENTENCES_MARKER = " ... "
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Splits a text into sentences, at sentence ending punctuation followed by whitespace and at line breaks.
+
+    Args:
+        text (str): the text to split
+
+    Returns:
+        List[str]: the non-empty sentences, in order
+    """
+    return [sentence.strip() for sentence in SENTENCE_SPLIT_PATTERN.split(text) if sentence.strip()]
+
+
+def get_bm25_scores(query: str, sentences: List[str]) -> np.ndarray:
+    """
+    Scores sentences against a query with BM25, treating every sentence as a document of the corpus. Only the query
+    terms are counted, and the scores of all sentences are computed at once from the (sentences x query terms) matrix
+    of term frequencies.
+
+    Args:
+        query (str): the question
+        sentences (List[str]): the sentences to score
+
+    Returns:
+        np.ndarray: the score of each sentence, 0 for a sentence with no query term
+    """
+    query_terms = sorted(set(TERM_PATTERN.findall(query.lower())))
+    if not sentences or not query_terms:
+        return np.zeros(len(sentences))
+
+    term_index = {term: index for index, term in enumerate(query_terms)}
+    term_frequencies = np.zeros((len(sentences), len(query_terms)))
+    sentence_lengths = np.zeros(len(sentences))
+    for sentence_index, sentence in enumerate(sentences):
+        terms = TERM_PATTERN.findall(sentence.lower())
+        sentence_lengths[sentence_index] = len(terms)
+        for term in terms:
+            if term in term_index:
+                term_frequencies[sentence_index, term_index[term]] += 1
+
+    document_frequencies = (term_frequencies > 0).sum(axis=0)
+    idf = np.log(1 + (len(sentences) - document_frequencies + 0.5) / (document_frequencies + 0.5))
+    length_norm = BM25_K1 * (1 - BM25_B + BM25_B * sentence_lengths / max(sentence_lengths.mean(), 1))
+    return (idf * term_frequencies * (BM25_K1 + 1) / (term_frequencies + length_norm[:, None])).sum(axis=1)
+
+
+class ExtractiveContextCompressor:
+    """
+    ExtractiveContextCompressor shortens the retrieved documents to the sentences relevant to the question, so that
+    the prompt does not carry whole documents when a few sentences answer the question. Sentences of all documents are
+    scored together with BM25. Each document longer than the per-document cap keeps its top sentences and their
+    neighbours, in their original order, until the cap is reached. Skipped runs of sentences are marked with an
+    ellipsis.
+
+    Attributes:
+        top_sentences (int): most relevant sentences kept from a document
+            [optional, defaults to DEFAULT_COMPRESSION_TOP_SENTENCES]
+        context_sentences (int): sentences kept on each side of a relevant sentence
+            [optional, defaults to DEFAULT_COMPRESSION_CONTEXT_SENTENCES]
+        max_tokens_per_document (int): documents shorter than this are kept whole, longer ones are compressed to it
+            [optional, defaults to DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT]
+
+    Methods:
+        compress(query, documents): Compresses the documents to their sentences relevant to the query
+    """
+
+    def __init__(
+        self,
+        top_sentences: Optional[int] = DEFAULT_COMPRESSION_TOP_SENTENCES,
+        context_sentences: Optional[int] = DEFAULT_COMPRESSION_CONTEXT_SENTENCES,
+        max_tokens_per_document: Optional[int] = DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT,
+    ) -> None:
+        self._top_sentences = int(top_sentences)
+        self._context_sentences = int(context_sentences)
+        self._max_tokens_per_document = int(max_tokens_per_document)
+
+    @property
+    def top_sentences(self) -> int:
+        return self._top_sentences
+
+    @property
+    def context_sentences(self) -> int:
+        return self._context_sentences
+
+    @property
+    def max_tokens_per_document(self) -> int:
+        return self._max_tokens_per_document
+
+    def select_sentences(self, sentences: List[str], scores: np.ndarray) -> List[int]:
+        """
+        Selects the sentences kept from a document: the top scored sentences that match the query, each with its
+        neighbours, as long as they fit the per-document cap. A document without any matching sentence keeps its
+        leading sentences.
+
+        Args:
+            sentences (List[str]): the sentences of the document
+            scores (np.ndarray): the score of each sentence
+
+        Returns:
+            List[int]: the indices of the kept sentences, in document order
+        """
+        max_characters = self.max_tokens_per_document * ESTIMATED_CHARACTERS_PER_TOKEN
+        ranking = [index for index in np.argsort(-scores, kind="stable")[: self.top_sentences] if scores[index] > 0]
+        if not ranking:
+            ranking = range(len(sentences))
+            window = 0
+        else:
+            window = self.context_sentences
+
+        kept_indices = set()
+        kept_characters = 0
+        for index in ranking:
+            span = range(max(index - window, 0), min(index + window + 1, len(sentences)))
+            new_indices = [span_index for span_index in span if span_index not in kept_indices]
+            new_characters = sum(len(sentences[span_index]) + 1 for span_index in new_indices)
+            if kept_characters + new_characters > max_characters:
+                if kept_indices:
+                    break
+                # the best sentence is kept even without its neighbours, so a relevant document is never emptied
+                new_indices = [index]
+                new_characters = len(sentences[index])
+            kept_indices.update(new_indices)
+            kept_characters += new_characters
+        return sorted(kept_indices)
+
+    def compress(self, query: str, documents: List[Document]) -> List[Document]:
+        """
+        Compresses the documents longer than the per-document cap to their sentences relevant to the query.
+
+        Args:
+            query (str): the question the documents were retrieved for
+            documents (List[Document]): the documents to compress
+
+        Returns:
+            List[Document]: the compressed documents, in the same order and with the same metadata
+        """
+        document_sentences = [split_sentences(document.page_content) for document in documents]
+        all_sentences = [sentence for sentences in document_sentences for sentence in sentences]
+        all_scores = get_bm25_scores(query, all_sentences)
+        max_characters = self.max_tokens_per_document * ESTIMATED_CHARACTERS_PER_TOKEN
+
+        compressed_documents = []
+        offset = 0
+        for document, sentences in zip(documents, document_sentences):
+            scores = all_scores[offset : offset + len(sentences)]
+            offset += len(sentences)
+            if len(document.page_content) <= max_characters or not sentences:
+                compressed_documents.append(document)
+                continue
+
+            kept_indices = self.select_sentences(sentences, scores)
+            parts = []
+            for position, index in enumerate(kept_indices):
+                if position and index != kept_indices[position - 1] + 1:
+                    parts.append(SKIPPED_SENTENCES_MARKER)
+                elif position:
+                    parts.append(" ")
+                parts.append(sentences[index])
+            compressed_documents.append(Document(page_content="".join(parts), metadata=document.metadata))
+
+        original_characters = sum(len(document.page_content) for document in documents)
+        compressed_characters = sum(len(document.page_content) for document in compressed_documents)
+        if original_characters:
+            compression_ratio = round(compressed_characters / original_characters, 3)
+            request_timer.set_flag(RequestFlags.COMPRESSION_RATIO, compression_ratio)
+        logger.debug(f"Compressed {original_characters} characters of documents to {compressed_characters}")
+        return compressed_documents
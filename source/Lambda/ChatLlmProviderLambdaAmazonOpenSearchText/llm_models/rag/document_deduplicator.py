@@ -0,0 +1,192 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+from aws_lambda_powertools import Logger
+from langchain.schema import BaseRetriever, Document
+from utils.constants import (
+    DEDUPLICATION_CANDIDATE_FACTOR,
+    DEFAULT_DEDUPLICATION_THRESHOLD,
+    DOCUMENT_EMBEDDING_METADATA_KEY,
+    DOCUMENT_SCORE_METADATA_KEY,
+    MINHASH_NUM_PERMUTATIONS,
+    MINHASH_SEED,
+    MINHASH_SHINGLE_SIZE,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+WORD_PATTERN = re.compile(r"\w+")
+MINHASH_PRIME = (1 << 31) - 1  # keeps the permutation products within int64
+
+
+def get_shingle_hashes(text: str, shingle_size: int = MINHASH_SHINGLE_SIZE) -> np.ndarray:
+    """
+    Hashes the word shingles of a text. Texts shorter than a shingle are hashed as a single shingle.
+
+    Args:
+        text (str): the text to hash
+        shingle_size (int): the number of words per shingle
+
+    Returns:
+        np.ndarray: the unique 32 bit hashes of the shingles, empty for a text without words
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    shingles = {" ".join(words[i : i + shingle_size]) for i in range(max(len(words) - shingle_size + 1, 1))}
+    shingles.discard("")
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.int64)
+
+
+class DocumentDeduplicator:
+    """
+    DocumentDeduplicator collapses near-duplicate retrieved documents, such as overlapping chunks of the same source,
+    so that the prompt does not pay for the same text twice. Documents are compared with the cosine similarity of their
+    embeddings when every document carries one in its metadata, and with the MinHash estimate of the Jaccard similarity
+    of their word shingles otherwise. Of each group of near-duplicates, the highest scored document is kept. So that
+    removing a near-duplicate does not shrink the context, the retriever can be made to fetch more candidates than
+    the top_k documents kept, the place of a removed document then goes to the next distinct candidate.
+
+    Attributes:
+        threshold (float): similarity at or above which two documents are near-duplicates
+            [optional, defaults to DEFAULT_DEDUPLICATION_THRESHOLD]
+        num_permutations (int): number of hash permutations of a MinHash signature
+            [optional, defaults to MINHASH_NUM_PERMUTATIONS]
+        top_k (int): number of distinct documents kept, all of them when not set [optional, defaults to None]
+
+    Methods:
+        get_similarity_matrix(documents): Returns the pairwise similarities of the documents
+        over_fetch(retriever): Makes the retriever fetch more candidates than the documents kept
+        deduplicate(documents): Removes the near-duplicates from the documents
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = DEFAULT_DEDUPLICATION_THRESHOLD,
+        num_permutations: Optional[int] = MINHASH_NUM_PERMUTATIONS,
+        top_k: Optional[int] = None,
+    ) -> None:
+        self._threshold = float(threshold)
+        self._top_k = top_k
+        random_state = np.random.RandomState(MINHASH_SEED)
+        self._permutation_a = random_state.randint(1, MINHASH_PRIME, size=(num_permutations, 1), dtype=np.int64)
+        self._permutation_b = random_state.randint(0, MINHASH_PRIME, size=(num_permutations, 1), dtype=np.int64)
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    @property
+    def num_permutations(self) -> int:
+        return len(self._permutation_a)
+
+    @property
+    def top_k(self) -> Optional[int]:
+        return self._top_k
+
+    def over_fetch(self, retriever: BaseRetriever) -> None:
+        """
+        Makes a retriever with a `top_k` fetch DEDUPLICATION_CANDIDATE_FACTOR times as many candidates, and keeps its
+        previous top_k distinct documents. Retrievers without a `top_k` are left unchanged.
+
+        Args:
+            retriever (BaseRetriever): the retriever of the documents to deduplicate
+        """
+        top_k = getattr(retriever, "top_k", None)
+        if top_k is None or self._top_k is not None:
+            return
+        self._top_k = int(top_k)
+        retriever.top_k = self._top_k * DEDUPLICATION_CANDIDATE_FACTOR
+
+    def get_minhash_signatures(self, documents: List[Document]) -> np.ndarray:
+        """
+        Computes the MinHash signatures of the documents, all permutations of a document at once.
+
+        Args:
+            documents (List[Document]): the documents to sign
+
+        Returns:
+            np.ndarray: a (documents x permutations) matrix of signatures
+        """
+        signatures = np.full((len(documents), self.num_permutations), MINHASH_PRIME, dtype=np.int64)
+        for index, document in enumerate(documents):
+            shingle_hashes = get_shingle_hashes(document.page_content)
+            if shingle_hashes.size:
+                shingle_hashes = shingle_hashes % MINHASH_PRIME
+                permuted_hashes = (self._permutation_a * shingle_hashes + self._permutation_b) % MINHASH_PRIME
+                signatures[index] = permuted_hashes.min(axis=1)
+        return signatures
+
+    def get_similarity_matrix(self, documents: List[Document]) -> np.ndarray:
+        """
+        Returns the pairwise similarities of the documents, the cosine similarity of their embeddings when all of them
+        have one, the estimated Jaccard similarity of their word shingles otherwise.
+
+        Args:
+            documents (List[Document]): the documents to compare
+
+        Returns:
+            np.ndarray: a symmetric (documents x documents) matrix of similarities
+        """
+        embeddings = [(document.metadata or {}).get(DOCUMENT_EMBEDDING_METADATA_KEY) for document in documents]
+        if all(embedding is not None for embedding in embeddings):
+            vectors = np.asarray(embeddings, dtype=np.float64)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            return vectors @ vectors.T
+
+        signatures = self.get_minhash_signatures(documents)
+        return (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2)
+
+    def deduplicate(self, documents: List[Document]) -> List[Document]:
+        """
+        Removes the near-duplicates from the documents. Documents are visited by score (or in retrieval order when they
+        carry no score) and dropped when they are a near-duplicate of a document already kept, until top_k documents
+        are kept, which leaves the place of a dropped document to the next distinct candidate.
+
+        Args:
+            documents (List[Document]): the retrieved documents
+
+        Returns:
+            List[Document]: the top_k best distinct documents, in retrieval order
+        """
+        if len(documents) < 2:
+            return documents[: self.top_k]
+
+        similarities = self.get_similarity_matrix(documents)
+        scores = [(document.metadata or {}).get(DOCUMENT_SCORE_METADATA_KEY) for document in documents]
+        ranking = sorted(
+            range(len(documents)),
+            key=lambda index: -float(scores[index]) if scores[index] is not None else float("inf"),
+        )
+
+        kept_indices = []
+        duplicates = 0
+        for index in ranking:
+            if self.top_k is not None and len(kept_indices) >= self.top_k:
+                break
+            if not kept_indices or similarities[index, kept_indices].max() < self.threshold:
+                kept_indices.append(index)
+            else:
+                duplicates += 1
+
+        if duplicates:
+            logger.debug(f"Removed {duplicates} near-duplicate documents of {len(documents)}")
+        request_timer.set_flag(RequestFlags.DUPLICATE_DOCUMENTS, duplicates)
+        return [documents[index] for index in sorted(kept_indices)]
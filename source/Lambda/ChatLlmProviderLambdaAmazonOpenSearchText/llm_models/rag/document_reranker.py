@@ -0,0 +1,227 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import functools
+import json
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, List, Optional
+
+import boto3
+from aws_lambda_powertools import Logger
+from botocore.config import Config
+from custom_config import custom_usr_agent_config
+from langchain.schema import Document
+from utils.constants import (
+    DEFAULT_RERANK_TIMEOUT,
+    DEFAULT_RERANK_TOP_N,
+    DOCUMENT_SCORE_METADATA_KEY,
+    RERANK_MAX_WORKERS,
+    TRACE_ID_ENV_VAR,
+)
+from utils.enum_types import RequestFlags, RequestStages
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+# Shared across invocations of the lambda container, so no thread is started on the critical path
+_rerank_executor = ThreadPoolExecutor(max_workers=RERANK_MAX_WORKERS)
+
+
+def get_rerank_client_config(timeout: float) -> Config:
+    """
+    Returns the configuration of the sagemaker-runtime client of a reranker. A timed out call cannot be cancelled once
+    it runs, so the client gives up on the request itself after the rerank timeout, without retrying, which releases
+    its worker of the shared pool instead of holding it for the default 60 second read timeout.
+
+    Args:
+        timeout (float): seconds to wait for the scores
+
+    Returns:
+        Config: the client configuration
+    """
+    return custom_usr_agent_config().merge(
+        Config(connect_timeout=timeout, read_timeout=timeout, retries={"max_attempts": 0})
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_rerank_client(timeout: float) -> Any:
+    """
+    Creates the sagemaker-runtime client of the rerankers with a timeout, shared across invocations of the lambda
+    container. It is not the client of `get_service_client`, which is shared by every user of the service.
+
+    Args:
+        timeout (float): seconds to wait for the scores
+
+    Returns:
+        Any: the sagemaker-runtime client
+    """
+    return boto3.client("sagemaker-runtime", config=get_rerank_client_config(timeout))
+
+
+class RerankContentHandler:
+    """
+    Serializes the rerank request to, and deserializes the scores from, a cross-encoder endpoint. The default format is
+    the one of the Hugging Face text-embeddings-inference rerank API, `{"query": ..., "texts": [...]}` in and a list of
+    `{"index": ..., "score": ...}` out. Subclasses override the transforms for endpoints with another format.
+    """
+
+    content_type = "application/json"
+    accepts = "application/json"
+
+    def transform_input(self, query: str, passages: List[str]) -> bytes:
+        return json.dumps({"query": query, "texts": passages}).encode("utf-8")
+
+    def transform_output(self, output: bytes) -> List[float]:
+        response_json = json.loads(output)
+        scores = [0.0] * len(response_json)
+        for result in response_json:
+            scores[result["index"]] = float(result["score"])
+        return scores
+
+
+class DocumentReranker(ABC):
+    """
+    DocumentReranker reorders the retrieved documents by their relevance to the question, scored by a cross-encoder in
+    one batched call, and keeps the best top_n. The call is bounded by a hard timeout: when it is exceeded, or the call
+    fails, the documents are kept in their retrieval order so a slow reranker never fails a chat request.
+
+    Attributes:
+        top_n (int): number of documents kept after reranking [optional, defaults to DEFAULT_RERANK_TOP_N]
+        timeout (float): seconds to wait for the scores [optional, defaults to DEFAULT_RERANK_TIMEOUT]
+
+    Methods:
+        get_scores(query, passages): Scores the passages against the query, implemented by subclasses
+        rerank(query, documents): Reorders the documents by score and keeps the best top_n
+    """
+
+    def __init__(self, top_n: Optional[int] = DEFAULT_RERANK_TOP_N, timeout: Optional[float] = DEFAULT_RERANK_TIMEOUT):
+        self._top_n = int(top_n)
+        self._timeout = float(timeout)
+
+    @property
+    def top_n(self) -> int:
+        return self._top_n
+
+    @property
+    def timeout(self) -> float:
+        return self._timeout
+
+    @abstractmethod
+    def get_scores(self, query: str, passages: List[str]) -> List[float]:
+        """
+        Scores each passage against the query.
+
+        Args:
+            query (str): the question the documents were retrieved for
+            passages (List[str]): the contents of the documents
+
+        Returns:
+            List[float]: the relevance score of each passage, higher is more relevant
+        """
+
+    def rerank(self, query: str, documents: List[Document]) -> List[Document]:
+        """
+        Reorders the documents by their relevance score and keeps the best top_n. The score is stored in the metadata
+        of the returned documents, under DOCUMENT_SCORE_METADATA_KEY.
+
+        Args:
+            query (str): the question the documents were retrieved for
+            documents (List[Document]): the retrieved documents
+
+        Returns:
+            List[Document]: the top_n documents, best first, or the first top_n in retrieval order on fallback
+        """
+        if not documents:
+            return documents
+
+        with request_timer.stage(RequestStages.RERANK):
+            future = _rerank_executor.submit(self.get_scores, query, [document.page_content for document in documents])
+            try:
+                scores = future.result(timeout=self.timeout)
+                if len(scores) != len(documents):
+                    raise ValueError(f"Expected {len(documents)} scores, received {len(scores)}")
+            except FutureTimeoutError:
+                future.cancel()
+                logger.warning(
+                    f"Reranking timed out after {self.timeout} seconds, keeping the retrieval order",
+                    xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+                )
+                request_timer.set_flag(RequestFlags.RERANK_FALLBACK, True)
+                return documents[: self.top_n]
+            except Exception as ex:
+                logger.warning(
+                    f"Reranking failed, keeping the retrieval order. Error: {ex}",
+                    xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+                )
+                request_timer.set_flag(RequestFlags.RERANK_FALLBACK, True)
+                return documents[: self.top_n]
+
+        request_timer.set_flag(RequestFlags.RERANK_FALLBACK, False)
+        ranking = sorted(range(len(documents)), key=lambda index: -scores[index])[: self.top_n]
+        return [
+            Document(
+                page_content=documents[index].page_content,
+                metadata={**(documents[index].metadata or {}), DOCUMENT_SCORE_METADATA_KEY: scores[index]},
+            )
+            for index in ranking
+        ]
+
+
+class SageMakerDocumentReranker(DocumentReranker):
+    """
+    SageMakerDocumentReranker scores the documents with a cross-encoder model deployed to a SageMaker endpoint. All
+    (query, passage) pairs of a request are sent in a single invocation.
+
+    Attributes:
+        endpoint_name (str): name of the SageMaker endpoint
+        content_handler (RerankContentHandler): serializes the request and deserializes the scores
+            [optional, defaults to RerankContentHandler()]
+        client (Any): sagemaker-runtime client [optional, defaults to a client timing out after the rerank timeout]
+        top_n (int): number of documents kept after reranking [optional, defaults to DEFAULT_RERANK_TOP_N]
+        timeout (float): seconds to wait for the scores [optional, defaults to DEFAULT_RERANK_TIMEOUT]
+    """
+
+    def __init__(
+        self,
+        endpoint_name: str,
+        content_handler: Optional[RerankContentHandler] = None,
+        client: Optional[Any] = None,
+        top_n: Optional[int] = DEFAULT_RERANK_TOP_N,
+        timeout: Optional[float] = DEFAULT_RERANK_TIMEOUT,
+    ):
+        super().__init__(top_n=top_n, timeout=timeout)
+        self._endpoint_name = endpoint_name
+        self._content_handler = content_handler or RerankContentHandler()
+        self._client = client or get_rerank_client(self.timeout)
+
+    @property
+    def endpoint_name(self) -> str:
+        return self._endpoint_name
+
+    @property
+    def content_handler(self) -> RerankContentHandler:
+        return self._content_handler
+
+    def get_scores(self, query: str, passages: List[str]) -> List[float]:
+        response = self._client.invoke_endpoint(
+            EndpointName=self.endpoint_name,
+            Body=self.content_handler.transform_input(query, passages),
+            ContentType=self.content_handler.content_type,
+            Accept=self.content_handler.accepts,
+        )
+        return self.content_handler.transform_output(response["Body"].read())
@@ -0,0 +1,125 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import json
+import os
+from typing import Any, Dict, Sequence
+
+from aws_lambda_powertools import Logger
+from helper import get_service_client
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import Document
+from utils.constants import (
+    COMBINE_DOCUMENTS_INPUT_KEY,
+    CONVERSATION_ID_EVENT_KEY,
+    SOURCE_DOCUMENTS_RESPONSE_KEY,
+    TRACE_ID_ENV_VAR,
+    WEBSOCKET_CALLBACK_URL_ENV_VAR,
+)
+from utils.enum_types import RequestStages
+from utils.helpers import format_source_documents
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+
+class WebsocketSourceDocumentsHandler(BaseCallbackHandler):
+    """
+    WebsocketSourceDocumentsHandler is attached to a retrieval chain and sends a compact list of the source documents
+    placed in the prompt to the websocket client as soon as they are known, while the LLM is still generating the
+    answer. The documents are those left once the retrieved ones are deduplicated, reranked, compressed and packed, so
+    that every source shown to the user was read by the LLM.
+
+    Attributes:
+        connection_url (str): The connection URL for the websocket client.
+        connection_id (str): The connection ID for the websocket client, retrieved from the event object
+        conversation_id (str): The conversation ID for the websocket client, retrieved from the event object
+        client (botocore.client): client that establishes the connection to the websocket API
+
+    Methods:
+        on_chain_start(serialized, inputs, **kwargs): Executes when a chain starts, and posts the sources of the
+            documents combined into the prompt to the connection
+        post_sources_to_connection(sources): Sends the source references to the client that is connected to a websocket.
+        format_response(sources): Formats the source references in a format that the websocket accepts
+    """
+
+    def __init__(self, connection_id: str, conversation_id: str) -> None:
+        self._connection_url = os.environ.get(WEBSOCKET_CALLBACK_URL_ENV_VAR)
+        self._connection_id = connection_id
+        self._conversation_id = conversation_id
+        self._client = get_service_client("apigatewaymanagementapi", endpoint_url=self._connection_url)
+        super().__init__()
+
+    @property
+    def connection_id(self) -> str:
+        return self._connection_id
+
+    @connection_id.setter
+    def connection_id(self, connection_id) -> None:
+        self._connection_id = connection_id
+
+    @property
+    def conversation_id(self) -> str:
+        return self._conversation_id
+
+    @conversation_id.setter
+    def conversation_id(self, conversation_id) -> None:
+        self._conversation_id = conversation_id
+
+    @property
+    def client(self) -> str:
+        return self._client
+
+    @client.setter
+    def client(self, client) -> None:
+        self._client = client
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], **kwargs: Any) -> None:
+        """
+        Executes when a chain starts. The chain which combines the documents into the prompt is started with the final
+        documents, which are reduced to their ids, sources and short snippets before being posted, so that the client
+        can render citations before the answer is streamed. Other chains are ignored.
+
+        Args:
+            serialized (Dict[str, Any]): the serialized chain
+            inputs (Dict[str, Any]): the inputs of the chain
+        """
+        documents: Sequence[Document] = inputs.get(COMBINE_DOCUMENTS_INPUT_KEY) if isinstance(inputs, dict) else None
+        if documents is not None:
+            self.post_sources_to_connection(format_source_documents(documents))
+
+    def post_sources_to_connection(self, sources: Sequence[Any]) -> None:
+        """
+        Sends the source references to the client that is connected to a websocket. A failure to post the sources is logged,
+        but does not fail the chat request since the answer can still be delivered.
+
+        Args:
+            sources (Sequence[Any]): compact source references to send to the client
+        """
+        with request_timer.stage(RequestStages.WEBSOCKET_POST):
+            try:
+                self.client.post_to_connection(ConnectionId=self.connection_id, Data=self.format_response(sources))
+            except Exception as ex:
+                logger.error(
+                    f"Error sending source documents to connection {self.connection_id}: {ex}",
+                    xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+                )
+
+    def format_response(self, sources: Sequence[Any]) -> str:
+        """
+        Formats the source references in a format that the websocket accepts
+
+        Args:
+            sources (Sequence[Any]): The value of the "sourceDocuments" key in the websocket response
+        """
+        return json.dumps({SOURCE_DOCUMENTS_RESPONSE_KEY: sources, CONVERSATION_ID_EVENT_KEY: self.conversation_id})
@@ -14,7 +14,10 @@
 
 from abc import ABC, abstractmethod
 
+from typing import List, Optional
+
 from aws_lambda_powertools import Logger
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.schema import BaseMemory, BaseRetriever
 from utils.enum_types import KnowledgeBaseTypes
 
@@ -30,6 +33,8 @@ class KnowledgeBase(ABC):
 
     knowledge_base_type: KnowledgeBaseTypes
     retriever: BaseRetriever
+    # Callbacks passed to the chain invocation, which are notified of the retriever and chain runs
+    retriever_callbacks: Optional[List[BaseCallbackHandler]] = None
 
     @property
     def retriever(self) -> BaseRetriever:
@@ -4,10 +4,30 @@ import json
 import boto3
 from typing import Any, Dict,  Optional
 from aws_lambda_powertools import Logger
-from opensearchpy import OpenSearch
 from shared.knowledge.knowledge_base import KnowledgeBase
+from shared.knowledge.metadata_filter import build_metadata_filter
+from shared.knowledge.opensearch_connection import get_opensearch_client, prime_opensearch
 from shared.knowledge.opensearch_retriever import CustomOpenSearchRetriever
-from utils.constants import DEFAULT_OPENSEARCH_NUMBER_OF_DOCS, DEFAULT_RETURN_SOURCE_DOCS, OPENSEARCH_INDEX_ID_ENV_VAR
+from utils.constants import (
+    DEFAULT_HIGHLIGHT_BOUNDARY_SCANNER,
+    DEFAULT_HIGHLIGHT_FRAGMENT_SIZE,
+    DEFAULT_HIGHLIGHT_NUMBER_OF_FRAGMENTS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_OPENSEARCH_HIGHLIGHT,
+    DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
+    DEFAULT_OPENSEARCH_PRIME_CONNECTION,
+    DEFAULT_OPENSEARCH_REQUEST_CACHE,
+    DEFAULT_OPENSEARCH_SEARCH_FIELDS,
+    DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+    DEFAULT_OPENSEARCH_SESSION_PREFERENCE,
+    DEFAULT_OPENSEARCH_TERMINATE_AFTER,
+    DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+    DEFAULT_RETURN_SOURCE_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    OPENSEARCH_INDEX_ID_ENV_VAR,
+    USER_ID_EVENT_KEY,
+)
 from utils.enum_types import KnowledgeBaseTypes
 
 logger = Logger(utc=True)
@@ -43,6 +63,24 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
 
         index_name (str): OpenSearch index name
         number_of_docs (int): Number of documents to query for [Optional]
+        min_score (float): Score below which a retrieved document is dropped [Optional]
+        min_number_of_docs (int): Number of documents kept whatever their scores [Optional]
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap [Optional]
+        metadata_filter (Dict): Filter on the document metadata, from MetadataFilter and UserAttributeMapping [Optional]
+        search_template_id (str): Id of a stored search template run in place of the query [Optional]
+        request_cache (bool): Whether the results are cached in the shard request cache [Optional]
+        preference (str): The user id when SessionPreference is set, so that the searches of a user hit the same shard
+            copies and their caches [Optional]
+        track_total_hits (bool): Whether the total number of hits is counted [Optional]
+        search_timeout (str): Time after which a search returns its partial results [Optional]
+        terminate_after (int): Documents collected per shard before a search stops early [Optional]
+        prime_connection (bool): Whether a pooled connection is opened when a container first sets up the knowledge base
+            [Optional]
+        search_fields (List[str]): Fields matched by the query, each optionally boosted as "field^boost" [Optional]
+        highlight (bool): Whether documents are returned as their best highlighted fragments [Optional]
+        fragment_size (int): Characters per highlighted fragment [Optional]
+        number_of_fragments (int): Highlighted fragments returned per document [Optional]
+        boundary_scanner (str): How fragments are broken, at "sentence", "word" or "chars" boundaries [Optional]
         retriever (CustomOpenSearchRetriever): Custom OpenSearch retriever
 
     Methods:
@@ -54,6 +92,7 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
     def __init__(
         self,
         opensearch_knowledge_base_params: Optional[Dict[str, Any]] = {},
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._check_env_variables()
         
@@ -76,22 +115,70 @@ class OpenSearchKnowledgeBase(KnowledgeBase):
             "ReturnSourceDocs",
             DEFAULT_RETURN_SOURCE_DOCS,
         )
+        self.min_score = opensearch_knowledge_base_params.get("MinScore", DEFAULT_MIN_SCORE)
+        self.min_number_of_docs = opensearch_knowledge_base_params.get("MinNumberOfDocs", DEFAULT_MIN_NUMBER_OF_DOCS)
+        self.score_gap_cutoff = opensearch_knowledge_base_params.get("ScoreGapCutoff", DEFAULT_SCORE_GAP_CUTOFF)
+        self.metadata_filter = build_metadata_filter(
+            opensearch_knowledge_base_params.get("MetadataFilter"),
+            opensearch_knowledge_base_params.get("UserAttributeMapping"),
+            user_context,
+        )
+        self.search_template_id = opensearch_knowledge_base_params.get("SearchTemplateId")
+        self.request_cache = opensearch_knowledge_base_params.get("RequestCache", DEFAULT_OPENSEARCH_REQUEST_CACHE)
+        session_preference = opensearch_knowledge_base_params.get(
+            "SessionPreference", DEFAULT_OPENSEARCH_SESSION_PREFERENCE
+        )
+        self.preference = (user_context or {}).get(USER_ID_EVENT_KEY) if session_preference else None
+        self.track_total_hits = opensearch_knowledge_base_params.get(
+            "TrackTotalHits", DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS
+        )
+        self.search_timeout = opensearch_knowledge_base_params.get("SearchTimeout", DEFAULT_OPENSEARCH_SEARCH_TIMEOUT)
+        self.terminate_after = opensearch_knowledge_base_params.get(
+            "TerminateAfter", DEFAULT_OPENSEARCH_TERMINATE_AFTER
+        )
+        self.prime_connection = opensearch_knowledge_base_params.get(
+            "PrimeConnection", DEFAULT_OPENSEARCH_PRIME_CONNECTION
+        )
+        self.search_fields = opensearch_knowledge_base_params.get("SearchFields", DEFAULT_OPENSEARCH_SEARCH_FIELDS)
+        self.highlight = opensearch_knowledge_base_params.get("Highlight", DEFAULT_OPENSEARCH_HIGHLIGHT)
+        self.fragment_size = opensearch_knowledge_base_params.get("FragmentSize", DEFAULT_HIGHLIGHT_FRAGMENT_SIZE)
+        self.number_of_fragments = opensearch_knowledge_base_params.get(
+            "NumberOfFragments", DEFAULT_HIGHLIGHT_NUMBER_OF_FRAGMENTS
+        )
+        self.boundary_scanner = opensearch_knowledge_base_params.get(
+            "BoundaryScanner", DEFAULT_HIGHLIGHT_BOUNDARY_SCANNER
+        )
         
-        self.client = OpenSearch(
-            hosts=[
-                {
-                    "host": OPENSEARCH_HOST,
-                    "port": OPENSEARCH_PORT,
-                }
-            ],
-            http_auth=OPENSEARCH_AUTH,
+        self.client = get_opensearch_client(
+            OPENSEARCH_HOST,
+            OPENSEARCH_PORT,
+            OPENSEARCH_AUTH,
             use_ssl=OPENSEARCH_USE_SSL,
             verify_certs=OPENSEARCH_VERIFY_CERTIFICATES,
             timeout=OPENSEARCH_TIMEOUT,
         )
+        prime_opensearch(self.client, self.index_id, prime_connection=self.prime_connection)
       
         self.retriever = CustomOpenSearchRetriever(
-            index_id=self.index_id, top_k=self.number_of_docs, return_source_documents=self.return_source_documents, client=self.client
+            index_id=self.index_id,
+            top_k=self.number_of_docs,
+            return_source_documents=self.return_source_documents,
+            client=self.client,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+            metadata_filter=self.metadata_filter,
+            search_fields=self.search_fields,
+            highlight=self.highlight,
+            fragment_size=self.fragment_size,
+            number_of_fragments=self.number_of_fragments,
+            boundary_scanner=self.boundary_scanner,
+            search_template_id=self.search_template_id,
+            request_cache=self.request_cache,
+            preference=self.preference,
+            track_total_hits=self.track_total_hits,
+            search_timeout=self.search_timeout,
+            terminate_after=self.terminate_after,
         )
     
     def _check_env_variables(self) -> None:
@@ -5,17 +5,40 @@ import os
 import time
 from typing import Any, Dict, List, Optional, Sequence
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from opensearchpy import exceptions as opensearch_exceptions
-from utils.constants import METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
+from shared.knowledge.metadata_filter import to_opensearch_filter
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+from shared.knowledge.relevance_filter import select_relevant_documents
+from utils.constants import (
+    DEFAULT_HIGHLIGHT_BOUNDARY_SCANNER,
+    DEFAULT_HIGHLIGHT_FRAGMENT_SIZE,
+    DEFAULT_HIGHLIGHT_NUMBER_OF_FRAGMENTS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_OPENSEARCH_HIGHLIGHT,
+    DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
+    DEFAULT_OPENSEARCH_REQUEST_CACHE,
+    DEFAULT_OPENSEARCH_SEARCH_FIELDS,
+    DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+    DEFAULT_OPENSEARCH_TERMINATE_AFTER,
+    DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DOCUMENT_SCORE_METADATA_KEY,
+    HIGHLIGHT_FRAGMENT_SEPARATOR,
+    TRACE_ID_ENV_VAR,
+)
 from utils.enum_types import CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.AWS_OPENSEARCH.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.AWS_OPENSEARCH)
+OPENSEARCH_TEXT_FIELD = "text"
 from enum import Enum
 
 
@@ -34,31 +57,94 @@ class CustomOpenSearchRetriever(BaseRetriever):
     Attributes:
         client (Any): OpenSearch client
         index_name (str): OpenSearch index name
-        top_k (int): Number of documents to return
+        top_k (int): Number of documents to fetch, the most returned
+        min_score (float): Score below which a fetched document is dropped, no threshold when None
+        min_number_of_docs (int): Number of documents returned whatever their scores
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap
+        metadata_filter (Dict): Filter on the document metadata, as built by build_metadata_filter, no filter when None
+        search_fields (List[str]): Fields matched by the query, each optionally boosted as "field^boost"
+        highlight (bool): Whether a document is returned as its best highlighted fragments instead of its whole text
+        fragment_size (int): Characters per highlighted fragment
+        number_of_fragments (int): Highlighted fragments returned per document
+        boundary_scanner (str): How fragments are broken, at "sentence", "word" or "chars" boundaries
+        search_template_id (str): Id of a stored search template run in place of the query, with the params "query",
+            "size" and, with a metadata filter, "filter"
+        request_cache (bool): Whether the results are cached in the shard request cache
+        preference (str): Routes the searches with the same value to the same shard copies, no routing when None
+        track_total_hits (bool): Whether the total number of hits is counted
+        search_timeout (str): Time after which a search returns its partial results, no bound when None
+        terminate_after (int): Documents collected per shard before a search stops early, no bound when None
     """
 
     index_id: str
     client: Any
     top_k: int
     return_source_documents: bool
+    min_score: Optional[float]
+    min_number_of_docs: int
+    score_gap_cutoff: bool
+    metadata_filter: Optional[Dict] = None
+    search_fields: List[str] = DEFAULT_OPENSEARCH_SEARCH_FIELDS
+    highlight: bool = DEFAULT_OPENSEARCH_HIGHLIGHT
+    fragment_size: int = DEFAULT_HIGHLIGHT_FRAGMENT_SIZE
+    number_of_fragments: int = DEFAULT_HIGHLIGHT_NUMBER_OF_FRAGMENTS
+    boundary_scanner: str = DEFAULT_HIGHLIGHT_BOUNDARY_SCANNER
+    search_template_id: Optional[str] = None
+    request_cache: bool = DEFAULT_OPENSEARCH_REQUEST_CACHE
+    preference: Optional[str] = None
+    track_total_hits: bool = DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS
+    search_timeout: Optional[str] = DEFAULT_OPENSEARCH_SEARCH_TIMEOUT
+    terminate_after: Optional[int] = DEFAULT_OPENSEARCH_TERMINATE_AFTER
 
     def __init__(
         self,
         index_id: str,
         client: Any,
-        top_k: Optional[int] = 10,
+        top_k: Optional[int] = DEFAULT_OPENSEARCH_NUMBER_OF_DOCS,
         return_source_documents: Optional[bool] = False,
+        min_score: Optional[float] = DEFAULT_MIN_SCORE,
+        min_number_of_docs: Optional[int] = DEFAULT_MIN_NUMBER_OF_DOCS,
+        score_gap_cutoff: Optional[bool] = DEFAULT_SCORE_GAP_CUTOFF,
+        metadata_filter: Optional[Dict] = None,
+        search_fields: Optional[List[str]] = DEFAULT_OPENSEARCH_SEARCH_FIELDS,
+        highlight: Optional[bool] = DEFAULT_OPENSEARCH_HIGHLIGHT,
+        fragment_size: Optional[int] = DEFAULT_HIGHLIGHT_FRAGMENT_SIZE,
+        number_of_fragments: Optional[int] = DEFAULT_HIGHLIGHT_NUMBER_OF_FRAGMENTS,
+        boundary_scanner: Optional[str] = DEFAULT_HIGHLIGHT_BOUNDARY_SCANNER,
+        search_template_id: Optional[str] = None,
+        request_cache: Optional[bool] = DEFAULT_OPENSEARCH_REQUEST_CACHE,
+        preference: Optional[str] = None,
+        track_total_hits: Optional[bool] = DEFAULT_OPENSEARCH_TRACK_TOTAL_HITS,
+        search_timeout: Optional[str] = DEFAULT_OPENSEARCH_SEARCH_TIMEOUT,
+        terminate_after: Optional[int] = DEFAULT_OPENSEARCH_TERMINATE_AFTER,
     ):
         super().__init__(
-            index_id=index_id, top_k=top_k, return_source_documents=return_source_documents
+            index_id=index_id,
+            top_k=top_k,
+            return_source_documents=return_source_documents,
+            min_score=min_score,
+            min_number_of_docs=min_number_of_docs,
+            score_gap_cutoff=score_gap_cutoff,
+            metadata_filter=metadata_filter,
+            search_fields=search_fields,
+            highlight=highlight,
+            fragment_size=fragment_size,
+            number_of_fragments=number_of_fragments,
+            boundary_scanner=boundary_scanner,
+            search_template_id=search_template_id,
+            request_cache=request_cache,
+            preference=preference,
+            track_total_hits=track_total_hits,
+            search_timeout=search_timeout,
+            terminate_after=terminate_after,
         )  # Call the superclass constructor
         self.index_id = index_id
         self.top_k = top_k
         self.return_source_documents = return_source_documents
         self.client = client
 
-    @tracer.capture_method(capture_response=True)
-    @metrics.log_metrics
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def _get_relevant_documents(self, query: str) -> List[Document]:
         """
         Run search on OpenSearch index and get top k documents.
@@ -72,9 +158,7 @@ class CustomOpenSearchRetriever(BaseRetriever):
             subsegment.put_annotation("operation", "retrieve/query")
             metrics.add_metric(name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY.value, unit=MetricUnit.Count, value=1)
             try:
-                cleaned_docs = self._opensearch_query(query)
-                documents = [Document(page_content=doc) for doc in cleaned_docs]
-                return documents
+                return self._opensearch_query(query)
             except opensearch_exceptions.OpenSearchException as e:
                 logger.error(
                     f"OpenSearch query failed, returning empty docs. Query: {query}\nException: {e}",
@@ -86,23 +170,21 @@ class CustomOpenSearchRetriever(BaseRetriever):
 
             return []
 
-    @tracer.capture_method(capture_response=True)
-    def _opensearch_query(self, query: str):
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def _opensearch_query(self, query: str) -> List[Document]:
         """
-        Execute a query on the OpenSearch index and return a list of ResultItem-like responses.
+        Execute a query on the OpenSearch index and return a list of cleaned documents.
 
         Args:
             query (str): Query to search for in the OpenSearch index
 
         Returns:
-            Sequence[ResultItem]: List of OpenSearch query response items
+            List[Document]: List of cleaned documents
         """
         try:
             start_time = time.time()
-            response = self.client.search(
-                body={"size": self.top_k, "query": {"match": {"text": query}}, "_source": ["text"]},
-                index=self.index_id,
-            )
+            response = self._search(self._get_search_body(query))
             end_time = time.time()
             metrics.add_metric(
                 name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY_PROCESSING_TIME.value,
@@ -111,25 +193,191 @@ class CustomOpenSearchRetriever(BaseRetriever):
             )
 
             cleaned_docs = self._get_clean_docs(response["hits"]["hits"])
-            return cleaned_docs
+            return select_relevant_documents(
+                cleaned_docs,
+                min_score=self.min_score,
+                min_number_of_docs=self.min_number_of_docs,
+                score_gap_cutoff=self.score_gap_cutoff,
+            )
 
         except opensearch_exceptions.OpenSearchException as e:
             logger.error(f"OpenSearch query failed: {e}")
             return []
 
-    def _get_clean_docs(self, docs) -> Sequence[Dict[str, Any]]:
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def get_relevant_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        """
+        Retrieves the documents of several queries in a single _msearch request, and fuses their results with
+        reciprocal rank fusion.
+
+        Args:
+            queries (List[str]): the question followed by the generated queries
+
+        Returns:
+            List[Document]: the top_k fused documents, best first
+        """
+        with tracer.provider.in_subsegment("## opensearch_query") as subsegment:
+            subsegment.put_annotation("service", "opensearch")
+            subsegment.put_annotation("operation", "retrieve/msearch")
+            metrics.add_metric(name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY.value, unit=MetricUnit.Count, value=1)
+            try:
+                start_time = time.time()
+                body = []
+                for query in queries:
+                    body.append({"index": self.index_id, **self._get_request_params()})
+                    body.append(self._get_search_body(query))
+                if self.search_template_id:
+                    response = self.client.msearch_template(body=body)
+                else:
+                    response = self.client.msearch(body=body)
+                end_time = time.time()
+                metrics.add_metric(
+                    name=OpenSearchCloudWatchMetrics.OPENSEARCH_QUERY_PROCESSING_TIME.value,
+                    unit=MetricUnit.Seconds,
+                    value=(end_time - start_time),
+                )
+            except opensearch_exceptions.OpenSearchException as e:
+                logger.error(
+                    f"OpenSearch multi-query search failed, returning empty docs. Queries: {queries}\nException: {e}",
+                    xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
+                )
+                metrics.add_metric(
+                    name=OpenSearchCloudWatchMetrics.OPENSEARCH_FAILURES.value, unit=MetricUnit.Count, value=1
+                )
+                return []
+
+        ranked_lists = [
+            select_relevant_documents(
+                self._get_clean_docs(query_response.get("hits", {}).get("hits", [])),
+                min_score=self.min_score,
+                min_number_of_docs=self.min_number_of_docs,
+                score_gap_cutoff=self.score_gap_cutoff,
+            )
+            for query_response in response["responses"]
+        ]
+        return reciprocal_rank_fusion(ranked_lists, top_k=self.top_k)
+
+    def _get_search_body(self, query: str) -> Dict:
+        """
+        Builds the search request of a question. With highlighting, the request asks for the best fragments of the text
+        of each document in place of its source, so that neither the response nor the prompt carries whole documents.
+        A document whose text has no match, such as one matched on another field, returns its leading fragment. The
+        body carries the bounds of the search, and stops counting the total hits, which the retriever never reads. When
+        a stored template is configured, the body is the run of that template instead.
+
+        Args:
+            query (str): the question
+
+        Returns:
+            Dict: the body of the search request, or of the search template run
+        """
+        if self.search_template_id:
+            params = {"query": query, "size": self.top_k}
+            if self.metadata_filter:
+                params["filter"] = to_opensearch_filter(self.metadata_filter)
+            return {"id": self.search_template_id, "params": params}
+
+        body = {
+            "size": self.top_k,
+            "query": self._get_text_query(query),
+            "track_total_hits": self.track_total_hits,
+            "_source": [OPENSEARCH_TEXT_FIELD],
+        }
+        if self.search_timeout:
+            body["timeout"] = self.search_timeout
+        if self.terminate_after:
+            body["terminate_after"] = self.terminate_after
+        if not self.highlight:
+            return body
+
+        body["_source"] = False
+        body["highlight"] = {
+            "type": "unified",
+            "order": "score",
+            "pre_tags": [""],
+            "post_tags": [""],
+            "require_field_match": False,
+            "fields": {
+                OPENSEARCH_TEXT_FIELD: {
+                    "fragment_size": self.fragment_size,
+                    "number_of_fragments": self.number_of_fragments,
+                    "boundary_scanner": self.boundary_scanner,
+                    "no_match_size": self.fragment_size,
+                }
+            },
+        }
+        return body
+
+    def _get_request_params(self) -> Dict[str, str]:
+        """
+        Returns the request parameters of a search, which are also the header fields of a multi-search. The request
+        cache is not available to search templates.
+        """
+        request_params = {}
+        if self.preference:
+            request_params["preference"] = self.preference
+        if self.request_cache and not self.search_template_id:
+            request_params["request_cache"] = "true"
+        return request_params
+
+    def _search(self, body: Dict) -> Dict:
+        """
+        Runs a search, or a search template when a stored template is configured, on the index.
+
+        Args:
+            body (Dict): the body built by _get_search_body
+
+        Returns:
+            Dict: the search response
+        """
+        if self.search_template_id:
+            return self.client.search_template(body=body, index=self.index_id, **self._get_request_params())
+        return self.client.search(body=body, index=self.index_id, **self._get_request_params())
+
+    def _get_text_query(self, query: str) -> Dict:
+        """
+        Builds the full-text query of a question, a match query on the text field, or a multi_match query when other or
+        boosted fields are searched. With a metadata filter, the query is wrapped in a bool query whose filter clause
+        restricts the documents before they are scored.
+
+        Args:
+            query (str): the question
+
+        Returns:
+            Dict: the query clause of the search request
+        """
+        if list(self.search_fields) == [OPENSEARCH_TEXT_FIELD]:
+            match_query = {"match": {OPENSEARCH_TEXT_FIELD: query}}
+        else:
+            match_query = {"multi_match": {"query": query, "fields": list(self.search_fields)}}
+        if not self.metadata_filter:
+            return match_query
+        return {"bool": {"must": [match_query], "filter": to_opensearch_filter(self.metadata_filter)}}
+
+    def _get_clean_docs(self, docs: Sequence[Dict[str, Any]]) -> List[Document]:
         """
-        Parses and cleans the documents returned from OpenSearch, returning them in a Document-like format.
+        Parses and cleans the hits returned from OpenSearch, returning them as Documents. The content of a highlighted
+        hit is its fragments, best first. The hit score is always kept as metadata, the hit id only when source
+        documents are to be returned.
 
         Args:
-            docs (Sequence[ResultItem]): List of OpenSearch query response items
+            docs (Sequence[Dict[str, Any]]): List of OpenSearch query response hits
 
         Returns:
-            Sequence[Dict[str, Any]]: List of cleaned document objects
+            List[Document]: List of cleaned documents
         """
         cleaned_docs = []
         for value in docs:
-            cleaned_doc = value.get("_source", {}).get("text")
-            cleaned_docs.append(cleaned_doc)
+            fragments = (value.get("highlight") or {}).get(OPENSEARCH_TEXT_FIELD)
+            if fragments:
+                text = HIGHLIGHT_FRAGMENT_SEPARATOR.join(fragment.strip() for fragment in fragments)
+            else:
+                text = (value.get("_source") or {}).get(OPENSEARCH_TEXT_FIELD)
+            if not text:
+                continue
+            metadata = {"id": value.get("_id")} if self.return_source_documents else {}
+            metadata[DOCUMENT_SCORE_METADATA_KEY] = value.get("_score")
+            cleaned_docs.append(Document(page_content=text, metadata=metadata))
         return cleaned_docs
 
@@ -41,7 +41,6 @@ mocked_doc = {"page_content": "some-page-content-1", "metadata": {"source": "fak
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_BEDROCK_RAG_PROMPT[DEFAULT_BEDROCK_MODEL_FAMILY],
@@ -52,7 +51,6 @@ mocked_doc = {"page_content": "some-page-content-1", "metadata": {"source": "fak
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_BEDROCK_RAG_PROMPT[DEFAULT_BEDROCK_MODEL_FAMILY],
@@ -139,7 +137,6 @@ def test_bedrock_chat_handler(
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_BEDROCK_RAG_PROMPT[DEFAULT_BEDROCK_MODEL_FAMILY],
@@ -150,7 +147,6 @@ def test_bedrock_chat_handler(
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_BEDROCK_RAG_PROMPT[DEFAULT_BEDROCK_MODEL_FAMILY],
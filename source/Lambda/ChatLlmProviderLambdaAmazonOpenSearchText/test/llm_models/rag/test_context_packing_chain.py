@@ -0,0 +1,323 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+from typing import Any, Dict, List
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import AIMessage, BaseRetriever, Document, HumanMessage
+from llm_models.rag.context_packing_chain import (
+    ContextPacker,
+    ContextPackingConversationalRetrievalChain,
+    estimate_tokens,
+    get_document_score,
+    get_max_output_tokens,
+    truncate_to_sentences,
+)
+from llm_models.rag.document_deduplicator import DocumentDeduplicator
+from llm_models.rag.document_reranker import DocumentReranker
+from llm_models.rag.multi_query_generator import MultiQueryGenerator
+from utils.constants import DEFAULT_MAX_TOKENS_TO_SAMPLE
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+class ReverseReranker(DocumentReranker):
+    def get_scores(self, query: str, passages: List[str]) -> List[float]:
+        return [float(index) for index in range(len(passages))]
+
+
+SENTENCES = "First sentence here. Second sentence is here! Is this the third one? Yes."
+
+
+class FakeRetriever(BaseRetriever):
+    documents: List[Document] = []
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        return self.documents
+
+
+class TopKRetriever(FakeRetriever):
+    top_k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        return self.documents[: self.top_k]
+
+
+class QueryRetriever(BaseRetriever):
+    documents: Dict[str, List[Document]] = {}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+        return self.documents[query]
+
+
+class BatchedQueryRetriever(QueryRetriever):
+    batched_queries: List[List[str]] = []
+
+    def get_relevant_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        self.batched_queries.append(queries)
+        return [Document(page_content="batched")]
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    yield
+
+
+@pytest.mark.parametrize("text, expected", [("", 0), ("a", 1), ("abcd", 1), ("abcde", 2), ("x" * 400, 100)])
+def test_estimate_tokens(text, expected):
+    assert estimate_tokens(text) == expected
+
+
+@pytest.mark.parametrize(
+    "max_tokens, expected",
+    [
+        (100, SENTENCES),
+        (12, "First sentence here. Second sentence is here!"),
+        (5, "First sentence here."),
+        (4, ""),
+    ],
+)
+def test_truncate_to_sentences(max_tokens, expected):
+    assert truncate_to_sentences(SENTENCES, max_tokens) == expected
+
+
+def test_truncate_to_sentences_ignores_decimal_points():
+    assert truncate_to_sentences("Version 3.5 is out. More text follows here.", 6) == "Version 3.5 is out."
+
+
+@pytest.mark.parametrize(
+    "model_params, expected",
+    [
+        ({"maxTokenCount": 512, "temperature": 0.2}, 512),
+        ({"max_tokens_to_sample": 300}, 300),
+        ({"max_gen_len": 128}, 128),
+        ({"temperature": 0.2}, DEFAULT_MAX_TOKENS_TO_SAMPLE),
+        (None, DEFAULT_MAX_TOKENS_TO_SAMPLE),
+    ],
+)
+def test_get_max_output_tokens(model_params, expected):
+    assert get_max_output_tokens(model_params) == expected
+
+
+@pytest.mark.parametrize(
+    "token_budget, context_window, reserved_tokens, expected",
+    [
+        (2048, None, 5000, 2048),
+        (2048, 100000, 500, 2048),
+        (2048, 4096, 2000, 1840),
+        (2048, 4096, 5000, 0),
+    ],
+)
+def test_get_available_tokens(token_budget, context_window, reserved_tokens, expected):
+    packer = ContextPacker(token_budget=token_budget, context_window=context_window, max_output_tokens=256)
+    assert packer.get_available_tokens(reserved_tokens) == expected
+
+
+def test_pack_keeps_documents_within_budget():
+    documents = [Document(page_content="a" * 40), Document(page_content="b" * 40)]
+    assert ContextPacker(token_budget=20).pack(documents) == documents
+    assert request_timer.flags[RequestFlags.CONTEXT_TOKENS.value] == 20
+
+
+def test_pack_truncates_at_sentence_boundary():
+    documents = [
+        Document(page_content="a" * 40, metadata={"source": "fake-source-1"}),
+        Document(page_content=SENTENCES, metadata={"source": "fake-source-2"}),
+        Document(page_content="c" * 40),
+    ]
+
+    packed_documents = ContextPacker(token_budget=22).pack(documents)
+
+    assert [document.page_content for document in packed_documents] == [
+        "a" * 40,
+        "First sentence here. Second sentence is here!",
+    ]
+    assert packed_documents[1].metadata == {"source": "fake-source-2"}
+    assert request_timer.flags[RequestFlags.CONTEXT_TOKENS.value] == 22
+
+
+def test_pack_orders_by_score():
+    documents = [
+        Document(page_content="low", metadata={"score": 0.2}),
+        Document(page_content="unscored"),
+        Document(page_content="high", metadata={"score": 0.9}),
+    ]
+
+    packed_documents = ContextPacker(token_budget=100).pack(documents)
+
+    assert [document.page_content for document in packed_documents] == ["high", "low", "unscored"]
+
+
+@pytest.mark.parametrize(
+    "metadata, expected",
+    [
+        ({"score": 0.5}, 0.5),
+        ({"score": "0.5"}, 0.5),
+        ({"score": None}, float("-inf")),
+        ({"score": "high"}, float("-inf")),
+        ({"score": float("nan")}, float("-inf")),
+        ({}, float("-inf")),
+    ],
+)
+def test_get_document_score(metadata, expected):
+    assert get_document_score(Document(page_content="fake-content", metadata=metadata)) == expected
+
+
+def test_pack_ranks_documents_without_numeric_score_last():
+    documents = [
+        Document(page_content="null", metadata={"score": None}),
+        Document(page_content="low", metadata={"score": 0.2}),
+        Document(page_content="text", metadata={"score": "high"}),
+        Document(page_content="high", metadata={"score": "0.9"}),
+    ]
+
+    packed_documents = ContextPacker(token_budget=100).pack(documents)
+
+    assert [document.page_content for document in packed_documents] == ["high", "low", "null", "text"]
+
+
+def test_pack_reserves_prompt_tokens():
+    documents = [Document(page_content="a" * 400), Document(page_content="b" * 400)]
+    packer = ContextPacker(token_budget=1000, context_window=400, max_output_tokens=100)
+
+    assert packer.pack(documents, reserved_tokens=150) == documents[:1]
+
+
+def test_chain_packs_retrieved_documents():
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=FakeRetriever(documents=[Document(page_content=SENTENCES), Document(page_content="c" * 400)]),
+        condense_question_llm=FakeListLLM(responses=["What is the third sentence?"]),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        get_chat_history=lambda chat_history: chat_history,
+        return_source_documents=True,
+        context_packer=ContextPacker(token_budget=50),
+    )
+
+    result = chain(
+        {
+            "question": "And the third one?",
+            "chat_history": [HumanMessage(content="Hi"), AIMessage(content="Hello")],
+        }
+    )
+
+    assert result["answer"] == "fake-answer"
+    assert [document.page_content for document in result["source_documents"]] == [SENTENCES]
+    assert chain.get_reserved_tokens("What is the third sentence?", {"chat_history": "human: Hi"}) == 5 + 7 + 3
+
+
+def test_chain_removes_duplicates_before_packing():
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=FakeRetriever(
+            documents=[
+                Document(page_content=SENTENCES),
+                Document(page_content=SENTENCES + " Maybe."),
+                Document(page_content="Another document."),
+            ]
+        ),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        context_packer=ContextPacker(token_budget=25),
+        document_deduplicator=DocumentDeduplicator(),
+    )
+
+    result = chain({"question": "What is the third sentence?", "chat_history": []})
+
+    assert [document.page_content for document in result["source_documents"]] == [SENTENCES, "Another document."]
+    assert request_timer.flags[RequestFlags.DUPLICATE_DOCUMENTS.value] == 1
+
+
+def test_chain_replaces_duplicates_with_the_next_candidates():
+    retriever = TopKRetriever(
+        documents=[
+            Document(page_content=SENTENCES),
+            Document(page_content=SENTENCES + " Maybe."),
+            Document(page_content="Another document."),
+            Document(page_content="Yet another one."),
+            Document(page_content="The last document."),
+        ]
+    )
+    document_deduplicator = DocumentDeduplicator()
+    document_deduplicator.over_fetch(retriever)
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=retriever,
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        document_deduplicator=document_deduplicator,
+    )
+
+    result = chain({"question": "What is the third sentence?", "chat_history": []})
+
+    assert [document.page_content for document in result["source_documents"]] == [
+        SENTENCES,
+        "Another document.",
+        "Yet another one.",
+    ]
+    assert request_timer.flags[RequestFlags.DUPLICATE_DOCUMENTS.value] == 1
+
+
+def test_chain_reranks_before_packing():
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=FakeRetriever(
+            documents=[Document(page_content=content) for content in ["First.", "Second.", "Third."]]
+        ),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        context_packer=ContextPacker(token_budget=100),
+        document_reranker=ReverseReranker(top_n=2),
+    )
+
+    result = chain({"question": "Which one?", "chat_history": []})
+
+    assert [document.page_content for document in result["source_documents"]] == ["Third.", "Second."]
+
+
+def test_chain_fuses_the_documents_of_generated_queries():
+    documents = {
+        "Which one?": [Document(page_content="First."), Document(page_content="Second.")],
+        "Which document?": [Document(page_content="Third."), Document(page_content="Second.")],
+    }
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=QueryRetriever(documents=documents),
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        context_packer=ContextPacker(token_budget=100),
+        query_generator=MultiQueryGenerator.from_llm(FakeListLLM(responses=["Which document?"])),
+    )
+
+    result = chain({"question": "Which one?", "chat_history": []})
+
+    assert [document.page_content for document in result["source_documents"]] == ["Second.", "First."]
+
+
+def test_chain_uses_batched_multi_query_search():
+    retriever = BatchedQueryRetriever()
+    chain = ContextPackingConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["fake-answer"]),
+        retriever=retriever,
+        combine_docs_chain_kwargs={"prompt": PromptTemplate.from_template("{context}\n{question}")},
+        return_source_documents=True,
+        query_generator=MultiQueryGenerator.from_llm(FakeListLLM(responses=["Which document?"]), mode="hyde"),
+    )
+
+    result = chain({"question": "Which one?", "chat_history": []})
+
+    assert [document.page_content for document in result["source_documents"]] == ["batched"]
+    assert retriever.batched_queries == [["Which one?", "Which document?"]]
@@ -15,8 +15,8 @@
 from unittest import mock
 
 import pytest
-from langchain.chains import ConversationalRetrievalChain
 from langchain.schema.document import Document
+from llm_models.rag.context_packing_chain import ContextPackingConversationalRetrievalChain
 from llm_models.rag.huggingface_retrieval import HuggingFaceRetrievalLLM
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
 from shared.memory.ddb_chat_memory import DynamoDBChatMemory
@@ -71,7 +71,7 @@ def test_implement_error_not_raised(chat_fixture, is_streaming, request):
         assert chat_model.verbose == False
         assert chat_model.knowledge_base.kendra_index_id == "fake-kendra-index-id"
         assert chat_model.conversation_memory.chat_memory.messages == []
-        assert type(chat_model.conversation_chain) == ConversationalRetrievalChain
+        assert type(chat_model.conversation_chain) == ContextPackingConversationalRetrievalChain
         assert type(chat_model.conversation_memory) == DynamoDBChatMemory
     except NotImplementedError as ex:
         raise Exception(ex)
@@ -0,0 +1,70 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+from llm_models.rag.multi_query_generator import MultiQueryGenerator
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+
+class FailingLLM(FakeListLLM):
+    def _call(self, *args, **kwargs) -> str:
+        raise RuntimeError("fake-error")
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    yield
+
+
+def test_paraphrases():
+    generator = MultiQueryGenerator.from_llm(
+        FakeListLLM(responses=["1. How is S3 priced?\n\n- What does S3 cost?\nwhat is the price of s3?\nExtra line"]),
+        num_queries=3,
+    )
+
+    assert generator.generate_queries("What is the price of S3?") == [
+        "What is the price of S3?",
+        "How is S3 priced?",
+        "What does S3 cost?",
+    ]
+    assert request_timer.flags[RequestFlags.EXPANDED_QUERIES.value] == 2
+
+
+def test_hypothetical_document():
+    generator = MultiQueryGenerator.from_llm(
+        FakeListLLM(responses=[" S3 is priced per GB stored.\nRequests are billed too. "]), mode="hyde"
+    )
+
+    assert generator.generate_queries("What is the price of S3?") == [
+        "What is the price of S3?",
+        "S3 is priced per GB stored.\nRequests are billed too.",
+    ]
+    assert "Passage:" in generator.prompt.template
+
+
+def test_failed_generation_falls_back_to_the_question():
+    generator = MultiQueryGenerator.from_llm(FailingLLM(responses=[]))
+
+    assert generator.generate_queries("What is the price of S3?") == ["What is the price of S3?"]
+    assert request_timer.flags[RequestFlags.EXPANDED_QUERIES.value] == 0
+
+
+def test_unsupported_mode():
+    with pytest.raises(ValueError) as error:
+        MultiQueryGenerator.from_llm(FakeListLLM(responses=[]), mode="fake-mode")
+
+    assert error.value.args[0] == "Unsupported multi-query mode fake-mode, expected one of ['paraphrase', 'hyde']"
@@ -0,0 +1,76 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+from uuid import uuid4
+
+import pytest
+from langchain.schema import Document, Generation, LLMResult
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
+from utils.enum_types import RequestStages
+from utils.request_timer import request_timer
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    yield
+
+
+def run_llm(handler):
+    run_id = uuid4()
+    handler.on_llm_start({}, ["fake-prompt"], run_id=run_id)
+    handler.on_llm_end(LLMResult(generations=[[Generation(text="fake-response")]]), run_id=run_id)
+
+
+def run_retriever(handler):
+    run_id = uuid4()
+    handler.on_retriever_start({}, "fake-query", run_id=run_id)
+    handler.on_retriever_end([Document(page_content="fake-content")], run_id=run_id)
+
+
+def test_rag_stages():
+    handler = StageTimingCallbackHandler(rag_enabled=True)
+    run_llm(handler)
+    run_retriever(handler)
+    run_llm(handler)
+
+    assert set(request_timer.stage_durations) == {
+        RequestStages.CONDENSE_LLM.value,
+        RequestStages.RETRIEVAL.value,
+        RequestStages.ANSWER_LLM.value,
+    }
+
+
+def test_rag_stages_without_condensing():
+    handler = StageTimingCallbackHandler(rag_enabled=True)
+    run_retriever(handler)
+    run_llm(handler)
+
+    assert set(request_timer.stage_durations) == {RequestStages.RETRIEVAL.value, RequestStages.ANSWER_LLM.value}
+
+
+def test_non_rag_stages():
+    handler = StageTimingCallbackHandler()
+    run_llm(handler)
+
+    assert set(request_timer.stage_durations) == {RequestStages.ANSWER_LLM.value}
+
+
+def test_failed_run_is_recorded():
+    handler = StageTimingCallbackHandler(rag_enabled=True)
+    run_id = uuid4()
+    handler.on_retriever_start({}, "fake-query", run_id=run_id)
+    handler.on_retriever_error(ValueError("fake-error"), run_id=run_id)
+
+    assert set(request_timer.stage_durations) == {RequestStages.RETRIEVAL.value}
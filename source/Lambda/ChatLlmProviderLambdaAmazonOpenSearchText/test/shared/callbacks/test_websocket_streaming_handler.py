@@ -0,0 +1,89 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from langchain.schema import Generation, LLMResult
+from shared.callbacks.websocket_streaming_handler import WebsocketStreamingCallbackHandler
+from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+
+
+def get_emf_records(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{") and "_aws" in line]
+
+
+def get_metric_definitions(record, namespace):
+    for directive in record["_aws"]["CloudWatchMetrics"]:
+        if directive["Namespace"] == namespace.value:
+            return directive["Metrics"]
+    return []
+
+
+@pytest.fixture
+def streaming_handler(setup_environment):
+    request_timer.reset()
+    handler = WebsocketStreamingCallbackHandler(
+        connection_id="fake-id", conversation_id="fake-conversation-id", is_streaming=True
+    )
+    handler.client = MagicMock()
+    yield handler
+
+
+def test_streaming_latency_metrics(streaming_handler, capsys):
+    for token in ["Hello", " ", "world"]:
+        streaming_handler.on_llm_new_token(token)
+    streaming_handler.on_llm_end(LLMResult(generations=[[Generation(text="Hello world")]]))
+
+    assert len(streaming_handler.token_delivery_times) == 3
+    assert streaming_handler.client.post_to_connection.call_count == 4
+    assert get_emf_records(capsys.readouterr().out) == []
+
+    request_timer.publish_timings()
+    records = get_emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    record = records[0]
+    metric_definitions = get_metric_definitions(record, CloudWatchNamespaces.LANGCHAIN_LLM)
+    assert {metric["Name"] for metric in metric_definitions} == {
+        CloudWatchMetrics.LLM_TIME_TO_FIRST_TOKEN.value,
+        CloudWatchMetrics.LLM_STREAMED_TOKENS.value,
+        CloudWatchMetrics.WEBSOCKET_POST_TO_CONNECTION_TIME.value,
+        CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P50.value,
+        CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P90.value,
+        CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P99.value,
+        CloudWatchMetrics.LLM_TOKENS_PER_SECOND.value,
+    }
+    assert all(metric["StorageResolution"] == 1 for metric in metric_definitions)
+    assert record[CloudWatchMetrics.LLM_STREAMED_TOKENS.value] in (3, [3])
+
+
+def test_non_streaming_latency_metrics(streaming_handler, capsys):
+    streaming_handler.is_streaming = False
+    streaming_handler.on_llm_end(LLMResult(generations=[[Generation(text="Hello world")]]))
+    request_timer.publish_timings()
+
+    records = get_emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    metric_names = {
+        metric["Name"] for metric in get_metric_definitions(records[0], CloudWatchNamespaces.LANGCHAIN_LLM)
+    }
+    assert CloudWatchMetrics.LLM_TIME_TO_FIRST_TOKEN.value in metric_names
+    assert CloudWatchMetrics.LLM_INTER_TOKEN_LATENCY_P50.value not in metric_names
+    assert CloudWatchMetrics.LLM_TOKENS_PER_SECOND.value not in metric_names
+
+
+def test_no_metrics_without_tokens(streaming_handler):
+    streaming_handler.add_latency_metrics()
+    assert request_timer.metrics == {}
@@ -112,3 +112,20 @@ def test_kendra_throws_client_error(kendra_retriever):
 
     response = kendra_retriever._get_relevant_documents("sample query")
     assert response == []
+
+
+def test_get_top_k_docs_keeps_relevant_documents(kendra_stubber):
+    retriever = CustomKendraRetriever(
+        index_id="00000000-0000-0000-0000-000000000000",
+        top_k=10,
+        min_score=0.5,
+    )
+    result_items = [
+        RetrieveResultItem(Id=confidence, Content=confidence, ScoreAttributes={"ScoreConfidence": confidence})
+        for confidence in ["MEDIUM", "LOW", "VERY_HIGH", "NOT_AVAILABLE"]
+    ]
+
+    response = retriever._get_top_k_docs(result_items)
+
+    assert [document.metadata["result_id"] for document in response] == ["VERY_HIGH", "MEDIUM"]
+    assert [document.metadata["score"] for document in response] == [1.0, 0.5]
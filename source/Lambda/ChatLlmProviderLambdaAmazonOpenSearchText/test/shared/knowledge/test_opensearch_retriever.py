@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from langchain.docstore.document import Document
+from shared.knowledge.opensearch_retriever import CustomOpenSearchRetriever
+
+HITS = [
+    {"_id": "1", "_score": 12.0, "_source": {"text": "doc-1"}},
+    {"_id": "2", "_score": 11.5, "_source": {"text": "doc-2"}},
+    {"_id": "3", "_score": 3.0, "_source": {"text": "doc-3"}},
+]
+
+
+@pytest.fixture
+def client():
+    client = mock.MagicMock()
+    client.search.return_value = {"hits": {"hits": HITS}}
+    yield client
+
+
+def test_match_search(client):
+    retriever = CustomOpenSearchRetriever(index_id="fake-index", client=client, top_k=3, return_source_documents=True)
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="doc-1", metadata={"id": "1", "score": 12.0}),
+        Document(page_content="doc-2", metadata={"id": "2", "score": 11.5}),
+        Document(page_content="doc-3", metadata={"id": "3", "score": 3.0}),
+    ]
+    client.search.assert_called_once_with(
+        body={"size": 3, "query": {"match": {"text": "fake-query"}}, "track_total_hits": False, "_source": ["text"]},
+        index="fake-index",
+    )
+
+
+@pytest.mark.parametrize(
+    "min_score, score_gap_cutoff, expected_contents",
+    [(5.0, False, ["doc-1", "doc-2"]), (12.0, False, ["doc-1"]), (None, True, ["doc-1", "doc-2"])],
+)
+def test_relevant_documents(min_score, score_gap_cutoff, expected_contents, client):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        client=client,
+        top_k=3,
+        min_score=min_score,
+        score_gap_cutoff=score_gap_cutoff,
+    )
+
+    assert [document.page_content for document in retriever.get_relevant_documents("fake-query")] == expected_contents
+
+
+def test_multi_query_search(client):
+    client.msearch.return_value = {"responses": [{"hits": {"hits": HITS[:2]}}, {"hits": {"hits": [HITS[2], HITS[1]]}}]}
+    retriever = CustomOpenSearchRetriever(index_id="fake-index", client=client, top_k=2)
+
+    documents = retriever.get_relevant_documents_for_queries(["fake-query", "other-query"])
+
+    assert [document.page_content for document in documents] == ["doc-2", "doc-1"]
+    client.msearch.assert_called_once_with(
+        body=[
+            {"index": "fake-index"},
+            {"size": 2, "query": {"match": {"text": "fake-query"}}, "track_total_hits": False, "_source": ["text"]},
+            {"index": "fake-index"},
+            {"size": 2, "query": {"match": {"text": "other-query"}}, "track_total_hits": False, "_source": ["text"]},
+        ]
+    )
+
+
+def test_filtered_match_search(client):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        client=client,
+        top_k=3,
+        metadata_filter={"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    client.search.assert_called_once_with(
+        body={
+            "size": 3,
+            "query": {
+                "bool": {
+                    "must": [{"match": {"text": "fake-query"}}],
+                    "filter": {"term": {"metadata.tenant": "fake-tenant"}},
+                }
+            },
+            "track_total_hits": False,
+            "_source": ["text"],
+        },
+        index="fake-index",
+    )
+
+
+def test_highlighted_multi_match_search(client):
+    client.search.return_value = {
+        "hits": {
+            "hits": [
+                {"_id": "1", "_score": 12.0, "highlight": {"text": ["Best fragment. ", "Second fragment."]}},
+                {"_id": "2", "_score": 11.5, "highlight": {"text": ["Leading fragment."]}},
+            ]
+        }
+    }
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        client=client,
+        top_k=2,
+        search_fields=["title^2", "text"],
+        highlight=True,
+        fragment_size=100,
+        number_of_fragments=2,
+    )
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="Best fragment. ... Second fragment.", metadata={"score": 12.0}),
+        Document(page_content="Leading fragment.", metadata={"score": 11.5}),
+    ]
+    client.search.assert_called_once_with(
+        body={
+            "size": 2,
+            "query": {"multi_match": {"query": "fake-query", "fields": ["title^2", "text"]}},
+            "track_total_hits": False,
+            "_source": False,
+            "highlight": {
+                "type": "unified",
+                "order": "score",
+                "pre_tags": [""],
+                "post_tags": [""],
+                "require_field_match": False,
+                "fields": {
+                    "text": {
+                        "fragment_size": 100,
+                        "number_of_fragments": 2,
+                        "boundary_scanner": "sentence",
+                        "no_match_size": 100,
+                    }
+                },
+            },
+        },
+        index="fake-index",
+    )
+
+
+def test_bounded_cached_search(client):
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        client=client,
+        top_k=3,
+        request_cache=True,
+        preference="fake-user",
+        track_total_hits=True,
+        search_timeout="500ms",
+        terminate_after=1000,
+    )
+
+    retriever.get_relevant_documents("fake-query")
+
+    client.search.assert_called_once_with(
+        body={
+            "size": 3,
+            "query": {"match": {"text": "fake-query"}},
+            "track_total_hits": True,
+            "_source": ["text"],
+            "timeout": "500ms",
+            "terminate_after": 1000,
+        },
+        index="fake-index",
+        preference="fake-user",
+        request_cache="true",
+    )
+
+
+def test_search_template(client):
+    client.search_template.return_value = {"hits": {"hits": HITS}}
+    client.msearch_template.return_value = {"responses": [{"hits": {"hits": HITS[:2]}}]}
+    retriever = CustomOpenSearchRetriever(
+        index_id="fake-index",
+        client=client,
+        top_k=3,
+        metadata_filter={"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+        search_template_id="fake-template",
+        request_cache=True,
+        preference="fake-user",
+    )
+
+    assert len(retriever.get_relevant_documents("fake-query")) == 3
+    assert len(retriever.get_relevant_documents_for_queries(["fake-query"])) == 2
+
+    params = {"query": "fake-query", "size": 3, "filter": {"term": {"metadata.tenant": "fake-tenant"}}}
+    client.search_template.assert_called_once_with(
+        body={"id": "fake-template", "params": params}, index="fake-index", preference="fake-user"
+    )
+    client.msearch_template.assert_called_once_with(
+        body=[{"index": "fake-index", "preference": "fake-user"}, {"id": "fake-template", "params": params}]
+    )
+    client.search.assert_not_called()
@@ -13,7 +13,8 @@
 ######################################################################################################################
 
 import pytest
-from utils.helpers import type_cast, validate_prompt_template
+from langchain.schema import Document
+from utils.helpers import format_source_documents, percentile, type_cast, validate_prompt_template
 
 
 @pytest.mark.parametrize(
@@ -99,3 +100,35 @@ def test_valid_type_casting(value, data_type, response, response_type, setup_env
 )
 def test_invalid_casting(value, data_type, setup_environment):
     assert type_cast(value, data_type) is None
+
+
+def test_format_source_documents():
+    documents = [
+        Document(page_content="a" * 500, metadata={"id": "doc-1", "source": "s3://bucket/doc-1.txt", "score": 0.9}),
+        {"page_content": "some-page-content-2", "metadata": {"source": "fake-url-2"}},
+        Document(page_content="some-page-content-3"),
+    ]
+    assert format_source_documents(documents, snippet_length=10) == [
+        {"id": "doc-1", "source": "s3://bucket/doc-1.txt", "score": 0.9, "snippet": "a" * 10},
+        {"id": "1", "source": "fake-url-2", "snippet": "some-page-"},
+        {"id": "2", "snippet": "some-page-"},
+    ]
+
+
+def test_format_source_documents_empty():
+    assert format_source_documents([]) == []
+    assert format_source_documents(None) == []
+
+
+@pytest.mark.parametrize(
+    "values, pct, expected",
+    [
+        ([5, 1, 4, 2, 3], 50, 3),
+        ([5, 1, 4, 2, 3], 90, 5),
+        ([5, 1, 4, 2, 3], 0, 1),
+        ([7.5], 99, 7.5),
+        ([], 50, None),
+    ],
+)
+def test_percentile(values, pct, expected):
+    assert percentile(values, pct) == expected
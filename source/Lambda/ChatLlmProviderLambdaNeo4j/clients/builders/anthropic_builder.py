@@ -17,7 +17,11 @@ from aws_lambda_powertools import Logger
 from clients.builders.llm_builder import LLMBuilder
 from llm_models.anthropic import AnthropicLLM
 from llm_models.rag.anthropic_retrieval import AnthropicRetrievalLLM
-from utils.constants import DEFAULT_ANTHROPIC_RAG_ENABLED_MODE
+from utils.constants import (
+    DEFAULT_ANTHROPIC_RAG_ENABLED_MODE,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_SPECULATIVE_RETRIEVAL,
+)
 
 logger = Logger(utc=True)
 
@@ -62,6 +66,17 @@ class AnthropicBuilder(LLMBuilder):
         if self.rag_enabled and not self.knowledge_base:
             raise ValueError("KnowledgeBase is required for RAG-enabled Anthropic chat model.")
         elif self.rag_enabled and self.knowledge_base:
-            self.llm_model = AnthropicRetrievalLLM(**self.model_params)
+            llm_params = self.llm_config.get("LlmParams")
+            self.llm_model = AnthropicRetrievalLLM(
+                **self.model_params,
+                condensing_model=llm_params.get("CondensingModelId"),
+                condensing_model_params=llm_params.get("CondensingModelParams"),
+                speculative_retrieval=llm_params.get("SpeculativeRetrieval", DEFAULT_SPECULATIVE_RETRIEVAL),
+                context_token_budget=llm_params.get("ContextTokenBudget", DEFAULT_CONTEXT_TOKEN_BUDGET),
+                deduplication_threshold=llm_params.get("DeduplicationThreshold"),
+                rerank_params=llm_params.get("RerankParams"),
+                compression_params=llm_params.get("CompressionParams"),
+                multi_query_params=llm_params.get("MultiQueryParams"),
+            )
         else:
             self.llm_model = AnthropicLLM(**self.model_params, rag_enabled=self.rag_enabled)
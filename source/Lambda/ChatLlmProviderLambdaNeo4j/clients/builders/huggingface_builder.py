@@ -19,7 +19,12 @@ from aws_lambda_powertools import Logger
 from clients.builders.llm_builder import LLMBuilder
 from llm_models.huggingface import HuggingFaceLLM
 from llm_models.rag.huggingface_retrieval import HuggingFaceRetrievalLLM
-from utils.constants import DEFAULT_HUGGINGFACE_RAG_ENABLED_MODE, TRACE_ID_ENV_VAR
+from utils.constants import (
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_HUGGINGFACE_RAG_ENABLED_MODE,
+    DEFAULT_SPECULATIVE_RETRIEVAL,
+    TRACE_ID_ENV_VAR,
+)
 
 logger = Logger(utc=True)
 
@@ -98,6 +103,14 @@ class HuggingFaceBuilder(LLMBuilder):
         if self.rag_enabled and not self.knowledge_base:
             raise ValueError("KnowledgeBase is required for RAG-enabled HuggingFace chat model.")
         elif self.rag_enabled and self.knowledge_base:
-            self.llm_model = HuggingFaceRetrievalLLM(**self.model_params)
+            self.llm_model = HuggingFaceRetrievalLLM(
+                **self.model_params,
+                speculative_retrieval=llm_params.get("SpeculativeRetrieval", DEFAULT_SPECULATIVE_RETRIEVAL),
+                context_token_budget=llm_params.get("ContextTokenBudget", DEFAULT_CONTEXT_TOKEN_BUDGET),
+                deduplication_threshold=llm_params.get("DeduplicationThreshold"),
+                rerank_params=llm_params.get("RerankParams"),
+                compression_params=llm_params.get("CompressionParams"),
+                multi_query_params=llm_params.get("MultiQueryParams"),
+            )
         else:
             self.llm_model = HuggingFaceLLM(**self.model_params, rag_enabled=self.rag_enabled)
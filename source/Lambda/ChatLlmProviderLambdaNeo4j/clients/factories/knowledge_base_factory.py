@@ -13,7 +13,7 @@
 ######################################################################################################################
 
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from aws_lambda_powertools import Logger
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
@@ -31,13 +31,16 @@ class KnowledgeBaseFactory:
     in the llm_config.
     """
 
-    def get_knowledge_base(self, llm_config: Dict, errors: List[str]) -> KnowledgeBase:
+    def get_knowledge_base(
+        self, llm_config: Dict, errors: List[str], user_context: Optional[Dict] = None
+    ) -> KnowledgeBase:
         """
         Returns a KnowledgeBase object based on the knowledge-base object constructed with the provided configuration.
 
         Args:
             llm_config(Dict): Model configuration set by admin
             errors(List): List of errors to append to
+            user_context(Dict): Authorizer context of the request, for the filters on user attributes
 
         Returns:
             KnowledgeBase: the knowledge-base constructed with the provided configuration.
@@ -72,14 +75,18 @@ class KnowledgeBaseFactory:
             if not llm_config.get("KnowledgeBaseParams"):
                 raise ValueError("Missing required parameter (KnowledgeBaseParams) for Kendra knowledge base.")
 
-            return KendraKnowledgeBase(kendra_knowledge_base_params=llm_config.get("KnowledgeBaseParams"))
+            return KendraKnowledgeBase(
+                kendra_knowledge_base_params=llm_config.get("KnowledgeBaseParams"), user_context=user_context
+            )
       
             
         if knowledge_base_str == KnowledgeBaseTypes.Neo4j.value:
             if not llm_config.get("KnowledgeBaseParams"):
                 raise ValueError("Missing required parameter (KnowledgeBaseParams) for Neo4j knowledge base.")
 
-            return Neo4jKnowledgeBase(neo4j_knowledge_base_params=llm_config.get("KnowledgeBaseParams"))
+            return Neo4jKnowledgeBase(
+                neo4j_knowledge_base_params=llm_config.get("KnowledgeBaseParams"), user_context=user_context
+            )
 
         else:
             errors.append(f"Unsupported KnowledgeBase type: {knowledge_base_type}.")
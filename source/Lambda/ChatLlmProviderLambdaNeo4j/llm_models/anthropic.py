@@ -17,13 +17,14 @@ import time
 from typing import Any, Dict, List, Optional
 
 from anthropic import AI_PROMPT, HUMAN_PROMPT, AuthenticationError, NotFoundError
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from langchain.callbacks.base import BaseCallbackHandler
 from langchain.llms.base import LLM
 from langchain.schema import BaseMemory
 from llm_models.base_langchain import BaseLangChainModel
 from llm_models.custom_chat_anthropic import CustomChatAnthropic
+from shared.callbacks.stage_timing_handler import StageTimingCallbackHandler
 from shared.knowledge.knowledge_base import KnowledgeBase
 from utils.constants import (
     DEFAULT_ANTHROPIC_MODEL,
@@ -35,15 +36,16 @@ from utils.constants import (
     DEFAULT_ANTHROPIC_TEMPERATURE,
     DEFAULT_MAX_TOKENS_TO_SAMPLE,
     DEFAULT_VERBOSE_MODE,
-    METRICS_SERVICE_NAME,
     TRACE_ID_ENV_VAR,
 )
 from utils.custom_exceptions import LLMBuildError
 from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 tracer = Tracer()
 logger = Logger(utc=True)
-metrics = Metrics(namespace=CloudWatchNamespaces.LANGCHAIN_LLM.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
 
 
 class AnthropicLLM(BaseLangChainModel):
@@ -156,7 +158,8 @@ class AnthropicLLM(BaseLangChainModel):
             stop_sequences=self.stop_sequences,
         )
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def generate(self, question: str) -> Dict[str, Any]:
         """
         Fetches the response from the LLM
@@ -174,7 +177,7 @@ class AnthropicLLM(BaseLangChainModel):
             metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_QUERY.value, unit=MetricUnit.Count, value=1)
             try:
                 start_time = time.time()
-                response = self.conversation_chain.predict(input=question)
+                response = self.conversation_chain.predict(input=question, callbacks=[StageTimingCallbackHandler()])
                 end_time = time.time()
                 metrics.add_metric(
                     name=CloudWatchMetrics.LANGCHAIN_QUERY_PROCESSING_TIME.value,
@@ -208,8 +211,6 @@ class AnthropicLLM(BaseLangChainModel):
                 )
                 metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES.value, unit=MetricUnit.Count, value=1)
                 raise ex
-            finally:
-                metrics.flush_metrics()
 
     def get_clean_model_params(self, model_params: Dict[str, Any]) -> Dict[str, Any]:
         """
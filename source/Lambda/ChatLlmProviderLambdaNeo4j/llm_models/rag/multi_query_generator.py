@@ -0,0 +1,130 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+
+import os
+import re
+from typing import List
+
+from aws_lambda_powertools import Logger
+from langchain.chains import LLMChain
+from langchain.llms.base import BaseLanguageModel
+from utils.constants import (
+    DEFAULT_MULTI_QUERY_NUM_QUERIES,
+    MULTI_QUERY_HYDE_PROMPT_TEMPLATE,
+    MULTI_QUERY_PARAPHRASE_PROMPT_TEMPLATE,
+    TRACE_ID_ENV_VAR,
+)
+from utils.enum_types import MultiQueryModes, RequestFlags, RequestStages
+from utils.request_timer import request_timer
+
+logger = Logger(utc=True)
+
+LIST_MARKER_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+class MultiQueryGenerator(LLMChain):
+    """
+    MultiQueryGenerator generates the additional queries of a multi-query retrieval, so that the documents of an
+    ambiguous question are found even when a single query embedding misses them. In the paraphrase mode, the LLM
+    rewrites the question num_queries times. In the HyDE mode, it writes a hypothetical passage answering the question,
+    which is searched for alongside the question. The question itself is always the first query, and a failed
+    generation falls back to it alone so that it never fails a chat request.
+
+    Attributes:
+        mode (str): "paraphrase" or "hyde" [optional, defaults to DEFAULT_MULTI_QUERY_MODE]
+        num_queries (int): number of paraphrases generated [optional, defaults to DEFAULT_MULTI_QUERY_NUM_QUERIES]
+
+    Methods:
+        from_llm(llm, mode, num_queries): Creates the generator with the prompt of the mode
+        parse_queries(text): Parses the queries out of the LLM output
+        generate_queries(question): Returns the question followed by the generated queries
+    """
+
+    mode: str = MultiQueryModes.PARAPHRASE.value
+    num_queries: int = DEFAULT_MULTI_QUERY_NUM_QUERIES
+
+    @classmethod
+    def from_llm(
+        cls,
+        llm: BaseLanguageModel,
+        mode: str = MultiQueryModes.PARAPHRASE.value,
+        num_queries: int = DEFAULT_MULTI_QUERY_NUM_QUERIES,
+    ) -> "MultiQueryGenerator":
+        """
+        Creates a MultiQueryGenerator with the prompt of the mode.
+
+        Args:
+            llm (BaseLanguageModel): the LLM generating the queries, usually the condensing LLM
+            mode (str): "paraphrase" or "hyde"
+            num_queries (int): number of paraphrases generated
+
+        Returns:
+            MultiQueryGenerator: the query generator
+
+        Raises:
+            ValueError: if the mode is not supported
+        """
+        if mode == MultiQueryModes.PARAPHRASE.value:
+            prompt = MULTI_QUERY_PARAPHRASE_PROMPT_TEMPLATE
+        elif mode == MultiQueryModes.HYDE.value:
+            prompt = MULTI_QUERY_HYDE_PROMPT_TEMPLATE
+        else:
+            supported_modes = [supported_mode.value for supported_mode in MultiQueryModes]
+            raise ValueError(f"Unsupported multi-query mode {mode}, expected one of {supported_modes}")
+        return cls(llm=llm, prompt=prompt, mode=mode, num_queries=int(num_queries))
+
+    def parse_queries(self, text: str) -> List[str]:
+        """
+        Parses the queries out of the LLM output: the lines of the paraphrases, stripped of any list markers, or the
+        whole hypothetical passage.
+
+        Args:
+            text (str): the LLM output
+
+        Returns:
+            List[str]: the generated queries
+        """
+        if self.mode == MultiQueryModes.HYDE.value:
+            return [text.strip()] if text.strip() else []
+        queries = [LIST_MARKER_PATTERN.sub("", line).strip() for line in text.splitlines()]
+        return [query for query in queries if query][: self.num_queries]
+
+    def generate_queries(self, question: str) -> List[str]:
+        """
+        Generates the queries of a question. The LLM runs without the chain callbacks, so it is not reported as a
+        condensing or answering call, and is timed as its own stage.
+
+        Args:
+            question (str): the standalone question
+
+        Returns:
+            List[str]: the question followed by the distinct generated queries
+        """
+        with request_timer.stage(RequestStages.QUERY_EXPANSION):
+            try:
+                generated_queries = self.parse_queries(self.predict(question=question, num_queries=self.num_queries))
+            except Exception as ex:
+                logger.warning(
+                    f"Query generation failed, retrieving for the question only. Error: {ex}",
+                    xray_trace_id=os.environ.get(TRACE_ID_ENV_VAR),
+                )
+                generated_queries = []
+
+        queries = [question]
+        for query in generated_queries:
+            if query.lower() not in (known_query.lower() for known_query in queries):
+                queries.append(query)
+        request_timer.set_flag(RequestFlags.EXPANDED_QUERIES, len(queries) - 1)
+        return queries
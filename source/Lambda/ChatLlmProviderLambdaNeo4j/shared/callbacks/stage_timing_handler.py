@@ -0,0 +1,82 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema import Document, LLMResult
+from utils.enum_types import RequestStages
+from utils.request_timer import request_timer
+
+
+class StageTimingCallbackHandler(BaseCallbackHandler):
+    """
+    StageTimingCallbackHandler times the LLM and retriever runs of a chain invocation and reports them to the request
+    timer. In a RAG chain, LLM runs that start before retrieval are the question condensing calls, and the ones that
+    start after it generate the answer.
+
+    Attributes:
+        rag_enabled (bool): Whether the chain performs retrieval, used to tell condensing calls from answer calls
+
+    Methods:
+        on_llm_start(serialized, prompts, **kwargs): Starts timing an LLM run
+        on_llm_end(response, **kwargs): Records the duration of an LLM run
+        on_llm_error(error, **kwargs): Records the duration of a failed LLM run
+        on_retriever_start(serialized, query, **kwargs): Starts timing a retriever run
+        on_retriever_end(documents, **kwargs): Records the duration of a retriever run
+        on_retriever_error(error, **kwargs): Records the duration of a failed retriever run
+    """
+
+    def __init__(self, rag_enabled: bool = False) -> None:
+        self._rag_enabled = rag_enabled
+        self._retrieval_started = False
+        self._runs = {}
+        super().__init__()
+
+    @property
+    def rag_enabled(self) -> bool:
+        return self._rag_enabled
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        if self.rag_enabled and not self._retrieval_started:
+            self._start_run(run_id, RequestStages.CONDENSE_LLM)
+        else:
+            self._start_run(run_id, RequestStages.ANSWER_LLM)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._retrieval_started = True
+        self._start_run(run_id, RequestStages.RETRIEVAL)
+
+    def on_retriever_end(self, documents: List[Document], *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end_run(run_id)
+
+    def _start_run(self, run_id: UUID, stage: RequestStages) -> None:
+        self._runs[run_id] = (stage, time.perf_counter())
+
+    def _end_run(self, run_id: UUID) -> None:
+        run = self._runs.pop(run_id, None)
+        if run:
+            stage, start_time = run
+            request_timer.record(stage, time.perf_counter() - start_time)
@@ -22,6 +22,8 @@ from utils.constants import (
     TRACE_ID_ENV_VAR,
     WEBSOCKET_CALLBACK_URL_ENV_VAR,
 )
+from utils.enum_types import RequestStages
+from utils.request_timer import request_timer
 
 logger = Logger(utc=True)
 
@@ -81,17 +83,18 @@ class WebsocketHandler:
         Raises:
             ex: _description_
         """
-        try:
-            self.client.post_to_connection(ConnectionId=self.connection_id, Data=self.format_response(response))
-            self.client.post_to_connection(
-                ConnectionId=self.connection_id, Data=self.format_response(END_CONVERSATION_TOKEN)
-            )
-        except Exception as ex:
-            logger.error(
-                f"Error sending token to connection {self.connection_id}: {ex}",
-                xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
-            )
-            raise ex
+        with request_timer.stage(RequestStages.WEBSOCKET_POST):
+            try:
+                self.client.post_to_connection(ConnectionId=self.connection_id, Data=self.format_response(response))
+                self.client.post_to_connection(
+                    ConnectionId=self.connection_id, Data=self.format_response(END_CONVERSATION_TOKEN)
+                )
+            except Exception as ex:
+                logger.error(
+                    f"Error sending token to connection {self.connection_id}: {ex}",
+                    xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
+                )
+                raise ex
 
     def format_response(self, response: str) -> str:
         """
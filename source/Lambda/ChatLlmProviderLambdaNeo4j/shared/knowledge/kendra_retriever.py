@@ -16,18 +16,29 @@ import os
 import time
 from typing import Any, Dict, List, Optional, Sequence
 
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from botocore.exceptions import ClientError
 from helper import get_service_client
 from langchain.retrievers.kendra import AmazonKendraRetriever, ResultItem, clean_excerpt
 from langchain.schema import Document
-from utils.constants import DEFAULT_KENDRA_NUMBER_OF_DOCS, METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
+from shared.knowledge.relevance_filter import select_relevant_documents
+from utils.constants import (
+    DEFAULT_KENDRA_NUMBER_OF_DOCS,
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DOCUMENT_SCORE_METADATA_KEY,
+    KENDRA_SCORE_CONFIDENCE_VALUES,
+    TRACE_ID_ENV_VAR,
+)
 from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.AWS_KENDRA.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.AWS_KENDRA)
 
 
 class CustomKendraRetriever(AmazonKendraRetriever):
@@ -41,11 +52,16 @@ class CustomKendraRetriever(AmazonKendraRetriever):
         top_k (int): Number of documents to return
         return_source_documents (bool): Whether source documents to be returned
         attribute_filter (Dict): Additional filtering of results based on metadata. See: https://docs.aws.amazon.com/kendra/latest/APIReference
+        min_score (float): Score below which a result is dropped, no threshold when None. Kendra only reports a score
+            confidence bucket, mapped to a score with KENDRA_SCORE_CONFIDENCE_VALUES
+        min_number_of_docs (int): Number of documents returned whatever their scores
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap
 
     Methods:
         get_relevant_documents(query): Run search on Kendra index and get top k documents.
         kendra_query(query, top_k, attribute_filter): Execute a query on the kendra index and return a list of processed responses.
         get_clean_docs(docs): Parses the documents returned from Kendra and cleans them.
+        get_top_k_docs(result_items): Converts the result items to documents, keeping the relevant ones.
 
     """
 
@@ -55,6 +71,9 @@ class CustomKendraRetriever(AmazonKendraRetriever):
     return_source_documents: bool
     attribute_filter: Optional[Dict] = None
     user_context: Optional[Dict] = None
+    min_score: Optional[float] = DEFAULT_MIN_SCORE
+    min_number_of_docs: int = DEFAULT_MIN_NUMBER_OF_DOCS
+    score_gap_cutoff: bool = DEFAULT_SCORE_GAP_CUTOFF
 
     def __init__(
         self,
@@ -63,6 +82,9 @@ class CustomKendraRetriever(AmazonKendraRetriever):
         return_source_documents: Optional[bool] = False,
         attribute_filter: Optional[Dict] = None,
         user_context: Optional[Dict] = None,
+        min_score: Optional[float] = DEFAULT_MIN_SCORE,
+        min_number_of_docs: Optional[int] = DEFAULT_MIN_NUMBER_OF_DOCS,
+        score_gap_cutoff: Optional[bool] = DEFAULT_SCORE_GAP_CUTOFF,
     ):
         super().__init__(
             index_id=index_id,
@@ -71,10 +93,13 @@ class CustomKendraRetriever(AmazonKendraRetriever):
             return_source_documents=return_source_documents,
             attribute_filter=attribute_filter,
             user_context=user_context,
+            min_score=min_score,
+            min_number_of_docs=min_number_of_docs,
+            score_gap_cutoff=score_gap_cutoff,
         )
 
-    @tracer.capture_method(capture_response=True)
-    @metrics.log_metrics
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def _get_relevant_documents(self, query: str) -> List[Document]:
         """
         @overrides AmazonKendraRetriever._get_relevant_documents
@@ -118,7 +143,8 @@ class CustomKendraRetriever(AmazonKendraRetriever):
             metrics.add_metric(name=CloudWatchMetrics.KENDRA_FAILURES.value, unit=MetricUnit.Count, value=1)
             return []
 
-    @tracer.capture_method(capture_response=True)
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def _kendra_query(self, query: str) -> Sequence[ResultItem]:
         """
         @overrides AmazonKendraRetriever._kendra_query
@@ -161,3 +187,27 @@ class CustomKendraRetriever(AmazonKendraRetriever):
                 doc.metadata = {}
 
         return docs
+
+    def _get_top_k_docs(self, result_items: Sequence[ResultItem]) -> List[Document]:
+        """
+        @overrides AmazonKendraRetriever._get_top_k_docs
+        Converts the top k result items to documents, with the score confidence of each result as its score, and keeps
+        the relevant ones.
+
+        Args:
+            result_items (Sequence[ResultItem]): List of kendra query response items of type ResultItem
+
+        Returns:
+            List[Document]: List of Langchain document objects, best first
+        """
+        top_docs = super()._get_top_k_docs(result_items)
+        for doc, item in zip(top_docs, result_items):
+            score_confidence = (getattr(item, "ScoreAttributes", None) or {}).get("ScoreConfidence")
+            doc.metadata[DOCUMENT_SCORE_METADATA_KEY] = KENDRA_SCORE_CONFIDENCE_VALUES.get(score_confidence, 0.0)
+
+        return select_relevant_documents(
+            top_docs,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+        )
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+import argparse
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+import boto3
+from aws_lambda_powertools import Logger
+from langchain.embeddings import BedrockEmbeddings
+from langchain.vectorstores import Neo4jVector
+from shared.knowledge.neo4j_knowledge_base import (
+    NEO4J_EMBEDDING_NODE_PROPERTY,
+    NEO4J_INDEX_ID,
+    NEO4J_NODE_LABEL,
+    NEO4J_NODE_PROPERTY,
+    NEO4J_SECRET_NAME_ENV_VAR,
+    NEO4J_URI,
+    get_secret,
+)
+from utils.constants import (
+    DEFAULT_NEO4J_BACKFILL_WORKERS,
+    DEFAULT_NEO4J_SYNC_BATCH_SIZE,
+    INGESTION_INITIAL_BACKOFF,
+    INGESTION_MAX_BACKOFF,
+    INGESTION_MAX_RETRIES,
+    NEO4J_CONTENT_HASH_PROPERTY,
+)
+
+logger = Logger(utc=True)
+
+# the text embedded for a node, the same as Neo4jVector.from_existing_graph embeds
+NEO4J_NODE_TEXT = "reduce(str='', k IN $props | str + '\\n' + k + ':' + coalesce(n[k], ''))"
+# pages the nodes by element id
+NEO4J_SYNC_PAGE_QUERY = (
+    "MATCH (n:`{node_label}`) WHERE elementId(n) > $after "
+    f"RETURN elementId(n) AS id, {NEO4J_NODE_TEXT} AS text, "
+    "n.`{content_hash_property}` AS content_hash, n.`{embedding_node_property}` IS NULL AS missing_embedding "
+    "ORDER BY id LIMIT $limit"
+)
+# pages the nodes without an embedding by element id, the nodes written meanwhile drop out of the next pages
+NEO4J_BACKFILL_PAGE_QUERY = (
+    "MATCH (n:`{node_label}`) WHERE n.`{embedding_node_property}` IS NULL AND elementId(n) > $after "
+    f"RETURN elementId(n) AS id, {NEO4J_NODE_TEXT} AS text "
+    "ORDER BY id LIMIT $limit"
+)
+NEO4J_BACKFILL_COUNT_QUERY = (
+    "MATCH (n:`{node_label}`) WHERE n.`{embedding_node_property}` IS NULL RETURN count(n) AS count"
+)
+# writes the embeddings and hashes of a batch of nodes in a single request
+NEO4J_SYNC_WRITE_QUERY = (
+    "UNWIND $rows AS row MATCH (n:`{node_label}`) WHERE elementId(n) = row.id "
+    "CALL db.create.setVectorProperty(n, '{embedding_node_property}', row.embedding) YIELD node "
+    "SET node.`{content_hash_property}` = row.content_hash RETURN count(*) AS written"
+)
+
+
+def get_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_queries(node_label: str, embedding_node_property: str) -> Dict[str, str]:
+    """
+    Returns the Cypher queries of the sync and the backfill, for the nodes of a label and their embedding property.
+    """
+    query_properties = {
+        "node_label": node_label,
+        "embedding_node_property": embedding_node_property,
+        "content_hash_property": NEO4J_CONTENT_HASH_PROPERTY,
+    }
+    return {
+        "sync_page": NEO4J_SYNC_PAGE_QUERY.format(**query_properties),
+        "backfill_page": NEO4J_BACKFILL_PAGE_QUERY.format(**query_properties),
+        "backfill_count": NEO4J_BACKFILL_COUNT_QUERY.format(**query_properties),
+        "write": NEO4J_SYNC_WRITE_QUERY.format(**query_properties),
+    }
+
+
+def with_retries(function: Callable, *args: Any, description: Optional[str] = "request") -> Any:
+    """
+    Calls a function, retrying it with exponential backoff when it raises, up to INGESTION_MAX_RETRIES times.
+
+    Raises:
+        Exception: the error of the last attempt
+    """
+    backoff = INGESTION_INITIAL_BACKOFF
+    for attempt in range(INGESTION_MAX_RETRIES + 1):
+        try:
+            return function(*args)
+        except Exception as ex:
+            if attempt == INGESTION_MAX_RETRIES:
+                raise
+            logger.warning(f"{description} failed, retrying in {backoff}s. Error: {ex}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, INGESTION_MAX_BACKOFF)
+
+
+def write_node_embeddings(store: Any, write_query: str, nodes: List[Dict[str, Any]]) -> int:
+    """
+    Embeds the texts of a batch of nodes in one call and writes the embeddings, with the hashes of the texts, in one
+    UNWIND request. Both are retried with exponential backoff.
+
+    Args:
+        store (Any): the Neo4jVector of the knowledge base, whose embedding is used
+        write_query (str): the write query of get_queries
+        nodes (List[Dict[str, Any]]): the "id" and "text" of each node
+
+    Returns:
+        int: the number of nodes written
+    """
+    texts = [node["text"] for node in nodes]
+    embeddings = with_retries(store.embedding.embed_documents, texts, description="Embedding request")
+    rows = [
+        {"id": node["id"], "embedding": embedding, "content_hash": get_content_hash(node["text"])}
+        for node, embedding in zip(nodes, embeddings)
+    ]
+    with_retries(lambda: store.query(write_query, params={"rows": rows}), description="UNWIND write")
+    return len(rows)
+
+
+def sync_node_embeddings(
+    store: Any,
+    node_label: str,
+    text_node_properties: List[str],
+    embedding_node_property: str,
+    batch_size: Optional[int] = DEFAULT_NEO4J_SYNC_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Brings the embeddings of the nodes of a label up to date with their text properties, re-embedding only the nodes
+    whose text changed. The SHA-256 hash of the text an embedding was computed from is stored next to it, and a node is
+    embedded when it has no embedding or when the hash of its current text differs. Nodes are read in pages ordered by
+    element id, and each page is embedded in one call and written in one UNWIND request. Nodes embedded before their
+    hash was stored are embedded once more, on the first sync.
+
+    Args:
+        store (Any): the Neo4jVector of the knowledge base, whose embedding is used
+        node_label (str): the label of the nodes
+        text_node_properties (List[str]): the properties embedded, as given to Neo4jVector.from_existing_graph
+        embedding_node_property (str): the property holding the embedding
+        batch_size (int): nodes per page [optional, defaults to DEFAULT_NEO4J_SYNC_BATCH_SIZE]
+
+    Returns:
+        Dict[str, int]: the number of nodes "embedded" and "unchanged"
+    """
+    queries = get_queries(node_label, embedding_node_property)
+    start_time = time.perf_counter()
+    counts = {"embedded": 0, "unchanged": 0}
+    after = ""
+    while True:
+        nodes = store.query(
+            queries["sync_page"], params={"after": after, "props": text_node_properties, "limit": batch_size}
+        )
+        if not nodes:
+            break
+        after = nodes[-1]["id"]
+
+        changed_nodes = [
+            node
+            for node in nodes
+            if node["missing_embedding"] or node["content_hash"] != get_content_hash(node["text"])
+        ]
+        counts["unchanged"] += len(nodes) - len(changed_nodes)
+        if changed_nodes:
+            counts["embedded"] += write_node_embeddings(store, queries["write"], changed_nodes)
+        if len(nodes) < batch_size:
+            break
+
+    logger.info(
+        f"Embedded {counts['embedded']} changed nodes of label {node_label}, {counts['unchanged']} unchanged, "
+        f"in {time.perf_counter() - start_time:.1f}s"
+    )
+    return counts
+
+
+def backfill_node_embeddings(
+    store: Any,
+    node_label: str,
+    text_node_properties: List[str],
+    embedding_node_property: str,
+    batch_size: Optional[int] = DEFAULT_NEO4J_SYNC_BATCH_SIZE,
+    max_workers: Optional[int] = DEFAULT_NEO4J_BACKFILL_WORKERS,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> Dict[str, int]:
+    """
+    Embeds the nodes of a label which have no embedding yet, outside of the chat lambda. The nodes are paged by element
+    id, and each page is embedded and written in one UNWIND request by one of max_workers concurrent workers, with at
+    most two pages per worker in memory. The progress is logged after every page.
+
+    The backfill resumes by itself: a node is only read while it has no embedding, so a new run after an interruption,
+    or after a page failed all its retries, embeds exactly the nodes left.
+
+    Args:
+        store (Any): the Neo4jVector of the knowledge base, whose embedding is used
+        node_label (str): the label of the nodes
+        text_node_properties (List[str]): the properties embedded, as given to Neo4jVector.from_existing_graph
+        embedding_node_property (str): the property holding the embedding
+        batch_size (int): nodes per page [optional, defaults to DEFAULT_NEO4J_SYNC_BATCH_SIZE]
+        max_workers (int): pages embedded and written concurrently
+            [optional, defaults to DEFAULT_NEO4J_BACKFILL_WORKERS]
+        progress_callback (Callable[[int, int], None]): called with the nodes embedded and the nodes to embed after
+            every page [optional]
+
+    Returns:
+        Dict[str, int]: the number of nodes "embedded" and "failed"
+
+    Raises:
+        Exception: the error of the first page that failed after its retries, once the other pages are written
+    """
+    queries = get_queries(node_label, embedding_node_property)
+    total = store.query(queries["backfill_count"])[0]["count"]
+    logger.info(f"Backfilling the embeddings of {total} nodes of label {node_label}")
+
+    start_time = time.perf_counter()
+    counts = {"embedded": 0, "failed": 0}
+    counts_lock = threading.Lock()
+    errors = []
+
+    def write_page(nodes: List[Dict[str, Any]]) -> None:
+        try:
+            written = write_node_embeddings(store, queries["write"], nodes)
+        except Exception as ex:
+            logger.error(f"Failed to write the embeddings of {len(nodes)} nodes after {nodes[0]['id']}. Error: {ex}")
+            with counts_lock:
+                counts["failed"] += len(nodes)
+                errors.append(ex)
+            return
+        with counts_lock:
+            counts["embedded"] += written
+            elapsed = time.perf_counter() - start_time
+            logger.info(
+                f"Embedded {counts['embedded']}/{total} nodes, {counts['embedded'] / max(elapsed, 1e-9):.1f} nodes/s"
+            )
+            if progress_callback:
+                progress_callback(counts["embedded"], total)
+
+    after = ""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        while True:
+            nodes = store.query(
+                queries["backfill_page"], params={"after": after, "props": text_node_properties, "limit": batch_size}
+            )
+            if not nodes:
+                break
+            after = nodes[-1]["id"]
+            if len(in_flight) >= 2 * max_workers:
+                _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            in_flight.add(executor.submit(write_page, nodes))
+            if len(nodes) < batch_size:
+                break
+
+    logger.info(
+        f"Embedded {counts['embedded']} nodes of label {node_label}, {counts['failed']} failed, "
+        f"in {time.perf_counter() - start_time:.1f}s"
+    )
+    if errors:
+        raise errors[0]
+    return counts
+
+
+def main() -> None:
+    """
+    Embeds the nodes of the knowledge base which have no embedding yet, configured with the same environment variables
+    as the lambda, e.g.
+
+        python -m shared.knowledge.neo4j_ingestion --workers 8
+
+    With --sync, the nodes whose text changed since they were embedded are embedded again as well. The vector index is
+    created once the nodes are embedded if it does not exist.
+    """
+    parser = argparse.ArgumentParser(description="Embeds the nodes of the Neo4j knowledge base")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_NEO4J_SYNC_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_NEO4J_BACKFILL_WORKERS)
+    parser.add_argument("--sync", action="store_true", help="also embeds again the nodes whose text changed")
+    args = parser.parse_args()
+
+    secret = get_secret(os.environ[NEO4J_SECRET_NAME_ENV_VAR])
+    node_label = os.environ[NEO4J_NODE_LABEL]
+    embedding_node_property = os.environ[NEO4J_EMBEDDING_NODE_PROPERTY]
+    store = Neo4jVector(
+        embedding=BedrockEmbeddings(model_id="amazon.titan-embed-text-v1", client=boto3.client("bedrock-runtime")),
+        url=os.environ[NEO4J_URI],
+        username=secret["username"],
+        password=secret["password"],
+        index_name=os.environ[NEO4J_INDEX_ID],
+        node_label=node_label,
+        embedding_node_property=embedding_node_property,
+    )
+
+    if args.sync:
+        sync_node_embeddings(store, node_label, NEO4J_NODE_PROPERTY, embedding_node_property, args.batch_size)
+    else:
+        backfill_node_embeddings(
+            store, node_label, NEO4J_NODE_PROPERTY, embedding_node_property, args.batch_size, args.workers
+        )
+    if not store.retrieve_existing_index():
+        store.create_new_index()
+
+
+if __name__ == "__main__":
+    main()
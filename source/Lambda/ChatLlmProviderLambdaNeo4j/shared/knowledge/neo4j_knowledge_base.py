@@ -5,8 +5,19 @@ import boto3
 from typing import Any, Dict,  Optional
 from aws_lambda_powertools import Logger
 from shared.knowledge.knowledge_base import KnowledgeBase
+from shared.knowledge.metadata_filter import build_metadata_filter
 from shared.knowledge.neo4j_retriever import CustomNeo4jRetriever
-from utils.constants import DEFAULT_NEO4J_NUMBER_OF_DOCS, DEFAULT_RETURN_SOURCE_DOCS, NEO4J_INDEX_ID_ENV_VAR
+from utils.constants import (
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_NEO4J_NUMBER_OF_DOCS,
+    DEFAULT_RETURN_SOURCE_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    NEO4J_INDEX_ID_ENV_VAR,
+)
 from utils.enum_types import KnowledgeBaseTypes
 from langchain.vectorstores import Neo4jVector
 from langchain.embeddings import BedrockEmbeddings
@@ -47,6 +58,13 @@ class Neo4jKnowledgeBase(KnowledgeBase):
 
         index_name (str): NEO4J index name
         number_of_docs (int): Number of documents to query for [Optional]
+        min_score (float): Score below which a retrieved document is dropped [Optional]
+        min_number_of_docs (int): Number of documents kept whatever their scores [Optional]
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap [Optional]
+        search_type (str): "similarity" or "mmr" to rerank fetch_k candidates by maximal marginal relevance [Optional]
+        fetch_k (int): Number of candidates reranked by maximal marginal relevance [Optional]
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance [Optional]
+        metadata_filter (Dict): Filter on the node properties, from MetadataFilter and UserAttributeMapping [Optional]
         retriever (CustomNeo4jRetriever): Custom NEO4J retriever
 
     Methods:
@@ -58,6 +76,7 @@ class Neo4jKnowledgeBase(KnowledgeBase):
     def __init__(
         self,
         neo4j_knowledge_base_params: Optional[Dict[str, Any]] = {},
+        user_context: Optional[Dict] = None,
     ) -> None:
         self._check_env_variables()
         
@@ -81,6 +100,17 @@ class Neo4jKnowledgeBase(KnowledgeBase):
             "ReturnSourceDocs",
             DEFAULT_RETURN_SOURCE_DOCS,
         )
+        self.min_score = neo4j_knowledge_base_params.get("MinScore", DEFAULT_MIN_SCORE)
+        self.min_number_of_docs = neo4j_knowledge_base_params.get("MinNumberOfDocs", DEFAULT_MIN_NUMBER_OF_DOCS)
+        self.score_gap_cutoff = neo4j_knowledge_base_params.get("ScoreGapCutoff", DEFAULT_SCORE_GAP_CUTOFF)
+        self.search_type = neo4j_knowledge_base_params.get("SearchType", DEFAULT_SEARCH_TYPE)
+        self.fetch_k = neo4j_knowledge_base_params.get("FetchK", DEFAULT_MMR_FETCH_K)
+        self.lambda_mult = neo4j_knowledge_base_params.get("LambdaMult", DEFAULT_MMR_LAMBDA_MULT)
+        self.metadata_filter = build_metadata_filter(
+            neo4j_knowledge_base_params.get("MetadataFilter"),
+            neo4j_knowledge_base_params.get("UserAttributeMapping"),
+            user_context,
+        )
 
        
         bedrock = boto3.client('bedrock-runtime')
@@ -98,7 +128,17 @@ class Neo4jKnowledgeBase(KnowledgeBase):
         embedding_node_property=os.environ.get(NEO4J_EMBEDDING_NODE_PROPERTY),
         )
         self.retriever = CustomNeo4jRetriever(
-            index_id=self.index_id, top_k=self.number_of_docs, return_source_documents=self.return_source_documents, docsearch=self.docsearch
+            index_id=self.index_id,
+            top_k=self.number_of_docs,
+            return_source_documents=self.return_source_documents,
+            docsearch=self.docsearch,
+            search_type=self.search_type,
+            fetch_k=self.fetch_k,
+            lambda_mult=self.lambda_mult,
+            min_score=self.min_score,
+            min_number_of_docs=self.min_number_of_docs,
+            score_gap_cutoff=self.score_gap_cutoff,
+            metadata_filter=self.metadata_filter,
         )
     def _check_env_variables(self) -> None:
         """
@@ -1,20 +1,53 @@
 #!/usr/bin/env python
 import os
 import time
-from typing import Any, Dict, List, Optional, Sequence
-from aws_lambda_powertools import Logger, Metrics, Tracer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.metrics import MetricUnit
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from langchain.vectorstores import Neo4jVector
 from langchain.embeddings import BedrockEmbeddings
 from langchain.vectorstores.neo4j_vector import SearchType
-from utils.constants import METRICS_SERVICE_NAME, TRACE_ID_ENV_VAR
-from utils.enum_types import CloudWatchNamespaces
+from shared.knowledge.maximal_marginal_relevance import maximal_marginal_relevance
+from shared.knowledge.metadata_filter import to_cypher_filter
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+from shared.knowledge.relevance_filter import select_relevant_documents
+from utils.constants import (
+    DEFAULT_MIN_NUMBER_OF_DOCS,
+    DEFAULT_MIN_SCORE,
+    DEFAULT_MMR_FETCH_K,
+    DEFAULT_MMR_LAMBDA_MULT,
+    DEFAULT_NEO4J_NUMBER_OF_DOCS,
+    DEFAULT_SCORE_GAP_CUTOFF,
+    DEFAULT_SEARCH_TYPE,
+    DOCUMENT_SCORE_METADATA_KEY,
+    TRACE_ID_ENV_VAR,
+)
+from utils.enum_types import CloudWatchNamespaces, RetrievalSearchTypes
+from utils.request_timer import request_timer
+from utils.trace_capture import capture_response
 
 logger = Logger(utc=True)
 tracer = Tracer()
-metrics = Metrics(namespace=CloudWatchNamespaces.AWS_NEO4J.value, service=METRICS_SERVICE_NAME)
+metrics = request_timer.get_metrics(CloudWatchNamespaces.AWS_NEO4J)
+NEO4J_VECTOR_SEARCH_YIELD = "YIELD node, score "
+# searches the candidates of a filtered similarity search, of which the top k matching the filter are returned
+NEO4J_SIMILARITY_SEARCH_QUERY = (
+    "CALL db.index.vector.queryNodes($index, $k, $embedding) YIELD node, score "
+    "WITH node, score LIMIT $top_k "
+)
+# returns the node embedding along with the columns of the vector store retrieval query
+NEO4J_MMR_SEARCH_QUERY = (
+    "CALL db.index.vector.queryNodes($index, $k, $embedding) YIELD node, score "
+    "WITH node, score, node[$embedding_node_property] AS embedding "
+)
+# searches the vector index once per query embedding, in a single request, tagging each row with its query
+NEO4J_MULTI_QUERY_SEARCH_QUERY = (
+    "UNWIND range(0, size($embeddings) - 1) AS query_index "
+    "CALL db.index.vector.queryNodes($index, $k, $embeddings[query_index]) YIELD node, score "
+    "WITH query_index, node, score "
+)
 from enum import Enum
 
 
@@ -33,7 +66,16 @@ class CustomNeo4jRetriever(BaseRetriever):
     Attributes:
         client (Any): Neo4j client
         index_name (str): Neo4j index name
-        top_k (int): Number of documents to return
+        top_k (int): Number of documents to fetch, the most returned
+        search_type (str): How documents are selected, by similarity or by maximal marginal relevance ("mmr")
+        fetch_k (int): Number of candidates fetched for maximal marginal relevance
+        lambda_mult (float): Weight of relevance against diversity for maximal marginal relevance
+        min_score (float): Score below which a fetched document is dropped, no threshold when None
+        min_number_of_docs (int): Number of documents returned whatever their scores
+        score_gap_cutoff (bool): Whether to drop the documents after the largest score gap
+        metadata_filter (Dict): Filter on the node properties, as built by build_metadata_filter, no filter when None.
+            The filter is a WHERE clause applied after the vector index search of max(fetch_k, top_k) candidates,
+            so a selective filter can return fewer than top_k documents. Requires Neo4j 5.13 or later
     """
 
     index_id: str
@@ -41,17 +83,40 @@ class CustomNeo4jRetriever(BaseRetriever):
     top_k: int
     return_source_documents: bool
     docsearch: Any
+    search_type: str
+    fetch_k: int
+    lambda_mult: float
+    min_score: Optional[float]
+    min_number_of_docs: int
+    score_gap_cutoff: bool
+    metadata_filter: Optional[Dict] = None
 
     def __init__(
         self,
         index_id: str,
         #client: Any,
         docsearch: Any,
-        top_k: Optional[int] = 10,
+        top_k: Optional[int] = DEFAULT_NEO4J_NUMBER_OF_DOCS,
         return_source_documents: Optional[bool] = False,
+        search_type: Optional[str] = DEFAULT_SEARCH_TYPE,
+        fetch_k: Optional[int] = DEFAULT_MMR_FETCH_K,
+        lambda_mult: Optional[float] = DEFAULT_MMR_LAMBDA_MULT,
+        min_score: Optional[float] = DEFAULT_MIN_SCORE,
+        min_number_of_docs: Optional[int] = DEFAULT_MIN_NUMBER_OF_DOCS,
+        score_gap_cutoff: Optional[bool] = DEFAULT_SCORE_GAP_CUTOFF,
+        metadata_filter: Optional[Dict] = None,
     ):
         super().__init__(
-            index_id=index_id, top_k=top_k, return_source_documents=return_source_documents
+            index_id=index_id,
+            top_k=top_k,
+            return_source_documents=return_source_documents,
+            search_type=search_type,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            min_score=min_score,
+            min_number_of_docs=min_number_of_docs,
+            score_gap_cutoff=score_gap_cutoff,
+            metadata_filter=metadata_filter,
         )  # Call the superclass constructor
         self.index_id = index_id
         self.top_k = top_k
@@ -59,8 +124,8 @@ class CustomNeo4jRetriever(BaseRetriever):
         #self.client = client
         self.docsearch = docsearch
 
-    @tracer.capture_method(capture_response=True)
-    @metrics.log_metrics
+    @tracer.capture_method(capture_response=False)
+    @capture_response
     def _get_relevant_documents(self, query: str) -> List[Document]:
         """
         Run search on Neo4j index and get top k documents.
@@ -74,9 +139,7 @@ class CustomNeo4jRetriever(BaseRetriever):
             subsegment.put_annotation("operation", "retrieve/query")
             metrics.add_metric(name=Neo4jCloudWatchMetrics.NEO4J_QUERY.value, unit=MetricUnit.Count, value=1)
             try:
-                cleaned_docs = self._neo4j_query(query)
-                documents = [Document(page_content=doc) for doc in cleaned_docs]
-                return documents
+                return self._neo4j_query(query)
             except Exception as e:
                 logger.error(
                     f" query failed, returning empty docs. Query: {query}\nException: {e}",
@@ -88,8 +151,9 @@ class CustomNeo4jRetriever(BaseRetriever):
 
             return []
 
-    @tracer.capture_method(capture_response=True)
-    def _neo4j_query(self, query: str):
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def _neo4j_query(self, query: str) -> List[Document]:
         """
         Execute a query on the neo4j index 
 
@@ -100,7 +164,18 @@ class CustomNeo4jRetriever(BaseRetriever):
         """
         try:
             start_time = time.time()
-            response = self.docsearch.similarity_search(query, k=1)
+            if self.search_type == RetrievalSearchTypes.MMR.value:
+                response = self._max_marginal_relevance_search(query)
+            elif self.metadata_filter:
+                response = self._filtered_similarity_search(query)
+            else:
+                response = [
+                    Document(
+                        page_content=document.page_content,
+                        metadata={**document.metadata, DOCUMENT_SCORE_METADATA_KEY: score},
+                    )
+                    for document, score in self.docsearch.similarity_search_with_score(query, k=self.top_k)
+                ]
             end_time = time.time()
             metrics.add_metric(
                 name=Neo4jCloudWatchMetrics.NEO4J_QUERY_PROCESSING_TIME.value,
@@ -108,24 +183,202 @@ class CustomNeo4jRetriever(BaseRetriever):
                 value=(end_time - start_time),
             )
 
-            cleaned_docs = self._get_clean_docs(response)
-            for doc in cleaned_docs:
-                print(doc)
-            return cleaned_docs
+            return select_relevant_documents(
+                self._get_clean_docs(response),
+                min_score=self.min_score,
+                min_number_of_docs=self.min_number_of_docs,
+                score_gap_cutoff=self.score_gap_cutoff,
+            )
 
         except Exception as e:
             logger.error(f"query failed: {e}")
             return []
 
-    def _get_clean_docs(self, documents):
-        cleaned_docs = []
-    
-        for document in documents:  # Assuming 'documents' is a list of Document objects
-            content = document.page_content  # Directly use the content string
-            if content:  # Ensure the content is not empty
-                cleaned_docs.append(content)
-    
-        return cleaned_docs
+    @tracer.capture_method(capture_response=False)
+    @capture_response
+    def get_relevant_documents_for_queries(self, queries: List[str]) -> List[Document]:
+        """
+        Retrieves the documents of several queries in a single UNWIND Cypher query over the vector index, and fuses
+        their results with reciprocal rank fusion. The queries are searched by similarity.
+
+        Args:
+            queries (List[str]): the question followed by the generated queries
+
+        Returns:
+            List[Document]: the top_k fused documents, best first
+        """
+        with tracer.provider.in_subsegment("## neo4j_query") as subsegment:
+            subsegment.put_annotation("service", "neo4j")
+            subsegment.put_annotation("operation", "retrieve/unwind")
+            metrics.add_metric(name=Neo4jCloudWatchMetrics.NEO4J_QUERY.value, unit=MetricUnit.Count, value=1)
+            try:
+                start_time = time.time()
+                retrieval_query = (
+                    self.docsearch.retrieval_query
+                    or f"RETURN node.`{self.docsearch.text_node_property}` AS text, {{}} AS metadata, score"
+                )
+                search_query, params = self._add_filter(
+                    NEO4J_MULTI_QUERY_SEARCH_QUERY,
+                    {
+                        "index": self.docsearch.index_name,
+                        "k": max(self.fetch_k, self.top_k) if self.metadata_filter else self.top_k,
+                        "embeddings": self.docsearch.embedding.embed_documents(queries),
+                    },
+                )
+                results = self.docsearch.query(search_query + retrieval_query + ", query_index", params=params)
+                end_time = time.time()
+                metrics.add_metric(
+                    name=Neo4jCloudWatchMetrics.NEO4J_QUERY_PROCESSING_TIME.value,
+                    unit=MetricUnit.Seconds,
+                    value=(end_time - start_time),
+                )
+            except Exception as e:
+                logger.error(
+                    f"Multi-query search failed, returning empty docs. Queries: {queries}\nException: {e}",
+                    xray_trace_id=os.environ[TRACE_ID_ENV_VAR],
+                )
+                metrics.add_metric(name=Neo4jCloudWatchMetrics.NEO4J_FAILURES.value, unit=MetricUnit.Count, value=1)
+                return []
+
+        docs_by_query = [[] for _ in queries]
+        for result in sorted(results, key=lambda result: -(result.get("score") or 0.0)):
+            metadata = {key: value for key, value in (result.get("metadata") or {}).items() if value is not None}
+            docs_by_query[result["query_index"]].append(
+                Document(
+                    page_content=result.get("text") or "",
+                    metadata={**metadata, DOCUMENT_SCORE_METADATA_KEY: result.get("score")},
+                )
+            )
+        ranked_lists = [
+            select_relevant_documents(
+                self._get_clean_docs(docs[: self.top_k]),
+                min_score=self.min_score,
+                min_number_of_docs=self.min_number_of_docs,
+                score_gap_cutoff=self.score_gap_cutoff,
+            )
+            for docs in docs_by_query
+        ]
+        return reciprocal_rank_fusion(ranked_lists, top_k=self.top_k)
+
+    def _filtered_similarity_search(self, query: str) -> List[Document]:
+        """
+        Searches max(fetch_k, top_k) candidate nodes with the vector index and returns the top_k of them matching the
+        metadata filter, applied as a WHERE clause on the candidates. Fewer than top_k are returned when fewer of the
+        candidates match.
+
+        Args:
+            query (str): Query to search for in the neo4j index
 
+        Returns:
+            List[Document]: List of documents, best first
+        """
+        retrieval_query = (
+            self.docsearch.retrieval_query
+            or f"RETURN node.`{self.docsearch.text_node_property}` AS text, {{}} AS metadata, score"
+        )
+        search_query, params = self._add_filter(
+            NEO4J_SIMILARITY_SEARCH_QUERY,
+            {
+                "index": self.docsearch.index_name,
+                "k": max(self.fetch_k, self.top_k),
+                "top_k": self.top_k,
+                "embedding": self.docsearch.embedding.embed_query(query),
+            },
+        )
+        documents = []
+        for result in self.docsearch.query(search_query + retrieval_query, params=params):
+            metadata = {key: value for key, value in (result.get("metadata") or {}).items() if value is not None}
+            documents.append(
+                Document(
+                    page_content=result.get("text") or "",
+                    metadata={**metadata, DOCUMENT_SCORE_METADATA_KEY: result.get("score")},
+                )
+            )
+        return documents
+
+    def _add_filter(self, search_query: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Adds the metadata filter to a vector index query, as a WHERE clause right after the nodes are yielded by the
+        index, along with the parameters of the filter.
+
+        Args:
+            search_query (str): the vector index query, yielding node and score
+            params (Dict[str, Any]): the parameters of the query
+
+        Returns:
+            Tuple[str, Dict[str, Any]]: the filtered query and its parameters, unchanged without a metadata filter
+        """
+        if not self.metadata_filter:
+            return search_query, params
+        predicate, filter_params = to_cypher_filter(self.metadata_filter, node_variable="node")
+        filtered_query = search_query.replace(
+            NEO4J_VECTOR_SEARCH_YIELD, f"{NEO4J_VECTOR_SEARCH_YIELD}WHERE {predicate} ", 1
+        )
+        return filtered_query, {**params, **filter_params}
+
+    def _max_marginal_relevance_search(self, query: str) -> List[Document]:
+        """
+        Fetches fetch_k candidate nodes together with their embeddings in a single vector index query, and selects
+        top_k of them by maximal marginal relevance.
+
+        Args:
+            query (str): Query to search for in the neo4j index
+
+        Returns:
+            List[Document]: List of selected documents, in selection order
+        """
+        query_vector = self.docsearch.embedding.embed_query(query)
+        retrieval_query = (
+            self.docsearch.retrieval_query
+            or f"RETURN node.`{self.docsearch.text_node_property}` AS text, {{}} AS metadata, score"
+        )
+        search_query, params = self._add_filter(
+            NEO4J_MMR_SEARCH_QUERY,
+            {
+                "index": self.docsearch.index_name,
+                "k": self.fetch_k,
+                "embedding": query_vector,
+                "embedding_node_property": self.docsearch.embedding_node_property,
+            },
+        )
+        results = self.docsearch.query(search_query + retrieval_query + ", embedding", params=params)
+        results = [result for result in results if result.get("embedding")]
+        selected = maximal_marginal_relevance(
+            query_vector,
+            [result["embedding"] for result in results],
+            k=self.top_k,
+            lambda_mult=self.lambda_mult,
+        )
+        documents = []
+        for index in selected:
+            metadata = results[index].get("metadata") or {}
+            metadata = {key: value for key, value in metadata.items() if value is not None}
+            documents.append(
+                Document(
+                    page_content=results[index].get("text") or "",
+                    metadata={**metadata, DOCUMENT_SCORE_METADATA_KEY: results[index].get("score")},
+                )
+            )
+        return documents
 
+    def _get_clean_docs(self, documents) -> List[Document]:
+        """
+        Parses and cleans the documents returned from Neo4j. The node properties returned as metadata are only kept when
+        source documents are to be returned, the score is always kept.
 
+        Args:
+            documents (List[Document]): List of documents returned by the vector search
+
+        Returns:
+            List[Document]: List of cleaned documents
+        """
+        cleaned_docs = []
+
+        for document in documents:
+            if document.page_content:
+                metadata = dict(document.metadata) if self.return_source_documents else {}
+                if DOCUMENT_SCORE_METADATA_KEY in document.metadata:
+                    metadata[DOCUMENT_SCORE_METADATA_KEY] = document.metadata[DOCUMENT_SCORE_METADATA_KEY]
+                cleaned_docs.append(Document(page_content=document.page_content, metadata=metadata))
+
+        return cleaned_docs
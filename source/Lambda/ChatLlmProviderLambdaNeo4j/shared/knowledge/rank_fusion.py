@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+from typing import Dict, List, Optional
+
+from langchain.schema import Document
+from utils.constants import DOCUMENT_SCORE_METADATA_KEY, RRF_K
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: List[List[Document]], top_k: Optional[int] = None, rrf_k: int = RRF_K
+) -> List[Document]:
+    """
+    Fuses the documents retrieved for several queries with reciprocal rank fusion: a document scores the sum, over the
+    lists it appears in, of 1 / (rrf_k + rank). Only ranks are used, so lists scored on different scales fuse fairly,
+    and a document found by several queries ranks above one found by a single query. Documents are identified by their
+    content, and the first copy found is kept.
+
+    Args:
+        ranked_lists (List[List[Document]]): the documents retrieved for each query, best first
+        top_k (int): number of fused documents returned, all of them when None
+        rrf_k (int): rank offset, a higher value flattens the weight of the top ranks
+
+    Returns:
+        List[Document]: the fused documents, best first, with their fused score in the metadata
+    """
+    fused_scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranked_list in ranked_lists:
+        for rank, document in enumerate(ranked_list, start=1):
+            key = document.page_content
+            fused_scores[key] = fused_scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+
+    ranking = sorted(fused_scores, key=lambda key: -fused_scores[key])[:top_k]
+    return [
+        Document(
+            page_content=documents[key].page_content,
+            metadata={**(documents[key].metadata or {}), DOCUMENT_SCORE_METADATA_KEY: fused_scores[key]},
+        )
+        for key in ranking
+    ]
@@ -277,3 +277,36 @@ def test_returned_bedrock_model(
     ):
         builder.set_llm_model()
         assert type(builder.llm_model) == model
+
+
+@pytest.mark.parametrize(
+    "prompt, is_streaming, rag_enabled",
+    [(DEFAULT_BEDROCK_RAG_PROMPT[DEFAULT_BEDROCK_MODEL_FAMILY], True, True)],
+)
+def test_set_llm_model_with_condensing_model(bedrock_llm_config, chat_event, setup_environment, setup_secret):
+    config = json.loads(bedrock_llm_config["Parameter"]["Value"])
+    config["LlmParams"]["CondensingModelId"] = "amazon.titan-text-lite-v1"
+    config["LlmParams"]["CondensingModelParams"] = {"maxTokenCount": {"Type": "integer", "Value": "100"}}
+    chat_event_body = json.loads(chat_event["body"])
+    builder = BedrockBuilder(
+        connection_id="fake-connection-id",
+        conversation_id="fake-conversation-id",
+        llm_config=config,
+        rag_enabled=True,
+    )
+    user_id = chat_event.get("requestContext", {}).get("authorizer", {}).get(USER_ID_EVENT_KEY, {})
+
+    builder.set_knowledge_base()
+    builder.set_memory_constants(LLMProviderTypes.BEDROCK.value)
+    builder.set_conversation_memory(user_id, chat_event_body[CONVERSATION_ID_EVENT_KEY])
+    with patch(
+        "clients.builders.llm_builder.WebsocketStreamingCallbackHandler",
+        return_value=AsyncIteratorCallbackHandler(),
+    ):
+        builder.set_llm_model()
+
+    assert builder.llm_model.condensing_model == "amazon.titan-text-lite-v1"
+    assert builder.llm_model.condensing_llm.model_id == "amazon.titan-text-lite-v1"
+    assert builder.llm_model.condensing_llm.model_kwargs["maxTokenCount"] == 100
+    assert builder.llm_model.condensing_llm.model_kwargs["temperature"] == 0.0
+    assert builder.llm_model.llm.model_id == "amazon.titan-text-express-v1"
@@ -127,6 +127,20 @@ def test_question_valid_length(llm_client):
         )
 
 
+def test_check_event_keeps_user_context(llm_client):
+    authorizer = {USER_ID_EVENT_KEY: "fake-user-id", "TenantId": "fake-tenant"}
+    event_body = llm_client.check_event(
+        {
+            "requestContext": {"authorizer": authorizer},
+            "connectionId": "fake-id",
+            "body": json.dumps({"question": "Hi"}),
+        }
+    )
+
+    assert event_body[USER_ID_EVENT_KEY] == "fake-user-id"
+    assert llm_client.user_context == authorizer
+
+
 def test_question_invalid_length(setup_environment, llm_client):
     invalid_question = "q" * (USER_QUERY_LENGTH + 1)
     with pytest.raises(ValueError) as error:
@@ -40,7 +40,6 @@ mocked_doc = {"page_content": "some-page-content-1", "metadata": {"source": "fak
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_ANTHROPIC_RAG_PROMPT,
@@ -51,7 +50,6 @@ mocked_doc = {"page_content": "some-page-content-1", "metadata": {"source": "fak
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_ANTHROPIC_RAG_PROMPT,
@@ -138,7 +136,6 @@ def test_anthropic_chat_handler(
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_ANTHROPIC_RAG_PROMPT,
@@ -149,7 +146,6 @@ def test_anthropic_chat_handler(
             {
                 "response": {
                     "answer": "I'm doing well, how are you?",
-                    "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
                 },
             },
             DEFAULT_ANTHROPIC_RAG_PROMPT,
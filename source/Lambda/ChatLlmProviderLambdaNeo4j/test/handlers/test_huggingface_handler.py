@@ -38,7 +38,6 @@ mocked_doc = {"page_content": "some-page-content-1", "metadata": {"source": "fak
         (
             {
                 "answer": "I'm doing well, how are you?",
-                "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
             },
             DEFAULT_HUGGINGFACE_RAG_PROMPT,
             False,
@@ -94,7 +93,6 @@ def test_huggingface_chat_handler(
         (
             {
                 "answer": "I'm doing well, how are you?",
-                "source_documents": [{"page_content": "some-page-content-1", "metadata": {"source": "fake-url-1"}}],
             },
             DEFAULT_HUGGINGFACE_RAG_PROMPT,
             False,
@@ -0,0 +1,100 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import pytest
+from langchain.llms.fake import FakeListLLM
+from langchain.prompts import PromptTemplate
+from langchain.schema import AIMessage, HumanMessage
+from llm_models.rag.adaptive_condense_question_chain import (
+    AdaptiveCondenseQuestionChain,
+    _rewrite_cache,
+    get_rewrite_cache_key,
+    is_self_contained,
+)
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+CHAT_HISTORY = [HumanMessage(content="What is Amazon Kendra?"), AIMessage(content="An intelligent search service.")]
+
+
+@pytest.fixture
+def condense_chain():
+    _rewrite_cache.clear()
+    request_timer.reset()
+    yield AdaptiveCondenseQuestionChain(
+        llm=FakeListLLM(responses=["What does Amazon Kendra cost?", "unexpected-call"]),
+        prompt=PromptTemplate.from_template("{chat_history}\n{question}"),
+    )
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("How much does it cost?", False),
+        ("What is the pricing model for Amazon Kendra enterprise edition indexes?", True),
+        ("What is the pricing model for the enterprise edition of these indexes?", False),
+        ("And what is the pricing model for Amazon Kendra enterprise edition?", False),
+        ("Why?", False),
+    ],
+)
+def test_is_self_contained(question, expected):
+    assert is_self_contained(question) == expected
+
+
+def test_rewrite_cache_key():
+    assert get_rewrite_cache_key(CHAT_HISTORY, "fake-question") == get_rewrite_cache_key(
+        "human: What is Amazon Kendra?\nai: An intelligent search service.", "fake-question"
+    )
+    assert get_rewrite_cache_key(CHAT_HISTORY, "fake-question") != get_rewrite_cache_key(
+        CHAT_HISTORY[:1], "fake-question"
+    )
+
+
+def test_skips_self_contained_question(condense_chain):
+    question = "What is the pricing model for Amazon Kendra enterprise edition indexes?"
+    assert condense_chain.run(question=question, chat_history=CHAT_HISTORY) == question
+    assert condense_chain.llm.i == 0
+    assert request_timer.flags[RequestFlags.CONDENSE_SKIPPED.value] is True
+
+
+def test_skips_empty_history(condense_chain):
+    assert condense_chain.run(question="How much does it cost?", chat_history=[]) == "How much does it cost?"
+    assert condense_chain.llm.i == 0
+
+
+def test_condenses_and_caches_follow_up(condense_chain):
+    question = "How much does it cost?"
+    assert condense_chain.run(question=question, chat_history=CHAT_HISTORY) == "What does Amazon Kendra cost?"
+    assert request_timer.flags[RequestFlags.CONDENSE_CACHE_HIT.value] is False
+
+    assert condense_chain.run(question=question, chat_history=CHAT_HISTORY) == "What does Amazon Kendra cost?"
+    assert request_timer.flags[RequestFlags.CONDENSE_CACHE_HIT.value] is True
+    assert condense_chain.llm.i == 1
+
+
+def test_from_llm_chain(condense_chain):
+    adaptive_chain = AdaptiveCondenseQuestionChain.from_llm_chain(condense_chain)
+    assert adaptive_chain.llm == condense_chain.llm
+    assert adaptive_chain.prompt == condense_chain.prompt
+
+
+def test_will_condense(condense_chain):
+    question = "How much does it cost?"
+    self_contained_question = "What is the pricing model for Amazon Kendra enterprise edition indexes?"
+    assert not condense_chain.will_condense(question, [])
+    assert not condense_chain.will_condense(self_contained_question, CHAT_HISTORY)
+    assert condense_chain.will_condense(question, CHAT_HISTORY)
+
+    condense_chain({"question": question, "chat_history": CHAT_HISTORY})
+    assert not condense_chain.will_condense(question, CHAT_HISTORY)
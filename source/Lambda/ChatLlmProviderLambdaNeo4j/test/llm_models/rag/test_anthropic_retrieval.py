@@ -17,9 +17,9 @@ from unittest import mock
 import pytest
 from anthropic import AuthenticationError
 from httpx import Request, Response
-from langchain.chains import ConversationalRetrievalChain
 from langchain.schema.document import Document
 from llm_models.rag.anthropic_retrieval import AnthropicRetrievalLLM
+from llm_models.rag.context_packing_chain import ContextPackingConversationalRetrievalChain
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
 from shared.memory.ddb_chat_memory import DynamoDBChatMemory
 from shared.memory.ddb_enhanced_message_history import DynamoDBChatMessageHistory
@@ -28,6 +28,7 @@ from utils.constants import (
     DEFAULT_ANTHROPIC_RAG_PLACEHOLDERS,
     DEFAULT_ANTHROPIC_RAG_PROMPT,
     DEFAULT_ANTHROPIC_TEMPERATURE,
+    DEFAULT_CONDENSING_MAX_TOKENS_TO_SAMPLE,
 )
 from utils.custom_exceptions import LLMBuildError
 
@@ -73,7 +74,7 @@ def test_implement_error_not_raised(chat_fixture, is_streaming, request):
         assert chat_model.verbose == False
         assert chat_model.knowledge_base.kendra_index_id == "fake-kendra-index-id"
         assert chat_model.conversation_memory.chat_memory.messages == []
-        assert type(chat_model.conversation_chain) == ConversationalRetrievalChain
+        assert type(chat_model.conversation_chain) == ContextPackingConversationalRetrievalChain
         assert type(chat_model.conversation_memory) == DynamoDBChatMemory
     except NotImplementedError as ex:
         raise Exception(ex)
@@ -127,3 +128,42 @@ def test_exception_for_failed_model_incorrect_key(setup_environment, is_streamin
     error.value.args[
         0
     ] == "ChatAnthropic model construction failed. API key was incorrect. Error: Error 401: Wrong API key"
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_condensing_llm_defaults_to_answering_model(anthropic_model):
+    condensing_llm = anthropic_model.condensing_llm
+    assert condensing_llm.model == DEFAULT_ANTHROPIC_MODEL
+    assert condensing_llm.temperature == 0.3
+    assert condensing_llm.max_tokens_to_sample == 200
+    assert condensing_llm.streaming == False
+    assert anthropic_model.conversation_chain.question_generator.llm is condensing_llm
+
+
+@pytest.mark.parametrize("is_streaming", [True])
+def test_separate_condensing_model(is_streaming, setup_environment):
+    chat = AnthropicRetrievalLLM(
+        api_token="fake-token",
+        conversation_memory=DynamoDBChatMemory(
+            DynamoDBChatMessageHistory("fake-table", "fake-conversation-id", "fake-user-id")
+        ),
+        knowledge_base=KendraKnowledgeBase(),
+        model="claude-2",
+        model_params={"max_tokens_to_sample": {"Type": "integer", "Value": "500"}},
+        prompt_template=DEFAULT_ANTHROPIC_RAG_PROMPT,
+        streaming=is_streaming,
+        temperature=0.8,
+        condensing_model="claude-instant-1",
+    )
+
+    condensing_llm = chat.condensing_llm
+    assert condensing_llm.model == "claude-instant-1"
+    assert condensing_llm.temperature == 0.0
+    assert condensing_llm.max_tokens_to_sample == DEFAULT_CONDENSING_MAX_TOKENS_TO_SAMPLE
+    assert condensing_llm.streaming == False
+    assert chat.conversation_chain.question_generator.llm is condensing_llm
+
+    assert chat.llm.model == "claude-2"
+    assert chat.llm.temperature == 0.8
+    assert chat.llm.max_tokens_to_sample == 500
+    assert chat.llm.streaming == True
@@ -15,19 +15,28 @@
 from unittest import mock
 
 import pytest
-from langchain.chains import ConversationalRetrievalChain
 from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
 from langchain.schema.document import Document
 from llm_models.rag.bedrock_retrieval import BedrockRetrievalLLM
+from llm_models.rag.context_packing_chain import ContextPackingConversationalRetrievalChain
+from llm_models.rag.speculative_retrieval_chain import SpeculativeConversationalRetrievalChain
 from shared.knowledge.kendra_knowledge_base import KendraKnowledgeBase
 from shared.memory.ddb_chat_memory import DynamoDBChatMemory
 from shared.memory.ddb_enhanced_message_history import DynamoDBChatMessageHistory
 from utils.constants import (
+    BEDROCK_CONTEXT_WINDOW_MAP,
     BEDROCK_MODEL_MAP,
+    DEDUPLICATION_CANDIDATE_FACTOR,
     DEFAULT_BEDROCK_ANTHROPIC_CONDENSING_PROMPT_TEMPLATE,
     DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE,
     DEFAULT_BEDROCK_RAG_PLACEHOLDERS,
     DEFAULT_BEDROCK_RAG_PROMPT,
+    DEFAULT_COMPRESSION_CONTEXT_SENTENCES,
+    DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT,
+    DEFAULT_CONTEXT_TOKEN_BUDGET,
+    DEFAULT_DEDUPLICATION_THRESHOLD,
+    DEFAULT_MULTI_QUERY_NUM_QUERIES,
+    DEFAULT_RERANK_TIMEOUT,
 )
 from utils.custom_exceptions import LLMBuildError
 from utils.enum_types import BedrockModelProviders
@@ -75,7 +84,7 @@ def test_implement_error_not_raised(chat_fixture, is_streaming, request):
         assert chat_model.conversation_memory.chat_memory.messages == []
         assert chat_model.condensing_prompt_template == CONDENSE_QUESTION_PROMPT
 
-        assert type(chat_model.conversation_chain) == ConversationalRetrievalChain
+        assert type(chat_model.conversation_chain) == ContextPackingConversationalRetrievalChain
         assert type(chat_model.conversation_memory) == DynamoDBChatMemory
     except NotImplementedError as ex:
         raise Exception(ex)
@@ -155,7 +164,7 @@ def test_anthropic_condensing_prompt():
     assert chat_model.conversation_memory.chat_memory.messages == []
     assert chat_model.condensing_prompt_template == DEFAULT_BEDROCK_ANTHROPIC_CONDENSING_PROMPT_TEMPLATE
 
-    assert type(chat_model.conversation_chain) == ConversationalRetrievalChain
+    assert type(chat_model.conversation_chain) == ContextPackingConversationalRetrievalChain
     assert type(chat_model.conversation_memory) == DynamoDBChatMemory
 
 
@@ -172,3 +181,135 @@ def test_meta_condensing_prompt():
     )
 
     assert chat_model.condensing_prompt_template == DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_condensing_llm_defaults_to_answering_model(titan_model):
+    assert titan_model.condensing_model is None
+    assert titan_model.condensing_model_family == BedrockModelProviders.AMAZON.value
+    assert titan_model.condensing_llm.model_id == BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"]
+    assert titan_model.condensing_llm.model_kwargs == titan_model.model_params
+    assert titan_model.condensing_llm.streaming == False
+    assert titan_model.conversation_chain.question_generator.llm is titan_model.condensing_llm
+
+
+@pytest.mark.parametrize("is_streaming", [True])
+def test_separate_condensing_model(is_streaming, setup_environment):
+    chat_model = BedrockRetrievalLLM(
+        conversation_memory=DynamoDBChatMemory(
+            DynamoDBChatMessageHistory("fake-table", "fake-conversation-id", "fake-user-id")
+        ),
+        knowledge_base=KendraKnowledgeBase(),
+        model=BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"],
+        model_params={"maxTokenCount": {"Type": "integer", "Value": "512"}},
+        temperature=0.7,
+        prompt_template=DEFAULT_BEDROCK_RAG_PROMPT[BedrockModelProviders.AMAZON.value],
+        streaming=is_streaming,
+        condensing_model=BEDROCK_MODEL_MAP[BedrockModelProviders.ANTHROPIC.value]["ANTHROPIC_CLAUDE_INSTANT_V1"],
+        condensing_model_params={"max_tokens_to_sample": {"Type": "integer", "Value": "64"}},
+    )
+
+    assert chat_model.condensing_model_family == BedrockModelProviders.ANTHROPIC
+    assert chat_model.condensing_prompt_template == DEFAULT_BEDROCK_ANTHROPIC_CONDENSING_PROMPT_TEMPLATE
+
+    condensing_llm = chat_model.condensing_llm
+    assert condensing_llm.model_id == "anthropic.claude-instant-v1"
+    assert condensing_llm.model_kwargs["max_tokens_to_sample"] == 64
+    assert condensing_llm.model_kwargs["temperature"] == 0.0
+    assert condensing_llm.streaming == False
+    assert chat_model.conversation_chain.question_generator.llm is condensing_llm
+
+    # the answering model keeps its own settings
+    assert chat_model.llm.model_id == BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"]
+    assert chat_model.llm.streaming == True
+    assert chat_model.model_params["maxTokenCount"] == 512
+    assert chat_model.model_params["temperature"] == 0.7
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_unsupported_condensing_model(setup_environment):
+    with pytest.raises(LLMBuildError) as error:
+        BedrockRetrievalLLM(
+            conversation_memory=DynamoDBChatMemory(
+                DynamoDBChatMessageHistory("fake-table", "fake-conversation-id", "fake-user-id")
+            ),
+            knowledge_base=KendraKnowledgeBase(),
+            model=BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"],
+            condensing_model="fake-provider.fake-model",
+        )
+
+    assert error.value.args[0].startswith("Unsupported model family for the condensing model fake-provider.fake-model")
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_speculative_retrieval(setup_environment):
+    chat_model = BedrockRetrievalLLM(
+        conversation_memory=DynamoDBChatMemory(
+            DynamoDBChatMessageHistory("fake-table", "fake-conversation-id", "fake-user-id")
+        ),
+        knowledge_base=KendraKnowledgeBase(),
+        model=BEDROCK_MODEL_MAP[BedrockModelProviders.AMAZON.value]["DEFAULT"],
+        speculative_retrieval=True,
+    )
+
+    assert chat_model.speculative_retrieval == True
+    assert type(chat_model.conversation_chain) == SpeculativeConversationalRetrievalChain
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_context_packer(titan_model):
+    context_packer = titan_model.conversation_chain.context_packer
+    assert context_packer.token_budget == DEFAULT_CONTEXT_TOKEN_BUDGET
+    assert context_packer.context_window == BEDROCK_CONTEXT_WINDOW_MAP[BedrockModelProviders.AMAZON.value]
+    assert context_packer.max_output_tokens == 512
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_document_deduplicator(titan_model):
+    assert titan_model.conversation_chain.document_deduplicator is None
+    assert titan_model.conversation_chain.document_reranker is None
+
+    number_of_docs = titan_model.knowledge_base.retriever.top_k
+    titan_model._deduplication_threshold = DEFAULT_DEDUPLICATION_THRESHOLD
+    deduplicator = titan_model.get_document_deduplicator()
+
+    assert deduplicator.threshold == DEFAULT_DEDUPLICATION_THRESHOLD
+    assert deduplicator.top_k == number_of_docs
+    assert titan_model.knowledge_base.retriever.top_k == number_of_docs * DEDUPLICATION_CANDIDATE_FACTOR
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+@mock.patch("llm_models.rag.document_reranker.get_rerank_client")
+def test_document_reranker(mock_get_rerank_client, titan_model):
+    titan_model._rerank_params = {"EndpointName": "fake-reranker", "TopN": 2}
+
+    reranker = titan_model.get_document_reranker()
+
+    assert reranker.endpoint_name == "fake-reranker"
+    assert reranker.top_n == 2
+    assert reranker.timeout == DEFAULT_RERANK_TIMEOUT
+    mock_get_rerank_client.assert_called_once_with(DEFAULT_RERANK_TIMEOUT)
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_context_compressor(titan_model):
+    assert titan_model.conversation_chain.context_compressor is None
+
+    titan_model._compression_params = {"TopSentences": 2}
+    compressor = titan_model.get_context_compressor()
+
+    assert compressor.top_sentences == 2
+    assert compressor.context_sentences == DEFAULT_COMPRESSION_CONTEXT_SENTENCES
+    assert compressor.max_tokens_per_document == DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT
+
+
+@pytest.mark.parametrize("is_streaming", [False])
+def test_query_generator(titan_model):
+    assert titan_model.conversation_chain.query_generator is None
+
+    titan_model._multi_query_params = {"Mode": "hyde"}
+    query_generator = titan_model.get_query_generator()
+
+    assert query_generator.mode == "hyde"
+    assert query_generator.num_queries == DEFAULT_MULTI_QUERY_NUM_QUERIES
+    assert query_generator.llm == titan_model.condensing_llm
@@ -0,0 +1,104 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+
+import pytest
+from langchain.schema import Document
+from llm_models.rag.context_compressor import ExtractiveContextCompressor, get_bm25_scores, split_sentences
+from utils.enum_types import RequestFlags
+from utils.request_timer import request_timer
+
+KENDRA_DOCUMENT = (
+    "Amazon Kendra is an intelligent search service. It is powered by machine learning. "
+    "Kendra indexes documents from many repositories. The Developer Edition costs less than the Enterprise Edition. "
+    "Indexes can be created from the console. Connectors synchronize the repositories on a schedule."
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    yield
+
+
+def test_split_sentences():
+    assert split_sentences("First one. Second one!\nThird line\n\nIs it 3.5? Yes.") == [
+        "First one.",
+        "Second one!",
+        "Third line",
+        "Is it 3.5?",
+        "Yes.",
+    ]
+
+
+def test_get_bm25_scores():
+    scores = get_bm25_scores(
+        "How much does the Enterprise Edition cost?",
+        ["Kendra is a search service.", "The Enterprise Edition costs more.", "The Enterprise Edition cost is high."],
+    )
+
+    assert scores[0] == 0
+    assert scores[2] > scores[1] > 0
+    assert get_bm25_scores("", ["Kendra is a search service."]).tolist() == [0]
+    assert get_bm25_scores("question", []).tolist() == []
+
+
+def test_compress_keeps_relevant_sentences_with_context():
+    compressor = ExtractiveContextCompressor(top_sentences=1, context_sentences=1, max_tokens_per_document=40)
+
+    compressed_documents = compressor.compress(
+        "Which edition costs less?", [Document(page_content=KENDRA_DOCUMENT, metadata={"source": "kendra"})]
+    )
+
+    assert compressed_documents == [
+        Document(
+            page_content=(
+                "Kendra indexes documents from many repositories. "
+                "The Developer Edition costs less than the Enterprise Edition. "
+                "Indexes can be created from the console."
+            ),
+            metadata={"source": "kendra"},
+        )
+    ]
+    assert 0 < request_timer.flags[RequestFlags.COMPRESSION_RATIO.value] < 1
+
+
+def test_compress_marks_skipped_sentences():
+    compressor = ExtractiveContextCompressor(top_sentences=2, context_sentences=0, max_tokens_per_document=40)
+
+    compressed_documents = compressor.compress(
+        "Does it use machine learning, and what do connectors synchronize?", [Document(page_content=KENDRA_DOCUMENT)]
+    )
+
+    assert compressed_documents[0].page_content == (
+        "It is powered by machine learning. ... Connectors synchronize the repositories on a schedule."
+    )
+
+
+def test_compress_keeps_short_documents():
+    compressor = ExtractiveContextCompressor(max_tokens_per_document=200)
+    documents = [Document(page_content=KENDRA_DOCUMENT), Document(page_content="")]
+
+    assert compressor.compress("Which edition costs less?", documents) == documents
+    assert request_timer.flags[RequestFlags.COMPRESSION_RATIO.value] == 1
+
+
+def test_compress_without_matching_sentence_keeps_leading_sentences():
+    compressor = ExtractiveContextCompressor(max_tokens_per_document=25)
+
+    compressed_documents = compressor.compress("Unrelated question?", [Document(page_content=KENDRA_DOCUMENT)])
+
+    assert compressed_documents[0].page_content == (
+        "Amazon Kendra is an intelligent search service. It is powered by machine learning."
+    )
@@ -0,0 +1,178 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import boto3
+import pytest
+from botocore.config import Config
+from langchain.schema import Document
+from botocore.exceptions import ReadTimeoutError
+from llm_models.rag.document_reranker import (
+    RerankContentHandler,
+    SageMakerDocumentReranker,
+    get_rerank_client,
+    get_rerank_client_config,
+)
+from utils.enum_types import RequestFlags, RequestStages
+from utils.request_timer import request_timer
+
+DOCUMENTS = [
+    Document(page_content="Amazon S3 stores objects in buckets.", metadata={"source": "s3"}),
+    Document(page_content="Amazon Kendra is an intelligent search service.", metadata={"source": "kendra"}),
+    Document(page_content="Kendra pricing depends on the edition of the index.", metadata={"source": "pricing"}),
+]
+
+
+class RerankEndpointStandIn(BaseHTTPRequestHandler):
+    """Answers SageMaker InvokeEndpoint requests like a cross-encoder, scoring passages by their words in the query"""
+
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.requests.append((self.path, body))
+        if "slow" in self.path:
+            time.sleep(0.5)
+        if "broken" in self.path:
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        query_words = set(body["query"].lower().split())
+        scores = [
+            {"index": index, "score": len(query_words & set(text.lower().rstrip(".").split()))}
+            for index, text in enumerate(body["texts"])
+        ]
+        response = json.dumps(sorted(scores, key=lambda score: -score["score"])).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def endpoint_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RerankEndpointStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def get_client(endpoint_url, config):
+    return boto3.client(
+        "sagemaker-runtime",
+        endpoint_url=endpoint_url,
+        region_name="us-east-1",
+        aws_access_key_id="fake-key",
+        aws_secret_access_key="fake-secret",
+        config=config,
+    )
+
+
+@pytest.fixture(scope="module")
+def sagemaker_client(endpoint_url):
+    yield get_client(endpoint_url, Config(retries={"max_attempts": 1}))
+
+
+@pytest.fixture(autouse=True)
+def reset_request_timer():
+    request_timer.reset()
+    RerankEndpointStandIn.requests.clear()
+    yield
+
+
+def test_content_handler():
+    content_handler = RerankContentHandler()
+    assert json.loads(content_handler.transform_input("query", ["a", "b"])) == {"query": "query", "texts": ["a", "b"]}
+    assert content_handler.transform_output(b'[{"index": 1, "score": 0.9}, {"index": 0, "score": 0.1}]') == [0.1, 0.9]
+
+
+def test_rerank(sagemaker_client):
+    reranker = SageMakerDocumentReranker(endpoint_name="fake-reranker", client=sagemaker_client, top_n=2)
+
+    reranked_documents = reranker.rerank("what is the kendra pricing for an index", DOCUMENTS)
+
+    assert reranked_documents == [
+        Document(page_content=DOCUMENTS[2].page_content, metadata={"source": "pricing", "score": 4.0}),
+        Document(page_content=DOCUMENTS[1].page_content, metadata={"source": "kendra", "score": 3.0}),
+    ]
+    assert RerankEndpointStandIn.requests == [
+        (
+            "/endpoints/fake-reranker/invocations",
+            {
+                "query": "what is the kendra pricing for an index",
+                "texts": [document.page_content for document in DOCUMENTS],
+            },
+        )
+    ]
+    assert request_timer.flags[RequestFlags.RERANK_FALLBACK.value] is False
+    assert RequestStages.RERANK.value in request_timer.stage_durations
+
+
+def test_rerank_timeout_keeps_retrieval_order(sagemaker_client):
+    reranker = SageMakerDocumentReranker(endpoint_name="slow-reranker", client=sagemaker_client, top_n=2, timeout=0.1)
+
+    start_time = time.perf_counter()
+    assert reranker.rerank("kendra pricing", DOCUMENTS) == DOCUMENTS[:2]
+    assert time.perf_counter() - start_time < 0.4
+    assert request_timer.flags[RequestFlags.RERANK_FALLBACK.value] is True
+
+
+def test_rerank_error_keeps_retrieval_order(sagemaker_client):
+    reranker = SageMakerDocumentReranker(endpoint_name="broken-reranker", client=sagemaker_client, top_n=2)
+
+    assert reranker.rerank("kendra pricing", DOCUMENTS) == DOCUMENTS[:2]
+    assert request_timer.flags[RequestFlags.RERANK_FALLBACK.value] is True
+
+
+def test_rerank_without_documents(sagemaker_client):
+    reranker = SageMakerDocumentReranker(endpoint_name="fake-reranker", client=sagemaker_client)
+
+    assert reranker.rerank("kendra pricing", []) == []
+    assert RerankEndpointStandIn.requests == []
+
+
+def test_get_rerank_client_config():
+    config = get_rerank_client_config(0.5)
+
+    assert config.connect_timeout == 0.5
+    assert config.read_timeout == 0.5
+    assert config.retries == {"max_attempts": 0}
+
+
+def test_get_rerank_client_is_shared(setup_environment):
+    assert get_rerank_client(1.0) is get_rerank_client(1.0)
+    assert get_rerank_client(1.0) is not get_rerank_client(2.0)
+
+
+def test_rerank_client_releases_the_worker_on_timeout(endpoint_url):
+    reranker = SageMakerDocumentReranker(
+        endpoint_name="slow-reranker", client=get_client(endpoint_url, get_rerank_client_config(0.1)), timeout=0.1
+    )
+
+    start_time = time.perf_counter()
+    with pytest.raises(ReadTimeoutError):
+        reranker.get_scores("kendra pricing", [document.page_content for document in DOCUMENTS])
+    assert time.perf_counter() - start_time < 0.4
+    assert len(RerankEndpointStandIn.requests) == 1
@@ -38,3 +38,21 @@ def test_knowledge_base_construction(setup_environment):
     assert knowledge_base.retriever.index_id == "fake-kendra-index-id"
     assert knowledge_base.retriever.top_k == kendra_knowledge_base_params["NumberOfDocs"]
     assert knowledge_base.retriever.return_source_documents == kendra_knowledge_base_params["ReturnSourceDocs"]
+
+
+def test_knowledge_base_metadata_filter(setup_environment):
+    knowledge_base = KendraKnowledgeBase(
+        {
+            **kendra_knowledge_base_params,
+            "MetadataFilter": {"EqualsTo": {"Key": "_category", "Value": "faq"}},
+            "UserAttributeMapping": {"tenant": "TenantId"},
+        },
+        user_context={"UserId": "fake-user-id", "TenantId": "fake-tenant"},
+    )
+
+    assert knowledge_base.retriever.attribute_filter == {
+        "AndAllFilters": [
+            {"EqualsTo": {"Key": "_category", "Value": {"StringValue": "faq"}}},
+            {"EqualsTo": {"Key": "tenant", "Value": {"StringValue": "fake-tenant"}}},
+        ]
+    }
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import numpy as np
+import pytest
+from shared.knowledge.maximal_marginal_relevance import maximal_marginal_relevance, normalize_rows
+
+QUERY = [1.0, 0.0, 0.0]
+CANDIDATES = [
+    [1.0, 0.0, 0.0],
+    [0.99, 0.01, 0.0],
+    [0.7, 0.7, 0.0],
+    [0.0, 0.0, 1.0],
+]
+
+
+def test_normalize_rows():
+    assert np.allclose(normalize_rows(np.array([[3.0, 4.0], [0.0, 0.0]])), [[0.6, 0.8], [0.0, 0.0]])
+
+
+@pytest.mark.parametrize(
+    "lambda_mult, expected",
+    [
+        (1.0, [0, 1, 2]),
+        (0.3, [0, 3, 2]),
+        (0.0, [0, 3, 2]),
+    ],
+)
+def test_maximal_marginal_relevance(lambda_mult, expected):
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, k=3, lambda_mult=lambda_mult) == expected
+
+
+def test_maximal_marginal_relevance_limits():
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, k=10, lambda_mult=0.3) == [0, 3, 2, 1]
+    assert maximal_marginal_relevance(QUERY, CANDIDATES, k=0) == []
+    assert maximal_marginal_relevance(QUERY, [], k=3) == []
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+import pytest
+from shared.knowledge.metadata_filter import (
+    build_metadata_filter,
+    to_cypher_filter,
+    to_kendra_attribute_filter,
+    to_opensearch_filter,
+)
+
+FILTER_SPEC = {
+    "OrAllFilters": [
+        {"EqualsTo": {"Key": "category", "Value": "faq"}},
+        {"NotFilter": {"GreaterThanOrEquals": {"Key": "year", "Value": 2020}}},
+    ]
+}
+USER_CONTEXT = {"UserId": "fake-user-id", "TenantId": "fake-tenant", "Groups": ["admins", "hr"]}
+
+
+def test_build_metadata_filter():
+    metadata_filter = build_metadata_filter(FILTER_SPEC, {"tenant": "TenantId", "groups": "Groups"}, USER_CONTEXT)
+
+    assert metadata_filter == {
+        "AndAllFilters": [
+            FILTER_SPEC,
+            {"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+            {"ContainsAny": {"Key": "groups", "Value": ["admins", "hr"]}},
+        ]
+    }
+    assert build_metadata_filter(FILTER_SPEC) == FILTER_SPEC
+    assert build_metadata_filter(None, {}, USER_CONTEXT) is None
+
+
+def test_build_metadata_filter_fails():
+    with pytest.raises(ValueError) as error:
+        build_metadata_filter(None, {"tenant": "TenantId"}, {"UserId": "fake-user-id"})
+    assert error.value.args[0] == "User attribute TenantId is missing from the authorizer context"
+
+    with pytest.raises(ValueError) as error:
+        build_metadata_filter({"AndAllFilters": [{"StartsWith": {"Key": "category", "Value": "f"}}]})
+    assert error.value.args[0].startswith("Unsupported metadata filter operator StartsWith")
+
+
+def test_to_opensearch_filter():
+    metadata_filter = build_metadata_filter(FILTER_SPEC, {"groups": "Groups"}, USER_CONTEXT)
+
+    assert to_opensearch_filter(metadata_filter) == {
+        "bool": {
+            "filter": [
+                {
+                    "bool": {
+                        "should": [
+                            {"term": {"metadata.category": "faq"}},
+                            {"bool": {"must_not": [{"range": {"metadata.year": {"gte": 2020}}}]}},
+                        ],
+                        "minimum_should_match": 1,
+                    }
+                },
+                {"terms": {"metadata.groups": ["admins", "hr"]}},
+            ]
+        }
+    }
+
+
+def test_to_cypher_filter():
+    metadata_filter = build_metadata_filter(FILTER_SPEC, {"tenant": "TenantId"}, USER_CONTEXT)
+
+    predicate, parameters = to_cypher_filter(metadata_filter)
+
+    assert predicate == (
+        "((node.`category` = $filter_0 OR (NOT node.`year` >= $filter_1)) AND node.`tenant` = $filter_2)"
+    )
+    assert parameters == {"filter_0": "faq", "filter_1": 2020, "filter_2": "fake-tenant"}
+
+
+def test_to_cypher_filter_quotes_property_names():
+    predicate, parameters = to_cypher_filter({"ContainsAll": {"Key": "a` OR true //", "Value": "x"}}, "n")
+
+    assert predicate == (
+        "all(value IN $filter_0 WHERE CASE WHEN valueType(n.`a`` OR true //`) STARTS WITH 'LIST' "
+        "THEN value IN n.`a`` OR true //` ELSE value = n.`a`` OR true //` END)"
+    )
+    assert parameters == {"filter_0": ["x"]}
+
+
+def test_to_kendra_attribute_filter():
+    metadata_filter = build_metadata_filter(FILTER_SPEC, {"groups": "Groups"}, USER_CONTEXT)
+
+    assert to_kendra_attribute_filter(metadata_filter) == {
+        "AndAllFilters": [
+            {
+                "OrAllFilters": [
+                    {"EqualsTo": {"Key": "category", "Value": {"StringValue": "faq"}}},
+                    {"NotFilter": {"GreaterThanOrEquals": {"Key": "year", "Value": {"LongValue": 2020}}}},
+                ]
+            },
+            {"ContainsAny": {"Key": "groups", "Value": {"StringListValue": ["admins", "hr"]}}},
+        ]
+    }
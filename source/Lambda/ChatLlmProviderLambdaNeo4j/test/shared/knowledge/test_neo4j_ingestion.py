@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from shared.knowledge.neo4j_ingestion import backfill_node_embeddings, get_content_hash, sync_node_embeddings
+
+
+class FakeNeo4jStore:
+    """
+    Stands in for a Neo4jVector over a graph of nodes, answering the backfill queries from a dictionary of nodes.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.embedding = mock.MagicMock()
+        self.embedding.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+        self.writes = []
+
+    def query(self, query, params=None):
+        missing = sorted(node_id for node_id, node in self.nodes.items() if "embedding" not in node)
+        if "count(n)" in query:
+            return [{"count": len(missing)}]
+        if query.startswith("UNWIND"):
+            self.writes.append(params["rows"])
+            for row in params["rows"]:
+                self.nodes[row["id"]].update(embedding=row["embedding"], content_hash=row["content_hash"])
+            return [{"written": len(params["rows"])}]
+        return [
+            {"id": node_id, "text": "".join(f"\n{k}:{self.nodes[node_id].get(k, '')}" for k in params["props"])}
+            for node_id in missing
+            if node_id > params["after"]
+        ][: params["limit"]]
+
+
+def test_sync_node_embeddings_embeds_changed_nodes():
+    store = mock.MagicMock()
+    store.embedding.embed_documents.side_effect = lambda texts: [[float(len(text))] for text in texts]
+    store.query.side_effect = [
+        [
+            {"id": "4:a:1", "text": "\ntitle:new", "content_hash": None, "missing_embedding": True},
+            {
+                "id": "4:a:2",
+                "text": "\ntitle:same",
+                "content_hash": get_content_hash("\ntitle:same"),
+                "missing_embedding": False,
+            },
+        ],
+        [],
+        [{"id": "4:a:3", "text": "\ntitle:edited", "content_hash": "old-hash", "missing_embedding": False}],
+        [],
+    ]
+
+    counts = sync_node_embeddings(store, "Movie", ["title"], "embedding", batch_size=2)
+
+    assert counts == {"embedded": 2, "unchanged": 1}
+    assert store.embedding.embed_documents.call_args_list == [mock.call(["\ntitle:new"]), mock.call(["\ntitle:edited"])]
+    page_queries = [call for call in store.query.call_args_list if "after" in call.kwargs["params"]]
+    assert [call.kwargs["params"]["after"] for call in page_queries] == ["", "4:a:2"]
+    write_query, write_params = store.query.call_args_list[1].args[0], store.query.call_args_list[1].kwargs["params"]
+    assert write_query.startswith("UNWIND $rows AS row MATCH (n:`Movie`)")
+    assert "setVectorProperty(n, 'embedding', row.embedding)" in write_query
+    assert write_params == {
+        "rows": [{"id": "4:a:1", "embedding": [10.0], "content_hash": get_content_hash("\ntitle:new")}]
+    }
+
+
+def test_backfill_node_embeddings():
+    store = FakeNeo4jStore({f"4:a:{i}": {"title": f"title {i}"} for i in range(5)})
+    store.nodes["4:a:0"]["embedding"] = [0.0]
+    progress = []
+
+    counts = backfill_node_embeddings(
+        store,
+        "Movie",
+        ["title"],
+        "embedding",
+        batch_size=2,
+        max_workers=2,
+        progress_callback=lambda embedded, total: progress.append((embedded, total)),
+    )
+
+    assert counts == {"embedded": 4, "failed": 0}
+    assert sorted(len(rows) for rows in store.writes) == [2, 2]
+    assert store.nodes["4:a:0"] == {"title": "title 0", "embedding": [0.0]}
+    assert store.nodes["4:a:1"] == {
+        "title": "title 1",
+        "embedding": [14.0],
+        "content_hash": get_content_hash("\ntitle:title 1"),
+    }
+    assert progress[-1] == (4, 4)
+
+
+@mock.patch("shared.knowledge.neo4j_ingestion.time.sleep")
+def test_backfill_resumes_after_a_failed_page(mock_sleep):
+    store = FakeNeo4jStore({f"4:a:{i}": {"title": f"title {i}"} for i in range(4)})
+    embed_documents = store.embedding.embed_documents.side_effect
+
+    def throttled_first_page(texts):
+        if "\ntitle:title 0" in texts:
+            raise Exception("throttled")
+        return embed_documents(texts)
+
+    store.embedding.embed_documents.side_effect = throttled_first_page
+
+    with pytest.raises(Exception, match="throttled"):
+        backfill_node_embeddings(store, "Movie", ["title"], "embedding", batch_size=2, max_workers=1)
+    assert [node_id for node_id, node in sorted(store.nodes.items()) if "embedding" not in node] == ["4:a:0", "4:a:1"]
+
+    store.embedding.embed_documents.side_effect = embed_documents
+    counts = backfill_node_embeddings(store, "Movie", ["title"], "embedding", batch_size=2, max_workers=1)
+
+    assert counts == {"embedded": 2, "failed": 0}
+    assert all("embedding" in node for node in store.nodes.values())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from unittest import mock
+
+import pytest
+from langchain.docstore.document import Document
+from shared.knowledge.neo4j_retriever import (
+    NEO4J_MMR_SEARCH_QUERY,
+    NEO4J_MULTI_QUERY_SEARCH_QUERY,
+    CustomNeo4jRetriever,
+)
+
+QUERY_VECTOR = [1.0, 0.0, 0.0]
+RESULTS = [
+    {"text": "doc-1", "metadata": {"source": "a", "id": None}, "score": 1.0, "embedding": [1.0, 0.0, 0.0]},
+    {"text": "doc-2", "metadata": {"source": "a", "id": None}, "score": 0.9, "embedding": [0.99, 0.01, 0.0]},
+    {"text": "doc-3", "metadata": {"source": "b", "id": None}, "score": 0.8, "embedding": [0.7, 0.7, 0.0]},
+]
+
+
+@pytest.fixture
+def docsearch():
+    docsearch = mock.MagicMock()
+    docsearch.index_name = "fake-index"
+    docsearch.embedding_node_property = "embedding"
+    docsearch.retrieval_query = "RETURN node.text AS text, {} AS metadata, score"
+    docsearch.embedding.embed_query.return_value = QUERY_VECTOR
+    docsearch.query.return_value = RESULTS
+    docsearch.similarity_search_with_score.return_value = [
+        (Document(page_content="doc-1", metadata={"source": "a"}), 0.9),
+        (Document(page_content="doc-2", metadata={"source": "a"}), 0.85),
+        (Document(page_content="doc-3", metadata={"source": "b"}), 0.4),
+    ]
+    yield docsearch
+
+
+def test_similarity_search(docsearch):
+    retriever = CustomNeo4jRetriever(index_id="fake-index", docsearch=docsearch, top_k=3)
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="doc-1", metadata={"score": 0.9}),
+        Document(page_content="doc-2", metadata={"score": 0.85}),
+        Document(page_content="doc-3", metadata={"score": 0.4}),
+    ]
+    docsearch.similarity_search_with_score.assert_called_once_with("fake-query", k=3)
+    docsearch.query.assert_not_called()
+
+
+def test_max_marginal_relevance_search(docsearch):
+    retriever = CustomNeo4jRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        top_k=2,
+        return_source_documents=True,
+        search_type="mmr",
+        fetch_k=3,
+        lambda_mult=0.3,
+    )
+
+    assert retriever.get_relevant_documents("fake-query") == [
+        Document(page_content="doc-1", metadata={"source": "a", "score": 1.0}),
+        Document(page_content="doc-3", metadata={"source": "b", "score": 0.8}),
+    ]
+    docsearch.query.assert_called_once_with(
+        NEO4J_MMR_SEARCH_QUERY + docsearch.retrieval_query + ", embedding",
+        params={"index": "fake-index", "k": 3, "embedding": QUERY_VECTOR, "embedding_node_property": "embedding"},
+    )
+    docsearch.similarity_search_with_score.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "min_score, score_gap_cutoff, expected_contents",
+    [(0.5, False, ["doc-1", "doc-2"]), (0.95, False, ["doc-1"]), (None, True, ["doc-1", "doc-2"])],
+)
+def test_relevant_documents(min_score, score_gap_cutoff, expected_contents, docsearch):
+    retriever = CustomNeo4jRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        top_k=3,
+        min_score=min_score,
+        score_gap_cutoff=score_gap_cutoff,
+    )
+
+    assert [document.page_content for document in retriever.get_relevant_documents("fake-query")] == expected_contents
+
+
+def test_multi_query_search(docsearch):
+    docsearch.embedding.embed_documents.return_value = [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+    docsearch.query.return_value = [
+        {"text": "doc-1", "metadata": {"source": "a"}, "score": 0.9, "query_index": 0},
+        {"text": "doc-3", "metadata": {"source": "b"}, "score": 0.95, "query_index": 1},
+        {"text": "doc-2", "metadata": {"source": "a"}, "score": 0.8, "query_index": 0},
+        {"text": "doc-2", "metadata": {"source": "a"}, "score": 0.85, "query_index": 1},
+    ]
+    retriever = CustomNeo4jRetriever(index_id="fake-index", docsearch=docsearch, top_k=2)
+
+    documents = retriever.get_relevant_documents_for_queries(["fake-query", "other-query"])
+
+    assert [document.page_content for document in documents] == ["doc-2", "doc-1"]
+    docsearch.embedding.embed_documents.assert_called_once_with(["fake-query", "other-query"])
+    docsearch.query.assert_called_once_with(
+        NEO4J_MULTI_QUERY_SEARCH_QUERY + docsearch.retrieval_query + ", query_index",
+        params={"index": "fake-index", "k": 2, "embeddings": [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]},
+    )
+
+
+def test_filtered_similarity_search(docsearch):
+    retriever = CustomNeo4jRetriever(
+        index_id="fake-index",
+        docsearch=docsearch,
+        top_k=2,
+        fetch_k=3,
+        metadata_filter={"EqualsTo": {"Key": "tenant", "Value": "fake-tenant"}},
+    )
+
+    assert [document.page_content for document in retriever.get_relevant_documents("fake-query")] == [
+        "doc-1",
+        "doc-2",
+        "doc-3",
+    ]
+    docsearch.query.assert_called_once_with(
+        "CALL db.index.vector.queryNodes($index, $k, $embedding) YIELD node, score "
+        "WHERE node.`tenant` = $filter_0 "
+        "WITH node, score LIMIT $top_k " + docsearch.retrieval_query,
+        params={"index": "fake-index", "k": 3, "top_k": 2, "embedding": QUERY_VECTOR, "filter_0": "fake-tenant"},
+    )
+    docsearch.similarity_search_with_score.assert_not_called()
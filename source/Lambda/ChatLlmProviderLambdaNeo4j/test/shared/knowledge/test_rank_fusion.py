@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+######################################################################################################################
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+######################################################################################################################
+
+from langchain.schema import Document
+from shared.knowledge.rank_fusion import reciprocal_rank_fusion
+
+
+def get_documents(*contents):
+    return [Document(page_content=content, metadata={"source": content}) for content in contents]
+
+
+def test_documents_found_by_several_queries_rank_first():
+    fused_documents = reciprocal_rank_fusion([get_documents("a", "b", "c"), get_documents("c", "d")], rrf_k=60)
+
+    assert [document.page_content for document in fused_documents] == ["c", "a", "b", "d"]
+    assert fused_documents[0].metadata == {"source": "c", "score": 1 / 63 + 1 / 61}
+
+
+def test_top_k():
+    fused_documents = reciprocal_rank_fusion([get_documents("a", "b"), get_documents("b", "a", "c")], top_k=2)
+
+    assert [document.page_content for document in fused_documents] == ["a", "b"]
+
+
+def test_empty_lists():
+    assert reciprocal_rank_fusion([]) == []
+    assert reciprocal_rank_fusion([[], []]) == []
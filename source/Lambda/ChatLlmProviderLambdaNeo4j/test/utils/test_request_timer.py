@@ -0,0 +1,119 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import json
+import time
+
+import pytest
+from aws_lambda_powertools.metrics import MetricUnit
+from utils.enum_types import CloudWatchMetrics, CloudWatchNamespaces, RequestFlags, RequestStages
+from utils.request_timer import RequestTimer, log_request_timings, request_timer
+
+
+def get_emf_records(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{") and "_aws" in line]
+
+
+def test_stage_durations_are_accumulated():
+    timer = RequestTimer()
+    with timer.stage(RequestStages.WEBSOCKET_POST):
+        time.sleep(0.01)
+    timer.record(RequestStages.WEBSOCKET_POST, 0.5)
+    timer.record(RequestStages.RETRIEVAL, 0.25)
+
+    assert timer.stage_durations[RequestStages.WEBSOCKET_POST.value] >= 0.51
+    assert timer.stage_durations[RequestStages.RETRIEVAL.value] == 0.25
+
+    timer.reset()
+    assert timer.stage_durations == {}
+    assert timer.flags == {}
+
+
+def test_stage_is_recorded_on_error():
+    timer = RequestTimer()
+    with pytest.raises(ValueError):
+        with timer.stage(RequestStages.LLM_CONFIG):
+            raise ValueError("fake-error")
+
+    assert RequestStages.LLM_CONFIG.value in timer.stage_durations
+
+
+def test_server_timing():
+    timer = RequestTimer()
+    timer.record(RequestStages.RETRIEVAL, 0.0851)
+
+    server_timing = timer.server_timing()
+    assert server_timing.startswith("Retrieval;dur=85.1, Total;dur=")
+
+
+def test_publish_timings_single_record(capsys):
+    timer = RequestTimer()
+    timer.record(RequestStages.LLM_CONFIG, 0.01)
+    timer.record(RequestStages.ANSWER_LLM, 0.2)
+    timer.set_flag(RequestFlags.COLD_START, True)
+    timer.publish_timings()
+
+    records = get_emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    metric_definitions = records[0]["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+    assert {metric["Name"] for metric in metric_definitions} == {"LlmConfigTime", "AnswerLlmTime", "TotalTime"}
+    assert all(metric["StorageResolution"] == 1 for metric in metric_definitions)
+    assert records[0][RequestFlags.COLD_START.value] is True
+
+
+def test_publish_timings_includes_request_metrics(capsys):
+    timer = RequestTimer()
+    timer.record(RequestStages.RETRIEVAL, 0.1)
+    langchain_metrics = timer.get_metrics(CloudWatchNamespaces.LANGCHAIN_LLM)
+    langchain_metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_QUERY.value, unit=MetricUnit.Count, value=1)
+    langchain_metrics.add_metric(name=CloudWatchMetrics.LANGCHAIN_FAILURES, unit=MetricUnit.Count, value=1)
+    timer.add_metric(CloudWatchNamespaces.AWS_KENDRA, CloudWatchMetrics.KENDRA_QUERY.value, MetricUnit.Count, 2)
+    timer.publish_timings()
+
+    records = get_emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    directives = {
+        directive["Namespace"]: {metric["Name"] for metric in directive["Metrics"]}
+        for directive in records[0]["_aws"]["CloudWatchMetrics"]
+    }
+    assert directives == {
+        CloudWatchNamespaces.REQUEST_STAGES.value: {"RetrievalTime", "TotalTime"},
+        CloudWatchNamespaces.LANGCHAIN_LLM.value: {
+            CloudWatchMetrics.LANGCHAIN_QUERY.value,
+            CloudWatchMetrics.LANGCHAIN_FAILURES.value,
+        },
+        CloudWatchNamespaces.AWS_KENDRA.value: {CloudWatchMetrics.KENDRA_QUERY.value},
+    }
+    assert records[0][CloudWatchMetrics.KENDRA_QUERY.value] in (2, [2])
+
+    timer.reset()
+    assert timer.metrics == {}
+
+
+def test_log_request_timings_flags_cold_start(capsys, monkeypatch):
+    monkeypatch.setattr("utils.request_timer._cold_start", True)
+
+    @log_request_timings
+    def fake_handler(event, context):
+        request_timer.record(RequestStages.RETRIEVAL, 0.1)
+        return event
+
+    assert fake_handler("fake-event", None) == "fake-event"
+    assert fake_handler("fake-event", None) == "fake-event"
+
+    records = get_emf_records(capsys.readouterr().out)
+    assert len(records) == 2
+    assert records[0][RequestFlags.COLD_START.value] is True
+    assert records[1][RequestFlags.COLD_START.value] is False
+    assert "RetrievalTime" in {metric["Name"] for metric in records[1]["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
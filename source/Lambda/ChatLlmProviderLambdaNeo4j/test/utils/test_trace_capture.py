@@ -0,0 +1,115 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import json
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from aws_lambda_powertools import Tracer
+from langchain.schema import Document
+from utils.constants import TRACE_CAPTURE_MAX_SIZE_ENV_VAR, TRACE_CAPTURE_MODE_ENV_VAR, TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR
+from utils.enum_types import TraceCaptureModes
+from utils.trace_capture import capture_response, get_capture_mode, serialize_response, should_capture
+
+
+@pytest.fixture
+def tracing_enabled():
+    with patch("utils.trace_capture.tracer") as mocked_tracer:
+        mocked_tracer.disabled = False
+        yield mocked_tracer
+    for env in [TRACE_CAPTURE_MODE_ENV_VAR, TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR, TRACE_CAPTURE_MAX_SIZE_ENV_VAR]:
+        os.environ.pop(env, None)
+
+
+@pytest.mark.parametrize(
+    "mode, expected",
+    [
+        ("off", TraceCaptureModes.OFF),
+        ("SAMPLED", TraceCaptureModes.SAMPLED),
+        ("truncated", TraceCaptureModes.TRUNCATED),
+        ("invalid-mode", TraceCaptureModes.TRUNCATED),
+    ],
+)
+def test_get_capture_mode(mode, expected, tracing_enabled):
+    os.environ[TRACE_CAPTURE_MODE_ENV_VAR] = mode
+    assert get_capture_mode() == expected
+
+
+@pytest.mark.parametrize(
+    "mode, sample_rate, expected",
+    [("off", "100", False), ("sampled", "100", True), ("sampled", "0", False), ("truncated", "0", True)],
+)
+def test_should_capture(mode, sample_rate, expected, tracing_enabled):
+    os.environ[TRACE_CAPTURE_MODE_ENV_VAR] = mode
+    os.environ[TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR] = sample_rate
+    assert should_capture() == expected
+
+
+def test_should_not_capture_when_tracing_disabled(tracing_enabled):
+    tracing_enabled.disabled = True
+    assert not should_capture()
+
+
+def test_serialize_response():
+    assert serialize_response({"answer": "fake-answer"}, 100) == json.dumps({"answer": "fake-answer"})
+    assert serialize_response("a" * 20, 10) == '"aaaaaaaaa... (truncated)'
+
+
+def test_serialize_response_stops_at_max_size():
+    documents = [Document(page_content="a" * 50) for _ in range(1000)]
+    serialized = serialize_response(documents, 200)
+
+    assert len(serialized) == 200 + len("... (truncated)")
+    assert serialized.endswith("... (truncated)")
+
+
+def test_capture_response(tracing_enabled):
+    os.environ[TRACE_CAPTURE_MODE_ENV_VAR] = "truncated"
+    os.environ[TRACE_CAPTURE_MAX_SIZE_ENV_VAR] = "5"
+
+    @capture_response
+    def fake_method():
+        return "fake-response"
+
+    assert fake_method() == "fake-response"
+    tracing_enabled.put_metadata.assert_called_once_with(key="fake_method response", value='"fake... (truncated)')
+
+
+def test_capture_response_off(tracing_enabled):
+    os.environ[TRACE_CAPTURE_MODE_ENV_VAR] = "off"
+
+    @capture_response
+    def fake_method():
+        return "fake-response"
+
+    assert fake_method() == "fake-response"
+    tracing_enabled.put_metadata.assert_not_called()
+
+
+def test_traced_method_does_not_capture_full_response(tracing_enabled):
+    os.environ[TRACE_CAPTURE_MODE_ENV_VAR] = "truncated"
+    os.environ[TRACE_CAPTURE_MAX_SIZE_ENV_VAR] = "5"
+    method_tracer = Tracer()
+    method_tracer.provider = MagicMock()
+    subsegment = method_tracer.provider.in_subsegment.return_value.__enter__.return_value
+
+    @method_tracer.capture_method(capture_response=False)
+    @capture_response
+    def fake_method():
+        return "fake-response"
+
+    assert fake_method() == "fake-response"
+    subsegment.put_metadata.assert_not_called()
+    tracing_enabled.put_metadata.assert_called_once_with(key="fake_method response", value='"fake... (truncated)')
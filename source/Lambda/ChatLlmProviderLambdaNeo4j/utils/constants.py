@@ -28,13 +28,22 @@ OPENSEARCH_PORT = "OPENSEARCH_PORT"
 OPENSEARCH_INDEX_ID_ENV_VAR = "OPENSEARCH_INDEX_ID"
 NEO4J_INDEX_ID_ENV_VAR="NEO4J_INDEX_ID"
 WEBSOCKET_CALLBACK_URL_ENV_VAR = "WEBSOCKET_CALLBACK_URL"
-DEFAULT_OPENSEARCH_NUMBER_OF_DOCS = "DEFAULT_OPENSEARCH_NUMBER_OF_DOCS"
+DEFAULT_OPENSEARCH_NUMBER_OF_DOCS = 10
 DEFAULT_NEO4J_NUMBER_OF_DOCS = 1
+NEO4J_CONTENT_HASH_PROPERTY = "content_hash"  # node property holding the hash of the text of its embedding
+DEFAULT_NEO4J_SYNC_BATCH_SIZE = 100  # nodes per page read, per embedding call and per UNWIND write
+DEFAULT_NEO4J_BACKFILL_WORKERS = 4  # batches embedded and written concurrently by the backfill
+INGESTION_MAX_RETRIES = 5
+INGESTION_INITIAL_BACKOFF = 1  # seconds, doubled after each retry
+INGESTION_MAX_BACKOFF = 30  # seconds
 RAG_ENABLED_ENV_VAR = "RAG_ENABLED"
 DDB_MESSAGE_TTL_ENV_VAR = "DDB_MESSAGE_TTL"
 USE_CASE_UUID_ENV_VAR = "USE_CASE_UUID"
 TRACE_ID_ENV_VAR = "_X_AMZN_TRACE_ID"
 TRACE_ID_ENV_VAR = "_X_AMZN_TRACE_ID"
+TRACE_CAPTURE_MODE_ENV_VAR = "TRACE_CAPTURE_MODE"
+TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR = "TRACE_CAPTURE_SAMPLE_RATE"
+TRACE_CAPTURE_MAX_SIZE_ENV_VAR = "TRACE_CAPTURE_MAX_SIZE"
 CHAT_REQUIRED_ENV_VARS = [
     LLM_PARAMETERS_SSM_KEY_ENV_VAR,
     CONVERSATION_TABLE_NAME_ENV_VAR,
@@ -51,6 +60,49 @@ PROMPT_EVENT_KEY = "promptTemplate"
 
 # Chat constants across models
 END_CONVERSATION_TOKEN = "##END_CONVERSATION##"
+SOURCE_DOCUMENTS_RESPONSE_KEY = "sourceDocuments"
+SOURCE_DOCUMENT_SNIPPET_LENGTH = 300
+COMBINE_DOCUMENTS_INPUT_KEY = "input_documents"  # input of the chain stuffing the final documents into the prompt
+CONDENSE_SELF_CONTAINED_MIN_WORDS = 8  # shorter follow-up questions are always condensed
+CONDENSE_REWRITE_CACHE_SIZE = 256
+# words that usually refer back to earlier turns of the conversation, making a question depend on the chat history
+CONDENSE_ANAPHORA_WORDS = {
+    "it",
+    "its",
+    "it's",
+    "itself",
+    "they",
+    "them",
+    "their",
+    "theirs",
+    "themselves",
+    "this",
+    "these",
+    "those",
+    "he",
+    "him",
+    "his",
+    "she",
+    "her",
+    "hers",
+    "former",
+    "latter",
+    "above",
+    "previous",
+    "earlier",
+    "same",
+    "else",
+    "another",
+    "one",
+    "ones",
+}
+CONDENSE_FOLLOW_UP_PREFIXES = ("and ", "but ", "also ", "so ", "what about", "how about", "then ")
+SPECULATIVE_RETRIEVAL_MIN_SIMILARITY = 0.6  # word overlap of the raw and condensed questions needed to keep the documents
+SPECULATIVE_RETRIEVAL_MAX_WORKERS = 2
+DEFAULT_MULTI_QUERY_MODE = "paraphrase"
+DEFAULT_MULTI_QUERY_NUM_QUERIES = 3  # queries generated for a question, searched along with the question itself
+MULTI_QUERY_MAX_WORKERS = 4
+RRF_K = 60  # rank offset of reciprocal rank fusion, a higher value flattens the weight of the top ranks
 USER_QUERY_LENGTH = 2500
 PROMPT_LENGTH = 2000
 METRICS_SERVICE_NAME = f"GAABUseCase-{os.getenv(USE_CASE_UUID_ENV_VAR)}"
@@ -59,8 +111,50 @@ DEFAULT_RAG_CHAIN_TYPE = "stuff"
 DEFAULT_KENDRA_NUMBER_OF_DOCS = 2
 DEFAULT_OPENSEARCH_NUMBER_OF_DOCS 
 DEFAULT_RETURN_SOURCE_DOCS = False
+DEFAULT_SEARCH_TYPE = "similarity"
+DEFAULT_MMR_FETCH_K = 20  # candidates fetched with their vectors for maximal marginal relevance
+DEFAULT_MMR_LAMBDA_MULT = 0.5
+DEFAULT_MIN_SCORE = None  # no relevance threshold, every fetched document is kept
+DEFAULT_MIN_NUMBER_OF_DOCS = 1  # documents kept whatever their scores
+DEFAULT_SCORE_GAP_CUTOFF = False
+SCORE_GAP_MIN_RATIO = 2.0  # the largest score gap only cuts the documents when this many times the mean other gap
+KENDRA_SCORE_CONFIDENCE_VALUES = {"VERY_HIGH": 1.0, "HIGH": 0.75, "MEDIUM": 0.5, "LOW": 0.25, "NOT_AVAILABLE": 0.0}
+OPENSEARCH_METADATA_FIELD = "metadata"  # object field of the indexed documents holding their metadata
+DEFAULT_OPENSEARCH_EFFICIENT_FILTER = True  # filter inside the k-NN search, requires the lucene or faiss engine
 DEFAULT_MAX_TOKENS_TO_SAMPLE = 256
+DEFAULT_CONDENSING_MAX_TOKENS_TO_SAMPLE = 128  # a standalone question is short, so the condensing model is capped
+DEFAULT_CONDENSING_TEMPERATURE = 0.0
 DEFAULT_VERBOSE_MODE = False
+DEFAULT_SPECULATIVE_RETRIEVAL = False
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2048  # maximum tokens of retrieved documents placed in a RAG prompt
+ESTIMATED_CHARACTERS_PER_TOKEN = 4
+DOCUMENT_SCORE_METADATA_KEY = "score"
+DOCUMENT_EMBEDDING_METADATA_KEY = "embedding"
+DEFAULT_DEDUPLICATION_THRESHOLD = 0.8  # estimated similarity above which a retrieved document is a near-duplicate
+DEDUPLICATION_CANDIDATE_FACTOR = 2  # candidates fetched per kept document when near-duplicates are removed
+MINHASH_NUM_PERMUTATIONS = 64
+MINHASH_SHINGLE_SIZE = 3  # words per shingle
+MINHASH_SEED = 1
+DEFAULT_RERANK_TOP_N = 3  # documents kept after reranking
+DEFAULT_RERANK_TIMEOUT = 1.0  # seconds to wait for the rerank endpoint before the retrieval order is used
+RERANK_MAX_WORKERS = 2
+DEFAULT_COMPRESSION_TOP_SENTENCES = 3  # most relevant sentences kept from each document
+DEFAULT_COMPRESSION_CONTEXT_SENTENCES = 1  # sentences kept on each side of a relevant sentence
+DEFAULT_COMPRESSION_MAX_TOKENS_PER_DOCUMENT = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_OUTPUT_TOKENS_PARAM_NAMES = (
+    "maxTokenCount",
+    "maxTokens",
+    "max_tokens_to_sample",
+    "max_gen_len",
+    "max_tokens",
+    "max_new_tokens",
+    "max_length",
+)
+DEFAULT_TRACE_CAPTURE_MODE = "truncated"
+DEFAULT_TRACE_CAPTURE_SAMPLE_RATE = 10  # percentage of calls whose response is captured in sampled mode
+DEFAULT_TRACE_CAPTURE_MAX_SIZE = 4096  # characters of a serialized response kept in the trace
 
 RAG_KEY = "RAG"
 HUGGINGFACE_RAG = LLMProviderTypes.HUGGING_FACE.value + RAG_KEY
@@ -154,6 +248,7 @@ MAX_HUGGINGFACE_TEMPERATURE = 100.0
 DEFAULT_HUGGINGFACE_RAG_ENABLED_MODE = True
 DEFAULT_HUGGINGFACE_STREAMING_MODE = False
 DEFAULT_HUGGINGFACE_MODEL = "google/flan-t5-xxl"
+DEFAULT_HUGGINGFACE_CONTEXT_WINDOW = 1024
 
 DEFAULT_HUGGINGFACE_PROMPT = DEFAULT_CHAT_PROMPT
 DEFAULT_HUGGINGFACE_PLACEHOLDERS = [
@@ -187,6 +282,7 @@ DEFAULT_ANTHROPIC_MODEL = "claude-instant-v1"
 DEFAULT_ANTHROPIC_TEMPERATURE = 1.0
 DEFAULT_ANTHROPIC_RAG_ENABLED_MODE = True
 DEFAULT_ANTHROPIC_STREAMING_MODE = True
+DEFAULT_ANTHROPIC_CONTEXT_WINDOW = 100000
 
 DEFAULT_ANTHROPIC_PROMPT = """
 
@@ -271,6 +367,13 @@ DEFAULT_BEDROCK_TEMPERATURE_MAP = {
     BedrockModelProviders.META.value: 0.5,
     BedrockModelProviders.COHERE.value: 0.75,
 }
+BEDROCK_CONTEXT_WINDOW_MAP = {
+    BedrockModelProviders.AMAZON.value: 8000,
+    BedrockModelProviders.AI21.value: 8191,
+    BedrockModelProviders.ANTHROPIC.value: 100000,
+    BedrockModelProviders.META.value: 4096,
+    BedrockModelProviders.COHERE.value: 4000,
+}
 BEDROCK_STOP_SEQUENCES = {
     BedrockModelProviders.ANTHROPIC.value: [],
     BedrockModelProviders.AMAZON.value: ["|"],
@@ -342,6 +445,21 @@ DEFAULT_BEDROCK_META_CONDENSING_PROMPT_TEMPLATE = PromptTemplate.from_template(
     f"[INST] {CONDENSE_QUESTION_PROMPT.template} [/INST]"
 )
 
+MULTI_QUERY_PARAPHRASE_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    """Write {num_queries} different versions of the following question, to search a knowledge base for the documents that answer it. Vary the wording and the terms used, but keep the meaning. Write one version per line, without numbering or any other text.
+
+Question: {question}
+Versions:"""
+)
+
+# hypothetical document embeddings (HyDE): the passage is searched for, as it is closer to the documents than the question
+MULTI_QUERY_HYDE_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    """Write a short passage, of a few sentences, that answers the following question as a document of a knowledge base would.
+
+Question: {question}
+Passage:"""
+)
+
 # Chat environment variables
 LLM_PARAMETERS_SSM_KEY_ENV_VAR = "SSM_LLM_CONFIG_KEY"
 LLM_PROVIDER_API_KEY_ENV_VAR = "LLM_API_KEY_NAME"
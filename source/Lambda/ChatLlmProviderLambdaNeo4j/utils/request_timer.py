@@ -0,0 +1,249 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import functools
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricResolution, MetricUnit
+from utils.constants import METRICS_SERVICE_NAME
+from utils.enum_types import CloudWatchNamespaces, RequestFlags, RequestStages
+
+logger = Logger(utc=True)
+
+
+class RequestTimer:
+    """
+    Collects the duration of each stage of a chat request (config fetch, knowledge base setup, memory reads, LLM calls,
+    retrieval, websocket posts, etc.) so that they can be published together once the request completes.
+
+    Attributes:
+        start_time (float): Monotonic time at which the current request started
+        stage_durations (Dict[str, float]): Total time in seconds spent in each stage of the current request
+        flags (Dict[str, Any]): Flags describing the current request, e.g. cold start or cache hits
+        metrics (Dict[str, List[Tuple]]): Metrics of the current request by namespace, as (name, unit, value,
+            resolution) tuples
+
+    Methods:
+        reset(): Starts timing a new request
+        stage(stage): Context manager that records the time spent in the wrapped block against a stage
+        record(stage, duration): Adds a duration to a stage
+        set_flag(flag, value): Sets a flag on the current request
+        add_metric(namespace, name, unit, value, resolution): Adds a metric to the current request
+        get_metrics(namespace): Returns a RequestMetrics adding the metrics of a namespace to the current request
+        server_timing(): Formats the stage durations as a Server-Timing style header value
+        publish_timings(): Publishes the stage durations, flags and metrics as a single EMF record
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    @property
+    def start_time(self) -> float:
+        return self._start_time
+
+    @property
+    def stage_durations(self) -> Dict[str, float]:
+        return self._stage_durations
+
+    @property
+    def flags(self) -> Dict[str, Any]:
+        return self._flags
+
+    @property
+    def metrics(self) -> Dict[str, List[Tuple]]:
+        return self._metrics
+
+    def reset(self) -> None:
+        """Starts timing a new request, discarding the durations, flags and metrics of the previous one"""
+        self._start_time = time.perf_counter()
+        self._stage_durations = {}
+        self._flags = {}
+        self._metrics = {}
+
+    @contextmanager
+    def stage(self, stage: RequestStages) -> Iterator[None]:
+        """
+        Records the time spent in the wrapped block against the provided stage. Durations of a stage which runs multiple
+        times in a request are added up.
+
+        Args:
+            stage (RequestStages): The stage being timed
+        """
+        stage_start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - stage_start_time)
+
+    def record(self, stage: RequestStages, duration: float) -> None:
+        """
+        Adds a duration to a stage of the current request.
+
+        Args:
+            stage (RequestStages): The stage the duration belongs to
+            duration (float): Duration in seconds
+        """
+        stage_name = RequestStages(stage).value
+        self._stage_durations[stage_name] = self._stage_durations.get(stage_name, 0.0) + duration
+
+    def set_flag(self, flag: RequestFlags, value: Any) -> None:
+        """
+        Sets a flag on the current request.
+
+        Args:
+            flag (RequestFlags): The flag to set
+            value (Any): Value of the flag
+        """
+        self._flags[RequestFlags(flag).value] = value
+
+    def add_metric(
+        self,
+        namespace: Union[CloudWatchNamespaces, str],
+        name: str,
+        unit: MetricUnit,
+        value: float,
+        resolution: MetricResolution = MetricResolution.Standard,
+    ) -> None:
+        """
+        Adds a metric to the current request. It is published under its namespace in the EMF record of the request,
+        rather than flushed on its own.
+
+        Args:
+            namespace (CloudWatchNamespaces): The namespace of the metric
+            name (str): Name of the metric
+            unit (MetricUnit): Unit of the metric
+            value (float): Value of the metric, values of a metric added multiple times are all published
+            resolution (MetricResolution): Storage resolution of the metric
+        """
+        namespace = CloudWatchNamespaces(namespace).value
+        name = getattr(name, "value", name)
+        self._metrics.setdefault(namespace, []).append((name, unit, value, resolution))
+
+    def get_metrics(self, namespace: CloudWatchNamespaces) -> "RequestMetrics":
+        """
+        Returns a RequestMetrics adding the metrics of a namespace to the current request, to be used in place of a
+        module level Metrics instance.
+
+        Args:
+            namespace (CloudWatchNamespaces): The namespace of the metrics
+
+        Returns:
+            RequestMetrics: the metrics of the namespace
+        """
+        return RequestMetrics(self, namespace)
+
+    def server_timing(self) -> str:
+        """
+        Formats the stage durations of the current request as a Server-Timing style value,
+        e.g. `LlmConfig;dur=12.3, Retrieval;dur=85.1, Total;dur=1024.9`
+
+        Returns:
+            str: The formatted stage durations, in milliseconds
+        """
+        timings = {**self.stage_durations, RequestStages.TOTAL.value: time.perf_counter() - self.start_time}
+        return ", ".join(f"{stage};dur={duration * 1000:.1f}" for stage, duration in timings.items())
+
+    def publish_timings(self) -> None:
+        """
+        Publishes the duration of every stage of the current request as high resolution metrics, along with the request
+        flags and the metrics added to the request, in a single EMF record. The record holds one metric directive per
+        namespace, so that the metrics of the LLM, knowledge base and stage timings keep their own namespaces.
+        """
+        try:
+            total_duration = time.perf_counter() - self.start_time
+            logger.debug(f"Server-Timing: {self.server_timing()}")
+
+            stage_metrics = EphemeralMetrics(
+                namespace=CloudWatchNamespaces.REQUEST_STAGES.value, service=METRICS_SERVICE_NAME
+            )
+            timings = {**self.stage_durations, RequestStages.TOTAL.value: total_duration}
+            for stage_name, duration in timings.items():
+                stage_metrics.add_metric(
+                    name=f"{stage_name}Time",
+                    unit=MetricUnit.Milliseconds,
+                    value=duration * 1000,
+                    resolution=MetricResolution.High,
+                )
+            for flag_name, value in self.flags.items():
+                stage_metrics.add_metadata(key=flag_name, value=value)
+            record = stage_metrics.serialize_metric_set()
+
+            for namespace, namespace_values in self.metrics.items():
+                namespace_metrics = EphemeralMetrics(namespace=namespace, service=METRICS_SERVICE_NAME)
+                for name, unit, value, resolution in namespace_values:
+                    namespace_metrics.add_metric(name=name, unit=unit, value=value, resolution=resolution)
+                namespace_record = namespace_metrics.serialize_metric_set()
+                record["_aws"]["CloudWatchMetrics"].extend(namespace_record.pop("_aws")["CloudWatchMetrics"])
+                record.update(namespace_record)
+            print(json.dumps(record, separators=(",", ":")))
+        except Exception as ex:
+            logger.error(f"Error publishing request stage timings: {ex}")
+
+
+class RequestMetrics:
+    """
+    RequestMetrics adds the metrics of a namespace to the current request of a RequestTimer, with the add_metric
+    signature of the powertools Metrics, so that they are published in the single EMF record of the request.
+
+    Attributes:
+        timer (RequestTimer): The timer of the requests
+        namespace (CloudWatchNamespaces): The namespace of the metrics
+    """
+
+    def __init__(self, timer: RequestTimer, namespace: CloudWatchNamespaces) -> None:
+        self._timer = timer
+        self._namespace = namespace
+
+    @property
+    def namespace(self) -> CloudWatchNamespaces:
+        return self._namespace
+
+    def add_metric(
+        self, name: str, unit: MetricUnit, value: float, resolution: MetricResolution = MetricResolution.Standard
+    ) -> None:
+        self._timer.add_metric(self._namespace, name, unit, value, resolution)
+
+
+request_timer = RequestTimer()
+_cold_start = True
+
+
+def log_request_timings(lambda_handler: Callable) -> Callable:
+    """
+    Decorator for the lambda handlers which starts timing a new request on every invocation, flags whether the
+    invocation is a cold start, and publishes the collected stage timings once the handler returns.
+
+    Args:
+        lambda_handler (Callable): The lambda handler to wrap
+
+    Returns:
+        Callable: The wrapped lambda handler
+    """
+
+    @functools.wraps(lambda_handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Any:
+        global _cold_start
+        request_timer.reset()
+        request_timer.set_flag(RequestFlags.COLD_START, _cold_start)
+        _cold_start = False
+        try:
+            return lambda_handler(event, context)
+        finally:
+            request_timer.publish_timings()
+
+    return wrapper
@@ -0,0 +1,149 @@
+# *********************************************************************************************************************
+#  Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.                                                #
+#                                                                                                                    #
+#  Licensed under the Apache License, Version 2.0 (the "License"). You may not use this file except in compliance    #
+#  with the License. A copy of the License is located at                                                             #
+#                                                                                                                    #
+#      http://www.apache.org/licenses/LICENSE-2.0                                                                    #
+#                                                                                                                    #
+#  or in the 'license' file accompanying this file. This file is distributed on an 'AS IS' BASIS, WITHOUT WARRANTIES #
+#  OR CONDITIONS OF ANY KIND, express or implied. See the License for the specific language governing permissions    #
+#  and limitations under the License.                                                                                #
+# ********************************************************************************************************************#
+
+
+import functools
+import json
+import os
+import random
+from typing import Any, Callable
+
+from aws_lambda_powertools import Logger, Tracer
+from utils.constants import (
+    DEFAULT_TRACE_CAPTURE_MAX_SIZE,
+    DEFAULT_TRACE_CAPTURE_MODE,
+    DEFAULT_TRACE_CAPTURE_SAMPLE_RATE,
+    TRACE_CAPTURE_MAX_SIZE_ENV_VAR,
+    TRACE_CAPTURE_MODE_ENV_VAR,
+    TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR,
+)
+from utils.enum_types import TraceCaptureModes
+
+logger = Logger(utc=True)
+tracer = Tracer()
+
+
+def get_env_number(env_var: str, default: float, cast: Callable = float) -> float:
+    """
+    Reads a numeric setting from the environment, falling back to the default when it is not set or is not a number.
+
+    Args:
+        env_var (str): Name of the environment variable
+        default (float): Value to use when the environment variable is not set or invalid
+        cast (Callable): Type to cast the value to
+
+    Returns:
+        float: The numeric setting
+    """
+    try:
+        return cast(os.getenv(env_var, default))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid value for {env_var}, using {default}")
+        return default
+
+
+def get_capture_mode() -> TraceCaptureModes:
+    """
+    Reads the response capture policy from the environment, falling back to the default mode when it is not set or
+    is not a supported mode.
+
+    Returns:
+        TraceCaptureModes: the capture mode to apply
+    """
+    mode = os.getenv(TRACE_CAPTURE_MODE_ENV_VAR, DEFAULT_TRACE_CAPTURE_MODE).lower()
+    try:
+        return TraceCaptureModes(mode)
+    except ValueError:
+        logger.warning(f"Unsupported trace capture mode {mode}, using {DEFAULT_TRACE_CAPTURE_MODE}")
+        return TraceCaptureModes(DEFAULT_TRACE_CAPTURE_MODE)
+
+
+def should_capture() -> bool:
+    """
+    Decides whether the response of the current call should be captured, based on the capture mode and sample rate.
+
+    Returns:
+        bool: True if the response should be added to the trace
+    """
+    if tracer.disabled:
+        return False
+
+    mode = get_capture_mode()
+    if mode == TraceCaptureModes.OFF:
+        return False
+    if mode == TraceCaptureModes.SAMPLED:
+        sample_rate = get_env_number(TRACE_CAPTURE_SAMPLE_RATE_ENV_VAR, DEFAULT_TRACE_CAPTURE_SAMPLE_RATE)
+        return random.random() * 100 < sample_rate
+    return True
+
+
+def serialize_response(response: Any, max_size: int) -> str:
+    """
+    Serializes a method response for the trace, keeping at most `max_size` characters. Lists are serialized item by
+    item and serialization stops as soon as the limit is reached, so large document lists are not serialized in full.
+
+    Args:
+        response (Any): The method response
+        max_size (int): Maximum number of characters to keep
+
+    Returns:
+        str: The serialized, possibly truncated, response
+    """
+    if isinstance(response, (list, tuple)):
+        items = []
+        size = 0
+        for item in response:
+            items.append(json.dumps(item, default=str))
+            size += len(items[-1]) + 2
+            if size > max_size:
+                break
+        serialized = f"[{', '.join(items)}]"
+    else:
+        serialized = json.dumps(response, default=str)
+
+    if len(serialized) > max_size:
+        return f"{serialized[:max_size]}... (truncated)"
+    return serialized
+
+
+def capture_response(method: Callable) -> Callable:
+    """
+    Decorator that adds the response of a traced method to its X-Ray subsegment as metadata, according to the capture
+    policy set in the environment:
+        - off: responses are never captured
+        - sampled: responses of TRACE_CAPTURE_SAMPLE_RATE percent of the calls are captured, truncated to the max size
+        - truncated: responses of every call are captured, truncated to TRACE_CAPTURE_MAX_SIZE characters
+
+    It is used in place of `capture_response=True` and must be applied below
+    `tracer.capture_method(capture_response=False)`, so that the metadata is attached to the subsegment of the method
+    and the full response is not captured as well, which a bare `tracer.capture_method` does by default.
+
+    Args:
+        method (Callable): The method to decorate
+
+    Returns:
+        Callable: The decorated method
+    """
+
+    @functools.wraps(method)
+    def decorate(*args, **kwargs):
+        response = method(*args, **kwargs)
+        if should_capture():
+            try:
+                max_size = get_env_number(TRACE_CAPTURE_MAX_SIZE_ENV_VAR, DEFAULT_TRACE_CAPTURE_MAX_SIZE, int)
+                tracer.put_metadata(key=f"{method.__name__} response", value=serialize_response(response, max_size))
+            except Exception as ex:
+                logger.debug(f"Unable to capture the response of {method.__name__}: {ex}")
+        return response
+
+    return decorate